@@ -0,0 +1,540 @@
+import itertools
+import logging
+import os
+import pickle
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Dict
+
+from API.MessageBroker import MessageBroker, DELIVERY_SYNC, is_pattern
+from API.shared.SharedMemory import attach_shared_memory
+
+"""
+BrokerBridge
+------------
+Connects the MessageBroker of two processes over a Unix domain socket.
+
+Each side declares what it wants from the other:
+    - subscribe_remote(topic): messages the peer publishes on the topic (or '+' / '#' pattern) are
+      published on the local broker,
+    - import_request(topic): broker.request(topic, ...) in this process is answered by the responders of
+      the peer process.
+
+Frames are a fixed struct header (FRAME_HEADER: type, out-of-band buffer count, topic length, payload
+length, request id / slot) followed by the topic, the payload and one (slot, size) descriptor per
+out-of-band buffer. Payloads are pickled with protocol 5: buffers of at least SHM_THRESHOLD bytes
+(NumPy frames) are not copied into the pickle but written into a slot of a shared memory arena owned by
+the sender, so only a few bytes go through the socket. The receiver copies the buffer out of the slot and
+releases it with a RELEASE frame; when all slots are in use the buffer is sent in-band instead.
+
+Messages looped back are not re-forwarded: a message received for a topic is not sent back to the peer
+while it is being published locally.
+
+The socket is created with mode 0600 and payloads are pickles, so only bridge processes of the same user
+can connect.
+"""
+
+BRIDGE_SOCKET_PATH = os.path.join(tempfile.gettempdir(), "glue_dispensing_broker.sock")
+BRIDGE_CONNECT_TIMEOUT = 5.0  # seconds
+BRIDGE_REQUEST_TIMEOUT = 1.0  # seconds a bridged request() waits for the peer
+BRIDGE_SEND_QUEUE_SIZE = 1000  # outgoing messages, the oldest is dropped when full
+BRIDGE_SEND_BATCH = 64  # queued messages written with one send call
+
+SHM_THRESHOLD = 64 * 1024  # bytes, smaller buffers stay in the pickle
+SHM_SLOT_SIZE = 8 * 1024 * 1024  # bytes, fits a 1920x1080 BGR frame
+SHM_SLOTS = 8
+
+FRAME_HEADER = struct.Struct("!BBHII")  # type, buffers, topic length, payload length, request id / slot
+BUFFER_DESCRIPTOR = struct.Struct("!II")  # slot, size
+
+FRAME_HELLO = 1
+FRAME_SUBSCRIBE = 2
+FRAME_UNSUBSCRIBE = 3
+FRAME_PUBLISH = 4
+FRAME_REQUEST = 5
+FRAME_RESPONSE = 6
+FRAME_RELEASE = 7
+
+class SharedSlots:
+    """
+    Arena of fixed-size shared memory slots for out-of-band buffers.
+
+    The owner (sender) acquires and fills slots, the attached peer reads them and the owner frees them
+    when the peer releases them.
+    """
+
+    def __init__(self, name=None, slots=SHM_SLOTS, slot_size=SHM_SLOT_SIZE):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=slots * slot_size)
+        else:
+            self.memory = attach_shared_memory(name)
+        self.name = self.memory.name
+        self._free = deque(range(slots))
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+    def write(self, slot, buffer):
+        start = slot * self.slot_size
+        self.memory.buf[start:start + buffer.nbytes] = buffer.cast("B")
+
+    def read(self, slot, size):
+        start = slot * self.slot_size
+        return bytearray(self.memory.buf[start:start + size])
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class BrokerBridge:
+    """
+    One end of a bridge between the brokers of two processes.
+
+    Attributes:
+        name (str): Name used in logs.
+        connected (bool): False once the connection is lost or closed.
+    """
+
+    def __init__(self, sock: socket.socket, broker: MessageBroker = None, name="bridge",
+                 shm_slots=SHM_SLOTS, shm_slot_size=SHM_SLOT_SIZE, shm_threshold=SHM_THRESHOLD,
+                 send_queue_size=BRIDGE_SEND_QUEUE_SIZE):
+        self.sock = sock
+        self._reader = sock.makefile("rb", buffering=256 * 1024)  # many small frames per recv
+        self.broker = broker or MessageBroker()
+        self.name = name
+        self.connected = True
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.shm_threshold = shm_threshold
+        self._slots = SharedSlots(slots=shm_slots, slot_size=shm_slot_size) if shm_slots > 0 else None
+        self._peer_slots = None
+        self._peer_ready = threading.Event()
+
+        self._send_lock = threading.Lock()
+        self._outbox = deque()
+        self._outbox_size = send_queue_size
+        self._outbox_ready = threading.Condition()
+        self._requests = deque()
+        self._requests_ready = threading.Condition()
+        self._pending: Dict[int, list] = {}
+        self._request_ids = itertools.count(1)
+        self._forwarders = {}  # topic -> callback subscribed on the local broker for the peer
+        self._responders = {}  # topic -> callback answering local requests through the peer
+        self._inbound = threading.local()
+
+        self.stats = {"sent": 0, "received": 0, "bytes_sent": 0, "bytes_received": 0, "shm_buffers": 0,
+                      "inline_buffers": 0, "dropped": 0, "request_timeouts": 0}
+
+        # HELLO is the first frame on the stream, the peer attaches our arena before any frame refers to it
+        hello = f"{self._slots.name}|{self._slots.slots}|{self._slots.slot_size}" if self._slots else ""
+        self._send_frame(FRAME_HELLO, payload=hello.encode())
+        self._threads = [threading.Thread(target=self._receive_loop, name=f"{name}-receive", daemon=True),
+                         threading.Thread(target=self._send_loop, name=f"{name}-send", daemon=True),
+                         threading.Thread(target=self._request_loop, name=f"{name}-requests", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    @classmethod
+    def listen(cls, path=BRIDGE_SOCKET_PATH, timeout=None, **kwargs):
+        """Waits for the peer process to connect on path and returns the bridge."""
+        if os.path.exists(path):
+            os.unlink(path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen(1)
+        server.settimeout(timeout)
+        try:
+            sock, _ = server.accept()
+        finally:
+            server.close()
+            os.unlink(path)
+        sock.settimeout(None)
+        return cls(sock, **kwargs)
+
+    @classmethod
+    def connect(cls, path=BRIDGE_SOCKET_PATH, timeout=BRIDGE_CONNECT_TIMEOUT, **kwargs):
+        """Connects to a listening peer, retrying until timeout while it starts up."""
+        deadline = time.monotonic() + timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(path)
+                return cls(sock, **kwargs)
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    """ PUBLIC """
+
+    def subscribe_remote(self, topic: str):
+        """Publish the peer's messages of a topic or pattern on the local broker."""
+        self._send_frame(FRAME_SUBSCRIBE, topic)
+
+    def unsubscribe_remote(self, topic: str):
+        self._send_frame(FRAME_UNSUBSCRIBE, topic)
+
+    def import_request(self, topic: str, timeout: float = BRIDGE_REQUEST_TIMEOUT):
+        """Answer broker.request(topic, ...) of this process with the responders of the peer."""
+
+        def responder(message):
+            if getattr(self._inbound, "topic", None) == topic:
+                return None  # the peer is asking us, don't bounce it back
+            return self.request(topic, message, timeout)
+
+        self._responders[topic] = responder
+        self.broker.subscribe(topic, responder, mode=DELIVERY_SYNC)
+
+    def request(self, topic: str, message: Any, timeout: float = BRIDGE_REQUEST_TIMEOUT):
+        """
+        Calls broker.request(topic, message) in the peer process.
+
+        Returns:
+            The first non-None response of the peer's responders, None on timeout.
+        """
+        request_id = next(self._request_ids) & 0xFFFFFFFF
+        waiter = [threading.Event(), None]
+        self._pending[request_id] = waiter
+        try:
+            self._send_frame(FRAME_REQUEST, topic, *self._serialize(message), request_id=request_id)
+            if not waiter[0].wait(timeout):
+                self.stats["request_timeouts"] += 1
+                self.logger.warning("[%s] Request '%s' timed out", self.name, topic)
+                return None
+            return waiter[1]
+        finally:
+            self._pending.pop(request_id, None)
+
+    def wait_ready(self, timeout=BRIDGE_CONNECT_TIMEOUT):
+        """Waits for the peer's HELLO."""
+        return self._peer_ready.wait(timeout)
+
+    def metrics(self):
+        return dict(self.stats, outbox=len(self._outbox))
+
+    def close(self):
+        if not self.connected:
+            return
+        self.connected = False
+        for topic, forwarder in list(self._forwarders.items()):
+            self.broker.unsubscribe(topic, forwarder)
+        for topic, responder in list(self._responders.items()):
+            self.broker.unsubscribe(topic, responder)
+        self._forwarders.clear()
+        self._responders.clear()
+        for condition in (self._outbox_ready, self._requests_ready):
+            with condition:
+                condition.notify_all()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._reader.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(1.0)
+        if self._peer_slots is not None:
+            self._peer_slots.close()
+        if self._slots is not None:
+            self._slots.close()
+
+    """ OUTGOING """
+
+    def _forwarder(self, topic: str):
+        pattern = is_pattern(topic)
+
+        def forward(*args):
+            concrete, message = args if pattern else (topic, args[0])
+            if getattr(self._inbound, "topic", None) == concrete:
+                return  # received from the peer, don't send it back
+            with self._outbox_ready:
+                if len(self._outbox) >= self._outbox_size:
+                    self._outbox.popleft()
+                    self.stats["dropped"] += 1
+                self._outbox.append((concrete, message))
+                self._outbox_ready.notify()
+
+        return forward
+
+    def _send_loop(self):
+        while self.connected:
+            with self._outbox_ready:
+                while not self._outbox and self.connected:
+                    self._outbox_ready.wait()
+                if not self.connected:
+                    return
+                batch = [self._outbox.popleft() for _ in range(min(len(self._outbox), BRIDGE_SEND_BATCH))]
+
+            # Everything queued since the last write goes out in one system call
+            frames = []
+            for topic, message in batch:
+                try:
+                    frames.append(self._encode_frame(FRAME_PUBLISH, topic, *self._serialize(message)))
+                except Exception as e:
+                    self.logger.error("[%s] Cannot forward '%s': %s", self.name, topic, e)
+            try:
+                self._write(frames)
+            except OSError:
+                self._disconnected()
+                return
+
+    def _serialize(self, message):
+        """Returns (payload, [(slot, size)]) with large buffers moved to shared memory slots."""
+        descriptors = []
+
+        def buffer_callback(buffer):
+            raw = buffer.raw()
+            if raw.nbytes < self.shm_threshold:
+                return True
+            slot = self._slots.acquire() if self._slots is not None and raw.nbytes <= self._slots.slot_size else None
+            if slot is None:
+                self.stats["inline_buffers"] += 1
+                return True
+            self._slots.write(slot, raw)
+            descriptors.append((slot, raw.nbytes))
+            self.stats["shm_buffers"] += 1
+            return False
+
+        payload = pickle.dumps(message, protocol=5, buffer_callback=buffer_callback)
+        return payload, descriptors
+
+    def _encode_frame(self, frame_type, topic="", payload=b"", descriptors=(), request_id=0):
+        """Returns the frame as (header + topic, payload, descriptors) parts."""
+        topic_bytes = topic.encode()
+        header = FRAME_HEADER.pack(frame_type, len(descriptors), len(topic_bytes), len(payload), request_id)
+        trailer = b"".join(BUFFER_DESCRIPTOR.pack(*descriptor) for descriptor in descriptors)
+        return header + topic_bytes, payload, trailer
+
+    def _write(self, frames):
+        # Large in-band payloads are sent on their own instead of being copied into the joined buffer
+        chunks, small = [], []
+        for frame in frames:
+            for part in frame:
+                if len(part) >= SHM_THRESHOLD:
+                    if small:
+                        chunks.append(b"".join(small))
+                        small = []
+                    chunks.append(part)
+                elif part:
+                    small.append(part)
+        if small:
+            chunks.append(b"".join(small))
+        with self._send_lock:
+            for chunk in chunks:
+                self.sock.sendall(chunk)
+        self.stats["sent"] += len(frames)
+        self.stats["bytes_sent"] += sum(len(part) for frame in frames for part in frame)
+
+    def _send_frame(self, frame_type, topic="", payload=b"", descriptors=(), request_id=0):
+        self._write([self._encode_frame(frame_type, topic, payload, descriptors, request_id)])
+
+    """ INCOMING """
+
+    def _receive_exactly(self, size):
+        data = self._reader.read(size)
+        if len(data) < size:
+            raise ConnectionError("Bridge peer closed the connection")
+        return data
+
+    def _receive_loop(self):
+        try:
+            while self.connected:
+                frame_type, buffer_count, topic_length, payload_length, request_id = \
+                    FRAME_HEADER.unpack(self._receive_exactly(FRAME_HEADER.size))
+                topic = self._receive_exactly(topic_length).decode() if topic_length else ""
+                payload = self._receive_exactly(payload_length) if payload_length else b""
+                descriptors = [BUFFER_DESCRIPTOR.unpack(self._receive_exactly(BUFFER_DESCRIPTOR.size))
+                               for _ in range(buffer_count)]
+                self.stats["received"] += 1
+                self.stats["bytes_received"] += FRAME_HEADER.size + topic_length + payload_length
+                self._handle_frame(frame_type, topic, payload, descriptors, request_id)
+        except (OSError, ConnectionError):
+            self._disconnected()
+
+    def _deserialize(self, payload, descriptors):
+        buffers = []
+        for slot, size in descriptors:
+            buffers.append(self._peer_slots.read(slot, size))
+            self._send_frame(FRAME_RELEASE, request_id=slot)
+        return pickle.loads(payload, buffers=buffers)
+
+    def _handle_frame(self, frame_type, topic, payload, descriptors, request_id):
+        if frame_type == FRAME_PUBLISH:
+            message = self._deserialize(payload, descriptors)
+            self._inbound.topic = topic
+            try:
+                self.broker.publish(topic, message)
+            finally:
+                self._inbound.topic = None
+        elif frame_type == FRAME_RELEASE:
+            self._slots.release(request_id)
+        elif frame_type == FRAME_REQUEST:
+            with self._requests_ready:
+                self._requests.append((topic, self._deserialize(payload, descriptors), request_id))
+                self._requests_ready.notify()
+        elif frame_type == FRAME_RESPONSE:
+            waiter = self._pending.get(request_id)
+            if waiter is not None:
+                waiter[1] = self._deserialize(payload, descriptors)
+                waiter[0].set()
+            else:
+                self._deserialize(payload, descriptors)  # late response, still release its slots
+        elif frame_type == FRAME_SUBSCRIBE:
+            if topic not in self._forwarders:
+                self._forwarders[topic] = self._forwarder(topic)
+                self.broker.subscribe(topic, self._forwarders[topic], mode=DELIVERY_SYNC)
+        elif frame_type == FRAME_UNSUBSCRIBE:
+            forwarder = self._forwarders.pop(topic, None)
+            if forwarder is not None:
+                self.broker.unsubscribe(topic, forwarder)
+        elif frame_type == FRAME_HELLO:
+            if payload:
+                name, slots, slot_size = bytes(payload).decode().split("|")
+                self._peer_slots = SharedSlots(name, int(slots), int(slot_size))
+            self._peer_ready.set()
+
+    def _request_loop(self):
+        # Requests are answered off the receive thread, a slow responder must not stall the stream
+        while self.connected:
+            with self._requests_ready:
+                while not self._requests and self.connected:
+                    self._requests_ready.wait()
+                if not self.connected:
+                    return
+                topic, message, request_id = self._requests.popleft()
+            self._inbound.topic = topic
+            try:
+                result = self.broker.request(topic, message)
+            except Exception as e:
+                self.logger.error("[%s] Request '%s' failed: %s", self.name, topic, e)
+                result = None
+            finally:
+                self._inbound.topic = None
+            try:
+                self._send_frame(FRAME_RESPONSE, topic, *self._serialize(result), request_id=request_id)
+            except OSError:
+                self._disconnected()
+                return
+
+    def _disconnected(self):
+        if self.connected:
+            self.logger.warning("[%s] Bridge connection lost", self.name)
+            threading.Thread(target=self.close, daemon=True).start()
+
+
+""" BENCHMARK """
+
+
+def _echo_process(path):
+    """Peer process of the benchmark: echoes bench/ping on bench/pong and answers bench/echo requests."""
+    broker = MessageBroker()
+
+    def echo(message):
+        broker.publish("bench/pong", message)
+
+    def answer(message):
+        return message
+
+    broker.subscribe("bench/ping", echo, mode=DELIVERY_SYNC)
+    broker.subscribe("bench/echo", answer, mode=DELIVERY_SYNC)
+    bridge = BrokerBridge.connect(path, timeout=10.0, name="peer", send_queue_size=50000)
+    bridge.subscribe_remote("bench/ping")
+    while bridge.connected:
+        time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+
+    import numpy as np
+
+    if len(sys.argv) == 3 and sys.argv[1] == "--peer":
+        _echo_process(sys.argv[2])
+        sys.exit(0)
+
+    # The peer is an independent process, like a GUI or vision process started on its own
+    path = os.path.join(tempfile.gettempdir(), f"broker_bridge_bench_{os.getpid()}.sock")
+    peer = subprocess.Popen([sys.executable, "-m", "API.BrokerBridge", "--peer", path])
+    bridge = BrokerBridge.listen(path, timeout=10.0, name="main", send_queue_size=50000)
+    bridge.wait_ready()
+    broker = MessageBroker()
+
+    pongs = deque()
+    arrived = threading.Condition()
+
+    def on_pong(message):
+        with arrived:
+            pongs.append((time.perf_counter(), message))
+            arrived.notify()
+
+    broker.subscribe("bench/pong", on_pong, mode=DELIVERY_SYNC)
+    bridge.subscribe_remote("bench/pong")
+    bridge.import_request("bench/echo")
+    time.sleep(0.2)  # let the peer register the subscriptions
+
+    def round_trip(message):
+        with arrived:
+            pongs.clear()
+        start = time.perf_counter()
+        broker.publish("bench/ping", message)
+        with arrived:
+            arrived.wait_for(lambda: pongs, 5.0)
+        return pongs[0][0] - start
+
+    small = {"state": "MOVING", "speed": 120.5, "accel": 0.0}
+    latencies = sorted(round_trip(small) for _ in range(2000))
+    print(f"small message round trip: p50 {latencies[1000] * 1e6:.0f} us  p99 {latencies[1980] * 1e6:.0f} us")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        broker.request("bench/echo", {"x": 10, "y": 20})
+    print(f"bridged request(): {(time.perf_counter() - start) / 1000 * 1e6:.0f} us per call")
+
+    frame = np.random.randint(0, 255, (720, 1280, 3), dtype=np.uint8)
+    for label, threshold in (("shared memory", SHM_THRESHOLD), ("through the socket", 1 << 40)):
+        bridge.shm_threshold = threshold
+        times = []
+        for _ in range(100):
+            times.append(round_trip({"image": frame}))
+        echoed = pongs[0][1]["image"]
+        times.sort()
+        print(f"1280x720 frame round trip {label:<19} p50 {times[50] * 1000:.2f} ms  "
+              f"({2 * frame.nbytes / times[50] / 1e9:.2f} GB/s), intact: {np.array_equal(echoed, frame)}")
+
+    # Publish throughput one way (peer echoes everything back)
+    count = 20000
+    with arrived:
+        pongs.clear()
+    start = time.perf_counter()
+    for index in range(count):
+        broker.publish("bench/ping", index)
+    with arrived:
+        arrived.wait_for(lambda: len(pongs) + bridge.stats["dropped"] >= count, 10.0)
+    elapsed = time.perf_counter() - start
+    print(f"throughput: {len(pongs) / elapsed:,.0f} messages/s round trip, {bridge.stats['dropped']} dropped")
+    print(bridge.metrics())
+    bridge.close()
+    peer.wait(5.0)
@@ -85,6 +85,9 @@ ROBOT_STOP = "robot/stop"
 ROBOT_SAVE_POINT = "robot/savePoint"
 ROBOT_CALIBRATE = "robot/calibrate"
 ROBOT_CALIBRATE_PICKUP = "robot/calibPickup"
+ROBOT_AUTO_CALIBRATE = "robot/autoCalibrate"  # automated camera to robot calibration (AutoCalibrationRoutine)
+ROBOT_CYCLE_TIME_RECORD = "robot/cycleTime/record"  # data: True / False - log measured path times
+ROBOT_CYCLE_TIME_CALIBRATE = "robot/cycleTime/calibrate"  # fit the cycle time model to the logged paths
 
 CAMERA_ACTION_GET_LATEST_FRAME = "camera/getLatestFrame"
 CAMERA_ACTION_CAPTURE_CALIBRATION_IMAGE = "camera/captureCalibrationImage"  # Capture image for calibration
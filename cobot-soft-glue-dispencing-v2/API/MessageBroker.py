@@ -1,6 +1,377 @@
 import logging
+import threading
+import time
 import weakref
-from typing import Dict, List, Any, Callable
+from collections import deque, namedtuple
+from typing import Dict, List, Tuple, Any, Callable
+
+from API.shared.LatencyHistogram import LatencyHistogram
+
+"""
+MessageBroker
+-------------
+Process-wide publish / subscribe broker.
+
+Every subscription chooses how it is delivered:
+    - DELIVERY_SYNC (default): the callback is called in the publisher's thread before publish() returns.
+      Existing subscribers rely on it: Qt widgets updated from GUI thread publishers, and callbacks that
+      must be done when publish() returns.
+    - DELIVERY_ASYNC (opt-in per subscription): the message is put on a bounded queue owned by the
+      subscription and a worker thread of that subscription calls the callback. publish() only enqueues,
+      so a slow subscriber never stalls the publishing thread (e.g. the robot state poller). Messages of
+      one subscription are delivered in publish order. Subscribe a callback this way only if it is thread
+      safe (e.g. it only emits a Qt signal).
+
+When the queue of an async subscription is full the overflow policy decides:
+    - OVERFLOW_DROP_OLDEST: discard the oldest queued message (state streams, only the latest matters),
+    - OVERFLOW_DROP_NEWEST: discard the message being published,
+    - OVERFLOW_BLOCK: the publisher waits for space, at most block_timeout seconds, then drops it.
+
+request() always calls the callbacks synchronously, since the caller waits for the response.
+
+The registry maps every topic to an immutable tuple of subscriptions. subscribe / unsubscribe build a
+new tuple under a lock and swap it in with a single dict assignment, so publish() needs no lock and no
+copy: one dict lookup and one tuple iteration, safe against concurrent mutation. Subscriptions of
+garbage collected callbacks are only marked by the weakref callback and removed on the next mutation
+(or collect()).
+
+Conflated topics (conflate()) are latest-value topics for high-rate streams like the robot state or the
+glue meter values: the broker keeps only the latest message per topic (or per key of the message) with
+a sequence number. An async subscriber of a conflated topic has no queue but one pending slot per key
+that every publish overwrites, so it handles at most one message per key at its own pace, however fast
+the publisher is. Subscribing with with_sequence=True delivers LatestValue(sequence, key, value)
+instead of the bare message, and get_latest() reads the latest value without subscribing; consecutive
+sequence numbers show how many updates a consumer skipped.
+
+Topics are '/' separated levels. subscribe() also accepts MQTT style patterns: '+' matches exactly one
+level, '#' (last level only) matches the remaining levels, including none ("+/VALUE", "robot/#", "#").
+A pattern callback is called with (topic, message). Patterns are compiled into a topic
+trie; the subscriptions a topic resolves to (exact + matching patterns) are cached per topic and the
+cache is dropped on every subscribe / unsubscribe. Without patterns the exact registry is used directly,
+so exact publishing costs the same single dict lookup.
+
+The broker measures itself: publish count and rate per topic, and per subscription the handler latency
+histogram, failures and drops. A handler slower than its budget (handler_budget) logs a rate-limited
+warning. metrics_snapshot() returns everything as a dict, start_metrics() publishes it periodically on
+METRICS_TOPIC. Log calls use lazy %-formatting, nothing is formatted when the level is disabled.
+"""
+
+DELIVERY_SYNC = "sync"
+DELIVERY_ASYNC = "async"
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_DROP_NEWEST = "drop_newest"
+OVERFLOW_BLOCK = "block"
+
+DEFAULT_QUEUE_SIZE = 100  # messages per async subscription
+DEFAULT_BLOCK_TIMEOUT = 1.0  # seconds an OVERFLOW_BLOCK publisher waits for space
+ROUTE_CACHE_SIZE = 4096  # resolved topics cached while wildcard patterns are subscribed
+
+METRICS_TOPIC = "broker/metrics"
+METRICS_INTERVAL = 1.0  # seconds between snapshots published on METRICS_TOPIC
+METRICS_RATE_WINDOW = 0.5  # seconds, shortest window a publish rate is computed over
+DEFAULT_HANDLER_BUDGET = 0.05  # seconds a callback may take before it is reported as slow
+SLOW_HANDLER_WARNING_INTERVAL = 5.0  # seconds between slow handler warnings of one subscription
+
+TOPIC_SEPARATOR = "/"
+WILDCARD_LEVEL = "+"
+WILDCARD_TAIL = "#"
+
+LatestValue = namedtuple("LatestValue", ["sequence", "key", "value"])
+
+
+class _ConflatedTopic:
+    """Latest message (per key) of a conflated topic and its sequence number."""
+
+    def __init__(self, key=None):
+        self.key = key
+        self.latest: Dict[Any, LatestValue] = {}
+        self._lock = threading.Lock()
+
+    def update(self, message) -> LatestValue:
+        key = self.key(message) if self.key is not None else None
+        with self._lock:
+            previous = self.latest.get(key)
+            latest = LatestValue(previous.sequence + 1 if previous is not None else 1, key, message)
+            self.latest[key] = latest
+        return latest
+
+
+def is_pattern(topic: str) -> bool:
+    return WILDCARD_LEVEL in topic or WILDCARD_TAIL in topic
+
+
+def validate_pattern(pattern: str):
+    """Raises ValueError unless wildcards occupy whole levels and '#' is the last level."""
+    levels = pattern.split(TOPIC_SEPARATOR)
+    for index, level in enumerate(levels):
+        if (WILDCARD_LEVEL in level or WILDCARD_TAIL in level) and len(level) > 1:
+            raise ValueError(f"Wildcard must occupy a whole level in '{pattern}'")
+        if level == WILDCARD_TAIL and index != len(levels) - 1:
+            raise ValueError(f"'{WILDCARD_TAIL}' must be the last level in '{pattern}'")
+
+
+class _TopicTrie:
+    """Wildcard patterns compiled into a trie of topic levels."""
+
+    def __init__(self, patterns=()):
+        self.root = {}  # level -> (children, patterns ending at this node)
+        for pattern in patterns:
+            node = None
+            children = self.root
+            for level in pattern.split(TOPIC_SEPARATOR):
+                node = children.setdefault(level, ({}, []))
+                children = node[0]
+            node[1].append(pattern)
+
+    def match(self, topic: str) -> List[str]:
+        """Patterns matching a concrete topic."""
+        matches = []
+        levels = topic.split(TOPIC_SEPARATOR)
+        frontier = [self.root]
+        for level in levels:
+            following = []
+            for children in frontier:
+                tail = children.get(WILDCARD_TAIL)
+                if tail is not None:
+                    matches.extend(tail[1])
+                for key in (level, WILDCARD_LEVEL):
+                    node = children.get(key)
+                    if node is not None:
+                        following.append(node)
+            if not following:
+                return matches
+            frontier = [node[0] for node in following]
+            last = following
+        for node in last:
+            matches.extend(node[1])
+        for children in frontier:
+            # "a/#" also matches "a"
+            tail = children.get(WILDCARD_TAIL)
+            if tail is not None:
+                matches.extend(tail[1])
+        return matches
+
+
+class _TopicMetrics:
+    """Publish counter of one topic and its rate over the last window."""
+
+    def __init__(self, now):
+        self.published = 0
+        self.rate = 0.0
+        self._window_count = 0
+        self._window_start = now
+
+    def sample(self, now):
+        elapsed = now - self._window_start
+        if elapsed >= METRICS_RATE_WINDOW:
+            self.rate = (self.published - self._window_count) / elapsed
+            self._window_count = self.published
+            self._window_start = now
+        return {"published": self.published, "rate_hz": self.rate}
+
+
+class _Subscription:
+    """
+    One callback subscribed to one topic or wildcard pattern.
+
+    Calling the subscription returns the live callback or None, like the weak reference it wraps.
+
+    Attributes:
+        topic (str): Subscribed topic or pattern.
+        wildcard (bool): True for a '+' / '#' pattern; the callback then receives (topic, message).
+        ref (weakref.ref): Weak reference to the callback.
+        mode (str): DELIVERY_SYNC or DELIVERY_ASYNC.
+        delivered (int): Messages passed to the callback.
+        dropped (int): Messages discarded by the overflow policy.
+        failed (int): Callback calls that raised.
+        skipped (int): Updates of a conflated topic overwritten before they were delivered.
+        slow (int): Callback calls that took longer than handler_budget.
+        latency (LatencyHistogram): Callback durations.
+        conflated (bool): True if the topic is conflated (one pending slot per key instead of the queue).
+
+    The counters and the histogram are updated without a lock: a synchronous subscription called from
+    several publisher threads at the same instant may lose a sample, which is fine for metrics.
+    """
+
+    def __init__(self, topic, ref, mode=DELIVERY_SYNC, queue_size=DEFAULT_QUEUE_SIZE,
+                 overflow=OVERFLOW_DROP_OLDEST, block_timeout=DEFAULT_BLOCK_TIMEOUT, logger=None,
+                 conflated=False, with_sequence=False, handler_budget=DEFAULT_HANDLER_BUDGET, name=None):
+        if mode not in (DELIVERY_ASYNC, DELIVERY_SYNC):
+            raise ValueError(f"Unknown delivery mode '{mode}'")
+        if overflow not in (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_BLOCK):
+            raise ValueError(f"Unknown overflow policy '{overflow}'")
+        self.topic = topic
+        self.wildcard = is_pattern(topic)
+        self.ref = ref
+        self.mode = mode
+        self.queue_size = max(1, int(queue_size))
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.skipped = 0
+        self.conflated = conflated
+        self.with_sequence = with_sequence
+        self.name = name or topic
+        self.handler_budget = handler_budget
+        self.slow = 0
+        self.latency = LatencyHistogram()
+        self._last_slow_warning = None
+
+        self._queue = deque()
+        self._latest: Dict[Any, Tuple[str, LatestValue]] = {}  # pending slot per key of a conflated topic
+        self._last_sequence: Dict[Any, int] = {}
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._busy = False
+        self._closed = False
+        self._worker = None
+
+    def __call__(self):
+        return self.ref()
+
+    @property
+    def is_async(self):
+        return self.mode == DELIVERY_ASYNC
+
+    def pending(self):
+        return len(self._queue) + len(self._latest)
+
+    """ DELIVERY """
+
+    def deliver(self, callback, message, topic=None):
+        start = time.perf_counter()
+        try:
+            if self.wildcard:
+                callback(topic, message)
+            else:
+                callback(message)
+            self.delivered += 1
+        except Exception as e:
+            self.failed += 1
+            self.logger.error("Error calling subscriber %s for topic '%s': %s", self.name, topic or self.topic, e)
+            return False
+        finally:
+            elapsed = time.perf_counter() - start
+            self.latency.record(elapsed)
+            if elapsed > self.handler_budget:
+                self._report_slow(topic, elapsed, start)
+        return True
+
+    def _report_slow(self, topic, elapsed, now):
+        self.slow += 1
+        if self._last_slow_warning is None or now - self._last_slow_warning >= SLOW_HANDLER_WARNING_INTERVAL:
+            self._last_slow_warning = now
+            self.logger.warning("Slow subscriber %s on topic '%s': %.1f ms (budget %.1f ms, %d slow calls)",
+                                self.name, topic or self.topic, elapsed * 1000.0, self.handler_budget * 1000.0,
+                                self.slow)
+
+    def metrics(self):
+        return {"topic": self.topic, "callback": self.name, "mode": self.mode, "overflow": self.overflow,
+                "pending": self.pending(), "delivered": self.delivered, "dropped": self.dropped,
+                "skipped": self.skipped, "failed": self.failed, "slow": self.slow, "latency": self.latency.toDict()}
+
+    def _slot(self, topic, key):
+        # A pattern receives several conflated topics, keep their keys apart
+        return (topic, key) if self.wildcard else key
+
+    def payload(self, latest: LatestValue, topic=None):
+        """Message of a conflated topic as the callback receives it; counts the skipped updates."""
+        slot = self._slot(topic, latest.key)
+        last = self._last_sequence.get(slot)
+        if last is not None and latest.sequence > last + 1:
+            self.skipped += latest.sequence - last - 1
+        self._last_sequence[slot] = latest.sequence
+        return latest if self.with_sequence else latest.value
+
+    def offer(self, message, topic=None):
+        """
+        Queues a message for the worker (async subscriptions).
+
+        Returns:
+            bool: False if the message was dropped.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.queue_size:
+                if self.overflow == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.overflow == OVERFLOW_DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif not self._not_full.wait_for(lambda: len(self._queue) < self.queue_size or self._closed,
+                                                 self.block_timeout) or self._closed:
+                    self.dropped += 1
+                    return False
+            self._queue.append((topic, message))
+            self._wake()
+        return True
+
+    def offer_latest(self, latest: LatestValue, topic=None):
+        """Overwrites the pending slot of the key with the latest message of a conflated topic."""
+        with self._lock:
+            if self._closed:
+                return False
+            self._latest[self._slot(topic, latest.key)] = (topic, latest)
+            self._wake()
+        return True
+
+    def _wake(self):
+        # Callers hold _lock
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name=f"MessageBroker[{self.topic}]", daemon=True)
+            self._worker.start()
+        self._not_empty.notify()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._latest and not self._closed:
+                    self._not_empty.wait()
+                if self._closed:
+                    return
+                if self._queue:
+                    (topic, message), latest = self._queue.popleft(), None
+                    self._not_full.notify()
+                else:
+                    topic, latest = self._latest.pop(next(iter(self._latest)))
+                self._busy = True
+
+            # Resolve the weak reference per message so the worker never keeps the subscriber alive
+            callback = self.ref()
+            if callback is None:
+                self.close()
+                return
+            self.deliver(callback, message if latest is None else self.payload(latest, topic), topic)
+            callback = None
+
+            with self._lock:
+                self._busy = False
+                if not self._queue and not self._latest:
+                    self._idle.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits until the queue is empty and the callback returned. Returns False on timeout."""
+        with self._lock:
+            return self._idle.wait_for(lambda: self._closed or (not self._queue and not self._latest
+                                                                and not self._busy), timeout)
+
+    def close(self):
+        """Stops the worker; queued messages are discarded."""
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+            self._latest.clear()
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+            self._idle.notify_all()
 
 
 class MessageBroker:
@@ -13,13 +384,121 @@ class MessageBroker:
         return cls._instance
 
     def _init(self):
-        self.subscribers: Dict[str, List[weakref.ref]] = {}
+        # topic or pattern -> immutable tuple of subscriptions, replaced (never modified) under _lock
+        self.subscribers: Dict[str, Tuple[_Subscription, ...]] = {}
+        # (topic -> subscriptions, trie): the exact registry itself while no pattern is subscribed,
+        # otherwise a cache of resolved topics that is replaced on every mutation
+        self._routing = (self.subscribers, None)
+        self._lock = threading.Lock()
+        self._dead_topics = set()  # topics with collected callbacks, purged on the next mutation
+        self._conflated: Dict[str, _ConflatedTopic] = {}
+        self._topic_metrics: Dict[str, _TopicMetrics] = {}
+        self._metrics_thread = None
+        self._metrics_stop = threading.Event()
         self.logger = logging.getLogger(self.__class__.__name__)
 
-    def subscribe(self, topic: str, callback: Callable):
-        """Subscribe to a topic with automatic cleanup of dead references"""
-        if topic not in self.subscribers:
-            self.subscribers[topic] = []
+    """ REGISTRY """
+
+    def _replace(self, topic: str, subscriptions):
+        """Swaps in the new tuple of a topic. Callers hold _lock."""
+        if subscriptions:
+            self.subscribers[topic] = tuple(subscriptions)
+        else:
+            self.subscribers.pop(topic, None)
+        self._invalidate_routes(is_pattern(topic))
+
+    def _invalidate_routes(self, patterns_changed: bool):
+        """Drops the resolved topics, recompiles the trie if a pattern was added or removed. Callers hold _lock."""
+        trie = self._routing[1]
+        if patterns_changed:
+            patterns = [topic for topic in self.subscribers if is_pattern(topic)]
+            trie = _TopicTrie(patterns) if patterns else None
+        self._routing = ({}, trie) if trie is not None else (self.subscribers, None)
+
+    def _resolve(self, topic: str, trie: _TopicTrie):
+        """Subscriptions of the exact topic followed by those of every matching pattern."""
+        registry = self.subscribers
+        subscriptions = registry.get(topic, ())
+        for pattern in trie.match(topic):
+            subscriptions += registry.get(pattern, ())
+        return subscriptions
+
+    def _route(self, topic: str):
+        routes, trie = self._routing
+        subscriptions = routes.get(topic)
+        if subscriptions is None and trie is not None:
+            subscriptions = self._resolve(topic, trie)
+            if len(routes) < ROUTE_CACHE_SIZE:
+                routes[topic] = subscriptions
+        return subscriptions
+
+    def _purge_dead(self):
+        """Drops subscriptions whose callback was collected. Callers hold _lock."""
+        while self._dead_topics:
+            topic = self._dead_topics.pop()
+            subscriptions = self.subscribers.get(topic, ())
+            live = [subscription for subscription in subscriptions if subscription.ref() is not None]
+            if len(live) == len(subscriptions):
+                continue
+            for subscription in subscriptions:
+                if subscription.ref() is None:
+                    subscription.close()
+            self._replace(topic, live)
+            self.logger.debug("Cleaned up %d dead references for topic '%s'", len(subscriptions) - len(live), topic)
+
+    def collect(self):
+        """Removes the subscriptions of garbage collected callbacks now instead of on the next mutation"""
+        with self._lock:
+            self._purge_dead()
+
+    def conflate(self, topic: str, key: Callable = None):
+        """
+        Makes a topic a latest-value topic: only the latest message (per key) is kept and delivered.
+
+        Args:
+            topic (str): Topic to conflate, usually declared by its publisher.
+            key (Callable): Optional message -> key function; the latest message of every key is kept
+                (e.g. per sensor of a shared topic). None keeps a single latest message.
+        """
+        with self._lock:
+            if topic in self._conflated:
+                return
+            self._conflated[topic] = _ConflatedTopic(key)
+            for subscription in self.subscribers.get(topic, ()):
+                subscription.conflated = True
+
+    def is_conflated(self, topic: str) -> bool:
+        return topic in self._conflated
+
+    def get_latest(self, topic: str, key: Any = None):
+        """
+        Latest message of a conflated topic.
+
+        Returns:
+            LatestValue: (sequence, key, value), None if nothing was published yet.
+        """
+        conflated = self._conflated.get(topic)
+        return conflated.latest.get(key) if conflated is not None else None
+
+    def subscribe(self, topic: str, callback: Callable, mode: str = DELIVERY_SYNC,
+                  queue_size: int = DEFAULT_QUEUE_SIZE, overflow: str = OVERFLOW_DROP_OLDEST,
+                  block_timeout: float = DEFAULT_BLOCK_TIMEOUT, with_sequence: bool = False,
+                  handler_budget: float = DEFAULT_HANDLER_BUDGET):
+        """
+        Subscribe to a topic with automatic cleanup of dead references
+
+        Args:
+            topic (str): Topic or '+' / '#' pattern to subscribe to.
+            callback (Callable): Called with every published message, with (topic, message) for a pattern.
+            mode (str): DELIVERY_SYNC (publisher's thread) or DELIVERY_ASYNC (own queue and worker thread).
+            queue_size (int): Capacity of the queue of an async subscription.
+            overflow (str): OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST or OVERFLOW_BLOCK.
+            block_timeout (float): Longest wait of an OVERFLOW_BLOCK publisher in seconds.
+            with_sequence (bool): On a conflated topic deliver LatestValue(sequence, key, value).
+            handler_budget (float): Seconds a call may take before it is reported as slow.
+        """
+        if is_pattern(topic):
+            validate_pattern(topic)
 
         # Create weak reference to avoid keeping objects alive
         if hasattr(callback, '__self__'):
@@ -29,103 +508,149 @@ class MessageBroker:
             # It's a function - use regular weak reference
             weak_callback = weakref.ref(callback, self._cleanup_callback(topic, callback))
 
-        self.subscribers[topic].append(weak_callback)
-        print(f"Subscribed to topic '{topic}' with callback {callback.__name__ if hasattr(callback, '__name__') else str(callback)}")
-        self.logger.debug(f"Subscribed to topic '{topic}'. Total subscribers: {len(self.subscribers[topic])}")
+        with self._lock:
+            subscription = _Subscription(topic, weak_callback, mode, queue_size, overflow, block_timeout,
+                                         self.logger, topic in self._conflated, with_sequence, handler_budget,
+                                         getattr(callback, "__qualname__", None) or repr(callback))
+            self._purge_dead()
+            self._replace(topic, self.subscribers.get(topic, ()) + (subscription,))
+            count = len(self.subscribers[topic])
+        self.logger.debug("Subscribed %s to topic '%s' (%s). Total subscribers: %d", subscription.name, topic, mode,
+                          count)
+        return subscription
 
     def _cleanup_callback(self, topic: str, original_callback: Callable):
-        """Create a cleanup function that removes dead references"""
+        """Create a cleanup function that marks the topic for removal of its dead references"""
 
         def cleanup(weak_ref):
-            if topic in self.subscribers:
-                # Remove the dead reference
-                self.subscribers[topic] = [
-                    ref for ref in self.subscribers[topic]
-                    if ref is not weak_ref
-                ]
-                # Clean up empty topic
-                if not self.subscribers[topic]:
-                    del self.subscribers[topic]
-                self.logger.debug(f"Auto-cleaned up dead reference for topic '{topic}'")
+            # Runs inside the garbage collector, possibly while this thread holds a lock - only record the
+            # topic, the registry is rebuilt on the next mutation
+            self._dead_topics.add(topic)
 
         return cleanup
 
     def unsubscribe(self, topic: str, callback: Callable):
         """Manually unsubscribe from a topic"""
-        if topic not in self.subscribers:
-            return
-
-        # Find and remove matching callbacks
-        original_count = len(self.subscribers[topic])
-        self.subscribers[topic] = [
-            ref for ref in self.subscribers[topic]
-            if ref() is not None and ref() != callback
-        ]
-
-        # Clean up empty topic
-        if not self.subscribers[topic]:
-            del self.subscribers[topic]
-
-        removed_count = original_count - len(self.subscribers.get(topic, []))
+        with self._lock:
+            self._purge_dead()
+            subscriptions = self.subscribers.get(topic)
+            if not subscriptions:
+                return
+
+            # Find and remove matching callbacks
+            kept = []
+            for subscription in subscriptions:
+                if subscription() is not None and subscription() != callback:
+                    kept.append(subscription)
+                else:
+                    subscription.close()
+            self._replace(topic, kept)
+
+        removed_count = len(subscriptions) - len(kept)
         if removed_count > 0:
-            self.logger.debug(f"Unsubscribed {removed_count} callback(s) from topic '{topic}'")
+            self.logger.debug("Unsubscribed %d callback(s) from topic '%s'", removed_count, topic)
+
+    """ DELIVERY """
 
     def publish(self, topic: str, message: Any):
         """Publish message to all live subscribers"""
-        if topic not in self.subscribers:
-            self.logger.debug(f"No subscribers for topic '{topic}'")
-            return
+        metrics = self._topic_metrics.get(topic)
+        if metrics is None:
+            metrics = self._topic_metrics.setdefault(topic, _TopicMetrics(time.monotonic()))
+        metrics.published += 1
 
-        # Get all live callbacks and clean up dead ones
-        live_callbacks = []
-        dead_refs = []
+        conflated = self._conflated.get(topic)
+        latest = conflated.update(message) if conflated is not None else None
+
+        subscriptions = self._route(topic)
+        if not subscriptions:
+            self.logger.debug("No subscribers for topic '%s'", topic)
+            return
 
-        for weak_ref in self.subscribers[topic]:
-            callback = weak_ref()
-            if callback is not None:
-                live_callbacks.append(callback)
-            else:
-                dead_refs.append(weak_ref)
-
-        # Remove dead references
-        if dead_refs:
-            self.subscribers[topic] = [
-                ref for ref in self.subscribers[topic]
-                if ref not in dead_refs
-            ]
-            self.logger.debug(f"Cleaned up {len(dead_refs)} dead references for topic '{topic}'")
-
-        # Call all live callbacks
-        successful_calls = 0
         failed_calls = 0
+        for subscription in subscriptions:
+            if subscription.is_async:
+                # Only enqueue here, the worker resolves the callback and exits once it is gone
+                if latest is None:
+                    subscription.offer(message, topic)
+                else:
+                    subscription.offer_latest(latest, topic)
+                continue
 
-        for callback in live_callbacks:
-            try:
-                self.logger.debug(f"Publishing to topic: '{topic}' message: {message}")
-                callback(message)
-                successful_calls += 1
-            except Exception as e:
+            callback = subscription.ref()
+            if callback is None:
+                self._dead_topics.add(subscription.topic)
+                continue
+            payload = message if latest is None else subscription.payload(latest, topic)
+            if not subscription.deliver(callback, payload, topic):
                 failed_calls += 1
-                self.logger.error(f"Error calling subscriber for topic '{topic}': {e}")
                 # Don't break - continue with other subscribers
 
-        if successful_calls > 0:
-            self.logger.debug(f"Successfully published to {successful_calls} subscribers for topic '{topic}'")
         if failed_calls > 0:
-            self.logger.warning(f"Failed to publish to {failed_calls} subscribers for topic '{topic}'")
+            self.logger.warning("Failed to publish to %d subscribers for topic '%s'", failed_calls, topic)
+
+    def flush(self, topic: str = None, timeout: float = None) -> bool:
+        """
+        Waits until the async subscribers (of one topic or of all topics) handled every queued message.
+
+        Returns:
+            bool: False if the timeout expired first.
+        """
+        registry = self.subscribers
+        topics = [topic] if topic is not None else list(registry.keys())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for name in topics:
+            for subscription in registry.get(name, ()):
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                if subscription.is_async and not subscription.drain(remaining):
+                    return False
+        return True
+
+    """ METRICS """
+
+    def metrics_snapshot(self) -> Dict[str, Any]:
+        """
+        Returns:
+            dict: {"time", "topics": {topic: {published, rate_hz}}, "subscribers": [{topic, callback, mode,
+                pending, delivered, dropped, skipped, failed, slow, latency: {count, mean_ms, p50_ms, p95_ms,
+                p99_ms, max_ms}}]}
+        """
+        now = time.monotonic()
+        topics = {topic: metrics.sample(now) for topic, metrics in list(self._topic_metrics.items())}
+        subscribers = [subscription.metrics() for subscriptions in list(self.subscribers.values())
+                       for subscription in subscriptions]
+        return {"time": time.time(), "topics": topics, "subscribers": subscribers}
+
+    def start_metrics(self, interval: float = METRICS_INTERVAL):
+        """Publishes metrics_snapshot() on METRICS_TOPIC every interval seconds"""
+        if self._metrics_thread is not None and self._metrics_thread.is_alive():
+            return
+        self.conflate(METRICS_TOPIC)
+        self._metrics_stop.clear()
+        self._metrics_thread = threading.Thread(target=self._publish_metrics, args=(interval,), daemon=True)
+        self._metrics_thread.start()
+
+    def stop_metrics(self):
+        self._metrics_stop.set()
+        if self._metrics_thread is not None:
+            self._metrics_thread.join()
+            self._metrics_thread = None
+
+    def _publish_metrics(self, interval):
+        while not self._metrics_stop.wait(interval):
+            try:
+                self.publish(METRICS_TOPIC, self.metrics_snapshot())
+            except Exception as e:
+                self.logger.error("Error publishing broker metrics: %s", e)
 
-        # Clean up empty topic
-        if not self.subscribers[topic]:
-            del self.subscribers[topic]
+    def get_subscription_stats(self, topic: str) -> List[Dict[str, Any]]:
+        """Delivery counters and handler latency of the subscriptions of a topic"""
+        return [subscription.metrics() for subscription in self.subscribers.get(topic, ())]
 
     def get_subscriber_count(self, topic: str) -> int:
         """Get the number of active subscribers for a topic"""
-        if topic not in self.subscribers:
-            return 0
-
         # Count only live references
-        live_count = sum(1 for ref in self.subscribers[topic] if ref() is not None)
-        return live_count
+        return sum(1 for ref in self.subscribers.get(topic, ()) if ref() is not None)
 
     def get_all_topics(self) -> List[str]:
         """Get list of all topics with active subscribers"""
@@ -133,44 +658,51 @@ class MessageBroker:
 
     def clear_topic(self, topic: str):
         """Clear all subscribers for a specific topic"""
-        if topic in self.subscribers:
-            count = len(self.subscribers[topic])
-            del self.subscribers[topic]
-            self.logger.debug(f"Cleared {count} subscribers from topic '{topic}'")
+        with self._lock:
+            subscriptions = self.subscribers.pop(topic, ())
+            self._invalidate_routes(is_pattern(topic))
+        for subscription in subscriptions:
+            subscription.close()
+        if subscriptions:
+            self.logger.debug("Cleared %d subscribers from topic '%s'", len(subscriptions), topic)
 
     def request(self, topic: str, message: Any, timeout: float = 1.0):
-        """Synchronous request-response pattern - returns first non-None response"""
-        if topic not in self.subscribers:
-            self.logger.debug(f"No subscribers for request topic '{topic}'")
+        """Synchronous request-response pattern - returns first non-None response (exact subscribers only)"""
+        subscriptions = self.subscribers.get(topic)
+        if not subscriptions:
+            self.logger.debug("No subscribers for request topic '%s'", topic)
             return None
 
-        # Get all live callbacks
-        live_callbacks = []
-        for weak_ref in self.subscribers[topic]:
+        # Call callbacks (in this thread whatever their delivery mode) until we get a non-None response
+        for weak_ref in subscriptions:
             callback = weak_ref()
-            if callback is not None:
-                live_callbacks.append(callback)
-
-        # Call callbacks until we get a non-None response
-        for callback in live_callbacks:
+            if callback is None:
+                continue
             try:
-                self.logger.debug(f"Making request to topic: '{topic}' message: {message}")
+                self.logger.debug("Making request to topic: '%s' message: %s", topic, message)
                 result = callback(message)
                 if result is not None:
-                    self.logger.debug(f"Got response from topic '{topic}': {result}")
+                    self.logger.debug("Got response from topic '%s': %s", topic, result)
                     return result
             except Exception as e:
-                self.logger.error(f"Error in request callback for topic '{topic}': {e}")
+                self.logger.error("Error in request callback for topic '%s': %s", topic, e)
                 continue
 
-        self.logger.debug(f"No response received for request topic '{topic}'")
+        self.logger.debug("No response received for request topic '%s'", topic)
         return None
 
     def clear_all(self):
         """Clear all subscribers from all topics"""
-        total_cleared = sum(len(subs) for subs in self.subscribers.values())
-        self.subscribers.clear()
-        self.logger.debug(f"Cleared all {total_cleared} subscribers from all topics")
+        with self._lock:
+            registry = self.subscribers
+            self.subscribers = {}
+            self._routing = (self.subscribers, None)
+            self._dead_topics.clear()
+        total_cleared = sum(len(subs) for subs in registry.values())
+        for subscriptions in registry.values():
+            for subscription in subscriptions:
+                subscription.close()
+        self.logger.debug("Cleared all %d subscribers from all topics", total_cleared)
 
 
 # Example usage and testing:
@@ -212,6 +744,7 @@ if __name__ == "__main__":
     # Publish to all
     print("\n--- Publishing to all subscribers ---")
     broker2.publish("chat", "Hello from the singleton broker!")
+    broker2.flush("chat")
 
     # Delete one object
     print("\n--- Deleting obj1 ---")
@@ -220,6 +753,7 @@ if __name__ == "__main__":
     # Publish again - should auto-cleanup dead reference
     print("\n--- Publishing after obj1 deletion ---")
     broker2.publish("chat", "Message after obj1 deletion")
+    broker2.flush("chat")
 
     print(f"Subscriber count after cleanup: {broker1.get_subscriber_count('chat')}")
 
@@ -227,6 +761,7 @@ if __name__ == "__main__":
     print("\n--- Manual unsubscribe ---")
     broker1.unsubscribe("chat", global_subscriber)
     broker2.publish("chat", "After manual unsubscribe")
+    broker2.flush("chat")
 
 
     # Test synchronous request-response
@@ -246,4 +781,190 @@ if __name__ == "__main__":
     no_result = broker1.request("nonexistent/topic", {"data": "test"})
     print(f"No subscriber result: {no_result}")
 
-    print(f"Final subscriber count: {broker1.get_subscriber_count('chat')}")
\ No newline at end of file
+    print(f"Final subscriber count: {broker1.get_subscriber_count('chat')}")
+
+    # Publisher latency with a slow consumer (e.g. a widget redrawing for 2 ms per message)
+    print("\n--- Slow subscriber benchmark ---")
+    logging.getLogger().setLevel(logging.WARNING)
+    message_count = 500
+
+    def slow_subscriber(msg):
+        time.sleep(0.002)
+
+    for label, options in (("sync", {"mode": DELIVERY_SYNC}),
+                           ("async drop_oldest", {"mode": DELIVERY_ASYNC, "overflow": OVERFLOW_DROP_OLDEST,
+                                                  "queue_size": 50}),
+                           ("async drop_newest", {"mode": DELIVERY_ASYNC, "overflow": OVERFLOW_DROP_NEWEST,
+                                                  "queue_size": 50}),
+                           ("async block", {"mode": DELIVERY_ASYNC, "overflow": OVERFLOW_BLOCK, "queue_size": 50})):
+        topic = f"bench/{label}"
+        broker1.subscribe(topic, slow_subscriber, **options)
+        durations = []
+        for index in range(message_count):
+            start = time.perf_counter()
+            broker1.publish(topic, index)
+            durations.append(time.perf_counter() - start)
+        broker1.flush(topic)
+        durations.sort()
+        stats = broker1.get_subscription_stats(topic)[0]
+        print(f"{label:<18} publish mean {sum(durations) / len(durations) * 1e6:8.1f} us  "
+              f"p99 {durations[int(len(durations) * 0.99)] * 1e6:8.1f} us  "
+              f"delivered {stats['delivered']:<4} dropped {stats['dropped']}")
+        broker1.clear_topic(topic)
+
+    # Contention: publishers while other threads subscribe, unsubscribe and drop subscribers
+    print("\n--- Registry contention benchmark ---")
+    import contextlib
+    import io
+
+    publisher_threads, churn_threads, duration = 4, 2, 2.0
+    received = [0]
+
+    def counting_subscriber(msg):
+        received[0] += 1
+
+    broker1.subscribe("bench/contention", counting_subscriber, mode=DELIVERY_SYNC)
+    stop = threading.Event()
+    published = [0] * publisher_threads
+    errors = []
+
+    def publisher(index):
+        count = 0
+        while not stop.is_set():
+            try:
+                broker1.publish("bench/contention", count)
+            except Exception as e:
+                errors.append(e)
+            count += 1
+        published[index] = count
+
+    def churn():
+        while not stop.is_set():
+            try:
+                temporary = TestObject("temporary")
+                broker1.subscribe("bench/contention", temporary.method_subscriber, mode=DELIVERY_SYNC)
+                broker1.unsubscribe("bench/contention", temporary.method_subscriber)
+                dropped = TestObject("dropped")
+                broker1.subscribe("bench/contention", lambda msg: None, mode=DELIVERY_SYNC)  # collected at once
+                broker1.subscribe("bench/contention", dropped.method_subscriber, mode=DELIVERY_SYNC)
+                del dropped  # its subscription dies, removed lazily
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=publisher, args=(i,)) for i in range(publisher_threads)]
+    threads += [threading.Thread(target=churn) for _ in range(churn_threads)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    broker1.collect()
+    print(f"{publisher_threads} publishers + {churn_threads} churn threads: "
+          f"{sum(published) / duration:,.0f} publishes/s, {len(errors)} errors, "
+          f"{broker1.get_subscriber_count('bench/contention')} subscriber(s) left "
+          f"({len(broker1.subscribers['bench/contention'])} registered)")
+
+    # Single thread fast path
+    start = time.perf_counter()
+    for index in range(100000):
+        broker1.publish("bench/contention", index)
+    print(f"uncontended publish to 1 sync subscriber: {(time.perf_counter() - start) / 100000 * 1e6:.2f} us")
+
+    # Conflated topic: 1 kHz state stream, 20 Hz consumer
+    print("\n--- Conflated topic benchmark ---")
+    rate, duration = 1000, 1.0
+
+    for label, conflate in (("queued (drop_oldest)", False), ("conflated", True)):
+        topic = f"bench/state/{label}"
+        if conflate:
+            broker1.conflate(topic)
+        ages = []
+
+        def display(msg):
+            ages.append(time.perf_counter() - msg["time"])
+            time.sleep(0.05)  # redraw
+
+        broker1.subscribe(topic, display, mode=DELIVERY_ASYNC)
+        start = time.perf_counter()
+        for index in range(int(rate * duration)):
+            broker1.publish(topic, {"index": index, "time": time.perf_counter()})
+            time.sleep(max(0.0, start + (index + 1) / rate - time.perf_counter()))
+        time.sleep(0.1)
+        stats = broker1.get_subscription_stats(topic)[0]
+        print(f"{label:<22} handled {stats['delivered']:<4} of {int(rate * duration)}, "
+              f"mean age when handled {sum(ages) / len(ages) * 1000:7.1f} ms, "
+              f"dropped {stats['dropped']}, skipped {stats['skipped']}")
+        broker1.clear_topic(topic)
+
+    # Keyed conflation with sequence numbers
+    broker1.conflate("bench/meters", key=lambda msg: msg["meter"])
+    seen = {}
+
+    def meter_display(latest):
+        seen[latest.key] = latest.sequence
+
+    broker1.subscribe("bench/meters", meter_display, mode=DELIVERY_ASYNC, with_sequence=True)
+    for index in range(300):
+        broker1.publish("bench/meters", {"meter": index % 3 + 1, "weight": index})
+    broker1.flush("bench/meters")
+    print(f"keyed: last sequence per meter {seen}, latest of meter 2: {broker1.get_latest('bench/meters', 2)}")
+
+    # Wildcard subscriptions
+    print("\n--- Wildcard subscriptions ---")
+    matched = []
+
+    def monitor(topic, msg):
+        matched.append(topic)
+
+    broker1.subscribe("+/VALUE", monitor, mode=DELIVERY_SYNC)
+    broker1.subscribe("robot/#", monitor, mode=DELIVERY_SYNC)
+    for topic in ("GlueMeter_1/VALUE", "GlueMeter_2/VALUE", "GlueMeter_1/STATE", "robot", "robot/state",
+                  "robot/trajectory/point", "vision/state"):
+        broker1.publish(topic, 0)
+    print(f"matched: {matched}")
+
+    def exact_publish_time(topic, count=200000):
+        start = time.perf_counter()
+        for index in range(count):
+            broker1.publish(topic, index)
+        return (time.perf_counter() - start) / count * 1e6
+
+    with_patterns = exact_publish_time("bench/contention")
+    broker1.unsubscribe("+/VALUE", monitor)
+    broker1.unsubscribe("robot/#", monitor)
+    without_patterns = exact_publish_time("bench/contention")
+    print(f"exact publish, 1 sync subscriber: {without_patterns:.2f} us without patterns, "
+          f"{with_patterns:.2f} us with patterns subscribed (cached resolution)")
+
+    # Metrics
+    print("\n--- Broker metrics ---")
+    logging.getLogger().setLevel(logging.WARNING)
+    snapshots = []
+
+    def redraw(msg):
+        time.sleep(0.03 if msg % 50 == 0 else 0.0005)  # occasionally over its 20 ms budget
+
+    broker1.subscribe("bench/frames", redraw, mode=DELIVERY_ASYNC, handler_budget=0.02)
+    def on_metrics(snapshot):
+        snapshots.append(snapshot)
+
+    broker1.subscribe(METRICS_TOPIC, on_metrics)
+    broker1.start_metrics(interval=0.25)
+    for index in range(400):
+        broker1.publish("bench/frames", index)
+        broker1.publish("bench/contention", index)
+        time.sleep(0.0025)
+    broker1.flush()
+    time.sleep(0.3)
+    broker1.stop_metrics()
+    snapshot = snapshots[-1]
+    for topic in ("bench/frames", "bench/contention"):
+        print(f"{topic:<18} {snapshot['topics'][topic]}")
+    for subscriber in snapshot["subscribers"]:
+        if subscriber["topic"] == "bench/frames":
+            latency = subscriber["latency"]
+            print(f"{subscriber['callback']}: delivered {subscriber['delivered']} slow {subscriber['slow']} "
+                  f"p50 {latency['p50_ms']:.2f} ms p99 {latency['p99_ms']:.2f} ms max {latency['max_ms']:.2f} ms")
+    print(f"{len(snapshots)} snapshots published on '{METRICS_TOPIC}'")
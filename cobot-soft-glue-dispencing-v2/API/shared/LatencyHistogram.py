@@ -0,0 +1,50 @@
+from bisect import bisect_left
+
+HISTOGRAM_BUCKETS = [10 ** (e / 10.0) * 1e-6 for e in range(0, 71)]  # 1 us .. 10 s, 10 per decade
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram.
+
+    Attributes:
+        count (int): Recorded samples.
+        total (float): Sum of the samples in seconds.
+        maximum (float): Largest sample in seconds.
+    """
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+
+    def percentile(self, fraction):
+        """Upper bucket edge below which `fraction` of the samples lie (seconds)."""
+        if self.count == 0:
+            return 0.0
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(self.buckets[index], self.maximum) if index < len(self.buckets) else self.maximum
+        return self.maximum
+
+    def toDict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000.0 if self.count else 0.0,
+            "p50_ms": self.percentile(0.5) * 1000.0,
+            "p95_ms": self.percentile(0.95) * 1000.0,
+            "p99_ms": self.percentile(0.99) * 1000.0,
+            "max_ms": self.maximum * 1000.0,
+        }
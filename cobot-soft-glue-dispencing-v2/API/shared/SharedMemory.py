@@ -0,0 +1,32 @@
+from multiprocessing import resource_tracker, shared_memory
+
+"""
+SharedMemory
+------------
+Helpers for shared memory segments used by several independent processes.
+
+Up to Python 3.12 attaching to a segment registers it with the resource tracker of the attaching
+process, which unlinks it when that process exits - taking it away from the owner and every other
+reader. Attached segments are unregistered again; only the creating process owns (and unlinks) them.
+"""
+
+
+def attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attaches to an existing segment without taking ownership of it."""
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        resource_tracker.unregister(memory._name, "shared_memory")
+    except Exception:
+        pass
+    return memory
+
+
+def create_shared_memory(name: str, size: int) -> shared_memory.SharedMemory:
+    """Creates a named segment, replacing a stale one left behind by a crashed owner."""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
@@ -84,6 +84,8 @@ class WorkpieceJsonRepository:
         for root, _, files in os.walk(self.directory):
             # print(f"Root: {root}")
             for file in files:
+                if not file.endswith(self.WORKPIECE_FILE_SUFFIX):
+                    continue  # e.g. compiled spray programs stored next to the workpieces
                 # print(f"File: {file}")
                 file_path = os.path.join(root, file)
                 # print(f"File Path: {file_path}")  # Debugging: check the full file path
@@ -92,6 +94,7 @@ class WorkpieceJsonRepository:
                         data = json.load(f)  # Load JSON data
                         print(f"Loaded Data: {data}")  # Debugging: Show the loaded data
                         obj = self.dataClass.deserialize(data)  # Deserialize into the appropriate object
+                        obj.storageDir = root  # Folder of the workpiece, used for files stored next to it
                         # print(f"Deserialized Object: {obj}")  # Debugging: Show the deserialized object
                         objects.append(obj)
                 except Exception as e:
@@ -141,6 +144,7 @@ class WorkpieceJsonRepository:
             with open(file_path, 'w') as file:
                 file.write(serialized_data)
             # workpieces.sprayPattern = np.array(workpieces.sprayPattern).reshape(-1, 1, 2).astype(np.int32)
+            workpiece.storageDir = timestamp_dir
             self.data.append(workpiece)
             # print(f"Workpiece saved to {file_path}")
 
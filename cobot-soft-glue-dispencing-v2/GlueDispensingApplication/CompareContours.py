@@ -5,6 +5,7 @@ import numpy as np
 import copy
 import traceback
 from API.shared.Contour import Contour
+from GlueDispensingApplication.robot.SprayProgramCompiler import alignmentMatrix
 
 SIMILARITY_THRESHOLD = 70
 DEFECT_THRESHOLD = 5
@@ -165,9 +166,10 @@ def _alignContours(matched, defectsThresh=5):
         defectsThresh (float): Threshold for comparing convexity defects.
 
     Returns:
-        list: List of workpieces with aligned contours.
+        dict: Aligned workpieces ("workpieces"), contour orientations ("orientations"), the stored
+              workpieces they were aligned from ("sources") and their 3x3 poses ("poses").
     """
-    transformedMatchesDict = {"workpieces": [], "orientations": []}
+    transformedMatchesDict = {"workpieces": [], "orientations": [], "sources": [], "poses": []}
 
     for i, match in enumerate(matched):
         workpiece = copy.deepcopy(match["workpieces"])
@@ -256,6 +258,8 @@ def _alignContours(matched, defectsThresh=5):
 
         transformedMatchesDict["workpieces"].append(workpiece)
         transformedMatchesDict["orientations"].append(contourOrientation)
+        transformedMatchesDict["sources"].append(match["workpieces"])
+        transformedMatchesDict["poses"].append(alignmentMatrix(rotationDiff, centroid, centroidDiff))
         external = workpiece.contour.get("contour")
         # print(f"    Transformed Match {i + 1}: {external}")
     return transformedMatchesDict
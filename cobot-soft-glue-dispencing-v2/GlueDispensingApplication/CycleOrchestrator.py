@@ -0,0 +1,242 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+"""
+CycleOrchestrator
+-----------------
+Overlaps the vision and planning of the next batch with the execution of the current one.
+
+GlueSprayingApplication.start used to run strictly in sequence: detect, match, plan, execute. While
+the robot dispenses, the camera and the CPU sit idle. The orchestrator keeps two buffers:
+    - front: the plan being executed,
+    - back:  the plan of the scene the camera sees now, prepared in the background.
+While prefetching is active a planner thread watches the scene; as soon as it has been stable for a
+few frames and differs from the back buffer, the next plan is computed. When the next cycle starts,
+the back buffer is used only if its scene signature still matches the current contours (same number
+of parts, centroids and areas within tolerance) and its version token (workpieces, calibration) is
+unchanged; otherwise it is invalidated and the cycle is planned synchronously as before.
+"""
+
+SCENE_POSITION_TOLERANCE = 5.0  # px, maximum centroid displacement of an unchanged part
+SCENE_AREA_TOLERANCE = 0.05  # relative area change of an unchanged part
+SCENE_STABLE_FRAMES = 3  # consecutive matching frames before a scene is planned
+SCENE_POLL_INTERVAL = 0.1  # seconds
+
+
+def sceneSignature(contours):
+    """
+    Position and size of every detected part.
+
+    Args:
+        contours (list): Contours of shape (N, 2) or (N, 1, 2).
+
+    Returns:
+        np.ndarray: (M, 3) array of centroid x, centroid y and area, sorted by x.
+    """
+    rows = []
+    for contour in contours or []:
+        pts = np.asarray(contour, dtype=np.float32).reshape(-1, 1, 2)
+        if len(pts) < 3:
+            continue
+        moments = cv2.moments(pts)
+        if moments["m00"] == 0:
+            continue
+        rows.append((moments["m10"] / moments["m00"], moments["m01"] / moments["m00"], moments["m00"]))
+    signature = np.asarray(rows, dtype=np.float64).reshape(-1, 3)
+    return signature[np.argsort(signature[:, 0])]
+
+
+def scenesMatch(a, b, positionTolerance=SCENE_POSITION_TOLERANCE, areaTolerance=SCENE_AREA_TOLERANCE):
+    """True if every part of scene `a` has a counterpart in scene `b` at the same place with the same size."""
+    if a is None or b is None or len(a) != len(b):
+        return False
+    if len(a) == 0:
+        return True
+    distances = np.linalg.norm(a[:, None, :2] - b[None, :, :2], axis=2)
+    unmatched = set(range(len(b)))
+    for i in np.argsort(distances.min(axis=1)):
+        candidates = [j for j in unmatched if distances[i, j] <= positionTolerance
+                      and abs(a[i, 2] - b[j, 2]) <= areaTolerance * max(a[i, 2], b[j, 2])]
+        if not candidates:
+            return False
+        unmatched.remove(min(candidates, key=lambda j: distances[i, j]))
+    return True
+
+
+class PlannedCycle:
+    """
+    Plan of one batch.
+
+    Attributes:
+        signature (np.ndarray): Scene signature the plan was computed for.
+        version: Version token (workpieces, calibration) at planning time.
+        result: Return value of the plan function.
+        planTime (float): Planning duration in seconds.
+    """
+
+    def __init__(self, signature, version, result, planTime):
+        self.signature = signature
+        self.version = version
+        self.result = result
+        self.planTime = planTime
+
+
+class CycleOrchestrator:
+    """
+    Double-buffered planning of the next batch while the current one executes.
+
+    Attributes:
+        planFunction (callable): planFunction(contours) -> plan (must not move the robot).
+        sceneFunction (callable): Returns the currently detected contours.
+        versionFunction (callable): Returns a token that changes when plans become stale
+                                    (e.g. workpieces saved, new calibration).
+    """
+
+    def __init__(self, planFunction, sceneFunction, versionFunction=None, stableFrames=SCENE_STABLE_FRAMES,
+                 pollInterval=SCENE_POLL_INTERVAL):
+        self.planFunction = planFunction
+        self.sceneFunction = sceneFunction
+        self.versionFunction = versionFunction if versionFunction is not None else (lambda: None)
+        self.stableFrames = stableFrames
+        self.pollInterval = pollInterval
+
+        self.front = None
+        self.back = None
+        self._lock = threading.Lock()
+        self._planLock = threading.Lock()  # the prefetch and a synchronous plan never run concurrently
+        self._active = threading.Event()
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+        self.hits = 0
+        self.misses = 0
+
+    """ BUFFERS """
+
+    def acquire(self, contours):
+        """
+        Returns the plan for the current contours: the prefetched one if it is still valid, otherwise a
+        plan computed now. The returned plan becomes the front buffer.
+
+        Args:
+            contours (list): Contours detected at the start of the cycle.
+
+        Returns:
+            The result of the plan function.
+        """
+        signature = sceneSignature(contours)
+        version = self.versionFunction()
+        with self._lock:
+            planned, self.back = self.back, None
+
+        if planned is not None and planned.version == version and scenesMatch(planned.signature, signature):
+            self.hits += 1
+            print(f"[CycleOrchestrator] Using prefetched plan (saved {planned.planTime * 1000:.0f} ms)")
+        else:
+            if planned is not None:
+                print("[CycleOrchestrator] Scene changed since prefetch - planning again")
+            self.misses += 1
+            planned = self._plan(contours, signature, version)
+
+        self.front = planned
+        return planned.result
+
+    def invalidate(self):
+        """Drops the prefetched plan (e.g. after a new calibration or workpiece change)."""
+        with self._lock:
+            self.back = None
+
+    def _plan(self, contours, signature, version):
+        with self._planLock:
+            start = time.perf_counter()
+            result = self.planFunction(contours)
+        return PlannedCycle(signature, version, result, time.perf_counter() - start)
+
+    """ PREFETCH """
+
+    def startPrefetch(self):
+        """Starts watching the scene and planning it in the background (e.g. when execution starts)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopEvent.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self._active.set()
+
+    def stopPrefetch(self):
+        """Stops watching the scene (e.g. when execution ends); a plan in progress is still kept."""
+        self._active.clear()
+
+    def shutdown(self):
+        self._active.clear()
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        previous, stableCount = None, 0
+        while not self._stopEvent.is_set():
+            if not self._active.wait(timeout=self.pollInterval):
+                previous, stableCount = None, 0
+                continue
+
+            contours = self.sceneFunction()
+            signature = sceneSignature(contours) if contours is not None else None
+            if signature is None or len(signature) == 0:
+                previous, stableCount = None, 0
+            elif scenesMatch(previous, signature):
+                stableCount += 1
+            else:
+                previous, stableCount = signature, 1
+
+            with self._lock:
+                back = self.back
+            version = self.versionFunction()
+            if stableCount >= self.stableFrames and not (back is not None and back.version == version
+                                                         and scenesMatch(back.signature, signature)):
+                try:
+                    planned = self._plan(contours, signature, version)
+                except Exception as e:
+                    print(f"[CycleOrchestrator] Prefetch planning failed: {e}")
+                    planned = None
+                # The scene may have changed while planning - keep the plan only if it is still current
+                latest = self.sceneFunction()
+                if planned is not None and latest is not None and scenesMatch(sceneSignature(latest), signature):
+                    with self._lock:
+                        self.back = planned
+
+            self._stopEvent.wait(self.pollInterval)
+
+
+if __name__ == "__main__":
+    # Simulated cell: planning takes 0.3 s, execution 1 s; the next batch appears during execution
+    def square(cx, cy, size=80):
+        return np.array([[cx, cy], [cx + size, cy], [cx + size, cy + size], [cx, cy + size]], dtype=np.float32)
+
+    batches = [[square(100 + 150 * k, 200 + 10 * b) for k in range(4)] for b in range(5)]
+    scene = {"contours": batches[0]}
+
+    def plan(contours):
+        time.sleep(0.3)
+        return len(contours)
+
+    def execute(nextBatch):
+        time.sleep(0.5)
+        scene["contours"] = nextBatch  # the next batch is in place halfway through the execution
+        time.sleep(0.5)
+
+    for overlap in (False, True):
+        orchestrator = CycleOrchestrator(plan, lambda: scene["contours"], pollInterval=0.02)
+        scene["contours"] = batches[0]
+        t0 = time.perf_counter()
+        for b in range(len(batches)):
+            orchestrator.acquire(scene["contours"])
+            if overlap:
+                orchestrator.startPrefetch()
+            execute(batches[(b + 1) % len(batches)])
+            orchestrator.stopPrefetch()
+        orchestrator.shutdown()
+        print(f"overlap={overlap}: {len(batches)} batches in {time.perf_counter() - t0:.2f} s "
+              f"(prefetch hits {orchestrator.hits}, misses {orchestrator.misses})")
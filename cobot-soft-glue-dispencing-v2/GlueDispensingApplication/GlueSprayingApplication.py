@@ -25,10 +25,17 @@ from GlueDispensingApplication.vision.VisionService import VisionServiceSingleto
 from GlueDispensingApplication.utils import utils
 from GlueDispensingApplication.tools.GlueNozzleService import GlueNozzleService
 from GlueDispensingApplication.robot.RobotCalibrationService import RobotCalibrationService
+from GlueDispensingApplication.robot.AutoCalibration import AutoCalibrationRoutine
 from GlueDispensingApplication.robot.Plane import Plane
+from GlueDispensingApplication.robot.PathSequencer import PathSequencer, saveTray
+from GlueDispensingApplication.robot.FillPathGenerator import FILL_SPACING
+from GlueDispensingApplication.robot.SprayProgramCompiler import (SprayProgramCache, SprayProgramCompiler,
+                                                                  pathHeightAndRz, matrixFingerprint)
+from GlueDispensingApplication.CycleOrchestrator import CycleOrchestrator
+from GlueDispensingApplication.robot.ConveyorTracker import ConveyorTracker, ModbusBeltEncoder
 from GlueDispensingApplication.tools.GlueCell import GlueCellsManagerSingleton
 from GlueDispensingApplication.GlueSprayApplicationState import GlueSprayApplicationState
-from GlueDispensingApplication.SystemStatePublisherThread import SystemStatePublisherThread
+from GlueDispensingApplication.SystemStatePublisher import SystemStatePublisher
 from VisionSystem.VisionSystem import VisionSystemState
 """
 ENDPOINTS
@@ -59,14 +66,13 @@ class GlueSprayingApplication:
         super().__init__()
         self.broker = MessageBroker()
         self.stateTopic ="system/state"
+        self.statePublisher = SystemStatePublisher()
         self.state = GlueSprayApplicationState.INITIALIZING
 
-        self.system_state_publisher = SystemStatePublisherThread(publish_state_func=self.publishState,interval=0.1)
-        # self.system_state_publisher.start()
-
         self.settingsManager = settingsManager
         self.visionService = visionService
-        self.visonServiceState = None
+        # States are only published on change - start from the current ones
+        self.visonServiceState = self.statePublisher.getState(self.visionService.stateTopic)
         self.broker.subscribe(self.visionService.stateTopic, self.onVisonSystemStateUpdate)
 
 
@@ -74,7 +80,7 @@ class GlueSprayingApplication:
         self.workpieceService = workpieceService
 
         self.robotService = robotService
-        self.robotServiceState = None
+        self.robotServiceState = self.statePublisher.getState(self.robotService.stateTopic)
         self.broker.subscribe(self.robotService.stateTopic, self.onRobotServiceStateUpdate)
         # self.robotService.moveToLoginPosition()
 
@@ -82,6 +88,20 @@ class GlueSprayingApplication:
 
         self.robotCalibService = robotCalibrationService
 
+        # Paths are ordered by the modelled duration of the approach moves, not by their length
+        self.pathSequencer = PathSequencer(travelCost=self.robotService.cycleTimeEstimator.travelTimes)
+        self.recordTrays = False  # save the planned paths of every tray for offline sequencing benchmarks
+
+        # Precompiled per-workpiece programs - at runtime only the pose of the matched part is applied
+        self.useCompiledPrograms = True
+        self.sprayProgramCache = SprayProgramCache(SprayProgramCompiler(self.visionService.coordinateTransformService,
+                                                                        self.robotService.pathConditioner,
+                                                                        self.robotService.velocityProfiler))
+
+        # Double-buffered plans - the next batch is detected and planned while the current one executes
+        self.cycleOrchestrator = CycleOrchestrator(self._plan_matched_paths, lambda: self.visionService.contours,
+                                                   self._plan_version)
+
         # Start the camera feed in a separate thread
         self.cameraThread = threading.Thread(target=self.visionService.run, daemon=True)
         self.cameraThread.start()
@@ -91,9 +111,14 @@ class GlueSprayingApplication:
         # self.ppmX = self.visionService.getFrameWidth() / self.WORK_AREA_WIDTH  # Pixels per millimeter in x direction
         # self.ppmY = self.visionService.getFrameHeight() / self.WORK_AREA_HEIGHT  # Pixels per millimeter in
 
-    def publishState(self):
-        # print("Publishing state:", self.state)
-        self.broker.publish(self.stateTopic, self.state)
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self.statePublisher.report(self.stateTopic, state)
 
     def onRobotServiceStateUpdate(self, state):
         self.robotServiceState = state
@@ -116,134 +141,49 @@ class GlueSprayingApplication:
         or directly tracing contours. If contourMatching is False, only contour tracing is performed.
         """
         if contourMatching:
-            workpieces = self.workpieceService.loadAllWorkpieces()
-
             self.robotService.moveToCalibrationPosition()
             self.robotService._waitForRobotToReachPosition(self.robotService.calibrationPosition, 2, 0.1)
             time.sleep(2)
 
             newContours = self.visionService.contours
-
+            detectionTime = self.visionService.contoursTimestamp
 
             if newContours is None:
                 return False, "No contours found"
 
-            matches_data, noMatches, _ = CompareContours.findMatchingWorkpieces(workpieces, newContours)
-            print("Matches:", matches_data)
-            print("No Matches:", noMatches)
-
-            orientations = matches_data["orientations"]
-            matches = matches_data["workpieces"]
-
-            if not matches:
+            # Prefetched plan of this scene if it is still valid, otherwise planned now
+            plan = self.cycleOrchestrator.acquire(newContours)
+            if not plan["matched"]:
                 return False, "No matching workpieces found!"
-
-            finalPaths = []
-
-            for match_i, match in enumerate(matches):
-                sprayPatternContour = match.get_spray_pattern_contours()
-                sprayPatternFill = match.get_spray_pattern_fills()
-                print("sprayPatternContour ", sprayPatternContour)
-                print("sprayPatternFill ", sprayPatternFill)
-
-                orientation = orientations[match_i]
-                program = match.program
-                glueType = match.glueType
-
-                broker = MessageBroker()
-                broker.publish("glueType", glueType)
-
-                # ✅ Check if spray pattern exists and has data
-                has_spray_contours = sprayPatternContour and len(sprayPatternContour) > 0
-                has_spray_fills = sprayPatternFill and len(sprayPatternFill) > 0
-
-                # --- CASE 1: No spray pattern, fall back to outer contour ---
-                if not has_spray_contours and not has_spray_fills:
-                    print("No spray pattern found, using main contour")
-
-                    # Get main contour data
-                    if isinstance(match.contour, dict) and "contour" in match.contour:
-                        contour_data = match.contour["contour"]
-                        main_settings = match.contour.get("settings", {})
-                    else:
-                        contour_data = match.contour
-                        main_settings = {}
-
-                    # Convert to list format if numpy array
-                    if isinstance(contour_data, np.ndarray):
-                        contour_points = contour_data.reshape(-1, 2).tolist()
-                    else:
-                        contour_points = self._flatten_and_convert(contour_data)
-
-                    # Close contour if not already closed
-                    if contour_points and contour_points[0] != contour_points[-1]:
-                        contour_points.append(contour_points[0])
-
-                    # Transform to robot coordinates
-                    # robot_points = self._transform_to_robot_coordinates(contour_points)
-                    robot_points = contour_points
-                    # Convert to robot path format with Z, RX, RY, RZ
-                    robot_path = self._convert_to_robot_path(robot_points, main_settings)
-
-                    finalPaths.append((robot_path, main_settings))
-                    continue
-
-                # --- CASE 2: Process spray contours ---
-                for entry in sprayPatternContour:
-                    if "contour" in entry and entry["contour"] is not None and len(entry["contour"]) > 0:
-                        contour_data = entry["contour"]
-                        settings = entry.get("settings", {})
-
-                        # Convert to proper format
-                        pts = self._flatten_and_convert(contour_data)
-
-                        # Transform to robot coordinates
-                        robot_points = self._transform_to_robot_coordinates(pts)
-                        # robot_points = pts
-
-                        # Convert to robot path format
-                        robot_path = self._convert_to_robot_path(robot_points, settings)
-
-                        finalPaths.append((robot_path, settings))
-
-                # --- CASE 3: Process spray fills (with zigzag pattern) ---
-                for entry in sprayPatternFill:
-                    if "contour" in entry and entry["contour"] is not None and len(entry["contour"]) >= 3:
-                        contour_data = entry["contour"]
-                        settings = entry.get("settings", {})
-
-                        # Convert to proper format
-                        flat_pts = self._flatten_and_convert(contour_data)
-
-                        # Transform to robot coordinates first
-                        # robot_points = self._transform_to_robot_coordinates(flat_pts)
-                        robot_points = flat_pts
-                        # Convert to OpenCV format for zigzag function
-                        if len(robot_points) >= 3:
-                            # Convert to OpenCV contour format (N, 1, 2)
-                            opencv_contour = np.array(robot_points, dtype=np.float32).reshape(-1, 1, 2)
-
-                            # Apply zigzag pattern
-                            zigzag_contour = self.robotService.zigZag(opencv_contour, 25)
-
-                            # Convert zigzag result back to 2D points
-                            zigzag_points = zigzag_contour.reshape(-1, 2).tolist()
-
-                            # Convert to robot path format
-                            robot_path = self._convert_to_robot_path(zigzag_points, settings)
-
-                            finalPaths.append((robot_path, settings))
+            finalPaths = plan["paths"]
 
             # ✅ Send all paths to robot
             if finalPaths:
                 broker = MessageBroker()
+                for glueType in plan["glueTypes"]:
+                    broker.publish("glueType", glueType)
                 frame = self.visionService.captureImage()
                 # resize to (image_width=640, image_height=360)
                 frame = cv2.resize(frame, (640, 360))
                 broker.publish("robot/trajectory/updateImage", {"image": frame})
                 print("Final paths sent to robot:", len(finalPaths))
 
-                self.robotService.traceContours(finalPaths)
+                eta = self.robotService.estimateCycleTime(finalPaths)
+                print(f"Estimated cycle time: {eta['total']:.1f} s")
+                broker.publish("robot/cycle/eta", eta)
+
+                # Belt-fed dispensing: the paths are shifted by the belt travel since the detection
+                if self.robotService.conveyorTracker is not None:
+                    self.robotService.conveyorTracker.registerDetection(detectionTime)
+
+                # Detect and plan the next batch while this one is executing
+                self.cycleOrchestrator.startPrefetch()
+                try:
+                    self.robotService.traceContours(finalPaths)
+                finally:
+                    # Stop watching the scene once the execution ends; the prefetched plan stays in the
+                    # back buffer until the next acquire() consumes or invalidates it
+                    self.cycleOrchestrator.stopPrefetch()
 
             else:
                 print("No valid paths generated")
@@ -256,23 +196,16 @@ class GlueSprayingApplication:
 
             # Transform contours to robot coordinates and convert to proper format
             finalPaths = []
+            # The current glue settings with the keys traceContours and the velocity profiler read
             default_settings = {
-                "spraying_height": 4,
-                "velocity": 30,
-                "acceleration": 100,
-                "rz_angle": 0
+                **self.settingsManager.glue_settings.toDict(),
+                RobotSettingKey.VELOCITY.value: 30,
+                RobotSettingKey.ACCELERATION.value: 100,
             }
 
-            for contour in newContours:
-                # Flatten and convert contour
-                pts = self._flatten_and_convert(contour)
-
-                # Transform to robot coordinates
-                robot_points = self._transform_to_robot_coordinates(pts)
-
-                # Convert to robot path format
-                robot_path = self._convert_to_robot_path(robot_points, default_settings)
-
+            contours = [self._flatten_and_convert(contour) for contour in newContours]
+            robot_paths = self._transform_to_robot_paths(contours, [default_settings] * len(contours))
+            for robot_path in robot_paths:
                 finalPaths.append((robot_path, default_settings))
 
             if finalPaths:
@@ -283,35 +216,206 @@ class GlueSprayingApplication:
         self.state = GlueSprayApplicationState.IDLE
         return True, "Success"
 
+    def _plan_matched_paths(self, newContours):
+        """
+        Matches the detected contours with the stored workpieces and plans the sequenced robot paths.
+
+        The robot is not moved, so the next batch can be planned while the current one is executing.
+
+        Returns:
+            dict: "matched" (bool), "paths" (list of (robot_path, settings)) and "glueTypes" (list)
+        """
+        workpieces = self.workpieceService.loadAllWorkpieces()
+
+        matches_data, noMatches, _ = CompareContours.findMatchingWorkpieces(workpieces, newContours)
+        print("Matches:", matches_data)
+        print("No Matches:", noMatches)
+
+        orientations = matches_data["orientations"]
+        matches = matches_data["workpieces"]
+        sources = matches_data["sources"]
+        poses = matches_data["poses"]
+
+        if not matches:
+            return {"matched": False, "paths": [], "glueTypes": []}
+
+        finalPaths = []
+        glueTypes = []
+
+        for match_i, match in enumerate(matches):
+            glueTypes.append(match.glueType)
+
+            # Compiled program of the stored workpiece placed with the pose of the matched part
+            sprayProgram = self._compiled_program(sources[match_i])
+            if sprayProgram is not None:
+                finalPaths.extend(sprayProgram.toRobotPaths(poses[match_i],
+                                                            self.visionService.coordinateTransformService))
+                continue
+
+            sprayPatternContour = match.get_spray_pattern_contours()
+            sprayPatternFill = match.get_spray_pattern_fills()
+            print("sprayPatternContour ", sprayPatternContour)
+            print("sprayPatternFill ", sprayPatternFill)
+
+            orientation = orientations[match_i]
+            program = match.program
+
+            # ✅ Check if spray pattern exists and has data
+            has_spray_contours = sprayPatternContour and len(sprayPatternContour) > 0
+            has_spray_fills = sprayPatternFill and len(sprayPatternFill) > 0
+
+            # --- CASE 1: No spray pattern, fall back to outer contour ---
+            if not has_spray_contours and not has_spray_fills:
+                print("No spray pattern found, using main contour")
+
+                # Get main contour data
+                if isinstance(match.contour, dict) and "contour" in match.contour:
+                    contour_data = match.contour["contour"]
+                    main_settings = match.contour.get("settings", {})
+                else:
+                    contour_data = match.contour
+                    main_settings = {}
+
+                # Convert to list format if numpy array
+                if isinstance(contour_data, np.ndarray):
+                    contour_points = contour_data.reshape(-1, 2).tolist()
+                else:
+                    contour_points = self._flatten_and_convert(contour_data)
+
+                # Close contour if not already closed
+                if contour_points and contour_points[0] != contour_points[-1]:
+                    contour_points.append(contour_points[0])
+
+                # Transform to robot coordinates (x, y, z, rx, ry, rz) like the compiled outline
+                robot_path = self._transform_to_robot_paths([contour_points], [main_settings])[0]
+
+                finalPaths.append((robot_path, main_settings))
+                continue
+
+            # --- CASE 2: Process spray contours ---
+            spray_contours = []
+            spray_settings = []
+            for entry in sprayPatternContour:
+                if "contour" in entry and entry["contour"] is not None and len(entry["contour"]) > 0:
+                    # Convert to proper format
+                    spray_contours.append(self._flatten_and_convert(entry["contour"]))
+                    spray_settings.append(entry.get("settings", {}))
+
+            # Transform all spray contours to robot paths (x, y, z, rx, ry, rz) in one batch
+            for robot_path, settings in zip(self._transform_to_robot_paths(spray_contours, spray_settings),
+                                            spray_settings):
+                finalPaths.append((robot_path, settings))
+
+            # --- CASE 3: Process spray fills (with zigzag pattern) ---
+            for entry in sprayPatternFill:
+                if "contour" in entry and entry["contour"] is not None and len(entry["contour"]) >= 3:
+                    contour_data = entry["contour"]
+                    settings = entry.get("settings", {})
+
+                    # Convert to proper format
+                    flat_pts = self._flatten_and_convert(contour_data)
+
+                    # Transform to robot coordinates first - the fill spacing is in robot mm
+                    robot_points = self._transform_to_robot_coordinates(flat_pts)
+                    if len(robot_points) >= 3:
+                        # Raster fill clipped to the real polygon - one path per pass, the nozzle
+                        # only lifts between passes
+                        fill_passes = self.robotService.fillPaths(robot_points, FILL_SPACING, optimizeAngle=True)
+
+                        for fill_points in fill_passes:
+                            # Convert to robot path format
+                            robot_path = self._convert_to_robot_path(fill_points, settings)
+
+                            finalPaths.append((robot_path, settings))
+
+        if finalPaths:
+            if self.recordTrays:
+                saveTray(finalPaths)
+
+            # Order paths across all matched parts and pick contour entry points to minimize travel
+            startPosition = self.robotService.calibrationPosition
+            travelBefore = PathSequencer.travelDistance(finalPaths, startPosition)
+            timeBefore = self.pathSequencer.travelCostOf(finalPaths, startPosition)
+            finalPaths = self.pathSequencer.sequence(finalPaths, startPosition)
+            travelAfter = PathSequencer.travelDistance(finalPaths, startPosition)
+            timeAfter = self.pathSequencer.travelCostOf(finalPaths, startPosition)
+            print(f"Path sequencing: travel {travelBefore:.0f} mm -> {travelAfter:.0f} mm, "
+                  f"{timeBefore:.2f} s -> {timeAfter:.2f} s")
+
+        return {"matched": True, "paths": finalPaths, "glueTypes": glueTypes}
+
+    def enableConveyorTracking(self, encoder=None):
+        """
+        Dispense on the moving belt instead of stop-and-go.
+
+        Args:
+            encoder: Belt position source with read() in mm, defaults to the Modbus belt encoder.
+        """
+        tracker = ConveyorTracker(encoder if encoder is not None else ModbusBeltEncoder())
+        tracker.start()
+        self.robotService.conveyorTracker = tracker
+        return tracker
+
+    def disableConveyorTracking(self):
+        if self.robotService.conveyorTracker is not None:
+            self.robotService.conveyorTracker.stop()
+        self.robotService.conveyorTracker = None
+
+    def _plan_version(self):
+        """Changes when prefetched plans become stale (workpiece saved, new calibration)"""
+        transformService = self.visionService.coordinateTransformService
+        return len(self.workpieceService.loadAllWorkpieces()), matrixFingerprint(transformService.cameraToRobotMatrix)
+
+    def _compiled_program(self, workpiece):
+        """Compiled spray program of a stored workpiece or None if it cannot be used"""
+        if not self.useCompiledPrograms:
+            return None
+        try:
+            return self.sprayProgramCache.get(workpiece)
+        except ValueError as e:
+            print(f"Compiled spray program not available, building paths at runtime: {e}")
+            return None
+
     def _transform_to_robot_coordinates(self, points):
         """Transform 2D points from camera coordinates to robot coordinates"""
         if not points:
             return []
 
-        # Convert to numpy array for transformation
-        np_points = np.array(points, dtype=np.float32).reshape(-1, 1, 2)
-        print("Points before transformation: ", np_points)
-        # Apply camera to robot transformation
-        transformed = utils.applyTransformation(self.visionService.cameraToRobotMatrix, np_points)
-        print("Transformed points: ", transformed)
-        # Convert back to list format
-        result = []
-        for point in transformed:
-            # Flatten nested point structure
-            while isinstance(point, (list, tuple, np.ndarray)) and len(point) == 1:
-                point = point[0]
-            if len(point) >= 2:
-                result.append([float(point[0]), float(point[1])])
+        transformed = self.visionService.coordinateTransformService.cameraToRobot([points])[0]
+        return transformed.tolist()
 
-        return result
+    def _transform_to_robot_paths(self, contours, settings_list):
+        """
+        Transform camera contours to conditioned robot paths [x, y, z, rx, ry, rz].
+
+        All contours go through one batched perspective transform that also assigns z and rz,
+        then every path is simplified in robot millimetre space.
+        """
+        if not contours:
+            return []
+
+        heights, rz_angles = zip(*(self._path_height_and_rz(settings) for settings in settings_list))
+        robot_paths = self.visionService.coordinateTransformService.toRobotPaths(contours, heights, rz_angles)
+
+        # Simplify in robot millimetre space to avoid hundreds of tiny MoveL segments
+        return [self._condition_robot_points(path.tolist()) for path in robot_paths]
+
+    def _condition_robot_points(self, points):
+        """Simplify transformed points with the robot service path conditioner (tolerance in mm)"""
+        conditioned = self.robotService.pathConditioner.condition(points)
+        print(f"Path conditioning: {len(points)} -> {len(conditioned)} points")
+        return conditioned
+
+    def _path_height_and_rz(self, settings):
+        """Z height and RZ angle of a path"""
+        return pathHeightAndRz(settings)
 
     def _convert_to_robot_path(self, points_2d, settings):
         """Convert 2D points to robot path format [x, y, z, rx, ry, rz]"""
         robot_path = []
 
         # Extract settings with defaults
-        z_height = float(settings.get(GlueSettingKey.SPRAYING_HEIGHT,125))
-        rz_angle = float(settings.get(GlueSettingKey.RZ_ANGLE, 0))
+        z_height, rz_angle = self._path_height_and_rz(settings)
 
         for point in points_2d:
             if len(point) >= 2:
@@ -339,7 +443,8 @@ class GlueSprayingApplication:
         if newContours is None:
             raise Exception("[transformContoursToHomePositionPlane] contours can not be none")
 
-        newContours = utils.applyTransformation(self.visionService.cameraToRobotMatrix, newContours)
+        newContours = [np.round(contour, 6).reshape(-1, 1, 2).tolist() for contour in
+                       self.visionService.coordinateTransformService.cameraToRobot(newContours)]
 
         # print("New: ", newContours)
         # Extract 2D translation (X, Y) and yaw (rotation around Z)
@@ -504,6 +609,41 @@ class GlueSprayingApplication:
         message = "Robot Calibration Successful"
         return True, message, image
 
+    def autoCalibrateRobot(self):
+        """
+        Calibrates the camera to robot transformation automatically: the robot drives the camera through the
+        calibration grid around the calibration position, the table markers are detected on the latest frame
+        and the fitted matrix is saved and published.
+
+        Returns:
+            tuple: (success (bool), message (str), report (str))
+        """
+        self.visionService.drawControus = False
+        currentMatrix = self.visionService.coordinateTransformService.cameraToRobotMatrix
+        try:
+            routine = AutoCalibrationRoutine(self.robotService.robot, self.visionService.getLatestFrame,
+                                             calibrationPose=self.robotService.calibrationPosition,
+                                             initialMatrix=currentMatrix)
+            result = routine.run()
+        except Exception as e:
+            traceback.print_exc()
+            return False, f"Automatic calibration failed: {e}", ""
+
+        report = result.report()
+        if not result.success:
+            return False, "Automatic calibration failed: not enough markers detected", report
+        success, message = self.robotCalibService.applyMatrix(result.matrix)
+        if success:
+            message = f"{message} (rms {result.rms:.3f} mm after {result.poses} poses)"
+        return success, message, report
+
+    def setCycleTimeRecording(self, enabled):
+        self.robotService.setCycleTimeRecording(enabled)
+        return True, f"Cycle time recording {'enabled' if enabled else 'disabled'}"
+
+    def calibrateCycleTime(self):
+        return self.robotService.calibrateCycleTime()
+
     def calibrateCamera(self):
         self.robotService.moveToCalibrationPosition()
         self.robotService._waitForRobotToReachPosition(self.robotService.calibrationPosition,1,delay=0)
@@ -974,10 +1114,9 @@ class GlueSprayingApplication:
                 np_points = np.array(points, dtype=np.float32).reshape(-1, 1, 2)
 
                 # Transform to robot coordinates
-                transformed = utils.applyTransformation(self.visionService.cameraToRobotMatrix, np_points)
+                transformed = self.visionService.coordinateTransformService.cameraToRobot([np_points])[0].tolist()
                 finalContour = []
                 for point in transformed:
-                    print("Point: ", point)
                     point = flatten_point(point)
                     x = float(point[0])
                     y = float(point[1])
@@ -7,6 +7,11 @@ from GlueDispensingApplication.utils import utils
 import traceback
 
 from GlueDispensingApplication.utils.utils import applyTransformation
+from GlueDispensingApplication.RequestRouter import RequestRouter, ANY_ACTION
+
+CALIBRATION_TIMEOUT = 120.0  # seconds a caller waits for a robot / camera calibration
+WORKPIECE_TIMEOUT = 30.0  # seconds a caller waits for a workpiece to be created or saved
+MOVE_TIMEOUT = 60.0  # seconds a caller waits for the robot to reach a predefined position
 
 
 class RequestHandler:
@@ -41,40 +46,84 @@ class RequestHandler:
         self.workpieceController = workpieceController
         self.robotController = robotController
 
-        self.resource_dispatch = {
-            Constants.REQUEST_RESOURCE_ROBOT.lower(): self._handleRobot,
-            Constants.REQUEST_RESOURCE_CAMERA.lower(): self._handleCamera,
-            Constants.REQUEST_RESOURCE_SETTINGS.lower(): self._handleSettings,
-            Constants.REQUEST_RESOURCE_WORKPIECE.lower(): self._handleWorkpiece,
-        }
+        self.router = RequestRouter()
+        self._registerEndpoints()
+        self.router.compile()
 
-    def handleRequest(self, request, data=None):
+    def _registerEndpoints(self):
+        """
+        Endpoint table, compiled once. Long-running endpoints are asynchronous: they run on the router's
+        worker pool and are waited for at most their timeout.
+        """
+        robot = Constants.REQUEST_RESOURCE_ROBOT.lower()
+        camera = Constants.REQUEST_RESOURCE_CAMERA.lower()
+        settings = Constants.REQUEST_RESOURCE_SETTINGS.lower()
+        workpiece = Constants.REQUEST_RESOURCE_WORKPIECE.lower()
+        register = self.router.register
+
+        register(robot, "calibrate", self._handleRobotCalibration, asynchronous=True, timeout=CALIBRATION_TIMEOUT)
+        register(robot, "move", self.robotController.handle, ("request", "parts"), asynchronous=True,
+                 timeout=MOVE_TIMEOUT)
+        register(robot, "autoCalibrate", self._handleRobotAutoCalibration, asynchronous=True,
+                 timeout=CALIBRATION_TIMEOUT)
+        register(robot, "cycleTime", self._handleCycleTime, ("parts", "data"))
+        register(robot, ANY_ACTION, self.robotController.handle, ("request", "parts"))
+
+        register(camera, "calibrate", self._handleCameraCalibration, asynchronous=True,
+                 timeout=CALIBRATION_TIMEOUT)
+        register(camera, "captureCalibrationImage", self.cameraSystemController.handle,
+                 ("request", "parts", "data"), asynchronous=True)
+        register(camera, "testCalibration", self.cameraSystemController.handle, ("request", "parts", "data"),
+                 asynchronous=True, timeout=CALIBRATION_TIMEOUT)
+        register(camera, ANY_ACTION, self.cameraSystemController.handle, ("request", "parts", "data"))
+
+        register(settings, ANY_ACTION, self.settingsController.handle, ("request", "parts", "data"))
+
+        register(workpiece, "save", self._handleSaveWorkpiece, ("request", "parts", "data"), asynchronous=True,
+                 timeout=WORKPIECE_TIMEOUT)
+        register(workpiece, "dxf", self.saveWorkpieceFromDXF, ("data",), asynchronous=True,
+                 timeout=WORKPIECE_TIMEOUT)
+        register(workpiece, "create", self._handleCreateWorkpiece, asynchronous=True, timeout=WORKPIECE_TIMEOUT)
+        register(workpiece, "getall", self._handleGetAllWorkpieces)
+
+        register("handleExecuteFromGallery", None, self.handleExecuteFromGallery, ("data",), asynchronous=True,
+                 timeout=None)
+        register(Constants.START, None, self._handleStart, asynchronous=True, timeout=None)
+        register("login", None, self._handleLoginRequest, ("data",))
+        register(Constants.TEST_RUN, None, self._handleTestRun, asynchronous=True, timeout=None)
 
-        if request == "handleExecuteFromGallery":
-            return self.handleExecuteFromGallery(data)
+    def handleRequest(self, request, data=None):
+        """
+        Handles a request and returns its response. Asynchronous endpoints are waited for at most their
+        timeout.
 
-        parts = self._parseRequest(request)
-        resource = parts[0]
+        Raises:
+            ValueError: Unknown request.
+        """
+        return self.router.dispatch(request, data)
 
-        # if len(parts) >=1 and parts[1] == "saveWorkAreaPoints":
-        #     return self.handleSaveWorkAreaPoints(data)
+    def submitRequest(self, request, data=None):
+        """
+        Starts a request without waiting for it.
 
-        if resource in self.resource_dispatch:
-            return self.resource_dispatch[resource](parts, request, data)
+        Returns:
+            concurrent.futures.Future: Response of the request.
+        """
+        return self.router.submit(request, data)
 
-        if request == Constants.START:
-            return self._handleStart()
-        if request == "login":
-            print("handling login")
-            user = data[0]
-            password = data[1]
-            return self._handle_login(user,password)
+    def getMetrics(self):
+        """Calls, failures, timeouts and latency per endpoint."""
+        return self.router.metrics()
 
-        if request == Constants.TEST_RUN:
-            print("Handling test run")
-            return self.controller.testRun()
+    def _handleLoginRequest(self, data):
+        print("handling login")
+        user = data[0]
+        password = data[1]
+        return self._handle_login(user, password)
 
-        raise ValueError(f"Invalid command: {request}")
+    def _handleTestRun(self):
+        print("Handling test run")
+        return self.controller.testRun()
 
     def handleSaveWorkAreaPoints(self, points):
         self.cameraSystemController.saveWorkAreaPoints(points)
@@ -112,38 +161,6 @@ class RequestHandler:
 
         return  response
 
-    def _handleRobot(self, parts, request, _):
-        command = parts[1] if len(parts) > 1 else None
-        if command == "calibrate":
-            return self._handleRobotCalibration()
-        return self.robotController.handle(request, parts)
-
-    def _handleCamera(self, parts, request, data):
-        command = parts[1] if len(parts) > 1 else None
-        if command == "calibrate":
-            return self._handleCameraCalibration()
-
-        response =  self.cameraSystemController.handle(request, parts,data)
-        return response
-
-    def _handleSettings(self, parts, request, data):
-        return self.settingsController.handle(request, parts, data)
-
-    def _handleWorkpiece(self, parts, request, data):
-        command = parts[1] if len(parts) > 1 else None
-        print(f"handling wp: {parts} {request}")
-        if command == "save":
-            return self._handleSaveWorkpiece(request,parts,data)
-        elif command == "dxf":
-            return self.saveWorkpieceFromDXF(data)
-        elif command == "create":
-            return self._handleCreateWorkpiece()
-        elif command == "getall":
-
-            return self._handleGetAllWorkpieces()
-        else:
-            raise ValueError(f"Invalid workpiece command: {command}")
-
     def _handleRobotCalibration(self):
         """
         Handles robot calibration requests by invoking the calibration method on the controller.
@@ -163,6 +180,46 @@ class RequestHandler:
             return Response(Constants.RESPONSE_STATUS_ERROR, message=f"Error calibrating robot: {e}").to_dict()
 
 
+    def _handleRobotAutoCalibration(self):
+        """
+        Handles the automated robot calibration: runs the calibration routine with the robot and the latest
+        camera frame and applies the fitted matrix.
+
+        Returns:
+            dict: The response with the per region error report.
+        """
+        try:
+            result, message, report = self.controller.autoCalibrateRobot()
+            status = Constants.RESPONSE_STATUS_SUCCESS if result else Constants.RESPONSE_STATUS_ERROR
+            return Response(status, message=message, data={"report": report}).to_dict()
+        except Exception as e:
+            print(f"Error auto calibrating robot: {e}")
+            return Response(Constants.RESPONSE_STATUS_ERROR, message=f"Error auto calibrating robot: {e}").to_dict()
+
+    def _handleCycleTime(self, parts, data):
+        """
+        Handles the cycle time calibration requests: "robot/cycleTime/record" (data: enable) and
+        "robot/cycleTime/calibrate".
+
+        Returns:
+            dict: The response indicating success or failure of the operation.
+        """
+        action = parts[2] if len(parts) > 2 else None
+        try:
+            if action == "record":
+                result, message = self.controller.setCycleTimeRecording(bool(data))
+            elif action == "calibrate":
+                result, message = self.controller.calibrateCycleTime()
+            else:
+                return Response(Constants.RESPONSE_STATUS_ERROR,
+                                message=f"Unknown cycle time action: {action}").to_dict()
+            status = Constants.RESPONSE_STATUS_SUCCESS if result else Constants.RESPONSE_STATUS_ERROR
+            return Response(status, message=message).to_dict()
+        except Exception as e:
+            print(f"Error handling cycle time request: {e}")
+            return Response(Constants.RESPONSE_STATUS_ERROR,
+                            message=f"Error handling cycle time request: {e}").to_dict()
+
     def _handleCameraCalibration(self):
         """
         Handles the Camera Calibration action, invoking the calibration method.
@@ -282,9 +339,3 @@ class RequestHandler:
             traceback.print_exc()
             # Handle any uncaught exceptions gracefully
             return Response(Constants.RESPONSE_STATUS_ERROR, message=f"Uncaught exception: {e}").to_dict()
-
-    def _parseRequest(self, request):
-        # print(request)  # Output: ['robot', 'jog', 'X', 'Minus']
-        parts = request.split("/")
-        resource = parts[0]
-        return parts
\ No newline at end of file
@@ -0,0 +1,337 @@
+import inspect
+import threading
+import time
+from operator import itemgetter
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from API import Constants
+from API.Response import Response
+from API.shared.LatencyHistogram import LatencyHistogram
+
+"""
+RequestRouter
+-------------
+Dispatch table of the request handler, compiled once.
+
+Requests are '/' separated strings, "<resource>/<action>/<arguments...>" ("robot/jog/X/Minus") or a
+single word ("start"). Endpoints are registered per (resource, action); action None matches a request
+without an action, ANY_ACTION every action of the resource that has no endpoint of its own. compile()
+checks every handler once (callable, accepts the declared arguments) and freezes the table into a dict,
+afterwards a request is resolved with one lookup in a cache of resolved request strings (split only the
+first time a request string is seen) instead of parsing and comparing strings on every call.
+
+Each endpoint declares which of (request, parts, data) its handler takes, whether it is asynchronous and
+its timeout:
+    - synchronous endpoints (jog, settings, latest frame, ...) run in the caller's thread, as before,
+    - asynchronous endpoints (calibration, workpiece save, ...) run on a bounded worker pool, so a slow
+      operation occupies a pool thread instead of the request path. submit() returns the Future,
+      dispatch() waits for it at most the endpoint's timeout and then answers with an error response
+      (a Python thread cannot be interrupted: the handler finishes in the background, counted as a
+      timeout). When the pool and its queue are full the request is rejected with an error response.
+
+Every endpoint records its calls, failures, timeouts and rejections, the handler latency and, for
+asynchronous endpoints, the time spent waiting for a worker. Counters are updated without a lock and are
+approximate when one endpoint is called from several threads at once.
+"""
+
+ANY_ACTION = "*"
+ROUTER_WORKERS = 4  # threads of the pool running the asynchronous endpoints
+ROUTER_QUEUE_SIZE = 16  # asynchronous requests waiting for a worker before new ones are rejected
+DEFAULT_ENDPOINT_TIMEOUT = 30.0  # seconds dispatch() waits for an asynchronous endpoint
+ROUTE_CACHE_SIZE = 1024  # resolved request strings
+
+ENDPOINT_ARGUMENTS = ("request", "parts", "data")
+
+
+class Endpoint:
+    """
+    A compiled route.
+
+    Attributes:
+        name (str): "<resource>/<action>" of the route.
+        asynchronous (bool): Runs on the worker pool.
+        timeout (float): Seconds dispatch() waits for an asynchronous call, None waits forever.
+        latency (LatencyHistogram): Handler execution time.
+        wait (LatencyHistogram): Time asynchronous calls waited for a worker.
+    """
+
+    def __init__(self, name, handler, arguments=(), asynchronous=False, timeout=DEFAULT_ENDPOINT_TIMEOUT):
+        self.name = name
+        self.handler = handler
+        self.arguments = tuple(arguments)
+        self.asynchronous = asynchronous
+        self.timeout = timeout
+        self.latency = LatencyHistogram()
+        self.wait = LatencyHistogram()
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self._invoke = self._compileArguments()
+
+    @property
+    def calls(self):
+        return self.latency.count
+
+    def _compileArguments(self):
+        """Validates the handler once and returns the function calling it with its arguments."""
+        if not callable(self.handler):
+            raise TypeError(f"Handler of endpoint '{self.name}' is not callable: {self.handler!r}")
+        unknown = set(self.arguments) - set(ENDPOINT_ARGUMENTS)
+        if unknown:
+            raise ValueError(f"Endpoint '{self.name}' declares unknown arguments {sorted(unknown)}")
+        try:
+            inspect.signature(self.handler).bind(*self.arguments)
+        except TypeError as e:
+            raise TypeError(f"Handler of endpoint '{self.name}' does not accept {self.arguments}: {e}") from None
+        except ValueError:
+            pass  # no signature available (builtins), trust the declaration
+        handler = self.handler
+        indices = [ENDPOINT_ARGUMENTS.index(argument) for argument in self.arguments]
+        if not indices:
+            return lambda values: handler()
+        if len(indices) == 1:
+            index = indices[0]
+            return lambda values: handler(values[index])
+        select = itemgetter(*indices)
+        return lambda values: handler(*select(values))
+
+    def call(self, request, parts, data):
+        start = time.perf_counter()
+        try:
+            return self._invoke((request, parts, data))
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self.latency.record(time.perf_counter() - start)
+
+    def metrics(self):
+        return {"endpoint": self.name, "asynchronous": self.asynchronous, "timeout": self.timeout,
+                "calls": self.calls, "failures": self.failures, "timeouts": self.timeouts,
+                "rejected": self.rejected, "latency": self.latency.toDict(),
+                "wait": self.wait.toDict() if self.asynchronous else None}
+
+
+class RequestRouter:
+    """
+    Routes request strings to their endpoints.
+
+    Attributes:
+        workers (int): Threads of the pool running the asynchronous endpoints.
+        queueSize (int): Asynchronous requests that may wait for a worker.
+    """
+
+    def __init__(self, workers=ROUTER_WORKERS, queueSize=ROUTER_QUEUE_SIZE):
+        self.workers = workers
+        self.queueSize = queueSize
+        self._pending = {}  # (resource, action) -> Endpoint, until compile()
+        self._table = None
+        self._routes = {}  # request string -> (Endpoint, parts)
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(workers + queueSize)
+
+    """ TABLE """
+
+    def register(self, resource, action, handler, arguments=(), asynchronous=False,
+                 timeout=DEFAULT_ENDPOINT_TIMEOUT):
+        """
+        Adds an endpoint, before compile().
+
+        Args:
+            resource (str): First level of the request.
+            action (str): Second level, None for requests without one, ANY_ACTION for the rest.
+            handler (Callable): Called with the declared arguments.
+            arguments (tuple): Subset of ("request", "parts", "data"), in the order the handler takes them.
+            asynchronous (bool): Run on the worker pool.
+            timeout (float): Seconds dispatch() waits for an asynchronous call, None waits forever.
+        """
+        if self._table is not None:
+            raise RuntimeError("RequestRouter is compiled, endpoints can no longer be registered")
+        key = (resource, action)
+        if key in self._pending:
+            raise ValueError(f"Endpoint '{resource}/{action}' is registered twice")
+        if "/" in resource or (action is not None and "/" in action):
+            raise ValueError(f"Resource and action must be single levels: '{resource}/{action}'")
+        name = resource if action is None else f"{resource}/{action}"
+        self._pending[key] = Endpoint(name, handler, arguments, asynchronous, timeout)
+
+    def compile(self):
+        """Freezes the table. Returns self."""
+        self._table = dict(self._pending)
+        if any(endpoint.asynchronous for endpoint in self._table.values()):
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="RequestRouter")
+        return self
+
+    def resolve(self, request):
+        """
+        Returns:
+            tuple: (Endpoint, parts) of the request.
+
+        Raises:
+            ValueError: No endpoint matches the request.
+        """
+        route = self._routes.get(request)
+        if route is not None:
+            return route
+        if not isinstance(request, str):
+            raise ValueError(f"Invalid command: {request}")
+        parts = tuple(request.split("/"))
+        action = parts[1] if len(parts) > 1 else None
+        endpoint = self._table.get((parts[0], action))
+        if endpoint is None and action is not None:
+            endpoint = self._table.get((parts[0], ANY_ACTION))
+        if endpoint is None:
+            raise ValueError(f"Invalid command: {request}")
+        route = (endpoint, parts)
+        if len(self._routes) < ROUTE_CACHE_SIZE:
+            self._routes[request] = route
+        return route
+
+    """ DISPATCH """
+
+    def submit(self, request, data=None):
+        """
+        Starts a request without waiting for it.
+
+        Returns:
+            Future: Result of the handler; already done for a synchronous endpoint or a rejected request.
+        """
+        endpoint, parts = self.resolve(request)
+        if endpoint.asynchronous:
+            return self._submit(endpoint, request, parts, data)
+        future = Future()
+        try:
+            future.set_result(endpoint.call(request, parts, data))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def dispatch(self, request, data=None):
+        """
+        Handles a request and returns the handler's result.
+
+        Asynchronous endpoints are waited for at most their timeout, an error response is returned on
+        timeout or when the pool is full. Exceptions of the handler are raised.
+        """
+        endpoint, parts = self.resolve(request)
+        if not endpoint.asynchronous:
+            return endpoint.call(request, parts, data)
+        future = self._submit(endpoint, request, parts, data)
+        try:
+            return future.result(endpoint.timeout)
+        except FutureTimeoutError:
+            endpoint.timeouts += 1
+            print(f"[RequestRouter] '{request}' timed out after {endpoint.timeout} s, it keeps running in the "
+                  f"background")
+            return Response(Constants.RESPONSE_STATUS_ERROR,
+                            message=f"Request '{request}' timed out after {endpoint.timeout} s").to_dict()
+
+    def _submit(self, endpoint, request, parts, data):
+        if not self._slots.acquire(blocking=False):
+            endpoint.rejected += 1
+            print(f"[RequestRouter] Rejected '{request}': {self.workers} workers busy and {self.queueSize} "
+                  f"requests queued")
+            future = Future()
+            future.set_result(Response(Constants.RESPONSE_STATUS_ERROR,
+                                       message=f"Request '{request}' rejected, the system is busy").to_dict())
+            return future
+        submitted = time.perf_counter()
+
+        def run():
+            endpoint.wait.record(time.perf_counter() - submitted)
+            return endpoint.call(request, parts, data)
+
+        future = self._executor.submit(run)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    """ METRICS """
+
+    def metrics(self):
+        """Per endpoint counters and latency histograms (see Endpoint.metrics)."""
+        return [endpoint.metrics() for endpoint in (self._table or self._pending).values()]
+
+
+if __name__ == "__main__":
+    # The dispatch of the previous RequestHandler: parse, compare, walk the resource handlers
+    class LegacyHandler:
+        def __init__(self):
+            self.resource_dispatch = {"robot": self._handleRobot, "camera": self._handleCamera,
+                                      "settings": self._handleSettings, "workpiece": self._handleWorkpiece}
+
+        def handleRequest(self, request, data=None):
+            if request == "handleExecuteFromGallery":
+                return None
+            parts = request.split("/")
+            if parts[0] in self.resource_dispatch:
+                return self.resource_dispatch[parts[0]](parts, request, data)
+            if request == "start":
+                return None
+            raise ValueError(request)
+
+        def _handleRobot(self, parts, request, _):
+            command = parts[1] if len(parts) > 1 else None
+            if command == "calibrate":
+                return None
+            return jog(request, parts)
+
+        def _handleCamera(self, parts, request, data):
+            return frame()
+
+        def _handleSettings(self, parts, request, data):
+            return None
+
+        def _handleWorkpiece(self, parts, request, data):
+            return None
+
+    def jog(request, parts):
+        return parts[2]
+
+    def frame():
+        return None
+
+    def calibrate():
+        time.sleep(0.5)
+        return "calibrated"
+
+    router = RequestRouter()
+    router.register("robot", "calibrate", calibrate, asynchronous=True, timeout=0.2)
+    router.register("robot", ANY_ACTION, jog, ("request", "parts"))
+    router.register("camera", ANY_ACTION, frame)
+    router.register("start", None, frame, asynchronous=True)
+    router.compile()
+
+    legacy = LegacyHandler()
+    requests = ["robot/jog/X/Minus", "camera/getLatestFrame", "robot/jog/Y/Plus"] * 100000
+    for label, handle in (("parse and compare", legacy.handleRequest), ("compiled lookup", router.resolve),
+                          ("lookup + metrics", router.dispatch)):
+        start = time.perf_counter()
+        for request in requests:
+            handle(request)
+        print(f"{label:<18} {(time.perf_counter() - start) / len(requests) * 1e6:.2f} us per request")
+
+    # A slow endpoint no longer blocks the fast ones; its caller gets an error after the timeout
+    calibration = router.submit("robot/calibrate")
+    start = time.perf_counter()
+    for _ in range(1000):
+        router.dispatch("camera/getLatestFrame")
+    print(f"1000 frame requests while calibrating: {(time.perf_counter() - start) * 1000:.2f} ms, "
+          f"calibration done: {calibration.done()}")
+    print(f"dispatch of a second calibration: {router.dispatch('robot/calibrate')['message']}")
+    print(f"submitted calibration result: {calibration.result()}")
+
+    # Saturate the pool: 4 workers + 16 queued, the rest is rejected
+    futures = [router.submit("robot/calibrate") for _ in range(24)]
+    rejected = sum(1 for future in futures if future.done() and isinstance(future.result(), dict))
+    print(f"24 calibrations submitted at once: {rejected} rejected")
+    for future in futures:
+        future.result()
+    router.shutdown()
+    for endpoint in router.metrics():
+        print(f"  {endpoint['endpoint']:<16} calls {endpoint['calls']:>6}  failures {endpoint['failures']}  "
+              f"timeouts {endpoint['timeouts']}  rejected {endpoint['rejected']}  "
+              f"p50 {endpoint['latency']['p50_ms']:.4f} ms  max {endpoint['latency']['max_ms']:.1f} ms")
@@ -82,6 +82,7 @@ class SensorPublisher:
     def registerSensor(self, sensor):
         self.sensors.append(sensor)
         print(f"[SensorPublisher] Registered sensor: {sensor.getName()}")
+        self.broker.conflate(f"{sensor.getName()}/VALUE")
         if sensor.type == "modbus":
             self.modbus_sensors.append(sensor)
             # Start modbus thread if not already started
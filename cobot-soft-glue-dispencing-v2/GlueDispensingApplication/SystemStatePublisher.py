@@ -0,0 +1,254 @@
+import threading
+import time
+
+from API.MessageBroker import MessageBroker, DELIVERY_SYNC
+
+"""
+SystemStatePublisher
+--------------------
+Single publication service for the component states (vision system, robot service, application).
+
+Every component used to own a SystemStatePublisherThread that published its state every 0.1 s whether it
+had changed or not: one thread and ten messages per second per component, and a transition was seen up to
+100 ms late. Components now report their transitions with report(topic, state) and the service publishes:
+    - on change: the first transition after a quiet period is published immediately (in the reporting
+      thread), further transitions within STATE_COALESCE_WINDOW are coalesced and only the state reached at
+      the end of the window is published; a burst that returns to the published state publishes nothing,
+    - a heartbeat: every topic is republished after STATE_HEARTBEAT_INTERVAL without a change, so
+      subscribers can tell a silent component from a dead one.
+One thread serves every topic and sleeps until the next coalesced flush or heartbeat is due.
+
+Late joiners read the current states with snapshot() / getState(topic), or through the broker with
+broker.request(STATE_SNAPSHOT_TOPIC, None) (also across a BrokerBridge).
+"""
+
+STATE_COALESCE_WINDOW = 0.02  # seconds, transitions closer than this are published as one
+STATE_HEARTBEAT_INTERVAL = 2.0  # seconds without a change before a state is republished
+STATE_SNAPSHOT_TOPIC = "system/state/snapshot"
+
+_UNPUBLISHED = object()
+
+
+class _StateEntry:
+    __slots__ = ("state", "published", "lastPublish", "dueTime", "reports")
+
+    def __init__(self, state):
+        self.state = state
+        self.published = _UNPUBLISHED
+        self.lastPublish = float("-inf")
+        self.dueTime = None  # time of the pending coalesced publish, None if nothing is pending
+        self.reports = 0
+
+
+class SystemStatePublisher:
+    """
+    Process-wide publisher of the component states.
+
+    Attributes:
+        coalesceWindow (float): Seconds over which transitions are coalesced.
+        heartbeatInterval (float): Seconds without a change before a state is republished.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SystemStatePublisher, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.broker = MessageBroker()
+        self.coalesceWindow = STATE_COALESCE_WINDOW
+        self.heartbeatInterval = STATE_HEARTBEAT_INTERVAL
+        self._states = {}  # topic -> _StateEntry
+        # Reentrant: a sync subscriber may report a transition of its own while a state is being published
+        self._condition = threading.Condition(threading.RLock())
+        self._thread = None
+        self._running = False
+        self.published = 0
+        self.heartbeats = 0
+        self.coalesced = 0
+        self.broker.subscribe(STATE_SNAPSHOT_TOPIC, self.snapshot, mode=DELIVERY_SYNC)
+
+    """ REPORTING """
+
+    def report(self, topic, state):
+        """
+        Reports the current state of a component.
+
+        Args:
+            topic (str): State topic of the component (e.g. "vision-system/state").
+            state: New state, compared by equality with the published one.
+        """
+        with self._condition:
+            entry = self._states.get(topic)
+            if entry is None:
+                entry = self._states[topic] = _StateEntry(state)
+                self.broker.conflate(topic)
+            entry.state = state
+            entry.reports += 1
+
+            if entry.published is not _UNPUBLISHED and state == entry.published:
+                if entry.dueTime is not None:
+                    entry.dueTime = None  # the burst ended where it started
+                    self.coalesced += 1
+                return
+            if entry.dueTime is not None:
+                self.coalesced += 1  # the pending publish will carry this state
+                return
+
+            now = time.monotonic()
+            if now - entry.lastPublish >= self.coalesceWindow:
+                self._publish(topic, entry, now)
+            else:
+                entry.dueTime = entry.lastPublish + self.coalesceWindow
+            self._ensureThread()
+            self._condition.notify()
+
+    def _publish(self, topic, entry, now):
+        """Publishes the current state of an entry. Callers hold _condition."""
+        entry.published = entry.state
+        entry.lastPublish = now
+        entry.dueTime = None
+        self.published += 1
+        try:
+            self.broker.publish(topic, entry.state)
+        except Exception as e:
+            print(f"[SystemStatePublisher] Error publishing {topic}: {e}")
+
+    """ PUBLISHING THREAD """
+
+    def _ensureThread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="SystemStatePublisher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                now = time.monotonic()
+                nextWake = None
+                for topic, entry in list(self._states.items()):
+                    if entry.dueTime is not None and entry.dueTime <= now:
+                        self._publish(topic, entry, now)
+                    elif entry.dueTime is None and now - entry.lastPublish >= self.heartbeatInterval:
+                        self.heartbeats += 1
+                        self._publish(topic, entry, now)
+                    due = entry.dueTime if entry.dueTime is not None else entry.lastPublish + self.heartbeatInterval
+                    nextWake = due if nextWake is None else min(nextWake, due)
+                self._condition.wait(None if nextWake is None else max(0.0, nextWake - time.monotonic()))
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    """ QUERIES """
+
+    def getState(self, topic, default=None):
+        """Latest reported state of a topic (published or about to be)."""
+        entry = self._states.get(topic)
+        return default if entry is None else entry.state
+
+    def snapshot(self, message=None):
+        """
+        Current state of every reporting component, for subscribers that joined late.
+
+        Args:
+            message: Ignored, lets snapshot answer broker.request(STATE_SNAPSHOT_TOPIC, ...).
+
+        Returns:
+            dict: {topic: state}
+        """
+        with self._condition:
+            return {topic: entry.state for topic, entry in self._states.items()}
+
+    def metrics(self):
+        """Published messages, heartbeats among them, and transitions absorbed by coalescing."""
+        with self._condition:
+            return {"published": self.published, "heartbeats": self.heartbeats, "coalesced": self.coalesced,
+                    "reported": sum(entry.reports for entry in self._states.values())}
+
+
+if __name__ == "__main__":
+    import enum
+
+    class DemoState(enum.Enum):
+        INITIALIZING = "initializing"
+        IDLE = "idle"
+        RUNNING = "running"
+
+    TOPICS = ["vision-system/state", "robot-service/state", "system/state"]
+    DURATION = 7.0
+    POLL_INTERVAL = 0.1  # the interval of the removed SystemStatePublisherThread
+
+    broker = MessageBroker()
+    received = {"polling": 0, "changes": 0}
+    latencies = []
+
+    def onPolled(message):
+        received["polling"] += 1
+
+    def onChange(topic, message):
+        received["changes"] += 1
+        if message is DemoState.RUNNING and reportTimes.get(topic) is not None:
+            latencies.append(time.monotonic() - reportTimes.pop(topic))
+
+    reportTimes = {}
+    current = {topic: DemoState.INITIALIZING for topic in TOPICS}
+
+    # Before: one thread per component publishing its state every POLL_INTERVAL
+    for topic in TOPICS:
+        broker.subscribe(f"polled/{topic}", onPolled, mode=DELIVERY_SYNC)
+    stop = threading.Event()
+
+    def poller(topic):
+        while not stop.is_set():
+            broker.publish(f"polled/{topic}", current[topic])
+            time.sleep(POLL_INTERVAL)
+
+    pollers = [threading.Thread(target=poller, args=(topic,), daemon=True) for topic in TOPICS]
+    for thread in pollers:
+        thread.start()
+
+    # After: transitions reported to the service
+    broker.subscribe("+/state", onChange, mode=DELIVERY_SYNC)
+    publisher = SystemStatePublisher()
+    start = time.monotonic()
+    for topic in TOPICS:
+        publisher.report(topic, DemoState.INITIALIZING)
+    time.sleep(1.0)
+    for cycle in range(3):
+        for topic in TOPICS:
+            current[topic] = DemoState.RUNNING
+            reportTimes[topic] = time.monotonic()
+            publisher.report(topic, DemoState.RUNNING)
+        # A burst of flapping transitions within a few ms, ending in IDLE
+        for _ in range(50):
+            publisher.report(TOPICS[1], DemoState.RUNNING)
+            publisher.report(TOPICS[1], DemoState.IDLE)
+        current[TOPICS[1]] = DemoState.IDLE
+        time.sleep(0.5)
+        for topic in TOPICS:
+            current[topic] = DemoState.IDLE
+            publisher.report(topic, DemoState.IDLE)
+        time.sleep(0.5)
+    time.sleep(max(0.0, DURATION - (time.monotonic() - start)))
+    stop.set()
+    publisher.stop()
+
+    metrics = publisher.metrics()
+    print(f"{len(TOPICS)} components over {DURATION:.0f} s")
+    print(f"  polling every {POLL_INTERVAL * 1000:.0f} ms: {received['polling']} messages, {len(TOPICS)} threads, "
+          f"transition seen after up to {POLL_INTERVAL * 1000:.0f} ms")
+    print(f"  change driven:        {received['changes']} messages ({metrics['heartbeats']} heartbeats) for "
+          f"{metrics['reported']} reports, {metrics['coalesced']} coalesced, 1 thread")
+    if latencies:
+        latencies.sort()
+        print(f"  report to delivery:   p50 {latencies[len(latencies) // 2] * 1e6:.0f} us, "
+              f"max {latencies[-1] * 1e6:.0f} us")
+    print(f"  snapshot for late joiners: {broker.request(STATE_SNAPSHOT_TOPIC, None)}")
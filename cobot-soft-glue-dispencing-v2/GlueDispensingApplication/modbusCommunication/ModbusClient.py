@@ -80,6 +80,27 @@ class ModbusClient:
                     import traceback
                     traceback.print_exc()
 
+    def tryRead(self, register, signed=True, lockTimeout=-1):
+        """
+        Reads a register without logging, for high rate polling (e.g. the belt encoder).
+
+        Args:
+            register (int): Register address.
+            signed (bool): Interpret the value as signed.
+            lockTimeout (float): Seconds to wait for the bus, -1 waits as long as needed.
+
+        Returns:
+            int or None: The value, or None if the read failed or the bus stayed busy.
+        """
+        if not modbus_lock.acquire(timeout=lockTimeout):
+            return None
+        try:
+            return self.client.read_register(register, signed=signed)
+        except (minimalmodbus.ModbusException, minimalmodbus.InvalidResponseError, IOError):
+            return None
+        finally:
+            modbus_lock.release()
+
     def readBit(self,address,functioncode=1):
         with modbus_lock:
             return self.client.read_bit(address,functioncode=functioncode)
@@ -0,0 +1,426 @@
+import time
+
+import cv2
+import numpy as np
+
+from GlueDispensingApplication.robot.RobotConfig import CALIBRATION_POS, ROBOT_TOOL, ROBOT_USER
+
+"""
+AutoCalibration
+---------------
+Automated camera to robot calibration.
+
+The manual routine jogs the robot tip onto every table marker, and the CalibrationPipeline aligns the
+camera over one marker at a time, waiting a fixed number of frames and creating a new ArUco detector
+for every detection. This routine instead
+    1. drives the camera through a generated grid of xy offsets around the calibration pose, visiting
+       the grid in farthest-point order so the first poses already span the whole image,
+    2. detects the table markers on the latest frame after every move with one cached detector,
+       searching only the region where the current fit predicts the markers (full frame as fallback),
+    3. turns every detection into a pair (pixel, marker robot point - camera offset) - a camera moved
+       by d sees the marker where the calibration pose sees the point moved by -d,
+    4. refits the homography with RANSAC after every pose (bumped markers or false detections are
+       rejected) and stops as soon as the fit stops changing,
+    5. reports the reprojection error per image region so badly covered areas are visible.
+The fitted matrix is saved and published with RobotCalibrationService.applyMatrix.
+"""
+
+CALIBRATION_GRID_SIZE = (4, 4)  # columns, rows of the camera offset grid
+CALIBRATION_GRID_SPAN = (120.0, 80.0)  # mm, total x / y range of the camera offsets
+CALIBRATION_RANSAC_THRESHOLD = 2.0  # mm, maximum reprojection error of an inlier
+CALIBRATION_CONVERGENCE = 0.2  # mm, maximum change of the fit between two poses to count as converged
+CALIBRATION_CONVERGED_POSES = 3  # consecutive converged poses before the routine stops
+CALIBRATION_MIN_POSES = 4
+CALIBRATION_ROI_MARGIN = 60  # px around the predicted marker positions
+CALIBRATION_REGIONS = (3, 3)  # columns, rows of the per region error report
+CALIBRATION_SETTLE_TIME = 0.05  # seconds between reaching a pose and using the latest frame
+CALIBRATION_VELOCITY = 50
+CALIBRATION_ACCELERATION = 50
+CALIBRATION_POSITION_TOLERANCE = 0.5  # mm
+CALIBRATION_MOVE_TIMEOUT = 10.0  # seconds
+
+
+def generateGrid(size=CALIBRATION_GRID_SIZE, span=CALIBRATION_GRID_SPAN):
+    """
+    Camera offsets around the calibration pose in farthest-point order.
+
+    Args:
+        size (tuple): Columns and rows of the grid.
+        span (tuple): Total x and y range in mm.
+
+    Returns:
+        np.ndarray: (N, 2) xy offsets in mm, starting with the one closest to the calibration pose.
+    """
+    xs = np.linspace(-span[0] / 2, span[0] / 2, size[0]) if size[0] > 1 else np.zeros(1)
+    ys = np.linspace(-span[1] / 2, span[1] / 2, size[1]) if size[1] > 1 else np.zeros(1)
+    grid = np.array([(x, y) for y in ys for x in xs], dtype=float)
+
+    remaining = list(range(len(grid)))
+    first = min(remaining, key=lambda i: np.linalg.norm(grid[i]))
+    order = [first]
+    remaining.remove(first)
+    distances = np.linalg.norm(grid - grid[first], axis=1)
+    while remaining:
+        nxt = max(remaining, key=lambda i: distances[i])
+        order.append(nxt)
+        remaining.remove(nxt)
+        distances = np.minimum(distances, np.linalg.norm(grid - grid[nxt], axis=1))
+    return grid[order]
+
+
+def applyHomography(matrix, points):
+    """Maps (N, 2) points through a 3x3 homography."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 1, 2)
+    if len(pts) == 0:
+        return np.empty((0, 2))
+    return cv2.perspectiveTransform(pts, np.asarray(matrix, dtype=np.float64)).reshape(-1, 2)
+
+
+def loadMarkerPoints(path=None):
+    """
+    Robot xy of the table markers from the stored calibration robot points (marker id = line index).
+
+    Returns:
+        dict: {marker id: (x, y)}
+    """
+    if path is None:
+        from GlueDispensingApplication.robot.RobotCalibrationService import ROBOT_POINTS_PATH
+        path = ROBOT_POINTS_PATH
+    points = np.loadtxt(path).reshape(-1, 3)
+    return {i: (float(p[0]), float(p[1])) for i, p in enumerate(points)}
+
+
+def regionErrors(matrix, cameraPoints, robotPoints, frameSize, regions=CALIBRATION_REGIONS):
+    """
+    Reprojection error per image region.
+
+    Args:
+        matrix (np.ndarray): Camera to robot homography.
+        cameraPoints (np.ndarray): (N, 2) pixels.
+        robotPoints (np.ndarray): (N, 2) robot mm.
+        frameSize (tuple): Frame width and height in px.
+        regions (tuple): Columns and rows of regions.
+
+    Returns:
+        tuple: (rms (rows, cols) in mm, NaN for regions without points, counts (rows, cols))
+    """
+    cols, rows = regions
+    rms = np.full((rows, cols), np.nan)
+    counts = np.zeros((rows, cols), dtype=int)
+    if len(cameraPoints) == 0:
+        return rms, counts
+    errors = np.linalg.norm(applyHomography(matrix, cameraPoints) - robotPoints, axis=1)
+    col = np.clip((cameraPoints[:, 0] / frameSize[0] * cols).astype(int), 0, cols - 1)
+    row = np.clip((cameraPoints[:, 1] / frameSize[1] * rows).astype(int), 0, rows - 1)
+    for r in range(rows):
+        for c in range(cols):
+            inRegion = (row == r) & (col == c)
+            counts[r, c] = int(np.count_nonzero(inRegion))
+            if counts[r, c]:
+                rms[r, c] = float(np.sqrt(np.mean(errors[inRegion] ** 2)))
+    return rms, counts
+
+
+class MarkerDetector:
+    """
+    ArUco detector created once and reused, with region of interest tracking.
+
+    Attributes:
+        roiMargin (int): Margin in px around the predicted marker positions.
+        roiDetections (int): Detections served from the region of interest.
+        fullDetections (int): Detections that had to search the full frame.
+    """
+
+    def __init__(self, dictionary=cv2.aruco.DICT_4X4_250, roiMargin=CALIBRATION_ROI_MARGIN):
+        self.detector = cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(dictionary),
+                                                cv2.aruco.DetectorParameters())
+        self.roiMargin = roiMargin
+        self.roiDetections = 0
+        self.fullDetections = 0
+
+    def detect(self, frame, predicted=None):
+        """
+        Detects marker centers.
+
+        Args:
+            frame (np.ndarray): Image (gray, BGR or RGB).
+            predicted (dict): Optional {marker id: (x, y)} expected pixel positions; only this region is
+                              searched unless a predicted marker is missing.
+
+        Returns:
+            dict: {marker id: np.ndarray([x, y])} marker centers in px.
+        """
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if predicted:
+            pts = np.asarray(list(predicted.values()), dtype=float)
+            height, width = gray.shape
+            x0, y0 = np.maximum(np.floor(pts.min(axis=0) - self.roiMargin), 0).astype(int)
+            x1, y1 = np.minimum(np.ceil(pts.max(axis=0) + self.roiMargin), (width, height)).astype(int)
+            if x1 > x0 and y1 > y0:
+                centers = self._detect(gray[y0:y1, x0:x1], (x0, y0))
+                if all(markerId in centers for markerId in predicted):
+                    self.roiDetections += 1
+                    return centers
+        self.fullDetections += 1
+        return self._detect(gray, (0, 0))
+
+    def _detect(self, gray, offset):
+        corners, ids, _ = self.detector.detectMarkers(gray)
+        if ids is None:
+            return {}
+        return {int(markerId): corner.reshape(4, 2).mean(axis=0) + offset
+                for markerId, corner in zip(ids.flatten(), corners)}
+
+
+class CalibrationResult:
+    """
+    Result of an automated calibration.
+
+    Attributes:
+        matrix (np.ndarray): Camera to robot homography (None if the fit failed).
+        cameraPoints (np.ndarray): (N, 2) detected pixels.
+        robotPoints (np.ndarray): (N, 2) matching robot points.
+        inliers (np.ndarray): Boolean RANSAC inlier mask.
+        markerIds (np.ndarray): Marker id of every point.
+        rms (float): Inlier reprojection error in mm.
+        regionRms (np.ndarray): Inlier error per image region in mm.
+        regionCounts (np.ndarray): Inliers per image region.
+        poses (int): Visited grid poses.
+        converged (bool): True if the fit converged before the grid was exhausted.
+        elapsed (float): Duration in seconds.
+    """
+
+    def __init__(self, matrix, cameraPoints, robotPoints, inliers, markerIds, regionRms, regionCounts, poses,
+                 converged, elapsed):
+        self.matrix = matrix
+        self.cameraPoints = cameraPoints
+        self.robotPoints = robotPoints
+        self.inliers = inliers
+        self.markerIds = markerIds
+        self.regionRms = regionRms
+        self.regionCounts = regionCounts
+        self.poses = poses
+        self.converged = converged
+        self.elapsed = elapsed
+        if matrix is not None and np.any(inliers):
+            errors = np.linalg.norm(applyHomography(matrix, cameraPoints[inliers]) - robotPoints[inliers], axis=1)
+            self.rms = float(np.sqrt(np.mean(errors ** 2)))
+        else:
+            self.rms = float("nan")
+
+    @property
+    def success(self):
+        return self.matrix is not None
+
+    def rejectedMarkers(self):
+        """Marker ids rejected as outliers in more than half of their detections."""
+        rejected = []
+        for markerId in np.unique(self.markerIds):
+            mask = self.markerIds == markerId
+            if np.count_nonzero(~self.inliers[mask]) > np.count_nonzero(mask) / 2:
+                rejected.append(int(markerId))
+        return rejected
+
+    def report(self):
+        lines = [f"Calibration {'converged' if self.converged else 'finished'} after {self.poses} poses "
+                 f"in {self.elapsed:.2f} s: {int(np.count_nonzero(self.inliers))}/{len(self.inliers)} inliers, "
+                 f"rms {self.rms:.3f} mm"]
+        rejected = self.rejectedMarkers()
+        if rejected:
+            lines.append(f"  Rejected markers (check their stored robot points): {rejected}")
+        lines.append("  Reprojection error per image region (mm, inliers):")
+        for rmsRow, countRow in zip(self.regionRms, self.regionCounts):
+            lines.append("    " + "  ".join(f"{rms:6.3f} ({count:3d})" if count else "   --- (  0)"
+                                            for rms, count in zip(rmsRow, countRow)))
+        return "\n".join(lines)
+
+
+class AutoCalibrationRoutine:
+    """
+    Drives the robot through the calibration grid and fits the camera to robot homography.
+
+    Attributes:
+        robot: Robot wrapper (moveCart, getCurrentPosition), real or simulated.
+        frameFunction (callable): Returns the latest camera frame.
+        markerPoints (dict): {marker id: (x, y)} robot points of the table markers.
+        calibrationPose (list): Pose the homography is valid for (the pose the camera captures from).
+        initialMatrix (np.ndarray): Previous calibration, used only to predict the first regions of interest.
+    """
+
+    def __init__(self, robot, frameFunction, markerPoints=None, calibrationPose=CALIBRATION_POS,
+                 gridSize=CALIBRATION_GRID_SIZE, gridSpan=CALIBRATION_GRID_SPAN, detector=None,
+                 ransacThreshold=CALIBRATION_RANSAC_THRESHOLD, convergence=CALIBRATION_CONVERGENCE,
+                 convergedPoses=CALIBRATION_CONVERGED_POSES, minPoses=CALIBRATION_MIN_POSES,
+                 settleTime=CALIBRATION_SETTLE_TIME, velocity=CALIBRATION_VELOCITY,
+                 acceleration=CALIBRATION_ACCELERATION, initialMatrix=None):
+        self.robot = robot
+        self.frameFunction = frameFunction
+        self.markerPoints = markerPoints if markerPoints is not None else loadMarkerPoints()
+        self.calibrationPose = list(calibrationPose)
+        self.grid = generateGrid(gridSize, gridSpan)
+        self.detector = detector if detector is not None else MarkerDetector()
+        self.ransacThreshold = ransacThreshold
+        self.convergence = convergence
+        self.convergedPoses = convergedPoses
+        self.minPoses = minPoses
+        self.settleTime = settleTime
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.matrix = initialMatrix
+
+    """ ROBOT """
+
+    def _moveTo(self, pose):
+        self.robot.moveCart(pose, ROBOT_TOOL, ROBOT_USER, vel=self.velocity, acc=self.acceleration)
+        deadline = time.monotonic() + CALIBRATION_MOVE_TIMEOUT
+        while time.monotonic() < deadline:
+            current = self.robot.getCurrentPosition()
+            if current is not None and np.linalg.norm(np.subtract(current[:3], pose[:3])) <= \
+                    CALIBRATION_POSITION_TOLERANCE:
+                return True
+            time.sleep(0.01)
+        print(f"[AutoCalibration] Timeout moving to {pose}")
+        return False
+
+    """ FIT """
+
+    def _fit(self, cameraPoints, robotPoints):
+        if len(cameraPoints) < 4:
+            return None, np.zeros(len(cameraPoints), dtype=bool)
+        matrix, mask = cv2.findHomography(cameraPoints, robotPoints, cv2.RANSAC, self.ransacThreshold)
+        if matrix is None:
+            return None, np.zeros(len(cameraPoints), dtype=bool)
+        inliers = mask.ravel().astype(bool)
+        # Refine on the inliers only
+        refined, _ = cv2.findHomography(cameraPoints[inliers], robotPoints[inliers], 0)
+        return (refined if refined is not None else matrix), inliers
+
+    def _predict(self, offset):
+        if self.matrix is None:
+            return None
+        inverse = np.linalg.inv(self.matrix)
+        ids = list(self.markerPoints)
+        targets = np.asarray([self.markerPoints[i] for i in ids], dtype=float) - offset
+        pixels = applyHomography(inverse, targets)
+        return dict(zip(ids, pixels))
+
+    """ ROUTINE """
+
+    def run(self):
+        """
+        Runs the calibration.
+
+        Returns:
+            CalibrationResult: The fitted homography and its error report.
+        """
+        start = time.perf_counter()
+        cameraPoints, robotPoints, markerIds = [], [], []
+        inliers = np.zeros(0, dtype=bool)
+        frameSize = None
+        probes = None
+        stableCount = 0
+        converged = False
+        poses = 0
+
+        for offset in self.grid:
+            pose = list(self.calibrationPose)
+            pose[0] += offset[0]
+            pose[1] += offset[1]
+            if not self._moveTo(pose):
+                continue
+            time.sleep(self.settleTime)
+            frame = self.frameFunction()
+            if frame is None:
+                continue
+            poses += 1
+            frameSize = (frame.shape[1], frame.shape[0])
+
+            predicted = self._predict(offset)
+            if predicted is not None:
+                predicted = {i: p for i, p in predicted.items()
+                             if 0 <= p[0] < frameSize[0] and 0 <= p[1] < frameSize[1]}
+            centers = self.detector.detect(frame, predicted)
+            for markerId, center in centers.items():
+                if markerId not in self.markerPoints:
+                    continue
+                cameraPoints.append(center)
+                robotPoints.append(np.asarray(self.markerPoints[markerId], dtype=float) - offset)
+                markerIds.append(markerId)
+
+            matrix, inliers = self._fit(np.asarray(cameraPoints, dtype=np.float64).reshape(-1, 2),
+                                        np.asarray(robotPoints, dtype=np.float64).reshape(-1, 2))
+            if matrix is None:
+                continue
+
+            if probes is None:
+                xs, ys = np.meshgrid(np.linspace(0, frameSize[0], 5), np.linspace(0, frameSize[1], 5))
+                probes = np.column_stack([xs.ravel(), ys.ravel()])
+            if self.matrix is not None:
+                change = float(np.max(np.linalg.norm(applyHomography(matrix, probes)
+                                                     - applyHomography(self.matrix, probes), axis=1)))
+                stableCount = stableCount + 1 if change <= self.convergence else 0
+                print(f"[AutoCalibration] Pose {poses}: {len(cameraPoints)} points, fit change {change:.3f} mm")
+            self.matrix = matrix
+            if poses >= self.minPoses and stableCount >= self.convergedPoses:
+                converged = True
+                break
+
+        self._moveTo(self.calibrationPose)
+
+        cameraPoints = np.asarray(cameraPoints, dtype=np.float64).reshape(-1, 2)
+        robotPoints = np.asarray(robotPoints, dtype=np.float64).reshape(-1, 2)
+        markerIds = np.asarray(markerIds, dtype=int)
+        if len(inliers) != len(cameraPoints):
+            inliers = np.zeros(len(cameraPoints), dtype=bool)
+        matrix = self.matrix if len(cameraPoints) >= 4 and np.any(inliers) else None
+        if matrix is not None and frameSize is not None:
+            regionRms, regionCounts = regionErrors(matrix, cameraPoints[inliers], robotPoints[inliers], frameSize)
+        else:
+            regionRms, regionCounts = regionErrors(None, np.empty((0, 2)), np.empty((0, 2)), (1, 1))
+
+        result = CalibrationResult(matrix, cameraPoints, robotPoints, inliers, markerIds, regionRms,
+                                   regionCounts, poses, converged, time.perf_counter() - start)
+        print(f"[AutoCalibration] {result.report()}")
+        return result
+
+
+if __name__ == "__main__":
+    from GlueDispensingApplication.robot.SimulatedCalibrationCamera import SimulatedMarkerCamera, stopAndLookCalibration
+    from GlueDispensingApplication.robot.SimulatedRobotWrapper import SimulatedRobotWrapper
+
+    trueMatrix = np.array([[-0.5, 0.0, 300.0], [0.0, 0.5, 460.0], [0.0, 0.0, 1.0]])
+    try:
+        from GlueDispensingApplication.robot.RobotCalibrationService import CAMERA_TO_ROBOT_MATRIX_PATH
+        trueMatrix = np.load(CAMERA_TO_ROBOT_MATRIX_PATH)
+        markerPoints = loadMarkerPoints()
+    except (OSError, ValueError):
+        markerPoints = {i: tuple(p) for i, p in enumerate(applyHomography(
+            trueMatrix, [(x, y) for y in (180, 360, 540) for x in (290, 640, 990)]))}
+    # Marker 4 was bumped 12 mm off its stored robot point
+    bumped = dict(markerPoints)
+    truePoints = dict(markerPoints)
+    truePoints[4] = (markerPoints[4][0] + 12.0, markerPoints[4][1])
+
+    xs, ys = np.meshgrid(np.linspace(0, 1280, 9), np.linspace(0, 720, 6))
+    check = np.column_stack([xs.ravel(), ys.ravel()])
+
+    def accuracy(matrix):
+        errors = np.linalg.norm(applyHomography(matrix, check) - applyHomography(trueMatrix, check), axis=1)
+        return np.mean(errors), np.max(errors)
+
+    for name in ("stop and look", "automated"):
+        robot = SimulatedRobotWrapper(startPosition=CALIBRATION_POS, timeScale=1.0, publishState=False)
+        camera = SimulatedMarkerCamera(robot, truePoints, trueMatrix, calibrationPose=CALIBRATION_POS, seed=1)
+        if name == "stop and look":
+            start = time.perf_counter()
+            matrix = stopAndLookCalibration(robot, camera, bumped, generateGrid(), CALIBRATION_POS)
+            elapsed = time.perf_counter() - start
+        else:
+            routine = AutoCalibrationRoutine(robot, camera.getLatestFrame, bumped)
+            result = routine.run()
+            matrix, elapsed = result.matrix, result.elapsed
+            print(f"  detections in region of interest {routine.detector.roiDetections}, "
+                  f"full frame {routine.detector.fullDetections}")
+        robot.shutdown()
+        mean, worst = accuracy(matrix)
+        print(f"{name}: {elapsed:.2f} s, error vs ground truth mean {mean:.3f} mm, max {worst:.3f} mm")
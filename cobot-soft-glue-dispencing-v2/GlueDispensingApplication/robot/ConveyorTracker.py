@@ -0,0 +1,284 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from GlueDispensingApplication.robot.RobotConfig import ROBOT_MAX_LINEAR_VELOCITY
+
+"""
+ConveyorTracker
+---------------
+Conveyor tracking for dispensing on a moving belt.
+
+The belt flow used to stop the line, detect and spray parts that sit still. The tracker instead
+    1. samples the belt position from an encoder (Modbus counter) or from vision tracking of the parts,
+       every sample carrying its own timestamp,
+    2. estimates position and velocity (least squares over a short window) and extrapolates them,
+    3. registers the timestamp of the detection the paths were planned from,
+    4. shifts the planned robot paths along the belt axis by the displacement predicted for the time
+       the robot reaches every point, and computes the world velocity that keeps the speed relative
+       to the part equal to the planned spray speed.
+"""
+
+BELT_AXIS = (1.0, 0.0, 0.0)  # belt direction in the robot frame
+BELT_COUNTER_REGISTER = 30  # Modbus register of the belt encoder counter
+BELT_COUNTS_PER_MM = 10.0
+BELT_COUNTER_BITS = 16
+BELT_SAMPLE_RATE = 25  # Hz, the encoder shares the RS-485 bus with the pump and the glue cells
+BELT_BUS_TIMEOUT = 0.005  # seconds a sample waits for the Modbus bus before it is skipped
+BELT_VELOCITY_WINDOW = 0.2  # seconds of samples used for the velocity estimate
+BELT_HISTORY = 2.0  # seconds of samples kept for interpolation at detection timestamps
+BELT_MATCH_DISTANCE = 30.0  # mm, maximum displacement of a part between two vision observations
+
+
+class ModbusBeltEncoder:
+    """
+    Belt position from a wrapping Modbus encoder counter.
+
+    The counter is read with ModbusClient.tryRead: no log line per sample, and a sample is skipped
+    instead of queueing behind other bus traffic for longer than busTimeout.
+
+    Attributes:
+        client: Object with tryRead(register, lockTimeout=...) or read(register) returning the signed
+                counter (ModbusClient or a simulated belt).
+        register (int): Counter register.
+        countsPerMm (float): Encoder resolution.
+    """
+
+    def __init__(self, client=None, register=BELT_COUNTER_REGISTER, countsPerMm=BELT_COUNTS_PER_MM,
+                 bits=BELT_COUNTER_BITS, busTimeout=BELT_BUS_TIMEOUT):
+        if client is None:
+            from GlueDispensingApplication.modbusCommunication.ModbusClientSingleton import ModbusClientSingleton
+            client = ModbusClientSingleton.get_instance()
+        self.client = client
+        self.register = register
+        self.busTimeout = busTimeout
+        self.countsPerMm = countsPerMm
+        self.modulus = 1 << bits
+        self._lastRaw = None
+        self._counts = 0
+
+    def read(self):
+        """Returns the unwrapped belt position in mm or None if the counter could not be read."""
+        if hasattr(self.client, "tryRead"):
+            raw = self.client.tryRead(self.register, lockTimeout=self.busTimeout)
+        else:
+            raw = self.client.read(self.register)
+        if raw is None:
+            return None
+        if self._lastRaw is not None:
+            half = self.modulus // 2
+            self._counts += (raw - self._lastRaw + half) % self.modulus - half
+        self._lastRaw = raw
+        return self._counts / self.countsPerMm
+
+
+class VisionBeltEncoder:
+    """
+    Belt position from the displacement of the detected parts between frames (no encoder needed).
+
+    Every observation matches the part centroids (robot mm) with the previous observation and adds the
+    median displacement along the belt axis to the tracker.
+    """
+
+    def __init__(self, tracker, maxDistance=BELT_MATCH_DISTANCE):
+        self.tracker = tracker
+        self.maxDistance = maxDistance
+        self._previous = None
+        self._position = 0.0
+
+    def observe(self, centroids, timestamp):
+        """
+        Args:
+            centroids (array-like): Part centroids (N, 2) in robot mm.
+            timestamp (float): Capture time of the frame (tracker clock).
+
+        Returns:
+            float: Belt position in mm, or None if no part could be matched.
+        """
+        current = np.asarray(centroids, dtype=float).reshape(-1, 2)
+        previous, self._previous = self._previous, current
+        if previous is None or len(previous) == 0 or len(current) == 0:
+            return None
+
+        axis = self.tracker.axis[:2]
+        distances = np.linalg.norm(current[:, None, :] - previous[None, :, :], axis=2)
+        nearest = np.argmin(distances, axis=1)
+        valid = distances[np.arange(len(current)), nearest] <= self.maxDistance
+        if not np.any(valid):
+            return None
+        shifts = (current[valid] - previous[nearest[valid]]) @ axis
+        self._position += float(np.median(shifts))
+        self.tracker.addSample(timestamp, self._position)
+        return self._position
+
+
+class ConveyorTracker:
+    """
+    Belt position / velocity estimator and path shifter.
+
+    Attributes:
+        encoder: Object with read() returning the belt position in mm (None for push-only sources).
+        axis (np.ndarray): Unit belt direction in the robot frame.
+        clock (callable): Time source of all timestamps (must match the camera timestamps).
+        referencePosition (float): Belt position at the registered detection or None.
+    """
+
+    def __init__(self, encoder=None, axis=BELT_AXIS, sampleRate=BELT_SAMPLE_RATE, velocityWindow=BELT_VELOCITY_WINDOW,
+                 history=BELT_HISTORY, clock=time.monotonic):
+        axis = np.asarray(axis, dtype=float)
+        self.axis = axis / np.linalg.norm(axis)
+        self.encoder = encoder
+        self.period = 1.0 / sampleRate
+        self.velocityWindow = velocityWindow
+        self.history = history
+        self.clock = clock
+
+        self.referencePosition = None
+        self._samples = deque()
+        self._velocity = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def tracking(self):
+        return self.referencePosition is not None
+
+    """ ESTIMATION """
+
+    def addSample(self, timestamp, position):
+        """Adds a timestamped belt position (mm) and updates the velocity estimate."""
+        with self._lock:
+            if self._samples and timestamp <= self._samples[-1][0]:
+                return
+            self._samples.append((timestamp, position))
+            while self._samples and timestamp - self._samples[0][0] > self.history:
+                self._samples.popleft()
+            self._velocity = self._estimateVelocity()
+
+    def _estimateVelocity(self):
+        newest = self._samples[-1][0]
+        window = [s for s in self._samples if newest - s[0] <= self.velocityWindow]
+        if len(window) < 2:
+            return self._velocity
+        t, p = np.asarray(window).T
+        t = t - t.mean()
+        denom = float(np.dot(t, t))
+        return float(np.dot(t, p - p.mean()) / denom) if denom > 1e-12 else self._velocity
+
+    def velocity(self):
+        """Belt velocity in mm/s."""
+        with self._lock:
+            return self._velocity
+
+    def positionAt(self, timestamp=None):
+        """
+        Belt position at a timestamp: interpolated inside the sample history, extrapolated with the
+        estimated velocity after the newest sample.
+
+        Returns:
+            float: Position in mm (None before the first sample).
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            if not self._samples:
+                return None
+            lastTime, lastPosition = self._samples[-1]
+            if timestamp >= lastTime:
+                return lastPosition + self._velocity * (timestamp - lastTime)
+            times, positions = np.asarray(self._samples).T
+            if timestamp <= times[0]:
+                return positions[0] - self._velocity * (times[0] - timestamp)
+            return float(np.interp(timestamp, times, positions))
+
+    def sample(self):
+        """Reads the encoder once."""
+        if self.encoder is None:
+            return None
+        position = self.encoder.read()
+        if position is not None:
+            self.addSample(self.clock(), position)
+        return position
+
+    def start(self):
+        if self.encoder is None or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"[ConveyorTracker] Error reading belt encoder: {e}")
+            self._stop_event.wait(self.period)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    """ TRACKING """
+
+    def registerDetection(self, timestamp):
+        """
+        Sets the detection the paths were planned from.
+
+        Args:
+            timestamp (float): Capture time of the frame (tracker clock).
+
+        Returns:
+            float: Belt position at the detection or None if the belt position is unknown.
+        """
+        self.referencePosition = self.positionAt(timestamp)
+        return self.referencePosition
+
+    def clearDetection(self):
+        self.referencePosition = None
+
+    def displacement(self, timestamp=None):
+        """Belt travel in mm since the registered detection."""
+        if self.referencePosition is None:
+            return 0.0
+        return self.positionAt(timestamp) - self.referencePosition
+
+    def shiftPoses(self, poses, timestamps):
+        """Shifts poses [x, y, z, ...] along the belt axis by the displacement at their timestamps."""
+        shifted = np.array(poses, dtype=float)
+        displacements = np.array([self.displacement(t) for t in np.atleast_1d(timestamps)])
+        shifted[:, :3] += displacements[:, None] * self.axis
+        return shifted
+
+    def trackPath(self, path, speeds, startTime=None, maxVelocity=ROBOT_MAX_LINEAR_VELOCITY):
+        """
+        Plans the world-frame moves of a path on the moving belt.
+
+        The point i is reached at startTime + the planned time to it (segment length / planned speed),
+        shifted by the belt displacement at that time; the world velocity of every segment makes the
+        robot arrive on time, so the speed relative to the part stays the planned spray speed.
+
+        Args:
+            path (list): Planned poses (detection frame).
+            speeds (array-like): Planned speed per segment in mm/s (len(path) - 1).
+            startTime (float): Time the robot leaves path[0] (default: now).
+            maxVelocity (float): Velocity of vel=100 % in mm/s.
+
+        Returns:
+            tuple: (poses (N, 6) list, velocity percentage per move to poses[1:]).
+        """
+        startTime = self.clock() if startTime is None else startTime
+        pts = np.asarray(path, dtype=float)
+        lengths = np.linalg.norm(np.diff(pts[:, :3], axis=0), axis=1)
+        durations = lengths / np.maximum(np.asarray(speeds, dtype=float), 1e-6)
+        times = startTime + np.concatenate(([0.0], np.cumsum(durations)))
+
+        shifted = self.shiftPoses(pts, times)
+        worldLengths = np.linalg.norm(np.diff(shifted[:, :3], axis=0), axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            worldSpeeds = np.where(durations > 1e-9, worldLengths / durations, 0.0)
+        percent = np.clip(worldSpeeds / maxVelocity * 100.0, 1e-3, 100.0)
+        return shifted.tolist(), percent.tolist()
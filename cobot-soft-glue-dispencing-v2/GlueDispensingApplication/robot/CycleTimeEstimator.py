@@ -0,0 +1,438 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from API.shared.settings.conreateSettings.enums.GlueSettingKey import GlueSettingKey
+from API.shared.settings.conreateSettings.enums.RobotSettingKey import RobotSettingKey
+from GlueDispensingApplication.robot.RobotConfig import (ROBOT_MAX_LINEAR_VELOCITY, ROBOT_MAX_LINEAR_ACCELERATION,
+                                                         TRACE_APPROACH_VELOCITY, TRACE_APPROACH_ACCELERATION)
+
+"""
+CycleTimeEstimator
+------------------
+Predicts how long a spray program takes on the robot. Every linear segment is modelled with a
+trapezoidal velocity profile (optionally jerk limited, i.e. S-curve) whose entry and exit speeds are
+limited by the blend radius at the corners. When the executed speed of every segment is known (the
+velocity profile of RobotService), the segments are modelled with those speeds instead of the flat
+settings velocity. Tool on/off delays are taken from the glue settings and the approach moves between
+paths are modelled as point-to-point moves.
+
+The motion model is corrected with a linear calibration (actual = scale * predicted + offset) fitted
+against logged real executions. The executions measure the motion from the first to the last point of
+a path, so the calibration is fitted on the motion time only and the dwell times are added unscaled.
+"""
+
+CYCLE_TIME_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage', 'cycle_time')
+CYCLE_TIME_CALIBRATION_PATH = os.path.join(CYCLE_TIME_DIR, 'calibration.json')
+CYCLE_TIME_LOG_PATH = os.path.join(CYCLE_TIME_DIR, 'executions.jsonl')
+
+DEFAULT_BLEND_RADIUS = 1  # mm, the blend radius used by traceContours
+CYCLE_TIME_LOG_WINDOW = "motion"  # measured window of the logged executions, older entries are not used
+
+
+def segmentLengths(points):
+    """
+    Computes the XYZ length of every segment of a path.
+
+    Args:
+        points (array-like): Path of shape (N, >=2), only x, y (and z if present) are used.
+
+    Returns:
+        np.ndarray: Segment lengths of shape (N-1,).
+    """
+    pts = np.asarray(points, dtype=float)
+    if len(pts) < 2:
+        return np.zeros(0)
+    xyz = pts[:, :3] if pts.shape[1] >= 3 else pts[:, :2]
+    return np.linalg.norm(np.diff(xyz, axis=0), axis=1)
+
+
+def cornerSpeedLimits(points, velocity, acceleration, blendR):
+    """
+    Computes the maximum speed the robot can carry through every interior corner of a path.
+
+    The corner is blended with an arc that starts `blendR` before the corner. For a deflection angle
+    phi, the arc radius is blendR / tan(phi / 2) and the speed is limited by the centripetal
+    acceleration: v = sqrt(acc * radius). A zero blend radius stops the robot at every point.
+
+    Args:
+        points (array-like): Path of shape (N, >=2).
+        velocity (float): Programmed velocity in mm/s.
+        acceleration (float): Programmed acceleration in mm/s^2.
+        blendR (float): Blend radius in mm.
+
+    Returns:
+        np.ndarray: Speed limits of shape (N,) - one per point, 0 at the start and end points.
+    """
+    pts = np.asarray(points, dtype=float)
+    n = len(pts)
+    limits = np.zeros(n)
+    if n < 3 or blendR <= 0:
+        return limits
+
+    xyz = pts[:, :3] if pts.shape[1] >= 3 else pts[:, :2]
+    d = np.diff(xyz, axis=0)
+    lengths = np.linalg.norm(d, axis=1)
+    safe = np.where(lengths > 1e-9, lengths, 1.0)
+    u = d / safe[:, None]
+
+    cosPhi = np.clip(np.einsum('ij,ij->i', u[:-1], u[1:]), -1.0, 1.0)
+    phi = np.arccos(cosPhi)
+
+    # The blend can never use more than half of the adjacent segments
+    r = np.minimum(blendR, 0.5 * np.minimum(lengths[:-1], lengths[1:]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        radius = np.where(phi > 1e-6, r / np.tan(phi / 2.0), np.inf)
+    interior = np.minimum(velocity, np.sqrt(acceleration * radius))
+
+    degenerate = (lengths[:-1] < 1e-9) | (lengths[1:] < 1e-9)
+    interior[degenerate] = 0.0
+    limits[1:-1] = interior
+    return limits
+
+
+def limitJunctionSpeeds(lengths, limits, acceleration):
+    """
+    Makes junction speeds reachable with the given acceleration (forward / backward pass).
+
+    Args:
+        lengths (np.ndarray): Segment lengths of shape (N-1,).
+        limits (np.ndarray): Speed limits per point of shape (N,).
+        acceleration (float): Acceleration in mm/s^2.
+
+    Returns:
+        np.ndarray: Feasible junction speeds of shape (N,).
+    """
+    v = np.array(limits, dtype=float)
+    twoA = 2.0 * acceleration
+    for i in range(1, len(v)):
+        v[i] = min(v[i], np.sqrt(v[i - 1] ** 2 + twoA * lengths[i - 1]))
+    for i in range(len(v) - 2, -1, -1):
+        v[i] = min(v[i], np.sqrt(v[i + 1] ** 2 + twoA * lengths[i]))
+    return v
+
+
+def trapezoidalSegmentTimes(lengths, vIn, vOut, velocity, acceleration, jerk=None):
+    """
+    Vectorized duration of trapezoidal velocity profiles.
+
+    Args:
+        lengths (np.ndarray): Segment lengths (mm).
+        vIn (np.ndarray): Entry speeds (mm/s).
+        vOut (np.ndarray): Exit speeds (mm/s).
+        velocity (float or np.ndarray): Cruise speed limit (mm/s).
+        acceleration (float): Acceleration (mm/s^2).
+        jerk (float, optional): Jerk limit (mm/s^3). When given, every acceleration phase is
+                                extended by acc / jerk to approximate an S-curve profile.
+
+    Returns:
+        np.ndarray: Segment durations in seconds.
+    """
+    lengths = np.asarray(lengths, dtype=float)
+    vIn = np.asarray(vIn, dtype=float)
+    vOut = np.asarray(vOut, dtype=float)
+    a = float(acceleration)
+
+    # Peak speed: either the cruise speed or the triangular profile peak
+    vPeak = np.minimum(velocity, np.sqrt(np.maximum((2 * a * lengths + vIn ** 2 + vOut ** 2) / 2.0, 0.0)))
+    vPeak = np.maximum(vPeak, np.maximum(vIn, vOut))
+
+    tAcc = (vPeak - vIn) / a
+    tDec = (vPeak - vOut) / a
+    dAcc = (vPeak ** 2 - vIn ** 2) / (2 * a)
+    dDec = (vPeak ** 2 - vOut ** 2) / (2 * a)
+    dCruise = np.maximum(lengths - dAcc - dDec, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tCruise = np.where(vPeak > 1e-9, dCruise / vPeak, 0.0)
+
+    times = tAcc + tDec + tCruise
+
+    if jerk:
+        phases = (tAcc > 1e-9).astype(float) + (tDec > 1e-9).astype(float)
+        times = times + phases * (a / jerk)
+
+    return np.where(lengths > 1e-9, times, 0.0)
+
+
+class CycleTimeEstimator:
+    """
+    Estimates per-path and total execution times of spray programs.
+
+    Attributes:
+        robotSettings (RobotSettings): Default velocity / acceleration (percent of the robot limits).
+        glueSettings (GlueSettings): Default tool on/off delays.
+        maxVelocity (float): TCP speed at 100 % velocity (mm/s).
+        maxAcceleration (float): TCP acceleration at 100 % acceleration (mm/s^2).
+        jerk (float or None): Optional jerk limit for S-curve profiles (mm/s^3).
+        scale (float): Calibration scale.
+        offset (float): Calibration offset per path (seconds).
+    """
+
+    def __init__(self, robotSettings=None, glueSettings=None,
+                 maxVelocity=ROBOT_MAX_LINEAR_VELOCITY,
+                 maxAcceleration=ROBOT_MAX_LINEAR_ACCELERATION,
+                 blendR=DEFAULT_BLEND_RADIUS,
+                 jerk=None,
+                 calibrationPath=CYCLE_TIME_CALIBRATION_PATH,
+                 logPath=CYCLE_TIME_LOG_PATH):
+        self.robotSettings = robotSettings
+        self.glueSettings = glueSettings
+        self.maxVelocity = maxVelocity
+        self.maxAcceleration = maxAcceleration
+        self.blendR = blendR
+        self.jerk = jerk
+        self.calibrationPath = calibrationPath
+        self.logPath = logPath
+        self.scale = 1.0
+        self.offset = 0.0
+        self.loadCalibration()
+
+    """ SETTINGS """
+
+    def _robotValue(self, settings, key, default):
+        value = settings.get(key.value) if settings else None
+        if value is None and self.robotSettings is not None:
+            value = self.robotSettings.get_value(key.value)
+        return float(value) if value is not None else default
+
+    def _glueValue(self, settings, key, default):
+        value = settings.get(key.value) if settings else None
+        if value is None and self.glueSettings is not None:
+            value = self.glueSettings.get_value(key.value)
+        try:
+            return float(value) if value is not None else default
+        except (TypeError, ValueError):
+            return default
+
+    def _toMotion(self, velocityPercent, accelerationPercent):
+        """Converts SDK velocity / acceleration percentages to mm/s and mm/s^2."""
+        velocity = max(float(velocityPercent), 1e-3) / 100.0 * self.maxVelocity
+        acceleration = max(float(accelerationPercent), 1e-3) / 100.0 * self.maxAcceleration
+        return velocity, acceleration
+
+    def toolDelays(self, settings=None):
+        """
+        Returns the tool-on and tool-off dwell times of a path.
+
+        Args:
+            settings (dict, optional): Per path settings that override the glue settings.
+
+        Returns:
+            tuple: (toolOnDelay, toolOffDelay) in seconds.
+        """
+        toolOn = self._glueValue(settings, GlueSettingKey.TIME_BEFORE_MOTION, 0.0)
+        toolOff = self._glueValue(settings, GlueSettingKey.TIME_BEFORE_STOP, 0.0)
+        return toolOn, toolOff
+
+    """ ESTIMATION """
+
+    def motionTime(self, points, velocityPercent, accelerationPercent, blendR=None):
+        """
+        Raw (uncalibrated) duration of a blended MoveL sequence through all points.
+
+        Returns:
+            float: Duration in seconds.
+        """
+        if points is None or len(points) < 2:
+            return 0.0
+        blendR = self.blendR if blendR is None else blendR
+        velocity, acceleration = self._toMotion(velocityPercent, accelerationPercent)
+        lengths = segmentLengths(points)
+        limits = cornerSpeedLimits(points, velocity, acceleration, blendR)
+        junctions = limitJunctionSpeeds(lengths, limits, acceleration)
+        times = trapezoidalSegmentTimes(lengths, junctions[:-1], junctions[1:], velocity, acceleration, self.jerk)
+        return float(times.sum())
+
+    def profiledMotionTime(self, points, segmentSpeeds, accelerationPercent, blendR=None):
+        """
+        Raw (uncalibrated) duration of a blended move sequence executed with a speed per segment.
+
+        Args:
+            points (list): Path poses.
+            segmentSpeeds (array-like): Commanded speed of every segment in mm/s, shape (N-1,).
+            accelerationPercent (float): Acceleration from the settings (SDK %).
+
+        Returns:
+            float: Duration in seconds.
+        """
+        if points is None or len(points) < 2:
+            return 0.0
+        blendR = self.blendR if blendR is None else blendR
+        _, acceleration = self._toMotion(100.0, accelerationPercent)
+        speeds = np.maximum(np.asarray(segmentSpeeds, dtype=float), 1e-3)
+        lengths = segmentLengths(points)
+        # A point is passed at most with the slower of its two segments
+        pointSpeeds = np.minimum(np.r_[speeds[0], speeds], np.r_[speeds, speeds[-1]])
+        limits = np.minimum(cornerSpeedLimits(points, np.inf, acceleration, blendR), pointSpeeds)
+        junctions = limitJunctionSpeeds(lengths, limits, acceleration)
+        times = trapezoidalSegmentTimes(lengths, junctions[:-1], junctions[1:], speeds, acceleration, self.jerk)
+        return float(times.sum())
+
+    def pathMotionTime(self, path, settings=None, segmentSpeeds=None):
+        """Raw motion time of a path: with the executed segment speeds if given, the settings velocity otherwise."""
+        acceleration = self._robotValue(settings, RobotSettingKey.ACCELERATION, 100.0)
+        if segmentSpeeds is not None and path is not None and len(segmentSpeeds) == len(path) - 1:
+            return self.profiledMotionTime(path, segmentSpeeds, acceleration)
+        velocity = self._robotValue(settings, RobotSettingKey.VELOCITY, 100.0)
+        return self.motionTime(path, velocity, acceleration)
+
+    def travelTime(self, start, end):
+        """Raw duration of the point-to-point approach move between two poses."""
+        if start is None or end is None:
+            return 0.0
+        return float(self.travelTimes(float(segmentLengths([start, end])[0])))
+
+    def travelTimes(self, distances):
+        """
+        Vectorized raw duration of point-to-point approach moves (from and to standstill).
+
+        Used as the travel cost of PathSequencer, so paths are ordered by approach time instead of distance.
+
+        Args:
+            distances (float or array-like): Move lengths in mm.
+
+        Returns:
+            float or np.ndarray: Durations in seconds, a float for a single distance.
+        """
+        # Closed form of trapezoidalSegmentTimes for rest to rest moves - PathSequencer calls it very often
+        velocity, acceleration = self._toMotion(TRACE_APPROACH_VELOCITY, TRACE_APPROACH_ACCELERATION)
+        jerkTime = 2.0 * acceleration / self.jerk if self.jerk else 0.0
+        if np.isscalar(distances):
+            if distances <= 1e-9:
+                return 0.0
+            if distances < velocity ** 2 / acceleration:
+                return 2.0 * math.sqrt(distances / acceleration) + jerkTime
+            return distances / velocity + velocity / acceleration + jerkTime
+
+        distances = np.asarray(distances, dtype=float)
+        triangular = 2.0 * np.sqrt(np.maximum(distances, 0.0) / acceleration)
+        trapezoidal = distances / velocity + velocity / acceleration
+        times = np.where(distances < velocity ** 2 / acceleration, triangular, trapezoidal) + jerkTime
+        return np.where(distances > 1e-9, times, 0.0)
+
+    def estimatePath(self, path, settings=None, segmentSpeeds=None):
+        """
+        Calibrated duration of one spray path including its tool on/off dwell times.
+
+        Args:
+            path (list): Robot poses [x, y, z, rx, ry, rz].
+            settings (dict, optional): Per path settings (robot and glue keys).
+            segmentSpeeds (array-like, optional): Executed speed of every segment in mm/s.
+
+        Returns:
+            float: Duration in seconds.
+        """
+        toolOn, toolOff = self.toolDelays(settings)
+        motion = self.pathMotionTime(path, settings, segmentSpeeds)
+        return self.scale * motion + self.offset + toolOn + toolOff
+
+    def estimate(self, paths, startPosition=None, speedPlanner=None):
+        """
+        Estimates a whole program.
+
+        Args:
+            paths (list): List of (path, settings) tuples as passed to RobotService.traceContours.
+            startPosition (list, optional): Pose the robot starts from.
+            speedPlanner (callable, optional): (path, settings) -> executed speed of every segment in mm/s
+                                               (or None for the settings velocity).
+
+        Returns:
+            dict: {"paths": per path times, "travel": approach move times, "total": total seconds}
+        """
+        pathTimes = []
+        travelTimes = []
+        previous = startPosition
+        for path, settings in paths:
+            if not path:
+                pathTimes.append(0.0)
+                travelTimes.append(0.0)
+                continue
+            travelTimes.append(self.scale * self.travelTime(previous, path[0]))
+            segmentSpeeds = speedPlanner(path, settings) if speedPlanner is not None else None
+            pathTimes.append(self.estimatePath(path, settings, segmentSpeeds))
+            previous = path[-1]
+
+        total = float(sum(pathTimes) + sum(travelTimes))
+        if paths:
+            total += self._glueValue(paths[0][1], GlueSettingKey.TIME_BETWEEN_GENERATOR_AND_GLUE, 0.0)
+
+        return {"paths": pathTimes, "travel": travelTimes, "total": total}
+
+    """ CALIBRATION """
+
+    def loadCalibration(self):
+        if not self.calibrationPath or not os.path.exists(self.calibrationPath):
+            return False
+        try:
+            with open(self.calibrationPath, 'r') as f:
+                data = json.load(f)
+            self.scale = float(data.get("scale", 1.0))
+            self.offset = float(data.get("offset", 0.0))
+            return True
+        except Exception as e:
+            print(f"Error loading cycle time calibration: {e}")
+            return False
+
+    def saveCalibration(self):
+        os.makedirs(os.path.dirname(self.calibrationPath), exist_ok=True)
+        with open(self.calibrationPath, 'w') as f:
+            json.dump({"scale": self.scale, "offset": self.offset}, f, indent=2)
+
+    def logExecution(self, path, settings, actualSeconds, segmentSpeeds=None):
+        """
+        Appends a real execution to the log used for calibration.
+
+        Args:
+            path (list): Executed robot path.
+            settings (dict): Settings the path was executed with.
+            actualSeconds (float): Measured motion from the first to the last point of the path (no dwell).
+            segmentSpeeds (array-like, optional): Executed speed of every segment in mm/s.
+        """
+        raw = self.pathMotionTime(path, settings, segmentSpeeds)
+
+        os.makedirs(os.path.dirname(self.logPath), exist_ok=True)
+        with open(self.logPath, 'a') as f:
+            f.write(json.dumps({"predicted": raw, "actual": float(actualSeconds),
+                                "window": CYCLE_TIME_LOG_WINDOW}) + "\n")
+
+    def calibrate(self, records=None, save=True):
+        """
+        Fits actual = scale * predicted + offset by least squares.
+
+        Args:
+            records (list, optional): (predicted, actual) pairs. Defaults to the execution log.
+            save (bool): Persist the calibration.
+
+        Returns:
+            tuple: (success (bool), message (str))
+        """
+        if records is None:
+            records = []
+            if os.path.exists(self.logPath):
+                with open(self.logPath, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            entry = json.loads(line)
+                            if entry.get("window") == CYCLE_TIME_LOG_WINDOW:
+                                records.append((entry["predicted"], entry["actual"]))
+
+        if len(records) < 2:
+            return False, f"Not enough executions to calibrate: {len(records)}"
+
+        data = np.asarray(records, dtype=float)
+        A = np.column_stack([data[:, 0], np.ones(len(data))])
+        (scale, offset), *_ = np.linalg.lstsq(A, data[:, 1], rcond=None)
+        if scale <= 0:
+            return False, "Calibration rejected: non-positive scale"
+
+        self.scale = float(scale)
+        self.offset = float(offset)
+        if save:
+            self.saveCalibration()
+
+        residuals = data[:, 1] - (self.scale * data[:, 0] + self.offset)
+        rms = float(np.sqrt(np.mean(residuals ** 2)))
+        return True, f"Cycle time calibrated on {len(records)} executions (rms error {rms:.3f} s)"
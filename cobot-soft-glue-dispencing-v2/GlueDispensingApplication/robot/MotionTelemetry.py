@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+"""
+MotionTelemetry
+---------------
+Recorder of the commanded motion and the realtime robot state of a dispensing cycle.
+
+Three fixed-size ring buffers (NumPy structured arrays) are filled during a cycle:
+    - segments: every commanded move (approach, MoveL, MoveC) with its target, via point, commanded
+      velocity and the planned speed / pump speed,
+    - states:   the realtime state stream (TCP position and speed),
+    - pump:     every pump speed register write of a PumpSpeedController the recorder is attached to.
+Appending is a single row assignment, so the recorder can be fed from the state polling loop and the
+pump control loop. RobotService.traceContours does not drive the pump yet: its cycles carry the planned
+pump speed per move but no pump writes. endCycle flushes the cycle to a compressed .npz in the background.
+MotionTelemetryAnalyzer reads the files offline.
+"""
+
+TELEMETRY_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage', 'telemetry')
+TELEMETRY_STATE_CAPACITY = 60000  # 10 minutes at 100 Hz
+TELEMETRY_SEGMENT_CAPACITY = 20000
+TELEMETRY_PUMP_CAPACITY = 20000
+
+SEGMENT_APPROACH = 0
+SEGMENT_LINEAR = 1
+SEGMENT_CIRCULAR = 2
+
+SEGMENT_DTYPE = np.dtype([
+    ("time", "f8"),  # monotonic time the command was sent
+    ("path", "i4"),
+    ("segment", "i4"),
+    ("kind", "i1"),
+    ("x", "f4"), ("y", "f4"), ("z", "f4"),
+    ("viaX", "f4"), ("viaY", "f4"), ("viaZ", "f4"),  # NaN unless circular
+    ("velocity", "f4"),  # commanded velocity in %
+    ("plannedSpeed", "f4"),  # mm/s, NaN if not planned
+    ("plannedPump", "f4"),  # pump register value, NaN if not planned
+])
+
+STATE_DTYPE = np.dtype([
+    ("time", "f8"),
+    ("x", "f4"), ("y", "f4"), ("z", "f4"),
+    ("speed", "f4"),  # TCP speed in mm/s
+])
+
+PUMP_DTYPE = np.dtype([
+    ("time", "f8"),
+    ("speed", "f4"),  # written pump register value
+])
+
+
+class RingBuffer:
+    """
+    Fixed-capacity ring buffer of structured rows; the oldest rows are overwritten when full.
+
+    Attributes:
+        capacity (int): Maximum number of rows.
+        dropped (int): Rows overwritten since the last clear.
+    """
+
+    def __init__(self, dtype, capacity):
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def append(self, row):
+        with self._lock:
+            self.data[self.head] = row
+            self.head = (self.head + 1) % self.capacity
+            if self.count < self.capacity:
+                self.count += 1
+            else:
+                self.dropped += 1
+
+    def toArray(self):
+        """Rows in insertion order (copy)."""
+        with self._lock:
+            if self.count < self.capacity:
+                return self.data[:self.count].copy()
+            return np.concatenate((self.data[self.head:], self.data[:self.head]))
+
+    def clear(self):
+        with self._lock:
+            self.head = 0
+            self.count = 0
+            self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+
+class MotionTelemetryRecorder:
+    """
+    Records one dispensing cycle at a time.
+
+    Attributes:
+        storageDir (str): Directory of the flushed .npz files.
+        recording (bool): True between beginCycle and endCycle.
+        lastFile (str): Path of the most recently flushed cycle.
+    """
+
+    def __init__(self, storageDir=TELEMETRY_DIR, stateCapacity=TELEMETRY_STATE_CAPACITY,
+                 segmentCapacity=TELEMETRY_SEGMENT_CAPACITY, pumpCapacity=TELEMETRY_PUMP_CAPACITY,
+                 clock=time.monotonic):
+        self.storageDir = storageDir
+        self.clock = clock
+        self.segments = RingBuffer(SEGMENT_DTYPE, segmentCapacity)
+        self.states = RingBuffer(STATE_DTYPE, stateCapacity)
+        self.pump = RingBuffer(PUMP_DTYPE, pumpCapacity)
+        self.recording = False
+        self.cycleId = None
+        self.cycleStart = None
+        self.lastFile = None
+        self._flushThread = None
+
+    """ CYCLE """
+
+    def beginCycle(self, cycleId=None):
+        self.waitForFlush()
+        self.segments.clear()
+        self.states.clear()
+        self.pump.clear()
+        self.cycleStart = self.clock()
+        self.cycleId = cycleId if cycleId is not None else time.strftime("%Y%m%d_%H%M%S")
+        self.recording = True
+
+    def endCycle(self, flush=True):
+        """
+        Stops recording and writes the cycle to <storageDir>/cycle_<id>.npz in a background thread.
+
+        Returns:
+            str: Path of the file being written, None if nothing was recorded.
+        """
+        if not self.recording:
+            return None
+        self.recording = False
+        if not flush:
+            return None
+        arrays = {
+            "segments": self.segments.toArray(),
+            "states": self.states.toArray(),
+            "pump": self.pump.toArray(),
+            "meta": np.array([self.cycleStart, self.clock(), self.states.dropped + self.segments.dropped
+                              + self.pump.dropped], dtype="f8"),
+        }
+        os.makedirs(self.storageDir, exist_ok=True)
+        path = os.path.join(self.storageDir, f"cycle_{self.cycleId}.npz")
+        self._flushThread = threading.Thread(target=self._flush, args=(path, arrays), daemon=True)
+        self._flushThread.start()
+        self.lastFile = path
+        return path
+
+    def _flush(self, path, arrays):
+        try:
+            np.savez_compressed(path, **arrays)
+        except Exception as e:
+            print(f"[MotionTelemetry] Error writing {path}: {e}")
+
+    def waitForFlush(self, timeout=5.0):
+        if self._flushThread is not None:
+            self._flushThread.join(timeout)
+            self._flushThread = None
+
+    """ RECORDING """
+
+    def recordSegment(self, pathIndex, segmentIndex, kind, pose, velocity, via=None, plannedSpeed=np.nan,
+                      plannedPump=np.nan, timestamp=None):
+        """
+        Records a commanded move.
+
+        Args:
+            pathIndex (int): Index of the path in the cycle.
+            segmentIndex (int): Index of the move in the path (0 for the approach).
+            kind (int): SEGMENT_APPROACH, SEGMENT_LINEAR or SEGMENT_CIRCULAR.
+            pose (list): Target pose.
+            velocity (float): Commanded velocity in %.
+            via (list): Via pose of a circular move.
+            plannedSpeed (float): Planned TCP speed in mm/s.
+            plannedPump (float): Planned pump speed.
+        """
+        if not self.recording:
+            return
+        via = via if via is not None else (np.nan, np.nan, np.nan)
+        self.segments.append((self.clock() if timestamp is None else timestamp, pathIndex, segmentIndex, kind,
+                              pose[0], pose[1], pose[2], via[0], via[1], via[2], velocity, plannedSpeed,
+                              plannedPump))
+
+    def recordState(self, timestamp, pose, speed):
+        if self.recording and pose is not None:
+            self.states.append((timestamp, pose[0], pose[1], pose[2], speed))
+
+    def recordPump(self, timestamp, speed):
+        if self.recording:
+            self.pump.append((timestamp, speed))
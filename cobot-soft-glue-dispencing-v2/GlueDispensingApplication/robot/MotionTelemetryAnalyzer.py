@@ -0,0 +1,386 @@
+import sys
+
+import numpy as np
+
+from GlueDispensingApplication.robot.MotionTelemetry import SEGMENT_APPROACH, SEGMENT_CIRCULAR
+from GlueDispensingApplication.robot.PathConditioner import circleThroughPoints
+from GlueDispensingApplication.robot.RobotConfig import ROBOT_MAX_LINEAR_VELOCITY
+
+"""
+MotionTelemetryAnalyzer
+-----------------------
+Offline analysis of a cycle recorded by MotionTelemetryRecorder.
+
+The commanded moves are chained into one polyline (arcs densified). Every state sample is projected
+onto it with monotonic progress, which gives
+    - the time the TCP passes every commanded target -> actual duration per segment vs. planned,
+    - the distance of every sample to the commanded geometry -> path deviation per segment,
+    - standstills between the first command and the end of the motion -> idle gaps and where they are,
+and, when the cycle has pump register writes (a PumpSpeedController was recording), the writes are
+cross-correlated with the TCP speed -> pump speed lag.
+
+Usage: python -m GlueDispensingApplication.robot.MotionTelemetryAnalyzer cycle_<id>.npz
+"""
+
+IDLE_SPEED = 2.0  # mm/s, TCP slower than this is standing still
+IDLE_MIN_DURATION = 0.05  # seconds
+PROGRESS_SEARCH_WINDOW = 200  # polyline pieces searched ahead of the current one
+PROGRESS_TIE_TOLERANCE = 1.0  # mm, the earliest piece within this distance of the nearest one wins
+ARC_SAMPLES = 16
+PUMP_LAG_MAX = 0.5  # seconds
+PUMP_LAG_RESOLUTION = 0.005  # seconds
+
+
+def _arcPoints(a, via, b, samples=ARC_SAMPLES):
+    circle = circleThroughPoints(a, via, b)
+    if circle is None:
+        return np.array([via, b])
+    center, radius, normal = circle
+    u = (a - center) / radius
+    v = np.cross(normal, u)
+    end = np.arctan2(np.dot(b - center, v), np.dot(b - center, u)) % (2 * np.pi)
+    angles = np.linspace(0.0, end, samples + 1)[1:]
+    return center + radius * (np.cos(angles)[:, None] * u + np.sin(angles)[:, None] * v)
+
+
+def _project(point, a, b):
+    ab = b - a
+    denom = float(np.dot(ab, ab))
+    t = 0.0 if denom < 1e-12 else min(max(float(np.dot(point - a, ab)) / denom, 0.0), 1.0)
+    return float(np.linalg.norm(a + t * ab - point)), t
+
+
+class MotionTelemetryAnalyzer:
+    """
+    Attributes:
+        segments (np.ndarray): Commanded moves (SEGMENT_DTYPE).
+        states (np.ndarray): Realtime state samples (STATE_DTYPE).
+        pump (np.ndarray): Pump register writes (PUMP_DTYPE).
+    """
+
+    def __init__(self, segments, states, pump, meta=None):
+        self.segments = segments
+        self.states = states
+        self.pump = pump
+        self.meta = meta
+        self._tracked = None
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["segments"], data["states"], data["pump"], data["meta"] if "meta" in data else None)
+
+    """ PROGRESS """
+
+    def _polyline(self):
+        """Chained commanded geometry: pieces (start, end), owning segment row and cumulative length."""
+        start = np.array([self.states["x"][0], self.states["y"][0], self.states["z"][0]], dtype=float)
+        points, owners = [start], []
+        vertexLength = np.zeros(len(self.segments))
+        for row, segment in enumerate(self.segments):
+            target = np.array([segment["x"], segment["y"], segment["z"]], dtype=float)
+            if segment["kind"] == SEGMENT_CIRCULAR:
+                via = np.array([segment["viaX"], segment["viaY"], segment["viaZ"]], dtype=float)
+                newPoints = _arcPoints(points[-1], via, target)
+            else:
+                newPoints = [target]
+            for p in newPoints:
+                points.append(np.asarray(p, dtype=float))
+                owners.append(row)
+        points = np.asarray(points)
+        lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+        owners = np.asarray(owners)
+        for row in range(len(self.segments)):
+            last = np.nonzero(owners == row)[0]
+            vertexLength[row] = cumulative[last[-1] + 1] if len(last) else np.nan
+        return points, owners, cumulative, vertexLength
+
+    def track(self):
+        """
+        Projects every state sample onto the commanded polyline.
+
+        Returns:
+            dict: progress (mm along the polyline), distance (mm), owner (segment row per sample),
+                  vertexLength (progress at every commanded target).
+        """
+        if self._tracked is not None:
+            return self._tracked
+        points, owners, cumulative, vertexLength = self._polyline()
+        positions = np.column_stack([self.states["x"], self.states["y"], self.states["z"]]).astype(float)
+        progress = np.zeros(len(positions))
+        distance = np.zeros(len(positions))
+        owner = np.zeros(len(positions), dtype=int)
+        current = 0
+        pieces = len(points) - 1
+        for i, p in enumerate(positions):
+            candidates = []
+            for piece in range(current, min(current + PROGRESS_SEARCH_WINDOW, pieces)):
+                d, t = _project(p, points[piece], points[piece + 1])
+                candidates.append((d, piece, t))
+            if not candidates:
+                break
+            nearest = min(c[0] for c in candidates)
+            d, piece, t = next(c for c in candidates if c[0] <= nearest + PROGRESS_TIE_TOLERANCE)
+            current = piece
+            progress[i] = cumulative[piece] + t * (cumulative[piece + 1] - cumulative[piece])
+            distance[i] = d
+            owner[i] = owners[piece]
+        progress = np.maximum.accumulate(progress)
+        self._tracked = {"progress": progress, "distance": distance, "owner": owner, "vertexLength": vertexLength}
+        return self._tracked
+
+    """ ANALYSES """
+
+    def segmentTimings(self):
+        """
+        Returns:
+            list: Per commanded move: path, segment, kind, length, actual and planned duration (s),
+                  time the target was passed (NaN if never reached).
+        """
+        tracked = self.track()
+        times = self.states["time"]
+        progress = tracked["progress"]
+        results = []
+        previousTime = self.segments["time"][0] if len(self.segments) else np.nan
+        previousLength = 0.0
+        for row, segment in enumerate(self.segments):
+            target = tracked["vertexLength"][row]
+            reached = np.nonzero(progress >= target - 1e-6)[0]
+            if len(reached):
+                i = reached[0]
+                if i > 0 and progress[i] > progress[i - 1]:
+                    f = (target - progress[i - 1]) / (progress[i] - progress[i - 1])
+                    passed = times[i - 1] + f * (times[i] - times[i - 1])
+                else:
+                    passed = times[i]
+            else:
+                passed = np.nan
+            length = target - previousLength
+            speed = segment["plannedSpeed"]
+            if not np.isfinite(speed):
+                speed = segment["velocity"] / 100.0 * ROBOT_MAX_LINEAR_VELOCITY
+            results.append({
+                "path": int(segment["path"]), "segment": int(segment["segment"]), "kind": int(segment["kind"]),
+                "length": float(length), "passed": float(passed),
+                "duration": float(passed - previousTime),
+                "planned": float(length / speed) if speed > 0 else np.nan,
+            })
+            previousTime, previousLength = passed, target
+        return results
+
+    def pathDeviation(self):
+        """
+        Returns:
+            list: Per dispensing move (approach moves excluded): path, segment, mean and max distance (mm)
+                  of the state samples to the commanded geometry.
+        """
+        tracked = self.track()
+        results = []
+        for row, segment in enumerate(self.segments):
+            if segment["kind"] == SEGMENT_APPROACH:
+                continue
+            distances = tracked["distance"][tracked["owner"] == row]
+            if len(distances) == 0:
+                continue
+            results.append({"path": int(segment["path"]), "segment": int(segment["segment"]),
+                            "mean": float(np.mean(distances)), "max": float(np.max(distances))})
+        return results
+
+    def idleGaps(self, idleSpeed=IDLE_SPEED, minDuration=IDLE_MIN_DURATION):
+        """
+        Standstills between the first command and the last commanded target.
+
+        Returns:
+            list: start, duration (s) and the path / segment the robot was standing at.
+        """
+        if len(self.segments) == 0 or len(self.states) == 0:
+            return []
+        tracked = self.track()
+        timings = self.segmentTimings()
+        end = np.nanmax([t["passed"] for t in timings]) if timings else self.states["time"][-1]
+        times = self.states["time"]
+        window = (times >= self.segments["time"][0]) & (times <= end)
+        idle = (self.states["speed"] < idleSpeed) & window
+        gaps = []
+        i = 0
+        while i < len(idle):
+            if not idle[i]:
+                i += 1
+                continue
+            j = i
+            while j + 1 < len(idle) and idle[j + 1]:
+                j += 1
+            duration = times[j] - times[i]
+            if duration >= minDuration:
+                row = tracked["owner"][i]
+                segment = self.segments[row]
+                gaps.append({"start": float(times[i]), "duration": float(duration),
+                             "path": int(segment["path"]), "segment": int(segment["segment"])})
+            i = j + 1
+        return gaps
+
+    def pumpLag(self, maxLag=PUMP_LAG_MAX, resolution=PUMP_LAG_RESOLUTION):
+        """
+        Delay of the pump speed behind the TCP speed (cross-correlation on a uniform grid).
+
+        Returns:
+            dict: lag (s) and correlation at that lag, or None without pump writes.
+        """
+        if len(self.pump) < 2 or len(self.states) < 2:
+            return None
+        start = max(self.pump["time"][0], self.states["time"][0])
+        end = min(self.states["time"][-1], self.pump["time"][-1] + maxLag)
+        if end - start <= 2 * maxLag:
+            return None
+        grid = np.arange(start, end, resolution)
+        speed = np.interp(grid, self.states["time"], self.states["speed"])
+        held = np.searchsorted(self.pump["time"], grid, side="right") - 1
+        pump = self.pump["speed"][np.clip(held, 0, len(self.pump) - 1)].astype(float)
+
+        best = (0.0, -np.inf)
+        for shift in range(int(maxLag / resolution) + 1):
+            a = speed[:len(speed) - shift] if shift else speed
+            b = pump[shift:]
+            if np.std(a) < 1e-9 or np.std(b) < 1e-9:
+                continue
+            correlation = float(np.corrcoef(a, b)[0, 1])
+            if correlation > best[1]:
+                best = (shift * resolution, correlation)
+        return {"lag": best[0], "correlation": best[1]}
+
+    """ REPORT """
+
+    def report(self, top=5):
+        timings = self.segmentTimings()
+        deviations = self.pathDeviation()
+        gaps = self.idleGaps()
+        lag = self.pumpLag()
+
+        lines = [f"{len(self.segments)} commanded moves, {len(self.states)} state samples, "
+                 f"{len(self.pump)} pump writes"]
+        if timings:
+            first = self.segments["time"][0]
+            passed = [t["passed"] for t in timings if np.isfinite(t["passed"])]
+            total = (max(passed) - first) if passed else float("nan")
+            approach = sum(t["duration"] for t in timings if t["kind"] == SEGMENT_APPROACH
+                           and np.isfinite(t["duration"]))
+            idle = sum(g["duration"] for g in gaps)
+            planned = sum(t["planned"] for t in timings if np.isfinite(t["planned"]))
+            lines.append(f"Motion {total:.3f} s (planned {planned:.3f} s): approach moves {approach:.3f} s, "
+                         f"idle {idle:.3f} s in {len(gaps)} gaps")
+            unreached = sum(1 for t in timings if not np.isfinite(t["passed"]))
+            if unreached:
+                lines.append(f"  {unreached} commanded targets never reached")
+            slowest = sorted((t for t in timings if np.isfinite(t["duration"]) and t["planned"] > 0),
+                             key=lambda t: t["duration"] - t["planned"], reverse=True)[:top]
+            lines.append("Segments slowest against plan:")
+            for t in slowest:
+                lines.append(f"  path {t['path']} segment {t['segment']:3d}: {t['duration'] * 1000:7.1f} ms "
+                             f"(planned {t['planned'] * 1000:7.1f} ms, {t['length']:.1f} mm)")
+        if gaps:
+            lines.append("Longest idle gaps:")
+            for g in sorted(gaps, key=lambda g: g["duration"], reverse=True)[:top]:
+                lines.append(f"  {g['duration'] * 1000:7.1f} ms at path {g['path']} segment {g['segment']} "
+                             f"(t = {g['start'] - self.segments['time'][0]:.3f} s)")
+        if deviations:
+            mean = np.mean([d["mean"] for d in deviations])
+            worst = sorted(deviations, key=lambda d: d["max"], reverse=True)[:top]
+            lines.append(f"Path deviation: mean {mean:.3f} mm, worst segments:")
+            for d in worst:
+                lines.append(f"  path {d['path']} segment {d['segment']:3d}: max {d['max']:.3f} mm, "
+                             f"mean {d['mean']:.3f} mm")
+        if lag is not None:
+            lines.append(f"Pump speed lag behind TCP speed: {lag['lag'] * 1000:.0f} ms "
+                         f"(correlation {lag['correlation']:.2f})")
+        else:
+            lines.append("Pump speed lag: no pump writes recorded in this cycle")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for file in sys.argv[1:]:
+            print(file)
+            print(MotionTelemetryAnalyzer.load(file).report())
+        sys.exit(0)
+
+    # Demo: record a simulated cycle with a 0.3 s stall between two paths and a pump lagging 80 ms
+    import tempfile
+    import threading
+    import time
+    from collections import deque
+
+    from GlueDispensingApplication.robot.MotionTelemetry import MotionTelemetryRecorder, SEGMENT_LINEAR
+    from GlueDispensingApplication.robot.PathConditioner import PathConditioner, MOVE_CIRCULAR
+    from GlueDispensingApplication.robot.SimulatedRobotWrapper import SimulatedRobotWrapper
+    from GlueDispensingApplication.robot.VelocityProfiler import VelocityProfiler
+
+    def roundedRectangle(x0, y0, width, height, radius, z=150.0):
+        points = []
+        corners = [(x0 + width - radius, y0 + radius, -90), (x0 + width - radius, y0 + height - radius, 0),
+                   (x0 + radius, y0 + height - radius, 90), (x0 + radius, y0 + radius, 180)]
+        for cx, cy, startAngle in corners:
+            for a in np.linspace(startAngle, startAngle + 90, 10):
+                points.append([cx + radius * np.cos(np.radians(a)), cy + radius * np.sin(np.radians(a)), z,
+                               180, 0, 0])
+        points.append(points[0])
+        return points
+
+    paths = [roundedRectangle(-200, 300, 160, 100, 25), roundedRectangle(50, 320, 120, 80, 20)]
+    robot = SimulatedRobotWrapper(startPosition=[-250, 250, 200, 180, 0, 0], timeScale=1.0, publishState=False)
+    recorder = MotionTelemetryRecorder(storageDir=tempfile.mkdtemp())
+    conditioner, profiler = PathConditioner(), VelocityProfiler()
+    stop = threading.Event()
+    history = deque(maxlen=200)
+
+    def sampleState():
+        while not stop.is_set():
+            now = time.monotonic()
+            state = robot.getState()
+            recorder.recordState(now, state["pose"], state["speed"])
+            history.append((now, state["speed"]))
+            time.sleep(0.01)
+
+    def pumpLoop():
+        while not stop.is_set():
+            now = time.monotonic()
+            delayed = [s for t, s in history if t <= now - 0.08]
+            if delayed:
+                recorder.recordPump(now, 20.0 * delayed[-1])
+            time.sleep(0.02)
+
+    recorder.beginCycle("demo")
+    threads = [threading.Thread(target=sampleState, daemon=True), threading.Thread(target=pumpLoop, daemon=True)]
+    for thread in threads:
+        thread.start()
+    for index, path in enumerate(paths):
+        robot.moveCart(path[0], 0, 0, vel=30, acc=30)
+        recorder.recordSegment(index, 0, SEGMENT_APPROACH, path[0], 30)
+        if index == 1:
+            robot.waitUntilIdle()
+            time.sleep(0.3)  # e.g. waiting for the glue generator
+        profile = profiler.plan(path, 15, 30, glueSpeedCoefficient=20.0)
+        moveStart = 0
+        for number, (move, moveEnd) in enumerate(conditioner.toMoves(path, withIndices=True), start=1):
+            velocity = profile.segmentVelocity(moveStart, moveEnd)
+            speed = float(np.min(profile.speeds[moveStart:moveEnd]))
+            pump = profile.segmentPumpSpeed(moveStart, moveEnd)
+            if move[0] == MOVE_CIRCULAR:
+                robot.moveC(move[1], move[2], 0, 0, velocity, 30, 1)
+                recorder.recordSegment(index, number, SEGMENT_CIRCULAR, move[2], velocity, via=move[1],
+                                       plannedSpeed=speed, plannedPump=pump)
+            else:
+                robot.moveL(move[1], 0, 0, velocity, 30, 1)
+                recorder.recordSegment(index, number, SEGMENT_LINEAR, move[1], velocity, plannedSpeed=speed,
+                                       plannedPump=pump)
+            moveStart = moveEnd
+    robot.waitUntilIdle()
+    time.sleep(0.1)
+    stop.set()
+    file = recorder.endCycle()
+    recorder.waitForFlush()
+    robot.shutdown()
+
+    print(file)
+    print(MotionTelemetryAnalyzer.load(file).report())
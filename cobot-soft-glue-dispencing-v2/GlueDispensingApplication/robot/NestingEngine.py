@@ -0,0 +1,360 @@
+import time
+
+import cv2
+import numpy as np
+
+"""
+NestingEngine
+-------------
+2D nesting of workpiece outlines on the Plane.
+
+The old nesting placed the rotated bounding boxes of the parts in rows (shelf packing), so parts were
+never turned and concave outlines wasted most of the plane. The engine packs the real outlines:
+    1. the plane is rasterized into an occupancy grid (`resolution` mm per cell),
+    2. every part is tried in every rotation of `rotationStep`; rotations whose rotated bounding box
+       does not fit the plane are rejected immediately,
+    3. the outline is rasterized and correlated with the grid of blocked cells (placed parts grown by
+       the gap) - cells with zero overlap form the discrete no-fit region of the part,
+    4. the best free position over all rotations is taken (placement rule, e.g. first row then first
+       column, starting from the top edge yMax like the previous row layout).
+Several greedy layouts (parts by area or by size, three placement rules) are tried and the layout with the
+highest utilisation is returned. The first layout is always completed, so every part is either placed or
+really does not fit; the further layouts only run while the time budget allows and a layout cut short by
+the budget is abandoned (counted in NestingResult.abandoned, its parts are never reported as unplaced).
+"""
+
+NESTING_RESOLUTION = 2.0  # mm per occupancy cell
+NESTING_ROTATION_STEP = 90.0  # degrees
+NESTING_TIME_BUDGET = 2.0  # seconds
+NESTING_PLACEMENT_RULES = ("top", "bottom", "left")
+
+
+def _rotate(points, angle):
+    theta = np.radians(angle)
+    c, s = np.cos(theta), np.sin(theta)
+    return points @ np.array([[c, s], [-s, c]])
+
+
+def _centroid(points):
+    moments = cv2.moments(points.astype(np.float32).reshape(-1, 1, 2))
+    if moments["m00"] == 0:
+        return points.mean(axis=0)
+    return np.array([moments["m10"] / moments["m00"], moments["m01"] / moments["m00"]])
+
+
+def polygonArea(points):
+    x, y = points[:, 0], points[:, 1]
+    return 0.5 * abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))))
+
+
+class Placement:
+    """
+    Placement of one part.
+
+    Attributes:
+        index (int): Index of the part in the input list.
+        rotation (float): Rotation in degrees (CCW) applied to the outline around its centroid.
+        centroid (tuple): Centroid of the placed part in plane (robot) coordinates.
+        outline (np.ndarray): Placed outline (N, 2).
+    """
+
+    def __init__(self, index, rotation, centroid, outline):
+        self.index = index
+        self.rotation = rotation
+        self.centroid = centroid
+        self.outline = outline
+
+
+class NestingResult:
+    """
+    Attributes:
+        placements (list): Placement per placed part (in placement order).
+        unplaced (list): Indices of the parts that do not fit on the plane.
+        utilisation (float): Placed part area / plane area.
+        elapsed (float): Nesting time in seconds.
+        layouts (int): Layouts completed and compared.
+        abandoned (int): Further layouts cut short by the time budget.
+    """
+
+    def __init__(self, placements, unplaced, utilisation, elapsed, layouts=1, abandoned=0):
+        self.placements = placements
+        self.unplaced = unplaced
+        self.utilisation = utilisation
+        self.elapsed = elapsed
+        self.layouts = layouts
+        self.abandoned = abandoned
+
+
+class _RasterPart:
+    """Outline rasterized in one rotation; the centroid is the origin of the local coordinates."""
+
+    def __init__(self, local, rotation, resolution, gapCells):
+        rotated = _rotate(local, rotation)
+        minX, minY = rotated.min(axis=0)
+        maxX, maxY = rotated.max(axis=0)
+        self.rotation = rotation
+        self.outline = rotated
+        self.cols = int(np.ceil((maxX - minX) / resolution)) + 1
+        self.rows = int(np.ceil((maxY - minY) / resolution)) + 1
+
+        # Grid rows grow towards -y (the plane is filled from yMax down)
+        pixels = np.stack([(rotated[:, 0] - minX) / resolution, (maxY - rotated[:, 1]) / resolution], axis=1)
+        mask = np.zeros((self.rows, self.cols), dtype=np.uint8)
+        cv2.fillPoly(mask, [np.round(pixels * 16).astype(np.int32).reshape(-1, 1, 2)], 1, lineType=cv2.LINE_8,
+                     shift=4)
+        self.mask = mask
+        self.originCol = -minX / resolution
+        self.originRow = maxY / resolution
+
+        # The mask grown by the gap (offset by the gap in the grid) is what a placed part blocks
+        self.gapCells = gapCells
+        if gapCells > 0:
+            size = 2 * gapCells + 1
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+            padded = cv2.copyMakeBorder(mask, gapCells, gapCells, gapCells, gapCells, cv2.BORDER_CONSTANT, value=0)
+            self.collisionMask = cv2.dilate(padded, kernel)
+        else:
+            self.collisionMask = mask
+
+
+class NestingEngine:
+    """
+    Raster nesting engine.
+
+    Attributes:
+        xMin, xMax, yMin, yMax (float): Plane boundaries in mm.
+        gap (float): Minimum distance between parts in mm.
+        rotationStep (float): Rotation increment in degrees (360 disables extra rotations).
+        resolution (float): Occupancy grid resolution in mm.
+        timeBudget (float): Maximum nesting time per call in seconds.
+        occupancy (np.ndarray): Occupancy grid (rows from yMax down, columns from xMin right).
+    """
+
+    def __init__(self, xMin, xMax, yMin, yMax, gap=30.0, rotationStep=NESTING_ROTATION_STEP,
+                 resolution=NESTING_RESOLUTION, timeBudget=NESTING_TIME_BUDGET, occupancy=None):
+        self.xMin, self.xMax, self.yMin, self.yMax = xMin, xMax, yMin, yMax
+        self.gap = gap
+        self.rotationStep = rotationStep
+        self.resolution = resolution
+        self.timeBudget = timeBudget
+        rows = int(np.floor((yMax - yMin) / resolution))
+        cols = int(np.floor((xMax - xMin) / resolution))
+        self.occupancy = occupancy if occupancy is not None else np.zeros((rows, cols), dtype=np.uint8)
+
+    @staticmethod
+    def fromPlane(plane):
+        """Engine over a Plane; the occupancy is kept on the plane so consecutive nestings continue filling it."""
+        engine = NestingEngine(plane.xMin, plane.xMax, plane.yMin, plane.yMax, gap=plane.spacing,
+                               rotationStep=plane.rotationStep, resolution=plane.resolution,
+                               timeBudget=plane.timeBudget, occupancy=plane.occupancy)
+        plane.occupancy = engine.occupancy
+        return engine
+
+    def rotations(self):
+        step = self.rotationStep if self.rotationStep and self.rotationStep > 0 else 360.0
+        return np.arange(0.0, 360.0, step)
+
+    def nest(self, outlines):
+        """
+        Places the outlines on the plane.
+
+        Several greedy layouts (part order x placement rule) are compared and the one with the highest
+        utilisation is kept. The first layout is always completed; the others are only started and run
+        while the time budget allows, a layout the budget cuts short is abandoned.
+
+        Args:
+            outlines (list): Part outlines (N, 2) or (N, 1, 2) in mm.
+
+        Returns:
+            NestingResult: Placements, unplaced part indices and utilisation.
+        """
+        start = time.perf_counter()
+        deadline = start + self.timeBudget
+        parts = []
+        for index, outline in enumerate(outlines):
+            points = np.asarray(outline, dtype=np.float64).reshape(-1, 2)
+            local = points - _centroid(points)
+            extent = local.max(axis=0) - local.min(axis=0)
+            parts.append((index, polygonArea(points), float(extent.max()), local))
+
+        orders = [sorted(parts, key=lambda p: -p[1]), sorted(parts, key=lambda p: -p[2])]
+        rasters = {}
+        best = None
+        layouts, abandoned = 0, 0
+        for attempt, (order, rule) in enumerate((o, r) for o in orders for r in NESTING_PLACEMENT_RULES):
+            if attempt > 0 and time.perf_counter() > deadline:
+                break
+            occupancy = self.occupancy.copy()
+            layout = self._layout(order, rule, occupancy, rasters, None if attempt == 0 else deadline)
+            if layout is None:
+                abandoned += 1
+                break
+            layouts += 1
+            placements, unplaced = layout
+            area = sum(parts[p.index][1] for p in placements)
+            if best is None or area > best[0] + 1e-9:
+                best = (area, placements, unplaced, occupancy)
+
+        area, placements, unplaced, occupancy = best
+        self.occupancy[:] = occupancy
+        utilisation = area / ((self.xMax - self.xMin) * (self.yMax - self.yMin))
+        return NestingResult(placements, unplaced, utilisation, time.perf_counter() - start, layouts, abandoned)
+
+    def _layout(self, order, rule, occupancy, rasters, deadline):
+        """
+        Greedy placement of the parts in `order` with a placement rule; `occupancy` is updated in place.
+
+        Returns:
+            tuple: (placements, unplaced), None if the deadline passed before every part was tried.
+        """
+        gapCells = int(np.ceil(self.gap / self.resolution))
+        planeRows, planeCols = occupancy.shape
+        planeWidth, planeHeight = planeCols * self.resolution, planeRows * self.resolution
+
+        # Cells closer than the gap to a placed part - the outlines themselves are checked against this grid
+        blocked = occupancy.copy()
+        if gapCells > 0 and occupancy.any():
+            size = 2 * gapCells + 1
+            blocked = cv2.dilate(occupancy, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size)))
+
+        placements, unplaced = [], []
+        for index, area, extent, local in order:
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+
+            best = None
+            for rotation in self.rotations():
+                # Rotated bounding box check before any raster work
+                rotated = _rotate(local, rotation)
+                width, height = rotated.max(axis=0) - rotated.min(axis=0)
+                if width > planeWidth or height > planeHeight:
+                    continue
+                key = (index, float(rotation))
+                if key not in rasters:
+                    rasters[key] = _RasterPart(local, rotation, self.resolution, gapCells)
+                part = rasters[key]
+                position = self._freePosition(part, blocked, rule)
+                if position is not None and (best is None or position < best[0]):
+                    best = (position, part)
+
+            if best is None:
+                unplaced.append(index)
+                continue
+
+            (_, row, col), part = best
+            occupancy[row:row + part.rows, col:col + part.cols] |= part.mask
+            self._block(blocked, part, row, col)
+            centroid = (self.xMin + (col + part.originCol) * self.resolution,
+                        self.yMax - (row + part.originRow) * self.resolution)
+            placements.append(Placement(index, float(part.rotation), centroid, part.outline + np.asarray(centroid)))
+        return placements, unplaced
+
+    @staticmethod
+    def _block(blocked, part, row, col):
+        """Marks the part grown by the gap as blocked (clipped at the plane border)."""
+        g = part.gapCells
+        planeRows, planeCols = blocked.shape
+        top, left = row - g, col - g
+        r0, c0 = max(top, 0), max(left, 0)
+        r1 = min(top + part.collisionMask.shape[0], planeRows)
+        c1 = min(left + part.collisionMask.shape[1], planeCols)
+        blocked[r0:r1, c0:c1] |= part.collisionMask[r0 - top:r1 - top, c0 - left:c1 - left]
+
+    def _freePosition(self, part, blocked, rule):
+        """
+        Best collision free top-left grid cell of a part as (score, row, col) or None.
+
+        The part mask is correlated with the blocked grid (placed parts grown by the gap); zero overlap
+        means the part keeps the gap to every placed part. The rule picks among the free cells:
+            "top":    first row, then first column,
+            "bottom": lowest bottom edge (row + rows), then first column,
+            "left":   lowest right edge (col + cols), then first row.
+        """
+        planeRows, planeCols = blocked.shape
+        if part.rows > planeRows or part.cols > planeCols:
+            return None
+        overlap = cv2.filter2D(blocked.astype(np.float32), -1, part.mask.astype(np.float32), anchor=(0, 0),
+                               borderType=cv2.BORDER_CONSTANT)
+        rows, cols = np.nonzero(overlap[:planeRows - part.rows + 1, :planeCols - part.cols + 1] < 0.5)
+        if len(rows) == 0:
+            return None
+        if rule == "bottom":
+            score = (rows + part.rows) * planeCols + cols
+        elif rule == "left":
+            score = (cols + part.cols) * planeRows + rows
+        else:
+            score = rows * planeCols + cols
+        k = int(np.argmin(score))
+        return int(score[k]), int(rows[k]), int(cols[k])
+
+
+def shelfNesting(outlines, xMin, xMax, yMin, yMax, spacing=30.0, rowSpacing=50.0):
+    """
+    Reference: the previous row layout of RobotService.performWorkpieceNesting (rotated bounding boxes
+    aligned with x, placed left to right, new row below the tallest part of the row).
+
+    Returns:
+        tuple: (number of placed parts, utilisation)
+    """
+    xOffset, yOffset, tallest = 0.0, 0.0, 0.0
+    placedArea, placed = 0.0, 0
+    for outline in outlines:
+        points = np.asarray(outline, dtype=np.float32).reshape(-1, 1, 2)
+        (_, _), (w, h), _ = cv2.minAreaRect(points)
+        width, height = max(w, h), min(w, h)
+        tallest = max(tallest, height)
+        x = xOffset + xMin + width / 2
+        y = yMax - yOffset
+        if x + width / 2 > xMax:
+            xOffset = 0.0
+            yOffset += tallest + rowSpacing
+            y = yMax - yOffset
+            tallest = height
+            if y - height / 2 < yMin:
+                break
+        xOffset += width + spacing
+        placed += 1
+        placedArea += polygonArea(points.reshape(-1, 2))
+    return placed, placedArea / ((xMax - xMin) * (yMax - yMin))
+
+
+if __name__ == "__main__":
+    import glob
+    import json
+    import os
+
+    from GlueDispensingApplication.robot.Plane import Plane
+
+    # Workpiece library: stored workpieces if there are any, otherwise a synthetic mix of outlines
+    library = []
+    storage = os.path.join(os.path.dirname(__file__), '..', 'storage', 'workpieces')
+    for filePath in glob.glob(os.path.join(storage, '**', '*_workpiece.json'), recursive=True):
+        with open(filePath) as f:
+            contour = json.load(f).get("contour")
+        contour = contour.get("contour") if isinstance(contour, dict) else contour
+        if contour:
+            library.append(np.asarray(contour, dtype=np.float64).reshape(-1, 2))
+    source = "stored workpieces"
+    if not library:
+        source = "synthetic outlines (no stored workpieces)"
+        t = np.linspace(0, 2 * np.pi, 48, endpoint=False)
+        library = [np.array([[0, 0], [160, 0], [160, 40], [40, 40], [40, 120], [0, 120]], dtype=float),  # L
+                   np.array([[0, 0], [140, 0], [70, 90]], dtype=float),  # triangle
+                   np.array([[0, 0], [180, 0], [180, 60], [0, 60]], dtype=float),  # bar
+                   np.stack([45 * np.cos(t), 45 * np.sin(t)], axis=1),  # disc
+                   np.array([[0, 0], [120, 0], [120, 100], [80, 100], [80, 40], [40, 40], [40, 100], [0, 100]],
+                            dtype=float)]  # U
+    rng = np.random.default_rng(1)
+    tray = [library[i] for i in rng.integers(0, len(library), 20)]
+
+    plane = Plane()
+    bounds = (plane.xMin, plane.xMax, plane.yMin, plane.yMax)
+    placed, utilisation = shelfNesting(tray, *bounds, spacing=plane.spacing)
+    print(f"{len(tray)} parts from a library of {len(library)} {source}, plane {plane.xMax - plane.xMin} x "
+          f"{plane.yMax - plane.yMin} mm")
+    print(f"shelf (previous): {placed} placed, utilisation {utilisation * 100:.1f} %")
+    for step in (360, 90, 45):
+        engine = NestingEngine(*bounds, gap=plane.spacing, rotationStep=step, timeBudget=10.0)
+        result = engine.nest(tray)
+        print(f"engine rotation step {step:>3}: {len(result.placements)} placed, utilisation "
+              f"{result.utilisation * 100:.1f} %, {result.elapsed * 1000:.0f} ms")
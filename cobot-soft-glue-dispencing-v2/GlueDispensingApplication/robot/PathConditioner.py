@@ -0,0 +1,377 @@
+import heapq
+
+import numpy as np
+
+"""
+PathConditioner
+---------------
+Conditions robot paths (in robot millimetre space) before they are executed.
+
+Contours come from the camera at pixel resolution, so after the transformation to robot coordinates
+nearly straight edges still consist of dense runs of points which turn into hundreds of tiny MoveL
+commands. The conditioner:
+    1. simplifies every path with a millimetre tolerance (Douglas-Peucker or Visvalingam-Whyatt),
+    2. merges collinear runs left over by the simplification,
+    3. enforces a minimum segment length,
+and, at execution time, converts runs of points lying on a common circle into MoveC moves.
+
+Only the position (x, y, z) is used for the geometry; the orientation of every kept pose is preserved.
+"""
+
+PATH_TOLERANCE = 0.2  # mm, maximum deviation of the simplified path
+PATH_MIN_SEGMENT_LENGTH = 1.0  # mm
+PATH_COLLINEAR_ANGLE = 1.0  # degrees
+ARC_TOLERANCE = 0.2  # mm, maximum deviation of the fitted arc from the points and the segments between them
+ARC_MIN_POINTS = 4  # at least 3 segments before an arc replaces the MoveL's
+ARC_MAX_RADIUS = 2000.0  # mm, larger radii are executed as lines
+ARC_MAX_SWEEP = 180.0  # degrees per MoveC
+
+MOVE_LINEAR = "L"
+MOVE_CIRCULAR = "C"
+
+
+def _positions(path):
+    pts = np.asarray([p[:3] if len(p) >= 3 else list(p[:2]) + [0.0] for p in path], dtype=float)
+    return pts
+
+
+def _pointSegmentDistances(points, a, b):
+    """Vectorized distances of points to the segment a-b."""
+    ab = b - a
+    denom = float(np.dot(ab, ab))
+    if denom < 1e-12:
+        return np.linalg.norm(points - a, axis=1)
+    t = np.clip((points - a) @ ab / denom, 0.0, 1.0)
+    projection = a + t[:, None] * ab
+    return np.linalg.norm(points - projection, axis=1)
+
+
+def douglasPeucker(points, tolerance):
+    """
+    Douglas-Peucker simplification (iterative, vectorized distance computation).
+
+    Args:
+        points (np.ndarray): Positions of shape (N, 3).
+        tolerance (float): Maximum deviation in mm.
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points.
+    """
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    if np.linalg.norm(points[0] - points[-1]) < 1e-9:
+        # Closed path - split at the point farthest from the start so both halves are well defined
+        far = int(np.argmax(np.linalg.norm(points - points[0], axis=1)))
+        if far in (0, n - 1):
+            return np.array([0, n - 1])
+        keep[far] = True
+        stack = [(0, far), (far, n - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _pointSegmentDistances(points[first + 1:last], points[first], points[last])
+        idx = int(np.argmax(distances))
+        if distances[idx] > tolerance:
+            split = first + 1 + idx
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return np.flatnonzero(keep)
+
+
+def visvalingamWhyatt(points, tolerance):
+    """
+    Visvalingam-Whyatt simplification. Points are removed while the effective triangle area stays
+    below tolerance^2.
+
+    Args:
+        points (np.ndarray): Positions of shape (N, 3).
+        tolerance (float): Tolerance in mm.
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points.
+    """
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+
+    threshold = tolerance * tolerance
+    prev = list(range(-1, n - 1))
+    nxt = list(range(1, n + 1))
+    removed = np.zeros(n, dtype=bool)
+
+    def area(i):
+        a, b, c = points[prev[i]], points[i], points[nxt[i]]
+        return 0.5 * float(np.linalg.norm(np.cross(b - a, c - a)))
+
+    heap = [(area(i), i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+    current = {i: a for a, i in heap}
+
+    while heap:
+        a, i = heapq.heappop(heap)
+        if removed[i] or current.get(i) != a:
+            continue
+        if a >= threshold:
+            break
+        removed[i] = True
+        p, q = prev[i], nxt[i]
+        nxt[p] = q
+        prev[q] = p
+        for j in (p, q):
+            if 0 < j < n - 1 and not removed[j]:
+                current[j] = area(j)
+                heapq.heappush(heap, (current[j], j))
+
+    return np.flatnonzero(~removed)
+
+
+class PathConditioner:
+    """
+    Simplifies robot paths and plans MoveL / MoveC moves.
+
+    Attributes:
+        tolerance (float): Simplification tolerance in mm.
+        minSegmentLength (float): Minimum segment length in mm.
+        collinearAngle (float): Deflection angle in degrees below which a point is merged.
+        method (str): "dp" (Douglas-Peucker) or "vw" (Visvalingam-Whyatt).
+        enableArcs (bool): If True, `toMoves` replaces circular runs with MoveC moves.
+    """
+
+    def __init__(self, tolerance=PATH_TOLERANCE, minSegmentLength=PATH_MIN_SEGMENT_LENGTH,
+                 collinearAngle=PATH_COLLINEAR_ANGLE, method="dp", enableArcs=True,
+                 arcTolerance=ARC_TOLERANCE, arcMinPoints=ARC_MIN_POINTS):
+        if method not in ("dp", "vw"):
+            raise ValueError(f"Invalid simplification method: {method}")
+        self.tolerance = tolerance
+        self.minSegmentLength = minSegmentLength
+        self.collinearAngle = collinearAngle
+        self.method = method
+        self.enableArcs = enableArcs
+        self.arcTolerance = arcTolerance
+        self.arcMinPoints = arcMinPoints
+
+    """ SIMPLIFICATION """
+
+    def condition(self, path):
+        """
+        Simplifies a path.
+
+        Args:
+            path (list): Robot poses [x, y, z, rx, ry, rz] (or [x, y] points).
+
+        Returns:
+            list: The kept poses, first and last pose are always kept.
+        """
+        if path is None or len(path) < 3:
+            return list(path) if path is not None else []
+        return [path[i] for i in self.conditionIndices(path)]
+
+    def conditionIndices(self, path):
+        """
+        Indices of the poses `condition` keeps, e.g. to select the same points from another frame.
+
+        Args:
+            path (list): Robot poses [x, y, z, rx, ry, rz] (or [x, y] points).
+
+        Returns:
+            np.ndarray: Sorted indices into `path`.
+        """
+        if path is None or len(path) < 3:
+            return np.arange(0 if path is None else len(path))
+
+        points = _positions(path)
+        if self.method == "vw":
+            indices = visvalingamWhyatt(points, self.tolerance)
+        else:
+            indices = douglasPeucker(points, self.tolerance)
+
+        indices = self._mergeCollinear(points, indices)
+        return self._enforceMinSegmentLength(points, indices)
+
+    def _mergeCollinear(self, points, indices):
+        if len(indices) < 3:
+            return indices
+        cosLimit = np.cos(np.radians(self.collinearAngle))
+        kept = [indices[0]]
+        for k in range(1, len(indices) - 1):
+            a, b, c = points[kept[-1]], points[indices[k]], points[indices[k + 1]]
+            u, v = b - a, c - b
+            nu, nv = np.linalg.norm(u), np.linalg.norm(v)
+            if nu < 1e-9 or nv < 1e-9:
+                continue
+            if np.dot(u, v) / (nu * nv) >= cosLimit and \
+                    _pointSegmentDistances(b[None, :], a, c)[0] <= self.tolerance:
+                continue
+            kept.append(indices[k])
+        kept.append(indices[-1])
+        return np.asarray(kept)
+
+    def _enforceMinSegmentLength(self, points, indices):
+        if len(indices) < 3 or self.minSegmentLength <= 0:
+            return indices
+        kept = [indices[0]]
+        for idx in indices[1:-1]:
+            if np.linalg.norm(points[idx] - points[kept[-1]]) >= self.minSegmentLength:
+                kept.append(idx)
+        last = indices[-1]
+        if len(kept) > 1 and np.linalg.norm(points[last] - points[kept[-1]]) < self.minSegmentLength:
+            # Never move the end point - drop the interior point before it instead
+            kept.pop()
+        kept.append(last)
+        return np.asarray(kept)
+
+    """ ARC FITTING """
+
+    def toMoves(self, path, withIndices=False):
+        """
+        Plans the motion commands of a path.
+
+        Args:
+            path (list): Robot poses; the first pose is the start of the path.
+            withIndices (bool): If True, every move is returned as (move, endIndex) where endIndex is
+                                the index of the move's end pose in `path`.
+
+        Returns:
+            list: Moves after the first pose, either (MOVE_LINEAR, pose) or (MOVE_CIRCULAR, viaPose, endPose).
+        """
+        if path is None or len(path) < 2:
+            return []
+
+        moves = []
+        i = 0
+        n = len(path)
+        points = _positions(path) if self.enableArcs and n >= self.arcMinPoints else None
+        while i < n - 1:
+            end = self._longestArc(points, i) if points is not None else None
+            if end is not None:
+                via = (i + end) // 2
+                moves.append(((MOVE_CIRCULAR, path[via], path[end]), end))
+                i = end
+            else:
+                moves.append(((MOVE_LINEAR, path[i + 1]), i + 1))
+                i += 1
+
+        if withIndices:
+            return moves
+        return [move for move, _ in moves]
+
+    def _longestArc(self, points, start):
+        """Returns the index of the farthest point that still lies on a circle with the points from start."""
+        n = len(points)
+        best = None
+        end = start + self.arcMinPoints - 1
+        while end < n:
+            if not self._fitsArc(points[start:end + 1]):
+                break
+            best = end
+            end += 1
+        return best
+
+    def _fitsArc(self, pts):
+        a, m, b = pts[0], pts[len(pts) // 2], pts[-1]
+        circle = circleThroughPoints(a, m, b)
+        if circle is None:
+            return False
+        center, radius, normal = circle
+        if radius > ARC_MAX_RADIUS:
+            return False
+
+        rel = pts - center
+        outOfPlane = np.abs(rel @ normal)
+        inPlane = rel - np.outer(rel @ normal, normal)
+        radial = np.abs(np.linalg.norm(inPlane, axis=1) - radius)
+        if np.max(outOfPlane) > self.arcTolerance or np.max(radial) > self.arcTolerance:
+            return False
+
+        # The vertices lying on the circle is not enough: the arc also bulges away from every segment
+        # between them by the sagitta (a hexagon's corners all lie on its circumcircle)
+        halfChords = np.linalg.norm(np.diff(pts, axis=0), axis=1) / 2.0
+        sagitta = radius - np.sqrt(np.maximum(radius ** 2 - halfChords ** 2, 0.0))
+        if np.max(sagitta) > self.arcTolerance:
+            return False
+
+        # The points must progress monotonically around the centre (no back-tracking)
+        e1 = (a - center) / radius
+        e2 = np.cross(normal, e1)
+        angles = np.unwrap(np.arctan2(inPlane @ e2, inPlane @ e1))
+        steps = np.diff(angles)
+        if not (np.all(steps > 0) or np.all(steps < 0)):
+            return False
+
+        # Sparse points (quarter circle or more per segment) do not describe the arc reliably
+        if np.any(np.abs(steps) > np.pi / 2):
+            return False
+
+        return np.degrees(abs(angles[-1] - angles[0])) <= ARC_MAX_SWEEP
+
+
+def circleThroughPoints(a, b, c):
+    """Circumscribed circle of three 3D points: (center, radius, unit normal) or None if collinear."""
+    ab, ac = b - a, c - a
+    normal = np.cross(ab, ac)
+    nn = float(np.dot(normal, normal))
+    if nn < 1e-12:
+        return None
+    center = a + (np.dot(ac, ac) * np.cross(normal, ab) + np.dot(ab, ab) * np.cross(ac, normal)) / (2.0 * nn)
+    radius = float(np.linalg.norm(a - center))
+    return center, radius, normal / np.sqrt(nn)
+
+
+if __name__ == "__main__":
+    def densePolygon(corners, step=0.5, z=150.0):
+        """Closed polygon sampled every `step` mm, like a contour from the camera."""
+        points = []
+        for start, end in zip(corners, corners[1:] + corners[:1]):
+            count = max(1, int(np.ceil(np.linalg.norm(np.subtract(end, start)) / step)))
+            for t in np.arange(count) / count:
+                points.append([start[0] + t * (end[0] - start[0]), start[1] + t * (end[1] - start[1]), z, 180, 0, 0])
+        points.append(points[0])
+        return points
+
+    def executedPoints(path, moves, samples=50):
+        """Samples the tool path the moves command: straight lines and the arcs through the MoveC via points."""
+        points, current = [], _positions(path[:1])[0]
+        for move in moves:
+            if move[0] == MOVE_CIRCULAR:
+                via, end = _positions([move[1], move[2]])
+                center, radius, normal = circleThroughPoints(current, via, end)
+                e1 = (current - center) / radius
+                e2 = np.cross(normal, e1)
+                angles = np.unwrap([0.0] + [np.arctan2((p - center) @ e2, (p - center) @ e1) for p in (via, end)])
+                for a in np.linspace(angles[0], angles[-1], samples):
+                    points.append(center + radius * (np.cos(a) * e1 + np.sin(a) * e2))
+            else:
+                end = _positions([move[1]])[0]
+                points.extend(current + t * (end - current) for t in np.linspace(0.0, 1.0, samples))
+            current = end
+        return np.asarray(points)
+
+    radius = 50.0
+    shapes = {
+        "circle": [[radius * np.cos(a), radius * np.sin(a)] for a in np.radians(np.arange(0, 360, 1.0))],
+        "hexagon": [[radius * np.cos(a), radius * np.sin(a)] for a in np.radians(np.arange(0, 360, 60.0))],
+        "octagon": [[radius * np.cos(a), radius * np.sin(a)] for a in np.radians(np.arange(0, 360, 45.0))],
+        "square": [[0, 0], [100, 0], [100, 100], [0, 100]],
+    }
+    conditioner = PathConditioner()
+    for name, corners in shapes.items():
+        path = densePolygon(corners)
+        conditioned = conditioner.condition(path)
+        moves = conditioner.toMoves(conditioned)
+        dense = _positions(path)
+        executed = executedPoints(conditioned, moves)
+        distances = np.min([_pointSegmentDistances(executed, a, b) for a, b in zip(dense, dense[1:])], axis=0)
+        deviation = float(np.max(distances))
+        arcs = sum(move[0] == MOVE_CIRCULAR for move in moves)
+        print(f"{name:<8} {len(path):>5} points -> {len(conditioned):>3} kept, {len(moves) - arcs:>3} MoveL "
+              f"{arcs:>2} MoveC, max deviation from the contour {deviation:.3f} mm")
@@ -0,0 +1,425 @@
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+"""
+PathSequencer
+-------------
+Orders the spray paths of all matched workpieces so that the travel between paths is minimal.
+
+The problem is treated as a generalized TSP: every path is a cluster of possible entries.
+- a closed contour can be entered at any of its vertices (and is left at the same vertex),
+  the spraying direction is chosen to give the smoothest entry;
+- an open path (fill, open contour) can be entered from either end.
+
+A nearest-neighbour tour is built first and then improved with entry re-optimization, 2-opt and
+Or-opt moves until no move improves the tour or the time budget is spent.
+
+The cost of an approach move is its straight-line distance by default. With a travelCost (e.g.
+CycleTimeEstimator.travelTimes) it is the modelled duration of the move instead: every point-to-point
+move accelerates and decelerates, so one long move costs less time than several short moves of the
+same total length.
+"""
+
+TRAYS_DIR = os.path.join(os.path.dirname(__file__), '..', 'storage', 'trays')
+
+CLOSED_TOLERANCE = 1e-3  # mm, first and last point closer than this make a path closed
+DEFAULT_TIME_BUDGET = 0.2  # seconds
+MAX_OR_OPT_CHAIN = 3
+
+
+class _PathNode:
+    """Candidate entries of one path and the entry currently chosen for it."""
+
+    def __init__(self, index, path):
+        self.index = index
+        self.points = np.asarray([p[:3] for p in path], dtype=float)
+        self.closed = len(path) > 2 and np.linalg.norm(self.points[0] - self.points[-1]) <= CLOSED_TOLERANCE
+        if self.closed:
+            # Every vertex (without the duplicated closing point) is a possible entry
+            self.entries = self.points[:-1]
+        else:
+            self.entries = self.points[[0, -1]]
+        self.entry = 0
+        self.reversed = False
+
+    @property
+    def start(self):
+        if self.closed:
+            return self.entries[self.entry]
+        return self.points[-1] if self.reversed else self.points[0]
+
+    @property
+    def end(self):
+        if self.closed:
+            return self.entries[self.entry]
+        return self.points[0] if self.reversed else self.points[-1]
+
+    def flip(self):
+        if not self.closed:
+            self.reversed = not self.reversed
+
+    def bestEntry(self, previous, following, travelCost=None):
+        """Chooses the entry that minimizes the travel from `previous` and to `following`."""
+        if self.closed:
+            cost = np.zeros(len(self.entries))
+            if previous is not None:
+                cost += _cost(np.linalg.norm(self.entries - previous, axis=1), travelCost)
+            if following is not None:
+                cost += _cost(np.linalg.norm(self.entries - following, axis=1), travelCost)
+            self.entry = int(np.argmin(cost))
+        else:
+            forward = _travel(previous, self.points[0], travelCost) + _travel(self.points[-1], following, travelCost)
+            backward = _travel(previous, self.points[-1], travelCost) + _travel(self.points[0], following, travelCost)
+            self.reversed = backward < forward
+
+    def orientedPath(self, path, previous):
+        """Returns the original path rotated / reversed according to the chosen entry."""
+        if not self.closed:
+            return list(reversed(path)) if self.reversed else list(path)
+
+        ring = list(path[:-1])
+        rotated = ring[self.entry:] + ring[:self.entry]
+        forward = rotated + [rotated[0]]
+        backward = [rotated[0]] + list(reversed(rotated[1:])) + [rotated[0]]
+        if previous is None:
+            return forward
+
+        # Keep the spraying direction which continues the approach move most smoothly
+        approach = self.entries[self.entry] - previous
+        norm = np.linalg.norm(approach)
+        if norm < 1e-9:
+            return forward
+        approach = approach / norm
+
+        def alignment(candidate):
+            first = np.asarray(candidate[1][:3], dtype=float) - np.asarray(candidate[0][:3], dtype=float)
+            length = np.linalg.norm(first)
+            return float(np.dot(approach, first / length)) if length > 1e-9 else -1.0
+
+        return backward if alignment(backward) > alignment(forward) else forward
+
+
+def _distance(a, b):
+    if a is None or b is None:
+        return 0.0
+    return float(np.linalg.norm(np.asarray(a) - np.asarray(b)))
+
+
+def _cost(distances, travelCost):
+    """Cost of approach moves of the given lengths (the lengths themselves without a travelCost)."""
+    return distances if travelCost is None else np.asarray(travelCost(distances), dtype=float)
+
+
+def _travel(a, b, travelCost):
+    distance = _distance(a, b)
+    return distance if travelCost is None or a is None or b is None else float(travelCost(distance))
+
+
+class PathSequencer:
+    """
+    Orders spray paths and selects their entry points to minimize travel.
+
+    Attributes:
+        timeBudget (float): Maximum optimization time in seconds.
+        travelCost (callable or None): Vectorized cost of approach moves, np.ndarray of lengths in mm ->
+                                       np.ndarray of costs (e.g. CycleTimeEstimator.travelTimes).
+                                       None minimizes the travel distance.
+    """
+
+    def __init__(self, timeBudget=DEFAULT_TIME_BUDGET, travelCost=None):
+        self.timeBudget = timeBudget
+        self.travelCost = travelCost
+
+    def sequence(self, paths, startPosition=None):
+        """
+        Orders the given paths.
+
+        Args:
+            paths (list): List of (path, settings) tuples, path is a list of robot poses.
+            startPosition (list, optional): Pose the robot starts from.
+
+        Returns:
+            list: The same (path, settings) tuples, reordered, with rotated / reversed paths.
+        """
+        indexed = [(i, p) for i, (p, _) in enumerate(paths) if p is not None and len(p) > 0]
+        if len(indexed) < 2 and not (indexed and startPosition is not None):
+            return list(paths)
+
+        start = None if startPosition is None else np.asarray(startPosition[:3], dtype=float)
+        deadline = time.monotonic() + self.timeBudget
+
+        nodes = self._nearestNeighbour([_PathNode(i, p) for i, p in indexed], start)
+        self._improve(nodes, start, deadline)
+
+        result = []
+        previous = start
+        for node in nodes:
+            path, settings = paths[node.index]
+            result.append((node.orientedPath(path, previous), settings))
+            previous = node.end
+
+        # Empty paths are kept at the end so nothing is silently dropped
+        result.extend((p, s) for p, s in paths if p is None or len(p) == 0)
+        return result
+
+    @staticmethod
+    def travelDistance(paths, startPosition=None):
+        """
+        Total travel distance of the approach moves between consecutive paths.
+
+        Args:
+            paths (list): List of (path, settings) tuples.
+            startPosition (list, optional): Pose the robot starts from.
+
+        Returns:
+            float: Travel distance in mm.
+        """
+        total = 0.0
+        previous = None if startPosition is None else startPosition[:3]
+        for path, _ in paths:
+            if not path:
+                continue
+            total += _distance(previous, path[0][:3])
+            previous = path[-1][:3]
+        return total
+
+    def travelCostOf(self, paths, startPosition=None):
+        """
+        Total cost of the approach moves between consecutive paths, in the unit of travelCost.
+
+        Args:
+            paths (list): List of (path, settings) tuples.
+            startPosition (list, optional): Pose the robot starts from.
+
+        Returns:
+            float: Travel time in seconds with a time based travelCost, travel distance in mm without.
+        """
+        total = 0.0
+        previous = None if startPosition is None else startPosition[:3]
+        for path, _ in paths:
+            if not path:
+                continue
+            total += self._travel(previous, path[0][:3])
+            previous = path[-1][:3]
+        return total
+
+    def _travel(self, a, b):
+        return _travel(a, b, self.travelCost)
+
+    """ CONSTRUCTION """
+
+    def _nearestNeighbour(self, nodes, start):
+        remaining = list(nodes)
+        tour = []
+        current = start
+        if current is None:
+            tour.append(remaining.pop(0))
+            current = tour[0].end
+
+        while remaining:
+            bestCost, bestIdx, bestEntry = None, 0, 0
+            for idx, node in enumerate(remaining):
+                distances = _cost(np.linalg.norm(node.entries - current, axis=1), self.travelCost)
+                entry = int(np.argmin(distances))
+                if bestCost is None or distances[entry] < bestCost:
+                    bestCost, bestIdx, bestEntry = distances[entry], idx, entry
+
+            node = remaining.pop(bestIdx)
+            if node.closed:
+                node.entry = bestEntry
+            else:
+                node.reversed = bestEntry == 1
+            tour.append(node)
+            current = node.end
+        return tour
+
+    """ IMPROVEMENT """
+
+    def _improve(self, nodes, start, deadline):
+        improved = True
+        while improved and time.monotonic() < deadline:
+            improved = False
+            improved |= self._optimizeEntries(nodes, start)
+            improved |= self._twoOpt(nodes, start, deadline)
+            improved |= self._orOpt(nodes, start, deadline)
+
+    def _tourCost(self, nodes, start):
+        cost = 0.0
+        previous = start
+        for node in nodes:
+            cost += self._travel(previous, node.start)
+            previous = node.end
+        return cost
+
+    def _optimizeEntries(self, nodes, start):
+        before = self._tourCost(nodes, start)
+        for k, node in enumerate(nodes):
+            previous = start if k == 0 else nodes[k - 1].end
+            following = nodes[k + 1].start if k + 1 < len(nodes) else None
+            node.bestEntry(previous, following, self.travelCost)
+        return self._tourCost(nodes, start) < before - 1e-9
+
+    def _twoOpt(self, nodes, start, deadline):
+        n = len(nodes)
+        improved = False
+        for i in range(n - 1):
+            if time.monotonic() >= deadline:
+                break
+            before = start if i == 0 else nodes[i - 1].end
+            if before is None:
+                continue
+            for j in range(i + 1, n):
+                after = nodes[j + 1].start if j + 1 < n else None
+                delta = (self._travel(before, nodes[j].end) + self._travel(nodes[i].start, after)
+                         - self._travel(before, nodes[i].start) - self._travel(nodes[j].end, after))
+                if delta < -1e-9:
+                    segment = nodes[i:j + 1]
+                    segment.reverse()
+                    for node in segment:
+                        node.flip()
+                    nodes[i:j + 1] = segment
+                    improved = True
+                    before = start if i == 0 else nodes[i - 1].end
+        return improved
+
+    def _orOpt(self, nodes, start, deadline):
+        n = len(nodes)
+        improved = False
+        for length in range(1, min(MAX_OR_OPT_CHAIN, n - 1) + 1):
+            i = 0
+            while i + length <= n:
+                if time.monotonic() >= deadline:
+                    return improved
+                if self._relocateChain(nodes, start, i, length):
+                    improved = True
+                i += 1
+        return improved
+
+    def _relocateChain(self, nodes, start, i, length):
+        n = len(nodes)
+        chain = nodes[i:i + length]
+        prev = start if i == 0 else nodes[i - 1].end
+        nxt = nodes[i + length].start if i + length < n else None
+        if prev is None and i == 0:
+            return False
+        removeGain = (self._travel(prev, chain[0].start) + self._travel(chain[-1].end, nxt) - self._travel(prev, nxt))
+
+        rest = nodes[:i] + nodes[i + length:]
+        best = None
+        for k in range(len(rest) + 1):
+            a = start if k == 0 else rest[k - 1].end
+            b = rest[k].start if k < len(rest) else None
+            if a is None:
+                continue
+            base = self._travel(a, b)
+            forward = self._travel(a, chain[0].start) + self._travel(chain[-1].end, b) - base
+            backward = self._travel(a, chain[-1].end) + self._travel(chain[0].start, b) - base
+            for cost, reverse in ((forward, False), (backward, True)):
+                if cost < removeGain - 1e-9 and (best is None or cost < best[0]):
+                    best = (cost, k, reverse)
+
+        if best is None:
+            return False
+
+        _, k, reverse = best
+        if reverse:
+            chain = list(reversed(chain))
+            for node in chain:
+                node.flip()
+        nodes[:] = rest[:k] + chain + rest[k:]
+        return True
+
+
+""" RECORDED TRAYS """
+
+
+def saveTray(paths, directory=TRAYS_DIR):
+    """
+    Records the paths of one tray so the sequencing can be benchmarked offline.
+
+    Args:
+        paths (list): List of (path, settings) tuples.
+        directory (str): Target directory.
+
+    Returns:
+        str: Path of the written file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    filePath = os.path.join(directory, f"tray_{time.strftime('%Y%m%d_%H%M%S')}_{int(time.time() * 1000) % 1000:03d}.json")
+    with open(filePath, 'w') as f:
+        json.dump([{"path": [list(map(float, p)) for p in path], "settings": settings}
+                   for path, settings in paths], f, default=str)
+    return filePath
+
+
+def loadTray(filePath):
+    with open(filePath, 'r') as f:
+        return [(entry["path"], entry.get("settings", {})) for entry in json.load(f)]
+
+
+def _syntheticTray(rng, parts=8):
+    """Random tray of rectangular parts with a closed contour and an open fill each."""
+    paths = []
+    for _ in range(parts):
+        cx, cy = rng.uniform(-400, 400), rng.uniform(200, 700)
+        w, h = rng.uniform(40, 120), rng.uniform(40, 120)
+        corners = [(cx - w / 2, cy - h / 2), (cx + w / 2, cy - h / 2), (cx + w / 2, cy + h / 2),
+                   (cx - w / 2, cy + h / 2)]
+        contour = [[x, y, 10, 180, 0, 0] for x, y in corners] + [[corners[0][0], corners[0][1], 10, 180, 0, 0]]
+        paths.append((contour, {}))
+        fill = []
+        for row, y in enumerate(np.arange(cy - h / 2 + 10, cy + h / 2 - 5, 20)):
+            xs = (cx - w / 2 + 10, cx + w / 2 - 10)
+            if row % 2:
+                xs = xs[::-1]
+            fill.extend([[xs[0], y, 10, 180, 0, 0], [xs[1], y, 10, 180, 0, 0]])
+        if len(fill) >= 2:
+            paths.append((fill, {}))
+    order = rng.permutation(len(paths))
+    return [paths[i] for i in order]
+
+
+if __name__ == "__main__":
+    import sys
+    from GlueDispensingApplication.robot.CycleTimeEstimator import CycleTimeEstimator
+    from GlueDispensingApplication.robot.RobotConfig import CALIBRATION_POS
+
+    directory = sys.argv[1] if len(sys.argv) > 1 else TRAYS_DIR
+    files = sorted(glob.glob(os.path.join(directory, "*.json")))
+    if files:
+        trays = [(os.path.basename(f), loadTray(f)) for f in files]
+    else:
+        print(f"No recorded trays in {directory}, using synthetic trays")
+        rng = np.random.default_rng(0)
+        trays = [(f"synthetic_{i}", _syntheticTray(rng)) for i in range(10)]
+
+    estimator = CycleTimeEstimator(calibrationPath=None)
+    byDistance = PathSequencer()
+    byTime = PathSequencer(travelCost=estimator.travelTimes)
+
+    totalBefore = totalAfter = timeBefore = timeByDistance = timeByTime = 0.0
+    for name, paths in trays:
+        t0 = time.perf_counter()
+        ordered = byTime.sequence(paths, CALIBRATION_POS)
+        elapsed = time.perf_counter() - t0
+        before = PathSequencer.travelDistance(paths, CALIBRATION_POS)
+        after = PathSequencer.travelDistance(ordered, CALIBRATION_POS)
+        seconds = [byTime.travelCostOf(p, CALIBRATION_POS)
+                   for p in (paths, byDistance.sequence(paths, CALIBRATION_POS), ordered)]
+        totalBefore += before
+        totalAfter += after
+        timeBefore += seconds[0]
+        timeByDistance += seconds[1]
+        timeByTime += seconds[2]
+        print(f"{name}: {len(paths)} paths, travel {before:.0f} -> {after:.0f} mm, "
+              f"{seconds[0]:.2f} -> {seconds[2]:.2f} s (distance cost {seconds[1]:.2f} s), "
+              f"solved in {elapsed * 1000:.0f} ms")
+
+    if totalBefore:
+        print(f"TOTAL: travel {totalBefore:.0f} -> {totalAfter:.0f} mm "
+              f"({100 * (1 - totalAfter / totalBefore):.1f} % saved), travel time {timeBefore:.2f} -> "
+              f"{timeByTime:.2f} s (distance cost {timeByDistance:.2f} s)")
@@ -12,22 +12,25 @@ class Plane:
            xMax (int): The maximum x-coordinate (right boundary) of the nesting area.
            yMax (int): The maximum y-coordinate (top boundary) of the nesting area.
            yMin (int): The minimum y-coordinate (bottom boundary) of the nesting area.
-           spacing (int): The horizontal space to leave between adjacent workpieces.
+           spacing (int): The minimum distance to leave between adjacent workpieces.
            xOffset (int): The current horizontal offset used to determine the x-position of the next workpieces.
            yOffset (int): The current vertical offset used to determine the y-position of the current row.
            tallestContour (float): The height of the tallest workpieces in the current row, used for row spacing.
            rowCount (int): Tracks the number of completed rows.
            isFull (bool): Indicates whether the nesting area is full and cannot fit more workpieces.
+           rotationStep (float): Rotation increment in degrees tried by the nesting engine.
+           resolution (float): Size of an occupancy grid cell in mm.
+           timeBudget (float): Maximum nesting time in seconds.
+           occupancy (np.ndarray): Occupancy grid of the placed workpieces, None while the plane is empty.
 
        Usage:
-           The Plane instance is passed to the `nestingNew()` function, which uses it to calculate placement
-           coordinates for each workpieces. It automatically updates x and y offsets, checks for boundary overflows,
-           and transitions to new rows when needed. If the next row cannot be placed within the vertical boundary
-           (`yMin`), `isFull` is set to True to signal that no further nesting is possible.
+           The Plane instance is passed to `RobotService.performWorkpieceNesting()`, which places the workpiece
+           outlines with the NestingEngine. The occupancy grid is kept on the plane, so consecutive nestings
+           continue filling it. If a workpiece cannot be placed any more, `isFull` is set to True.
 
        Example:
            plane = Plane()
-           result, message = robotService.nestingNew(workpieces, callback, plane=plane)
+           result, message = robotService.performWorkpieceNesting(workpieces, callback, plane=plane)
        """
     def __init__(self):
         self.xMin = -400      # Left boundary of the nesting area (in mm or unit)
@@ -40,3 +43,7 @@ class Plane:
         self.tallestContour = 0  # Height of the tallest workpieces in the current row
         self.rowCount = 0        # Number of completed rows
         self.isFull = False      # Flag indicating if nesting area is full
+        self.rotationStep = 90   # Rotation increment tried by the nesting engine (degrees)
+        self.resolution = 2      # Occupancy grid cell size
+        self.timeBudget = 2.0    # Maximum nesting time (seconds)
+        self.occupancy = None    # Occupancy grid of the placed workpieces
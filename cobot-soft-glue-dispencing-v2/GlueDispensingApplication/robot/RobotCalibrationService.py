@@ -1,6 +1,9 @@
 import numpy as np
 import cv2
 
+from API.MessageBroker import MessageBroker
+from GlueDispensingApplication.vision.CoordinateTransformService import MATRIX_UPDATED_TOPIC
+
 """
 RobotCalibrationService
 -----------------------
@@ -99,6 +102,28 @@ class RobotCalibrationService():
               """
         print("Saving matrix...")
         np.save(CAMERA_TO_ROBOT_MATRIX_PATH, self.cameraToRobotMatrix)
+        # Let the coordinate transform service pick up the new matrix (and its inverse) right away
+        MessageBroker().publish(MATRIX_UPDATED_TOPIC, {"matrix": self.cameraToRobotMatrix})
+
+    def applyMatrix(self, matrix):
+        """
+              Save and publish a transformation matrix computed elsewhere (e.g. by AutoCalibrationRoutine).
+              The stored robot points of the table markers are left unchanged.
+
+              Args:
+                  matrix (np.ndarray): Camera to robot homography (3x3).
+
+              Returns:
+                  tuple: (success (bool), message (str))
+              """
+        if matrix is None:
+            self.message = "Error: No transformation matrix"
+            return False, self.message
+
+        self.cameraToRobotMatrix = np.asarray(matrix, dtype=np.float64)
+        self.__saveMatrix()
+        self.message = "Camera to robot transformation computed successfully"
+        return True, self.message
 
     def setCameraPoints(self, points):
         """
@@ -16,6 +16,15 @@ CALIBRATION_POS = [-25.4, 370.001, 819.846, 180, 0, 0]
 CALIBRATION_VEL= None
 CALIBRATION_ACC = None
 
+""" MOTION LIMITS (vel / acc of 100 % in the SDK) """
+ROBOT_MAX_LINEAR_VELOCITY = 1000  # mm/s
+ROBOT_MAX_LINEAR_ACCELERATION = 2500  # mm/s^2
+
+""" TRACE CONTOURS """
+TRACE_APPROACH_VELOCITY = 30
+TRACE_APPROACH_ACCELERATION = 80
+CYCLE_TIME_WAIT_TIMEOUT = 120  # seconds a recorded path may take before its execution is not logged
+
 """ JOG """
 JOG_VELOCITY = 20
 JOG_ACCELERATION = 100
@@ -0,0 +1,279 @@
+import http.client
+import queue
+import socket
+import threading
+import time
+import xmlrpc.client
+
+from API.shared.LatencyHistogram import LatencyHistogram
+
+"""
+RobotRpcTransport
+-----------------
+Persistent XML-RPC transport for the robot controller.
+
+The fairino SDK talks to the controller through one xmlrpc.client.ServerProxy per Robot.RPC, and the
+app creates one RPC for the RobotService and a second one for the RobotStateManager. A ServerProxy
+caches a single HTTP connection without any locking, so concurrent calls from two threads corrupt each
+other's request / response, and a blocking default socket timeout of None hangs forever on a dead
+controller.
+
+RobotRpcClient replaces the proxy inside Robot.RPC:
+    - a small pool of HTTP/1.1 keep-alive connections (TCP_NODELAY, timeout); every call checks one
+      connection out, so a connection is only ever used by one thread at a time,
+    - one client per controller address shared by all wrappers,
+    - system.multicall batching of independent calls (falls back to sequential calls on the same
+      connection if the controller does not support it),
+    - per-method latency histograms.
+"""
+
+RPC_PORT = 20003
+RPC_CONNECTIONS = 2  # e.g. one for motion commands, one for the state poller
+RPC_TIMEOUT = 2.0  # seconds
+RPC_BATCH_SIZE = 25  # calls per system.multicall
+
+
+class _NoDelayConnection(http.client.HTTPConnection):
+    def connect(self):
+        super().connect()
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class KeepAliveTransport(xmlrpc.client.Transport):
+    """xmlrpc Transport keeping one HTTP/1.1 connection open, with TCP_NODELAY and a socket timeout."""
+
+    def __init__(self, timeout=RPC_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        self.connects = 0
+
+    def make_connection(self, host):
+        if self._connection and host == self._connection[0]:
+            return self._connection[1]
+        chost, self._extra_headers, _ = self.get_host_info(host)
+        self._connection = host, _NoDelayConnection(chost, timeout=self.timeout)
+        self.connects += 1
+        return self._connection[1]
+
+
+class _Method:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Method(self._client, f"{self._name}.{name}")
+
+    def __call__(self, *params):
+        return self._client.call(self._name, *params)
+
+
+class RobotRpcClient:
+    """
+    Thread-safe XML-RPC client with a pool of keep-alive connections.
+
+    Drop-in for the ServerProxy of the fairino SDK (client.MoveL(...) calls the remote MoveL).
+
+    Attributes:
+        host (str): host:port of the controller.
+        multicallSupported (bool): False once the controller rejected system.multicall.
+    """
+
+    _clients = {}
+    _clientsLock = threading.Lock()
+
+    @classmethod
+    def forAddress(cls, ip, port=RPC_PORT, **kwargs):
+        """Returns the client shared by all users of the controller at ip:port."""
+        with cls._clientsLock:
+            key = (ip, port)
+            if key not in cls._clients:
+                cls._clients[key] = cls(f"http://{ip}:{port}", **kwargs)
+            return cls._clients[key]
+
+    def __init__(self, uri, connections=RPC_CONNECTIONS, timeout=RPC_TIMEOUT):
+        self.uri = uri
+        self.host = uri.split("://", 1)[-1].split("/", 1)[0]
+        self.handler = "/RPC2"
+        self.timeout = timeout
+        self.multicallSupported = True
+
+        self._pool = queue.LifoQueue()  # the most recently used connection is the warmest
+        self._transports = [KeepAliveTransport(timeout) for _ in range(connections)]
+        for transport in self._transports:
+            self._pool.put(transport)
+        self._histograms = {}
+        self._metricsLock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _Method(self, name)
+
+    """ CALLS """
+
+    def _request(self, transport, method, params):
+        body = xmlrpc.client.dumps(tuple(params), method, allow_none=False).encode("utf-8", "xmlcharrefreplace")
+        try:
+            response = transport.request(self.host, self.handler, body)
+        except (OSError, http.client.HTTPException):
+            # Drop the broken connection, the next request reconnects
+            transport.close()
+            raise
+        return response[0] if len(response) == 1 else response
+
+    def call(self, method, *params):
+        """
+        Calls a remote method.
+
+        Raises:
+            xmlrpc.client.Fault: The controller returned a fault.
+            OSError: Connection failed or timed out.
+        """
+        transport = self._pool.get()
+        start = time.perf_counter()
+        try:
+            return self._request(transport, method, params)
+        finally:
+            self._record(method, time.perf_counter() - start)
+            self._pool.put(transport)
+
+    def multicall(self, calls, batchSize=RPC_BATCH_SIZE):
+        """
+        Executes independent calls in as few round trips as possible.
+
+        Args:
+            calls (list): (method, params tuple) pairs.
+            batchSize (int): Calls per system.multicall request.
+
+        Returns:
+            list: Result of every call in order.
+
+        Raises:
+            xmlrpc.client.Fault: One of the calls returned a fault.
+        """
+        results = []
+        transport = self._pool.get()
+        try:
+            for first in range(0, len(calls), batchSize):
+                chunk = calls[first:first + batchSize]
+                if self.multicallSupported:
+                    start = time.perf_counter()
+                    try:
+                        entries = self._request(transport, "system.multicall",
+                                                [[{"methodName": m, "params": list(p)} for m, p in chunk]])
+                    except xmlrpc.client.Fault as e:
+                        print(f"[RobotRpcClient] system.multicall not supported ({e.faultString}), "
+                              f"using sequential calls")
+                        self.multicallSupported = False
+                    else:
+                        self._record("system.multicall", time.perf_counter() - start)
+                        for entry in entries:
+                            if isinstance(entry, dict):
+                                raise xmlrpc.client.Fault(entry.get("faultCode"), entry.get("faultString"))
+                            results.append(entry[0])
+                        continue
+                for method, params in chunk:
+                    start = time.perf_counter()
+                    results.append(self._request(transport, method, params))
+                    self._record(method, time.perf_counter() - start)
+        finally:
+            self._pool.put(transport)
+        return results
+
+    def close(self):
+        for transport in self._transports:
+            transport.close()
+
+    """ METRICS """
+
+    def _record(self, method, seconds):
+        with self._metricsLock:
+            histogram = self._histograms.get(method)
+            if histogram is None:
+                histogram = self._histograms[method] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def metrics(self):
+        """
+        Returns:
+            dict: {method: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}} plus "connects".
+        """
+        with self._metricsLock:
+            snapshot = {method: histogram.toDict() for method, histogram in self._histograms.items()}
+        snapshot["connects"] = sum(transport.connects for transport in self._transports)
+        return snapshot
+
+    def resetMetrics(self):
+        with self._metricsLock:
+            self._histograms = {}
+
+    def report(self):
+        metrics = self.metrics()
+        lines = [f"RPC latency ({metrics.pop('connects')} connects):"]
+        for method, m in sorted(metrics.items()):
+            lines.append(f"  {method:<20} n={m['count']:<6} mean {m['mean_ms']:7.3f} ms  p50 {m['p50_ms']:7.3f}  "
+                         f"p95 {m['p95_ms']:7.3f}  p99 {m['p99_ms']:7.3f}  max {m['max_ms']:7.3f}")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from GlueDispensingApplication.robot.SimulatedRpcServer import SimulatedRpcServer
+
+    server = SimulatedRpcServer(requestDelay=0.0005).start()
+    path = [[x * 2.0, 400.0, 150.0, 180.0, 0.0, 0.0] for x in range(100)]
+    noAxis, noOffset = [0.0] * 4, [0.0] * 6
+
+    def moveL(proxy, pose):
+        # What Robot.RPC.MoveL does: inverse kinematics, then the motion command
+        joints = proxy.GetInverseKin(0, pose, -1)[1:7]
+        return proxy.MoveL(joints, pose, 0, 0, 20.0, 30.0, 100.0, 1.0, noAxis, 0, 0, noOffset)
+
+    def timed(name, function):
+        requests = server.requests
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28} {elapsed * 1000:8.1f} ms for {len(path)} moves "
+              f"({elapsed / len(path) * 1000:.3f} ms/move, {server.requests - requests} HTTP requests)")
+
+    timed("ServerProxy per call", lambda: [moveL(xmlrpc.client.ServerProxy(server.uri), p) for p in path])
+    shared = xmlrpc.client.ServerProxy(server.uri)
+    timed("shared ServerProxy", lambda: [moveL(shared, p) for p in path])
+    client = RobotRpcClient(server.uri)
+    timed("RobotRpcClient", lambda: [moveL(client, p) for p in path])
+
+    def batched():
+        solutions = client.multicall([("GetInverseKin", (0, p, -1)) for p in path])
+        client.multicall([("MoveL", (s[1:7], p, 0, 0, 20.0, 30.0, 100.0, 1.0, noAxis, 0, 0, noOffset))
+                          for s, p in zip(solutions, path)])
+
+    timed("RobotRpcClient multicall", batched)
+
+    # Motion commands while the state poller runs in a second thread
+    for name, proxy in (("shared ServerProxy", xmlrpc.client.ServerProxy(server.uri)),
+                        ("RobotRpcClient", RobotRpcClient(server.uri))):
+        errors = []
+        stop = threading.Event()
+
+        def poll():
+            while not stop.is_set():
+                try:
+                    proxy.GetActualTCPPose(1)
+                except Exception as e:
+                    errors.append(e)
+
+        poller = threading.Thread(target=poll, daemon=True)
+        poller.start()
+        for pose in path:
+            try:
+                moveL(proxy, pose)
+            except Exception as e:
+                errors.append(e)
+        stop.set()
+        poller.join()
+        kinds = sorted({type(e).__name__ for e in errors})
+        print(f"concurrent poller, {name:<20} {len(errors)} failed calls {kinds if kinds else ''}")
+
+    print(client.report())
+    server.shutdown()
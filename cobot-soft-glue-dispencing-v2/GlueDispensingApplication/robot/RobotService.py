@@ -6,7 +6,7 @@ import threading
 import cv2
 import numpy as np
 
-from API.MessageBroker import MessageBroker
+from API.MessageBroker import MessageBroker, DELIVERY_ASYNC
 # from pl_gui.contour_editor.temp.testTransformPoints import startPosition
 
 from GlueDispensingApplication.tools.GlueNozzleService import GlueNozzleService
@@ -22,9 +22,18 @@ from GlueDispensingApplication.tools.nozzles.Tool3 import Tool3
 from GlueDispensingApplication.tools.Laser import Laser
 from GlueDispensingApplication.robot import RobotUtils
 from GlueDispensingApplication.tools.ToolChanger import ToolChanger
+from GlueDispensingApplication.tools.PumpSpeedController import PumpSpeedController, PumpSchedule
+from GlueDispensingApplication.robot.CycleTimeEstimator import CycleTimeEstimator
+from GlueDispensingApplication.robot.PathConditioner import PathConditioner, MOVE_CIRCULAR, MOVE_LINEAR
+from GlueDispensingApplication.robot.FillPathGenerator import generateFillPaths
+from GlueDispensingApplication.robot.VelocityProfiler import VelocityProfiler
+from GlueDispensingApplication.robot.NestingEngine import NestingEngine
+from GlueDispensingApplication.robot.MotionTelemetry import (MotionTelemetryRecorder, SEGMENT_APPROACH,
+                                                             SEGMENT_LINEAR, SEGMENT_CIRCULAR)
+from GlueDispensingApplication.robot.Plane import Plane
 import enum
 from API.shared.Contour import Contour
-from GlueDispensingApplication.SystemStatePublisherThread import SystemStatePublisherThread
+from GlueDispensingApplication.SystemStatePublisher import SystemStatePublisher
 import threading
 import time
 import math
@@ -50,8 +59,11 @@ class RobotState(enum.Enum):
 
 
 class RobotStateManager:
-    def __init__(self, controller_cycle_time=0.01, proportional_gain=0.34, speed_threshold=1, accel_threshold=0.001):
-        self.robot = RobotWrapper(ROBOT_IP)
+    def __init__(self, controller_cycle_time=0.01, proportional_gain=0.34, speed_threshold=1, accel_threshold=0.001,
+                 robot=None):
+        # Usually the RobotService's robot: only getCurrentPosition is polled, and the real arm's wrapper
+        # checks a pooled RPC connection out per call, so the poller and the motion commands never share one
+        self.robot = robot if robot is not None else RobotWrapper(ROBOT_IP)
         self.pos = None
         self.speed = 0.0
         self.accel = 0.0
@@ -62,10 +74,14 @@ class RobotStateManager:
         self.prev_time = None
         self.prev_speed = None
         self.trajectoryUpdate = False
+        self.telemetry = None  # MotionTelemetryRecorder fed with every polled state
         self._stop_event = threading.Event()
 
         self.following_error_gain = controller_cycle_time / proportional_gain
         self.broker = MessageBroker()
+        # Published every poll, consumers only need the latest state / trajectory point
+        self.broker.conflate(self.robotStateTopic)
+        self.broker.conflate("robot/trajectory/point")
 
         # Thresholds for determining motion state
         self.speed_threshold = speed_threshold
@@ -102,6 +118,8 @@ class RobotStateManager:
                 self.robotState = RobotState.ERROR
 
             self.pos = current_pos
+            if self.telemetry is not None:
+                self.telemetry.recordState(time.monotonic(), current_pos, self.speed)
 
 
             if self.prev_pos is not None:
@@ -170,17 +188,17 @@ class RobotService:
 
         self.logTag = "RobotService"
         self.stateTopic = "robot-service/state"
+        self.statePublisher = SystemStatePublisher()
         self.state= RobotServiceState.INITIALIZING
         self.broker = MessageBroker()
-        self.statePublisherThread = SystemStatePublisherThread(self.publishState, 0.1)
-        # self.statePublisherThread.start()
 
         self.robot = robot
         self.robot.printSdkVersion()
-        self.robotStateManager = RobotStateManager()
+        self.robotStateManager = RobotStateManager(robot=self.robot)
         self.robotStateManager.start_thread()
         self.robotState = None
-        self.broker.subscribe(self.robotStateManager.robotStateTopic, self.onRobotStateUpdate)
+        # robot/state is a conflated 100 Hz stream: handle it on its own worker so the poller never waits
+        self.broker.subscribe(self.robotStateManager.robotStateTopic, self.onRobotStateUpdate, mode=DELIVERY_ASYNC)
 
         self.pump = VacuumPump()
         self.laser = Laser()
@@ -189,6 +207,14 @@ class RobotService:
         # TODO: FINISH IMPLEMENTATION FOR ROBOT SETTINGS
         self.settingsService = settingsService
         self.robotSettings = self.settingsService.robot_settings
+        self.cycleTimeEstimator = CycleTimeEstimator(self.robotSettings, self.settingsService.glue_settings)
+        self.recordCycleTimes = False  # log measured path times for cycle time calibration (setCycleTimeRecording)
+        self.pathConditioner = PathConditioner()
+        self.velocityProfiler = VelocityProfiler()
+        self.useVelocityProfile = True  # curvature-aware per-segment velocities
+        self.usePumpSpeedControl = True  # PumpSpeedController couples the glue pump to the TCP speed on every path
+        self.conveyorTracker = None  # ConveyorTracker - shifts the paths with the belt while it is tracking
+        self.telemetry = None  # MotionTelemetryRecorder - records commanded moves and robot state per cycle
         self.glueNozzleService = glueNozzleService
         self.loginPosition = LOGIN_POS
         self.startPosition = HOME_POS
@@ -206,9 +232,59 @@ class RobotService:
             self.state = RobotServiceState.IDLE
 
 
-    def publishState(self):
-        # print("Publishing state:", self.state)
-        self.broker.publish(self.stateTopic,self.state)
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self.statePublisher.report(self.stateTopic, state)
+
+    def estimateCycleTime(self, paths):
+        """
+             Estimates the execution time of the given paths.
+
+             Args:
+                 paths (list): List of (path, settings) tuples as passed to traceContours
+
+             Returns:
+                 dict: Per path, travel and total times in seconds
+             """
+        return self.cycleTimeEstimator.estimate(paths, self.robotStateManager.pos, self._executedSegmentSpeeds)
+
+    def setCycleTimeRecording(self, enabled):
+        """Logs the measured motion time of every traced path (not on a moving belt) for calibrateCycleTime."""
+        self.recordCycleTimes = bool(enabled)
+
+    def calibrateCycleTime(self):
+        """
+        Fits the cycle time model to the logged executions.
+
+        Returns:
+            tuple: (success (bool), message (str))
+        """
+        return self.cycleTimeEstimator.calibrate()
+
+    def _executedSegmentSpeeds(self, path, settings):
+        """Speed of every segment of a path in mm/s as traceContours commands it, None without a velocity"""
+        from API.shared.settings.conreateSettings.enums.RobotSettingKey import RobotSettingKey
+
+        velocity = settings.get(RobotSettingKey.VELOCITY.value) if settings else None
+        acceleration = settings.get(RobotSettingKey.ACCELERATION.value) if settings else None
+        if velocity is None or acceleration is None or path is None or len(path) < 2:
+            return None
+        profile = self.velocityProfiler.plan(path, velocity, acceleration) if self.useVelocityProfile else None
+        moves, spans = self._plannedMoves(path, profile, velocity)
+        return self._moveSpeeds(moves, spans, len(path) - 1)
+
+    @staticmethod
+    def _moveSpeeds(moves, spans, segmentCount):
+        """Commanded speed of every path segment in mm/s from the velocity of the move covering it"""
+        speeds = np.empty(segmentCount)
+        for (_, move_velocity), (start, end) in zip(moves, spans):
+            speeds[start:end] = float(move_velocity) / 100.0 * ROBOT_MAX_LINEAR_VELOCITY
+        return speeds
 
     def getMotionParams(self):
         """
@@ -239,6 +315,22 @@ class RobotService:
         path = RobotUtils.zigZag(contour, spacing)
         return path
 
+    def fillPaths(self, contour, spacing, angle=0.0, holes=None, optimizeAngle=False):
+        """
+             Computes raster fill passes clipped to the contour (and its holes).
+
+             Args:
+                 contour (array): Input contour points
+                 spacing (float): Spacing between raster lines
+                 angle (float): Raster angle in degrees
+                 holes (list): Optional hole contours
+                 optimizeAngle (bool): Use the raster angle with the fewest strokes
+
+             Returns:
+                 list: Fill passes, each a list of [x, y] points
+             """
+        return generateFillPaths(contour, spacing, angle=angle, holes=holes, optimizeAngle=optimizeAngle)
+
     def moveToLoginPosition(self):
         currentPos = self.robot.getCurrentPosition()
         x, y, z, rx, ry, rz = currentPos
@@ -418,6 +510,8 @@ class RobotService:
         from API.shared.settings.conreateSettings.enums.RobotSettingKey import RobotSettingKey
 
         self.state = RobotServiceState.STARTING
+        if self.telemetry is not None:
+            self.telemetry.beginCycle()
 
         service = GlueSprayService(generatorTurnOffTimeout=10)
         glueType = service.glueB_addresses
@@ -446,9 +540,16 @@ class RobotService:
                 generator_to_glue_delay = float(settings.get(GlueSettingKey.TIME_BETWEEN_GENERATOR_AND_GLUE.value))
                 fanSpeed = int(settings.get(GlueSettingKey.FAN_SPEED.value))
 
-                # Move to the first point
+                # Move to the first point (on a moving belt: where it will be when the robot arrives)
+                start_point = path[0]
+                if self.conveyorTracker is not None and self.conveyorTracker.tracking:
+                    start_point = self._trackedApproachPoint(path[0])
                 try:
-                    ret = self.robot.moveCart(path[0], ROBOT_TOOL, ROBOT_USER, vel=30, acc=80)
+                    ret = self.robot.moveCart(start_point, ROBOT_TOOL, ROBOT_USER, vel=TRACE_APPROACH_VELOCITY,
+                                              acc=TRACE_APPROACH_ACCELERATION)
+                    if self.telemetry is not None:
+                        self.telemetry.recordSegment(current_path_index, 0, SEGMENT_APPROACH, start_point,
+                                                     TRACE_APPROACH_VELOCITY)
                     if ret != 0:
                         self.state = RobotServiceState.ERROR
                     else:
@@ -458,7 +559,7 @@ class RobotService:
                     print("Robot could not reach start position, stopping glue dispensing")
                     return
 
-                self._waitForRobotToReachPosition(path[0], reach_start_threshold, 0.1)
+                self._waitForRobotToReachPosition(start_point, reach_start_threshold, 0.1)
 
                 # Turn on generator if off
                 if not service.generatorCurrentState:
@@ -478,18 +579,69 @@ class RobotService:
                 glue_speed_coefficient = float(settings.get(GlueSettingKey.GLUE_SPEED_COEFFICIENT.value, 1.0))
                 reach_end_threshold = float(settings.get(GlueSettingKey.REACH_END_THRESHOLD.value))
 
-                for point in path:
-                    ret = self.robot.moveL(point, ROBOT_TOOL, ROBOT_USER, vel=velocity, acc=acceleration, blendR=1)
-                    if ret != 0:
-                        print(f"MoveL to point {point} failed with error code {ret}")
-                        self.state = RobotServiceState.ERROR
+                # Slow down in tight radii only - straight runs keep the velocity from the settings
+                profile = None
+                if self.useVelocityProfile:
+                    profile = self.velocityProfiler.plan(path, velocity, acceleration, glue_speed_coefficient)
+
+                # On a moving belt every point is shifted to where the part will be when the robot gets there
+                tracking = self.conveyorTracker is not None and self.conveyorTracker.tracking
+                if tracking:
+                    moves, spans = self._trackedMoves(path, profile, velocity)
+                else:
+                    moves, spans = self._plannedMoves(path, profile, velocity)
+
+                if self.telemetry is not None:
+                    self._recordMoves(current_path_index, moves, spans, profile, velocity)
+
+                # The pump follows the TCP speed from before the first move until the robot reached the end,
+                # capped by the planned pump speed ahead (located by TCP position, so not on a moving belt)
+                pump = None
+                if self.usePumpSpeedControl:
+                    schedule = None
+                    if profile is not None and not tracking and len(path) > 1:
+                        schedule = PumpSchedule(path, profile.pumpSpeeds)
+                    pump = self._startPumpSpeedControl(service, glueType, pumpSpeed, glue_speed_coefficient, schedule)
+
+                # Measured window of the cycle time log: the motion from the first to the last point
+                path_start_time = time.time()
+                # Not on a moving belt: the executed poses are shifted and differ from the path
+                record = self.recordCycleTimes and not tracking
+                arrived = False
+                try:
+                    if hasattr(self.robot, "executeMoves"):
+                        # All blended moves of the path in a few batched RPC round trips
+                        ret = self.robot.executeMoves(moves, ROBOT_TOOL, ROBOT_USER, acc=acceleration, blendR=1)
+                        if ret != 0:
+                            print(f"Path {current_path_index} failed with error code {ret}")
+                            self.state = RobotServiceState.ERROR
                     else:
-                        # self.adjustPumpSpeedWhileRobotIsMoving(service, glue_speed_coefficient, glueType, pumpSpeed, point,
-                        #                                        reach_end_threshold)
-                        # self._waitForRobotToReachPosition(point, reach_end_threshold, 0.1)
-                        pass
+                        for move, move_velocity in moves:
+                            if move[0] == MOVE_CIRCULAR:
+                                _, via, point = move
+                                ret = self.robot.moveC(via, point, ROBOT_TOOL, ROBOT_USER, vel=move_velocity,
+                                                       acc=acceleration, blendR=1)
+                            else:
+                                point = move[1]
+                                ret = self.robot.moveL(point, ROBOT_TOOL, ROBOT_USER, vel=move_velocity,
+                                                       acc=acceleration, blendR=1)
+                            if ret != 0:
+                                print(f"Move to point {point} failed with error code {ret}")
+                                self.state = RobotServiceState.ERROR
+
+                    if self.state != RobotServiceState.ERROR and (record or pump is not None):
+                        arrived = self._waitForPathEnd(path[-1], reach_end_threshold, path_start_time)
+                finally:
+                    # The pump never keeps running after the path, also when a move failed or raised
+                    if pump is not None:
+                        stats = self._stopPumpSpeedControl(pump)
+                        print(f"Pump speed control of path {current_path_index}: {stats['writes']} writes, "
+                              f"{stats['failures']} failed cycles, jitter max {stats['jitter_max'] * 1000:.1f} ms")
+
+                if record and arrived:
+                    self.cycleTimeEstimator.logExecution(path, settings, time.time() - path_start_time,
+                                                         self._moveSpeeds(moves, spans, len(path) - 1))
 
-                # service.motorOff(glueType, speedReverse=speedReverse, delay=reverseDuration)
                 # self.positionFetcher.trajectoryUpdate=False
                 self.state = RobotServiceState.TRANSITION_BETWEEN_PATHS
 
@@ -498,53 +650,163 @@ class RobotService:
                 if current_path_index >= len(paths):
                     self.state = RobotServiceState.COMPLETED
                 else:
-                    self.state = RobotServiceState.MOVING_TO_FIRST_POINT
+                    # STARTING moves to the first point of the next path
+                    self.state = RobotServiceState.STARTING
 
 
             else:
                 raise ValueError(f"Invalid state: {self.state}")
 
 
+        if self.telemetry is not None:
+            self.telemetry.endCycle()
+
         # Final cleanup after all paths
         # time.sleep(delay)
         # service.motorOff(glueType, speedReverse=speedReverse, delay=reverseDuration)
         # service.generatorOff()
 
-    def adjustPumpSpeedWhileRobotIsMoving(
-            self,
-            glueSprayService,
-            glue_speed_coefficient,
-            motorAddress,
-            pumpSpeed,
-            endPoint,
-            threshold,
-            use_second_order=True
-    ):
-        glueSprayService.motorOn(2,10000)
-        time.sleep(1)
-        while True:
-            currentVel = self.robotStateManager.speed
-            accel = self.robotStateManager.accel
+    def _plannedMoves(self, path, profile, velocity):
+        """
+        Circular runs of the path as MoveC, the rest as blended MoveL, with the velocity of every move.
 
-            # Following error compensation (1st order)
-            predicted_following_error = self.robotStateManager.following_error_gain * currentVel
+        Returns:
+            tuple: ([(move, velocity)], [(first segment, end segment)]) - the path segments every move covers
+        """
+        moves = []
+        spans = []
+        move_start = 0
+        for move, move_end in self.pathConditioner.toMoves(path, withIndices=True):
+            move_velocity = profile.segmentVelocity(move_start, move_end) if profile is not None else velocity
+            moves.append((move, move_velocity))
+            spans.append((move_start, move_end))
+            move_start = move_end
+        return moves, spans
+
+    def _recordMoves(self, path_index, moves, spans, profile, velocity):
+        """
+        Commanded moves of a path for the motion telemetry, with the speed and pump speed the velocity
+        profile planned for the segments of every move (the settings speed and no pump speed without a profile).
+        """
+        planned = profile is not None and len(profile.speeds) > 0
+        for number, ((move, move_velocity), (start, end)) in enumerate(zip(moves, spans), start=1):
+            if planned:
+                planned_speed = float(np.min(profile.speeds[start:end]))
+                planned_pump = profile.segmentPumpSpeed(start, end)
+            else:
+                planned_speed = float(velocity) / 100.0 * ROBOT_MAX_LINEAR_VELOCITY
+                planned_pump = np.nan
+            if move[0] == MOVE_CIRCULAR:
+                self.telemetry.recordSegment(path_index, number, SEGMENT_CIRCULAR, move[2], move_velocity,
+                                             via=move[1], plannedSpeed=planned_speed, plannedPump=planned_pump)
+            else:
+                self.telemetry.recordSegment(path_index, number, SEGMENT_LINEAR, move[1], move_velocity,
+                                             plannedSpeed=planned_speed, plannedPump=planned_pump)
 
-            # Optional 2nd order: account for accel lag
-            if use_second_order:
-                predicted_following_error += (self.robotStateManager.following_error_gain * 0.5) * accel
+    def enableTelemetry(self, storageDir=None):
+        """
+        Records the commanded moves (with the planned speed and pump speed), the polled robot state and the
+        pump writes of every traceContours cycle to a .npz file (see MotionTelemetryAnalyzer).
 
-            adjustedPumpSpeed = (currentVel + predicted_following_error) * glue_speed_coefficient
-            glueSprayService.motorOn(motorAddress, adjustedPumpSpeed)
+        Pump writes are recorded while the PumpSpeedController of traceContours drives the pump
+        (usePumpSpeedControl), so the analyzer can report the pump lag.
 
-            currentPos = self.robotStateManager.pos
-            distance = math.sqrt(
-                (currentPos[0] - endPoint[0]) ** 2 +
-                (currentPos[1] - endPoint[1]) ** 2 +
-                (currentPos[2] - endPoint[2]) ** 2
-            )
+        Returns:
+            MotionTelemetryRecorder: The recorder.
+        """
+        self.telemetry = MotionTelemetryRecorder() if storageDir is None else MotionTelemetryRecorder(storageDir)
+        self.robotStateManager.telemetry = self.telemetry
+        return self.telemetry
+
+    def disableTelemetry(self):
+        if self.telemetry is not None:
+            self.telemetry.endCycle(flush=False)
+        self.telemetry = None
+        self.robotStateManager.telemetry = None
+
+    def _trackedApproachPoint(self, point):
+        """First point of a path shifted by the belt travel during the approach move"""
+        distance = np.linalg.norm(np.asarray(point[:3]) - np.asarray(self.getCurrentPosition()[:3]))
+        approach_time = distance / (TRACE_APPROACH_VELOCITY / 100.0 * ROBOT_MAX_LINEAR_VELOCITY)
+        tracker = self.conveyorTracker
+        return tracker.shiftPoses([point], [tracker.clock() + approach_time])[0].tolist()
+
+    def _trackedMoves(self, path, profile, velocity):
+        """
+        MoveL's of a path shifted with the belt. Arcs are not arcs in the robot frame on a moving belt,
+        so no MoveC is used; the velocity of every move keeps the planned speed relative to the part.
 
-            if distance < threshold:
-                break
+        Returns:
+            tuple: ([(move, velocity)], [(segment, segment + 1)])
+        """
+        if profile is not None and len(profile.speeds) == len(path) - 1:
+            speeds = profile.speeds
+        else:
+            speeds = np.full(len(path) - 1, float(velocity) / 100.0 * ROBOT_MAX_LINEAR_VELOCITY)
+        poses, velocities = self.conveyorTracker.trackPath(path, speeds)
+        moves = [((MOVE_LINEAR, pose), move_velocity) for pose, move_velocity in zip(poses[1:], velocities)]
+        return moves, [(index, index + 1) for index in range(len(moves))]
+
+    def _startPumpSpeedControl(self, glueSprayService, motorAddress, pumpSpeed, glue_speed_coefficient,
+                               schedule=None, use_second_order=True):
+        """
+        Starts coupling the pump speed to the TCP velocity for one path.
+
+        The speed is regulated by a fixed-rate PumpSpeedController which only writes the
+        motor speed register when the command leaves the deadband, so the Modbus bus is not
+        flooded with identical writes.
+
+        Args:
+            glueSprayService (GlueSprayService): Service used to open the Modbus client
+            motorAddress (int): Motor speed register address
+            pumpSpeed (int): Initial pump speed written before the robot starts moving
+            glue_speed_coefficient (float): Pump speed units per mm/s of TCP velocity
+            schedule (PumpSchedule, optional): Planned pump speed of the path (VelocityProfile.pumpSpeeds)
+            use_second_order (bool): If True, compensates the acceleration lag as well
+
+        Returns:
+            tuple: (PumpSpeedController, Modbus client), None if the pump could not be started
+        """
+        try:
+            client = glueSprayService.getModbusClient(glueSprayService.motorsId)
+        except Exception as e:
+            print(f"Pump speed control not started, the motor controller is not reachable: {e}")
+            return None
+
+        controller = PumpSpeedController(self.robotStateManager,
+                                         lambda address, speed: client.writeRegister(address, speed),
+                                         motorAddress,
+                                         glue_speed_coefficient,
+                                         useSecondOrder=use_second_order,
+                                         schedule=schedule)
+        controller.telemetry = self.telemetry
+        try:
+            controller.start(initialSpeed=pumpSpeed)
+        except Exception as e:
+            print(f"Pump speed control not started, writing the initial speed failed: {e}")
+            client.close()
+            return None
+        return controller, client
+
+    def _stopPumpSpeedControl(self, pump):
+        """
+        Stops the pump control loop of a path and the pump.
+
+        Args:
+            pump (tuple): (PumpSpeedController, Modbus client) from _startPumpSpeedControl
+
+        Returns:
+            dict: Pump control loop statistics
+        """
+        controller, client = pump
+        controller.stop()
+        try:
+            controller.write(0)
+        except Exception as e:
+            print(f"Error stopping pump motor {controller.motorAddress}: {e}")
+        finally:
+            client.close()
+        return controller.getStats()
 
     def __getTool(self, toolID):
         """
@@ -567,6 +829,29 @@ class RobotService:
         else:
             raise ValueError("Invalid tool ID")
 
+    def _waitForPathEnd(self, endPoint, threshold, startTime, timeout=CYCLE_TIME_WAIT_TIMEOUT):
+        """
+        Waits until the robot stands still within threshold of the last point of a path.
+
+        Unlike _waitForRobotToReachPosition it does not return on the stale STATIONARY state seen right after
+        the moves were sent: the robot must have been seen moving first, since a closed contour ends where it
+        starts. The measured motion time (and the pump) end when the robot really arrived.
+
+        Returns:
+            bool: True if the robot arrived before startTime + timeout.
+        """
+        moved = False
+        while time.time() - startTime < timeout:
+            pos = self.robotStateManager.pos
+            if self.robotStateManager.robotState != RobotState.STATIONARY:
+                moved = True
+            elif moved and pos is not None:
+                distance = math.sqrt(sum((pos[i] - endPoint[i]) ** 2 for i in range(3)))
+                if distance < threshold:
+                    return True
+            time.sleep(0.005)
+        return False
+
     def _waitForRobotToReachPosition(self, endPoint, threshold, delay):
         """
            Waits until the robot reaches a given position within a threshold.
@@ -670,7 +955,8 @@ class RobotService:
     #
     #         ret = self.robot.moveL(point, tool, workpieces, vel=velocity, acc=acceleration, blendR=blendR)
 
-    def _getNestingMoves(self, angle, centroid, dropOffPositionX, dropOffPositionY, height, gripperId):
+    def _getNestingMoves(self, angle, centroid, dropOffPositionX, dropOffPositionY, height, gripperId,
+                         placementAngle=0.0):
         """
            Generates a pick-and-place trajectory for nesting.
 
@@ -680,6 +966,7 @@ class RobotService:
                dropOffPositionX (float): X position of drop target
                dropOffPositionY (float): Y position of drop target
                height (float): Height for Z-axis during move
+               placementAngle (float): Rotation of the workpiece on the plane chosen by the nesting (degrees)
 
            Returns:
                list: List of Cartesian positions for the move
@@ -724,9 +1011,15 @@ class RobotService:
         waypoint = [-317.997, 261.207, self.MIN_Z_VALUE + STATIC_Z_OFFSET, self.RX_VALUE, self.RY_VALUE, self.RZ_VALUE]
         path.append(waypoint)
 
-        # Step 4: Move to drop-off location
-        path.append([dropOffPositionX + xOffset, dropOffPositionY + yOffset, height + STATIC_Z_OFFSET,
-                     self.RX_VALUE, self.RY_VALUE, self.RZ_VALUE])
+        # Step 4: Move to drop-off location. The tool turns with the placed workpiece; rz is wrapped to
+        # [-180, 180) (the double gripper adds 90 degrees) and, as at the pick where the offset is rotated
+        # by the commanded rz, the gripper offset is rotated by the drop rz with the same (CCW) rotation
+        dropRz = ((self.RZ_VALUE + placementAngle + 180) % 360) - 180
+        phi = math.radians(dropRz)
+        dropXOffset = xOffset * math.cos(phi) - yOffset * math.sin(phi)
+        dropYOffset = xOffset * math.sin(phi) + yOffset * math.cos(phi)
+        path.append([dropOffPositionX + dropXOffset, dropOffPositionY + dropYOffset, height + STATIC_Z_OFFSET,
+                     self.RX_VALUE, self.RY_VALUE, dropRz])
 
         return path
 
@@ -837,6 +1130,9 @@ class RobotService:
         """
               Performs nesting of multiple workpieces by rotating, aligning, and placing them.
 
+              The outlines are aligned with the x-axis and then packed on the plane by the NestingEngine
+              (rotations, gap and time budget from the plane).
+
               Args:
                   plane: Plane object defining the nesting area
                   workpieces (list): List of workpieces objects with contour and height
@@ -849,105 +1145,44 @@ class RobotService:
         #     validationPos = [-350, 650, 450, 180, 0, 90]
         #     self.moveToPosition(validationPos, 0, 0, 100, 30, waitToReachPosition=True)
         #     callback()
-        grippers = []  # List of grippers
-        paths = []  # List of pick and place paths
-        count = 0  # Workpiece counter
-
-        rowCount = plane.rowCount  # Row counter
+        if plane is None:
+            plane = Plane()
 
-        for slot in self.toolChanger.slots:
-            # print("Slot: ", slot)
-            pass
-
-        # canvas = np.ones((720, 1280, 3), dtype=np.uint8) * 255  # Creates a 500x500 white canvas
+        """ROTATE CONTOURS TO ALIGN WITH THE X-AXIS"""
+        aligned = []
         for item in workpieces:
-            """ADD WORKPIECE GRIPPER TO GRIPPERS LIST"""
-            # Extract and store the gripper ID needed for the current workpieces.
-            grippers.append(int(item.gripperID.value))
-
-            """GET NESTING POSITION FOR WORKPIECE"""
-            # print("COUNT: ", count)
-            cnt = item.contour
+            cnt = item.contour.get("contour") if isinstance(item.contour, dict) else item.contour
             cntObject = Contour(cnt)
-            """ROTATE CONTOUR TO ALIGN WITH THE X-AXIS"""
             angle = cntObject.getOrientation()
-            angle = angle
-            # print("Nesting Angle: ", angle)
             centroid = cntObject.getCentroid()
             cntObject.rotate(-angle, centroid)
+            aligned.append((angle, centroid, cntObject.get_contour_points()))
+
+        """PLACE THE OUTLINES ON THE PLANE"""
+        engine = NestingEngine.fromPlane(plane)
+        result = engine.nest([outline for _, _, outline in aligned])
+        print(f"Nesting: {len(result.placements)}/{len(workpieces)} workpieces placed, {len(result.unplaced)} do "
+              f"not fit, utilisation {result.utilisation * 100:.1f} %, {result.elapsed * 1000:.0f} ms "
+              f"({result.layouts} layouts, {result.abandoned} abandoned at the time budget)")
+        if result.unplaced:
+            # Only parts that really do not fit - the first layout always tries every part
+            plane.isFull = True
 
-            """GET MINIMUM AREA RECTANGLE OF THE CONTOUR"""
-            minRect = cntObject.getMinAreaRect()
-            box = cv2.boxPoints(minRect)
-            box = np.intp(box)
-
-            """GET BOUNDING BOX CENTER AND DIMENSIONS"""
-            bboxCenter = (minRect[0][0], minRect[0][1])
-
-            # width = minRect[1][1]
-            # height = minRect[1][0]
-
-            width = minRect[1][0]
-            height = minRect[1][1]
-            if width < height:
-                temp = width
-                width = height
-                height = temp
-            # print(" bboxWidth: ", width)
-            # print(" bboxHeight: ", height)
-
-            """UPDATE HIGHEST CONTOUR HEIGHT ( IT IS USED FOR ROW SPACING)"""
-            if height > plane.tallestContour:
-                plane.tallestContour = height
-
-            """GET TARGET POINT FOR PLACING THE WORKPIECE"""
-            # Step 8: Compute the target placement point on the plane.
-            targetPointX = plane.xOffset + plane.xMin + (width / 2)
-            targetPointY = plane.yMax - plane.yOffset
-            # print(f"    Target point: ({targetPointX}, {targetPointY}")
-
-            """MOVE TO NEXT ROW IF THE CONTOUR EXCEEDS THE CANVAS WIDTH"""
-            if targetPointX + (width / 2) > plane.xMax:
-                # print(" The contour exceeds the canvas width. Moving to the next row.")
-
-                rowCount += 1  # Increment row counter
-                plane.xOffset = 0  # Reset xOffset for the new row
-                plane.yOffset += plane.tallestContour + 50  # Use only the tallest contour + fixed spacing
-
-                targetPointX = plane.xMin + (width / 2)  # Reset to the left
-                targetPointY = plane.yMax - plane.yOffset  # Move down
-                # print(" Target point after moving to the next row:", targetPointX, targetPointY)
-
-                # Reset the row's tallest contour tracking
-                plane.tallestContour = height
-
-                """CHECK IF THE CONTOUR EXCEEDS THE CANVAS HEIGHT"""
-                if targetPointY - (height / 2) < plane.yMin:
-                    plane.isFull = True
-                    # print(" The contour exceeds the canvas height.")
-                    break
-
-            # print(f"    bboxCenter: {bboxCenter}")
-            count += 1
-
-            """TRANSLATE THE CONTOUR TO THE TARGET POINT"""
-            cntObject.translate(targetPointX - bboxCenter[0], targetPointY - bboxCenter[1])
-            translated = cntObject.get_contour_points()
-
-            """GET THE TRANSLATED CONTOUR CENTER"""
-            newCentroid = cntObject.getCentroid()
-            # print(f"    New centroid: {newCentroid}")
+        grippers = []  # List of grippers
+        paths = []  # List of pick and place paths
+        for placement in result.placements:
+            item = workpieces[placement.index]
+            angle, centroid, _ = aligned[placement.index]
 
-            """"UPDATE THE xOffset FOR THE NEXT CONTOUR"""
-            plane.xOffset += width + plane.spacing  # Add horizontal spacing between contours
+            """ADD WORKPIECE GRIPPER TO GRIPPERS LIST"""
+            gripperId = int(item.gripperID.value)
+            grippers.append(gripperId)
 
             """ADD PICK AND PLACE PATH TO PATHS LIST"""
             moveHeight = self.pump.zOffset + item.height
-
-            gripperId = int(item.gripperID.value)
-            path = self._getNestingMoves(angle, centroid, newCentroid[0], newCentroid[1], moveHeight, gripperId)
+            path = self._getNestingMoves(angle, centroid, placement.centroid[0], placement.centroid[1], moveHeight,
+                                         gripperId, placement.rotation)
             paths.append(path)
-            # print(f"    Path: ", path)
 
         """EXECUTE NESTING TRAJECTORY"""
         # self.pickupGripper(0)
@@ -10,6 +10,9 @@ else:
     raise Exception("Unsupported OS")
 
 from enum import Enum
+
+from GlueDispensingApplication.robot.PathConditioner import MOVE_CIRCULAR
+from GlueDispensingApplication.robot.RobotRpcTransport import RobotRpcClient
 class TestRobotWrapper():
     """
        A mock wrapper class simulating robot control functionality for testing purposes.
@@ -25,6 +28,10 @@ class TestRobotWrapper():
         print("MoveL: ", position, tool, user, vel, acc, blendR)
         return position
 
+    def moveC(self, viaPosition, position, tool, user, vel, acc, blendR=-1.0):
+        print("MoveC: ", viaPosition, position, tool, user, vel, acc, blendR)
+        return position
+
     def getCurrentPosition(self):
         return [0, 0, 0, 0, 0, 0]
 
@@ -104,6 +111,9 @@ class RobotWrapper:
                """
         self.ip = ip
         self.robot = Robot.RPC(self.ip)
+        # Commands go over persistent keep-alive connections shared by every wrapper of this controller
+        self.rpcClient = RobotRpcClient.forAddress(self.ip)
+        self.robot.robot = self.rpcClient
 
         """overSpeedStrategy: over speed handling strategy
         0 - strategy off;
@@ -148,6 +158,76 @@ class RobotWrapper:
 
         return self.robot.MoveL(position, tool, user, vel=vel, acc=acc, blendR=blendR)
 
+    def moveC(self, viaPosition, position, tool, user, vel, acc, blendR=-1.0):
+        """
+              Executes a circular movement through a via point.
+
+              Args:
+                  viaPosition (list): Intermediate point on the arc.
+                  position (list): End point of the arc.
+                  tool (int): Tool frame ID.
+                  user (int): User frame ID.
+                  vel (float): Velocity.
+                  acc (float): Acceleration.
+                  blendR (float): Blend radius.
+
+              Returns:
+                  list: Result from robot circular move command.
+              """
+
+        return self.robot.MoveC(viaPosition, tool, user, position, tool, user,
+                                vel_p=vel, acc_p=acc, vel_t=vel, acc_t=acc, blendR=blendR)
+
+    def executeMoves(self, moves, tool, user, acc, blendR):
+        """
+              Sends a sequence of blended moves in as few round trips as possible: the inverse kinematics of
+              all points in one system.multicall batch, then all motion commands in one batch.
+
+              Args:
+                  moves (list): ((MOVE_LINEAR, point) or (MOVE_CIRCULAR, via, point), velocity) pairs.
+                  tool (int): Tool frame ID.
+                  user (int): User frame ID.
+                  acc (float): Acceleration.
+                  blendR (float): Blend radius (>= 0, the moves must not block).
+
+              Returns:
+                  int: 0 on success, otherwise the first error code.
+              """
+        if not Robot.RPC.is_conect:
+            return -4
+        poses = [list(map(float, pose)) for move, _ in moves for pose in move[1:]]
+        solutions = self.rpcClient.multicall([("GetInverseKin", (0, pose, -1)) for pose in poses])
+        for solution in solutions:
+            if solution[0] != 0:
+                return solution[0]
+        joints = iter([list(map(float, solution[1:7])) for solution in solutions])
+        poses = iter(poses)
+
+        calls = []
+        noAxis, noOffset = [0.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+        for move, velocity in moves:
+            params = [float(int(tool)), float(int(user)), float(velocity), float(acc)]
+            if move[0] == MOVE_CIRCULAR:
+                viaJoints, via, endJoints, end = next(joints), next(poses), next(joints), next(poses)
+                calls.append(("MoveC", (viaJoints, via, params, noAxis, 0, noOffset,
+                                        endJoints, end, params, noAxis, 0, noOffset, 100.0, float(blendR))))
+            else:
+                calls.append(("MoveL", (next(joints), next(poses), int(tool), int(user), float(velocity), float(acc),
+                                        100.0, float(blendR), noAxis, 0, 0, noOffset)))
+        for ret in self.rpcClient.multicall(calls):
+            if ret != 0:
+                return ret
+        return 0
+
+    def rpcMetrics(self):
+        """
+              Latency statistics of the controller RPC calls.
+
+              Returns:
+                  dict: Per method count and latency percentiles in ms.
+              """
+        return self.rpcClient.metrics()
+
     def getCurrentPosition(self):
         """
               Retrieves the current TCP (tool center point) position.
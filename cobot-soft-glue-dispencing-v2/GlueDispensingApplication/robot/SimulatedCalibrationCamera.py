@@ -0,0 +1,125 @@
+import time
+
+import cv2
+import numpy as np
+
+from GlueDispensingApplication.robot.RobotConfig import ROBOT_TOOL, ROBOT_USER
+
+"""
+SimulatedCalibrationCamera
+--------------------------
+Synthetic marker images for offline testing of the camera to robot calibration.
+
+SimulatedMarkerCamera renders the table ArUco markers as seen by the camera on the robot: a ground
+truth homography maps the calibration pose image to robot xy, and a camera moved by d sees the table
+moved by -d. Frames are produced at the camera frame rate from the current pose of the robot, with
+sensor noise. stopAndLookCalibration is the previous way of collecting the points (fresh detector,
+skipped frames after every move, full frame search, plain least squares) used as the baseline.
+"""
+
+SIM_CAMERA_SIZE = (1280, 720)
+SIM_CAMERA_FPS = 30
+SIM_MARKER_SIZE = 40.0  # mm, printed marker side
+SIM_MARKER_PIXELS = 120  # resolution of the rendered marker texture
+SIM_NOISE = 4.0  # gray level standard deviation
+
+
+class SimulatedMarkerCamera:
+    """
+    Camera mounted on a (simulated) robot looking at ArUco markers on the table.
+
+    Attributes:
+        robot: Robot wrapper providing getCurrentPosition.
+        markerPoints (dict): {marker id: (x, y)} true robot xy of the marker centers.
+        matrix (np.ndarray): Ground truth calibration pose pixel to robot xy homography.
+        calibrationPose (list): Pose the ground truth homography is valid for.
+    """
+
+    def __init__(self, robot, markerPoints, matrix, calibrationPose, size=SIM_CAMERA_SIZE, fps=SIM_CAMERA_FPS,
+                 markerSize=SIM_MARKER_SIZE, dictionary=cv2.aruco.DICT_4X4_250, noise=SIM_NOISE, seed=None):
+        self.robot = robot
+        self.markerPoints = markerPoints
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+        self.inverse = np.linalg.inv(self.matrix)
+        self.calibrationPose = list(calibrationPose)
+        self.size = size
+        self.period = 1.0 / fps
+        self.markerSize = markerSize
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        arucoDict = cv2.aruco.getPredefinedDictionary(dictionary)
+        self.textures = {}
+        for markerId in markerPoints:
+            texture = cv2.aruco.generateImageMarker(arucoDict, int(markerId), SIM_MARKER_PIXELS)
+            self.textures[markerId] = texture
+        self._frameIndex = None
+        self._frame = None
+
+    def render(self, pose):
+        """Renders the view from a robot pose."""
+        offset = np.asarray(pose[:2], dtype=float) - np.asarray(self.calibrationPose[:2], dtype=float)
+        frame = np.full((self.size[1], self.size[0]), 255, dtype=np.uint8)
+        half = self.markerSize / 2
+        src = np.float32([[0, 0], [SIM_MARKER_PIXELS, 0], [SIM_MARKER_PIXELS, SIM_MARKER_PIXELS],
+                          [0, SIM_MARKER_PIXELS]])
+        for markerId, (x, y) in self.markerPoints.items():
+            # Marker corners in robot xy (texture x along +x, texture y along -y) seen from the moved camera
+            corners = np.array([[x - half, y + half], [x + half, y + half], [x + half, y - half],
+                                [x - half, y - half]]) - offset
+            pixels = cv2.perspectiveTransform(corners.reshape(-1, 1, 2), self.inverse).reshape(-1, 2)
+            if np.any(pixels < 0) or np.any(pixels[:, 0] >= self.size[0]) or np.any(pixels[:, 1] >= self.size[1]):
+                continue
+            warp = cv2.getPerspectiveTransform(src, pixels.astype(np.float32))
+            marker = cv2.warpPerspective(self.textures[markerId], warp, self.size, flags=cv2.INTER_LINEAR,
+                                         borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+            mask = cv2.warpPerspective(np.full_like(self.textures[markerId], 255), warp, self.size)
+            frame = np.where(mask > 0, marker, frame)
+        if self.noise > 0:
+            frame = np.clip(frame + self.rng.normal(0, self.noise, frame.shape), 0, 255).astype(np.uint8)
+        return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+    def getLatestFrame(self):
+        """Returns the newest frame (one render per frame period)."""
+        index = int(time.monotonic() / self.period)
+        if index != self._frameIndex:
+            self._frame = self.render(self.robot.getCurrentPosition())
+            self._frameIndex = index
+        return self._frame
+
+    def waitNextFrame(self):
+        """Blocks until the next frame and returns it."""
+        time.sleep(self.period - time.monotonic() % self.period)
+        return self.getLatestFrame()
+
+
+def stopAndLookCalibration(robot, camera, markerPoints, grid, calibrationPose, skipFrames=5, vel=50, acc=50):
+    """
+    Baseline: every grid pose, waits until idle, skips frames, creates a new detector, searches the full
+    frame; fits the homography by least squares once all poses are visited.
+
+    Returns:
+        np.ndarray: Camera to robot homography.
+    """
+    cameraPoints, robotPoints = [], []
+    for offset in grid:
+        pose = list(calibrationPose)
+        pose[0] += offset[0]
+        pose[1] += offset[1]
+        robot.moveCart(pose, ROBOT_TOOL, ROBOT_USER, vel=vel, acc=acc)
+        robot.waitUntilIdle()
+        for _ in range(skipFrames):
+            frame = camera.waitNextFrame()
+        detector = cv2.aruco.ArucoDetector(cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250),
+                                           cv2.aruco.DetectorParameters())
+        corners, ids, _ = detector.detectMarkers(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+        if ids is None:
+            continue
+        for markerId, corner in zip(ids.flatten(), corners):
+            if int(markerId) in markerPoints:
+                cameraPoints.append(corner.reshape(4, 2).mean(axis=0))
+                robotPoints.append(np.asarray(markerPoints[int(markerId)], dtype=float) - offset)
+    robot.moveCart(list(calibrationPose), ROBOT_TOOL, ROBOT_USER, vel=vel, acc=acc)
+    robot.waitUntilIdle()
+    matrix, _ = cv2.findHomography(np.asarray(cameraPoints), np.asarray(robotPoints), 0)
+    return matrix
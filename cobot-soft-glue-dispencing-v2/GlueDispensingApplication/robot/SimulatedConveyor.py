@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+
+from GlueDispensingApplication.robot.ConveyorTracker import BELT_AXIS, BELT_COUNTS_PER_MM, BELT_COUNTER_BITS
+
+"""
+SimulatedConveyor
+-----------------
+Simulated belt and camera for offline testing of the conveyor tracking.
+
+SimulatedBelt behaves like the Modbus client of the belt encoder (read(register) returns the signed,
+wrapping counter), so it can be passed to ModbusBeltEncoder unchanged. SimulatedBeltCamera returns
+the part contours (robot mm) moved with the belt together with the capture timestamp.
+Both use an injectable clock, e.g. the simulated time of SimulatedRobotWrapper.
+"""
+
+
+class SimulatedBelt:
+    """
+    Belt moving with constant velocity plus optional speed ripple.
+
+    Attributes:
+        velocity (float): Belt velocity in mm/s.
+        ripple (float): Relative amplitude of a 1 Hz speed ripple.
+        clock (callable): Time source.
+    """
+
+    def __init__(self, velocity=50.0, countsPerMm=BELT_COUNTS_PER_MM, bits=BELT_COUNTER_BITS, ripple=0.0,
+                 startCounts=0, clock=time.monotonic):
+        self.velocity = velocity
+        self.countsPerMm = countsPerMm
+        self.modulus = 1 << bits
+        self.ripple = ripple
+        self.startCounts = startCounts
+        self.clock = clock
+        self.startTime = clock()
+
+    def position(self, timestamp=None):
+        """True belt position in mm."""
+        t = (self.clock() if timestamp is None else timestamp) - self.startTime
+        return self.velocity * (t + self.ripple / (2 * np.pi) * (1 - np.cos(2 * np.pi * t)))
+
+    def read(self, register=None):
+        """Encoder counter as a signed register value (wraps like the real counter)."""
+        counts = int(round(self.position() * self.countsPerMm)) + self.startCounts
+        half = self.modulus // 2
+        return (counts + half) % self.modulus - half
+
+
+class SimulatedBeltCamera:
+    """
+    Camera looking at parts on the belt.
+
+    Attributes:
+        belt (SimulatedBelt): The belt carrying the parts.
+        parts (list): Part contours (N, 2) in robot mm at belt position 0.
+        axis (np.ndarray): Belt direction in the robot frame.
+    """
+
+    def __init__(self, belt, parts, axis=BELT_AXIS):
+        self.belt = belt
+        self.parts = [np.asarray(p, dtype=float) for p in parts]
+        self.axis = np.asarray(axis, dtype=float)[:2]
+
+    def capture(self):
+        """Returns (contours, timestamp) of a frame taken now."""
+        timestamp = self.belt.clock()
+        offset = self.belt.position(timestamp) * self.axis
+        return [p + offset for p in self.parts], timestamp
+
+
+def _polylineDistance(point, polyline):
+    a, b = polyline[:-1], polyline[1:]
+    ab = b - a
+    t = np.clip(np.sum((point - a) * ab, axis=1) / np.maximum(np.sum(ab * ab, axis=1), 1e-12), 0.0, 1.0)
+    return float(np.min(np.linalg.norm(a + t[:, None] * ab - point, axis=1)))
+
+
+if __name__ == "__main__":
+    from GlueDispensingApplication.robot.ConveyorTracker import ConveyorTracker, ModbusBeltEncoder
+    from GlueDispensingApplication.robot.SimulatedRobotWrapper import SimulatedRobotWrapper
+    from GlueDispensingApplication.robot.VelocityProfiler import VelocityProfiler
+
+    part = np.array([[0, 300], [120, 300], [120, 380], [0, 380], [0, 300]], dtype=float)
+    velocity, acceleration = 10, 30  # SDK % (100 mm/s spray speed)
+
+    for tracking in (False, True):
+        robot = SimulatedRobotWrapper(startPosition=[-100, 250, 150, 180, 0, 0], timeScale=4, publishState=False)
+        clock = lambda: robot.getState()["time"]
+        belt = SimulatedBelt(velocity=40.0, ripple=0.05, startCounts=32000, clock=clock)
+        camera = SimulatedBeltCamera(belt, [part])
+        tracker = ConveyorTracker(ModbusBeltEncoder(belt), clock=clock)
+        tracker.start()
+        time.sleep(0.1)
+
+        contours, captured = camera.capture()
+        tracker.registerDetection(captured)
+        path = [[x, y, 100, 180, 0, 0] for x, y in contours[0]]
+        profile = VelocityProfiler().plan(path, velocity, acceleration)
+
+        # Approach the start point where it will be, then trace
+        approachTime = 1.5
+        start = tracker.shiftPoses([path[0]], [clock() + approachTime])[0].tolist() if tracking else path[0]
+        robot.moveL(start, 0, 0, vel=30, acc=30, blendR=0)
+        robot.waitUntilIdle()
+        if tracking:
+            poses, percents = tracker.trackPath(path, profile.speeds)
+        else:
+            poses, percents = path, profile.velocityPercent.tolist()
+        for pose, percent in zip(poses[1:], percents):
+            robot.moveL(pose, 0, 0, vel=percent, acc=acceleration, blendR=1)
+
+        # Position of the nozzle relative to the part while spraying
+        partFrame = np.asarray(contours[0])
+        errors = []
+        while robot.getState()["moving"]:
+            state = robot.getState()
+            relative = np.asarray(state["pose"][:2]) - (belt.position(state["time"]) - belt.position(captured)) \
+                       * np.asarray(BELT_AXIS[:2])
+            errors.append(_polylineDistance(relative, partFrame))
+            time.sleep(0.005)
+        tracker.stop()
+        robot.shutdown()
+        print(f"tracking={tracking}: belt {tracker.velocity():.1f} mm/s estimated (true ~40), "
+              f"path error mean {np.mean(errors):.2f} mm, max {np.max(errors):.2f} mm")
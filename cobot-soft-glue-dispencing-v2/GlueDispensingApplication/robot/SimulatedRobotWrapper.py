@@ -0,0 +1,364 @@
+import math
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from API.MessageBroker import MessageBroker
+from GlueDispensingApplication.robot.RobotConfig import (ROBOT_MAX_LINEAR_VELOCITY, ROBOT_MAX_LINEAR_ACCELERATION,
+                                                         HOME_POS)
+from GlueDispensingApplication.robot.CycleTimeEstimator import cornerSpeedLimits
+from GlueDispensingApplication.robot.PathConditioner import circleThroughPoints, MOVE_CIRCULAR
+
+""" SIMULATOR DEFAULTS """
+SIM_CONTROL_RATE_HZ = 250  # motion integration rate (wall clock)
+SIM_STATE_PUBLISH_HZ = 50  # rate of the realtime state stream (wall clock)
+SIM_ERROR_DISABLED = 14  # returned by motion commands while the robot is disabled
+SIM_SDK_VERSION = ["Simulator", "FR-SIM"]
+
+
+class _TrapezoidProfile:
+    """
+    Trapezoidal velocity profile over a segment of length `length` starting at `vIn` and ending at `vOut`.
+    """
+
+    def __init__(self, length, vIn, vOut, velocity, acceleration):
+        a = max(acceleration, 1e-6)
+        vOut = min(vOut, math.sqrt(vIn ** 2 + 2 * a * length))
+        if vIn > math.sqrt(vOut ** 2 + 2 * a * length):
+            # Entry speed too high to stop in time - end the segment as slow as possible
+            vOut = math.sqrt(max(0.0, vIn ** 2 - 2 * a * length))
+
+        peak = min(velocity, math.sqrt((2 * a * length + vIn ** 2 + vOut ** 2) / 2.0))
+        peak = max(peak, vIn, vOut)
+
+        self.a = a
+        self.vIn, self.vOut, self.peak = vIn, vOut, peak
+        self.d1 = (peak ** 2 - vIn ** 2) / (2 * a)
+        self.d3 = (peak ** 2 - vOut ** 2) / (2 * a)
+        self.d2 = max(0.0, length - self.d1 - self.d3)
+        self.t1 = (peak - vIn) / a
+        self.t2 = self.d2 / peak if peak > 1e-9 else 0.0
+        self.t3 = (peak - vOut) / a
+        self.length = length
+        self.duration = self.t1 + self.t2 + self.t3
+
+    def at(self, t):
+        """Returns (distance, speed) at time t."""
+        if t <= 0:
+            return 0.0, self.vIn
+        if t < self.t1:
+            return self.vIn * t + 0.5 * self.a * t * t, self.vIn + self.a * t
+        t -= self.t1
+        if t < self.t2:
+            return self.d1 + self.peak * t, self.peak
+        t -= self.t2
+        if t < self.t3:
+            return self.d1 + self.d2 + self.peak * t - 0.5 * self.a * t * t, self.peak - self.a * t
+        return self.length, self.vOut
+
+
+def _orientationDelta(start, end):
+    """Shortest angular difference (degrees) per orientation axis."""
+    return [((e - s + 180.0) % 360.0) - 180.0 for s, e in zip(start, end)]
+
+
+class _LinearSegment:
+    def __init__(self, start, end):
+        self.start = np.asarray(start[:3], dtype=float)
+        self.end = np.asarray(end[:3], dtype=float)
+        self.orientation = list(start[3:6])
+        self.rotation = _orientationDelta(start[3:6], end[3:6])
+        self.endPose = list(end)
+        self.length = float(np.linalg.norm(self.end - self.start))
+
+    def direction(self):
+        return (self.end - self.start) / self.length if self.length > 1e-9 else np.zeros(3)
+
+    def poseAt(self, s):
+        f = s / self.length if self.length > 1e-9 else 1.0
+        xyz = self.start + f * (self.end - self.start)
+        rot = [o + f * d for o, d in zip(self.orientation, self.rotation)]
+        return list(xyz) + rot
+
+
+class _ArcSegment(_LinearSegment):
+    def __init__(self, start, via, end):
+        super().__init__(start, end)
+        circle = circleThroughPoints(self.start, np.asarray(via[:3], dtype=float), self.end)
+        if circle is None:
+            # Collinear via point - the arc degenerates to a line
+            self.center = None
+            return
+        self.center, self.radius, normal = circle
+        self.e1 = (self.start - self.center) / self.radius
+        self.e2 = np.cross(normal, self.e1)
+
+        def angle(p):
+            rel = np.asarray(p[:3], dtype=float) - self.center
+            return math.atan2(rel @ self.e2, rel @ self.e1) % (2 * math.pi)
+
+        # With e2 = normal x e1 the arc start -> via -> end runs in the positive direction
+        self.sweep = angle(end) or 2 * math.pi
+        self.length = self.radius * self.sweep
+
+    def direction(self):
+        if self.center is None:
+            return super().direction()
+        return self.e2
+
+    def poseAt(self, s):
+        if self.center is None:
+            return super().poseAt(s)
+        f = s / self.length if self.length > 1e-9 else 1.0
+        theta = f * self.sweep
+        xyz = self.center + self.radius * (math.cos(theta) * self.e1 + math.sin(theta) * self.e2)
+        rot = [o + f * d for o, d in zip(self.orientation, self.rotation)]
+        return list(xyz) + rot
+
+
+class SimulatedRobotWrapper:
+    """
+    Kinematic robot simulator implementing the RobotWrapper interface.
+
+    Motion commands are queued and executed by a background thread that integrates a trapezoidal
+    velocity profile per segment. Consecutive blended moves (blendR > 0) carry the corner speed
+    through the junction, otherwise the robot stops at every point. The simulated state is exposed
+    through `getCurrentPosition` / `getCurrentLinerSpeed` like the real controller and streamed on
+    `stateTopic`.
+
+    `timeScale` runs the simulation faster than realtime (e.g. 10 = ten times faster), so whole
+    spray programs can be exercised and timed without hardware. All reported times and speeds are
+    in simulated time.
+
+    Attributes:
+        timeScale (float): Simulated seconds per wall clock second.
+        maxVelocity (float): Velocity of vel=100 % in mm/s.
+        maxAcceleration (float): Acceleration of acc=100 % in mm/s^2.
+    """
+
+    def __init__(self, startPosition=None, timeScale=1.0, rateHz=SIM_CONTROL_RATE_HZ,
+                 maxVelocity=ROBOT_MAX_LINEAR_VELOCITY, maxAcceleration=ROBOT_MAX_LINEAR_ACCELERATION,
+                 publishState=True):
+        self.timeScale = float(timeScale)
+        self.period = 1.0 / rateHz
+        self.maxVelocity = maxVelocity
+        self.maxAcceleration = maxAcceleration
+
+        self.stateTopic = "robot/simulator/state"
+        self.broker = MessageBroker()
+        self.publishState = publishState
+
+        self.enabled = True
+        self.digitalOutputs = {}
+        self.commandCount = 0
+
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._active = None  # (segment, profile, elapsed)
+        self._pose = list(startPosition if startPosition is not None else HOME_POS)
+        self._commandedPose = list(self._pose)
+        self._speed = 0.0
+        self._simTime = 0.0
+        self._idle = threading.Event()
+        self._idle.set()
+
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    """ MOTION COMMANDS """
+
+    def _toMotion(self, vel, acc):
+        velocity = max(float(vel), 1e-3) / 100.0 * self.maxVelocity
+        acceleration = max(float(acc), 1e-3) / 100.0 * self.maxAcceleration
+        return velocity, acceleration
+
+    def _enqueue(self, kind, position, via, vel, acc, blendR):
+        if not self.enabled:
+            return SIM_ERROR_DISABLED
+        velocity, acceleration = self._toMotion(vel, acc)
+        with self._lock:
+            start = self._commandedPose
+            if kind == "C":
+                segment = _ArcSegment(start, via, position)
+            else:
+                segment = _LinearSegment(start, position)
+            self._queue.append((segment, velocity, acceleration, blendR))
+            self._commandedPose = list(position)
+            self.commandCount += 1
+            self._idle.clear()
+        return 0
+
+    def moveCart(self, position, tool, user, vel=100, acc=30):
+        # Point to point moves are simulated as linear moves that stop at the target
+        return self._enqueue("L", position, None, vel, acc, 0)
+
+    def moveL(self, position, tool, user, vel, acc, blendR):
+        return self._enqueue("L", position, None, vel, acc, blendR)
+
+    def moveC(self, viaPosition, position, tool, user, vel, acc, blendR=-1.0):
+        return self._enqueue("C", position, viaPosition, vel, acc, blendR)
+
+    def executeMoves(self, moves, tool, user, acc, blendR):
+        for move, velocity in moves:
+            if move[0] == MOVE_CIRCULAR:
+                ret = self.moveC(move[1], move[2], tool, user, velocity, acc, blendR)
+            else:
+                ret = self.moveL(move[1], tool, user, velocity, acc, blendR)
+            if ret != 0:
+                return ret
+        return 0
+
+    def startJog(self, axis, direction, step, vel, acc):
+        target = list(self._commandedPose)
+        sign = 1 if direction.value == 1 else -1
+        target[axis.value - 1] += sign * step
+        return self._enqueue("L", target, None, vel, acc, 0)
+
+    def stopMotion(self):
+        """Stops immediately and drops all queued motion."""
+        with self._lock:
+            self._queue.clear()
+            self._active = None
+            self._speed = 0.0
+            self._commandedPose = list(self._pose)
+            self._idle.set()
+        return 0
+
+    """ STATE """
+
+    def getCurrentPosition(self):
+        with self._lock:
+            return list(self._pose)
+
+    def getCurrentLinerSpeed(self):
+        with self._lock:
+            return 0, [self._speed, 0.0]
+
+    def getCurrentLinierSpeed(self):
+        return self.getCurrentLinerSpeed()
+
+    def getState(self):
+        """
+        Returns a snapshot of the simulated state.
+
+        Returns:
+            dict: pose, speed (mm/s), simulated time (s), queued commands and moving flag.
+        """
+        with self._lock:
+            return {
+                "pose": list(self._pose),
+                "speed": self._speed,
+                "time": self._simTime,
+                "queued": len(self._queue),
+                "moving": self._active is not None or bool(self._queue),
+            }
+
+    def waitUntilIdle(self, timeout=None):
+        """Blocks until all queued motion has finished. Returns False on timeout."""
+        return self._idle.wait(timeout)
+
+    """ TOOL / IO """
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.stopMotion()
+        self.enabled = False
+
+    def printSdkVersion(self):
+        print(SIM_SDK_VERSION)
+        return SIM_SDK_VERSION
+
+    def setDigitalOutput(self, portId, value):
+        self.digitalOutputs[portId] = value
+        return 0
+
+    def resetAllErrors(self):
+        return 0
+
+    """ SIMULATION LOOP """
+
+    def _startNext(self):
+        segment, velocity, acceleration, blendR = self._queue.popleft()
+        vOut = 0.0
+        if blendR > 0 and self._queue:
+            nextSegment, nextVelocity, nextAcceleration, _ = self._queue[0]
+            corner = [segment.start, segment.end, segment.end + nextSegment.direction()
+                      * max(nextSegment.length, 1e-6)]
+            vOut = float(cornerSpeedLimits(corner, min(velocity, nextVelocity),
+                                           min(acceleration, nextAcceleration), blendR)[1])
+        profile = _TrapezoidProfile(segment.length, self._speed, vOut, velocity, acceleration)
+        self._active = [segment, profile, 0.0]
+
+    def step(self, dt):
+        """Advances the simulation by dt simulated seconds."""
+        with self._lock:
+            self._simTime += dt
+            while dt > 0:
+                if self._active is None:
+                    if not self._queue:
+                        self._speed = 0.0
+                        self._idle.set()
+                        return
+                    self._startNext()
+                segment, profile, elapsed = self._active
+                elapsed += dt
+                if elapsed >= profile.duration:
+                    dt = elapsed - profile.duration
+                    self._pose = list(segment.endPose)
+                    self._speed = profile.vOut
+                    self._active = None
+                else:
+                    s, self._speed = profile.at(elapsed)
+                    self._pose = segment.poseAt(s)
+                    self._active[2] = elapsed
+                    dt = 0
+
+    def run(self):
+        nextTick = time.monotonic()
+        lastPublish = nextTick
+        publishPeriod = 1.0 / SIM_STATE_PUBLISH_HZ
+        while not self._stop_event.is_set():
+            self.step(self.period * self.timeScale)
+
+            now = time.monotonic()
+            if self.publishState and now - lastPublish >= publishPeriod:
+                self.broker.publish(self.stateTopic, self.getState())
+                lastPublish = now
+
+            nextTick += self.period
+            delay = nextTick - time.monotonic()
+            if delay < 0:
+                nextTick = time.monotonic()
+                continue
+            self._stop_event.wait(delay)
+
+    def shutdown(self):
+        self._stop_event.set()
+        self._thread.join(timeout=1)
+
+
+if __name__ == "__main__":
+    from GlueDispensingApplication.robot.CycleTimeEstimator import CycleTimeEstimator
+
+    square = [[0, 0, 100, 180, 0, 0], [200, 0, 100, 180, 0, 0], [200, 200, 100, 180, 0, 0],
+              [0, 200, 100, 180, 0, 0], [0, 0, 100, 180, 0, 0]]
+    estimator = CycleTimeEstimator(calibrationPath=None, logPath=None)
+
+    for blendR in (0, 1, 10):
+        robot = SimulatedRobotWrapper(startPosition=square[0], timeScale=20, publishState=False)
+        t0 = time.perf_counter()
+        simStart = robot.getState()["time"]
+        for point in square[1:]:
+            robot.moveL(point, 0, 0, vel=30, acc=30, blendR=blendR)
+        robot.waitUntilIdle()
+        wall = time.perf_counter() - t0
+        simulated = robot.getState()["time"] - simStart
+        estimated = estimator.motionTime(square, 30, 30, blendR)
+        robot.shutdown()
+        print(f"blendR={blendR}: simulated {simulated:.2f} s (wall {wall:.2f} s), estimated {estimated:.2f} s, "
+              f"end pose {[round(v, 3) for v in robot.getCurrentPosition()[:3]]}")
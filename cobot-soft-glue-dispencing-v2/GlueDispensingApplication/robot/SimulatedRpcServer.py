@@ -0,0 +1,116 @@
+import socketserver
+import threading
+import time
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+"""
+SimulatedRpcServer
+------------------
+Local XML-RPC stand-in for the robot controller (port 20003 interface of the fairino SDK).
+
+Implements the methods the app uses for motion (GetInverseKin, MoveL, MoveC, MoveCart), state
+(GetActualTCPPose, GetControllerIP) and system.multicall, speaks HTTP/1.1 so connections can be kept
+alive, and adds a configurable processing delay per HTTP request to stand in for the network round
+trip and the controller's request handling. Used to measure the transport without hardware.
+"""
+
+SIM_RPC_REQUEST_DELAY = 0.001  # seconds per HTTP request
+
+
+class _KeepAliveHandler(SimpleXMLRPCRequestHandler):
+    protocol_version = "HTTP/1.1"
+    rpc_paths = ("/RPC2", "/")
+
+    def do_POST(self):
+        time.sleep(self.server.requestDelay)
+        self.server.requests += 1
+        super().do_POST()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping broken connections are expected in the transport measurements
+        self.errors += 1
+
+
+class SimulatedRpcServer:
+    """
+    Threaded XML-RPC controller stand-in.
+
+    Attributes:
+        port (int): Bound port (0 picks a free one).
+        requests (int): HTTP requests served.
+        commands (int): Motion commands received.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, requestDelay=SIM_RPC_REQUEST_DELAY, multicall=True):
+        self.server = _ThreadingServer((host, port), requestHandler=_KeepAliveHandler, logRequests=False,
+                                       allow_none=False)
+        self.server.requestDelay = requestDelay
+        self.server.requests = 0
+        self.server.errors = 0
+        self.host, self.port = self.server.server_address
+        self.commands = 0
+        self.pose = [0.0, 300.0, 300.0, 180.0, 0.0, 0.0]
+        self._lock = threading.Lock()
+
+        self.server.register_function(self.GetControllerIP, "GetControllerIP")
+        self.server.register_function(self.GetInverseKin, "GetInverseKin")
+        self.server.register_function(self.MoveL, "MoveL")
+        self.server.register_function(self.MoveC, "MoveC")
+        self.server.register_function(self.MoveCart, "MoveCart")
+        self.server.register_function(self.GetActualTCPPose, "GetActualTCPPose")
+        if multicall:
+            self.server.register_multicall_functions()
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    @property
+    def uri(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    """ CONTROLLER METHODS """
+
+    def GetControllerIP(self):
+        return [0, self.host]
+
+    def GetInverseKin(self, type, desc_pos, config):
+        # Any deterministic joint solution will do for transport measurements
+        return [0] + [float(v) * 0.1 for v in desc_pos[:6]]
+
+    def _command(self, pose):
+        with self._lock:
+            self.commands += 1
+            self.pose = list(pose)
+        return 0
+
+    def MoveL(self, joint_pos, desc_pos, tool, user, vel, acc, ovl, blendR, exaxis_pos, search, offset_flag,
+              offset_pos):
+        return self._command(desc_pos)
+
+    def MoveC(self, joint_pos_p, desc_pos_p, params_p, exaxis_pos_p, offset_flag_p, offset_pos_p, joint_pos_t,
+              desc_pos_t, params_t, exaxis_pos_t, offset_flag_t, offset_pos_t, ovl, blendR):
+        return self._command(desc_pos_t)
+
+    def MoveCart(self, desc_pos, tool, user, vel, acc, ovl, blendT, config):
+        return self._command(desc_pos)
+
+    def GetActualTCPPose(self, flag):
+        with self._lock:
+            return [0] + list(self.pose)
@@ -0,0 +1,445 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from API.shared.settings.conreateSettings.enums.GlueSettingKey import GlueSettingKey
+from API.shared.settings.conreateSettings.enums.RobotSettingKey import RobotSettingKey
+from GlueDispensingApplication.robot.FillPathGenerator import generateFillPaths, FILL_SPACING
+from GlueDispensingApplication.robot.PathConditioner import PathConditioner
+from GlueDispensingApplication.robot.VelocityProfiler import VelocityProfiler
+from GlueDispensingApplication.vision.CoordinateTransformService import CoordinateTransformService
+
+"""
+SprayProgramCompiler
+--------------------
+Precompiled, per-workpiece spray programs.
+
+Every cycle used to rebuild the paths of every matched part from scratch: rotate and translate all
+spray pattern contours, transform them to robot coordinates, condition them and generate the raster
+fills. All of that only depends on the stored workpiece and the calibration, so it is compiled once
+into a program in the workpiece's own (stored camera) frame:
+    - ordered paths (spray contours, fill passes or the outer contour when there is no pattern),
+      already conditioned in robot millimetres,
+    - z / rz, the planned velocity and pump speed per segment and the tool on / off events per path.
+The program is persisted next to the workpiece file. At runtime only the pose of the matched part
+(3x3 matrix) is composed with the homography and applied to all points in one transformation.
+
+A program is recompiled when the workpiece geometry / settings or the calibration matrix change.
+"""
+
+PROGRAM_FILE_SUFFIX = "_program.json"
+PROGRAM_VERSION = 1
+
+PATH_CONTOUR = "contour"
+PATH_FILL = "fill"
+PATH_OUTLINE = "outline"  # outer contour used when the workpiece has no spray pattern
+
+EVENT_TOOL_ON = "tool_on"
+EVENT_TOOL_OFF = "tool_off"
+
+DEFAULT_HEIGHT = 125.0
+DEFAULT_VELOCITY = 30.0
+DEFAULT_ACCELERATION = 30.0
+
+
+def alignmentMatrix(angle, pivot, translation):
+    """
+    Pose of a matched part in the camera frame: rotation by `angle` degrees (CCW, same formula as
+    Contour.rotate) around `pivot` followed by `translation`.
+
+    Returns:
+        np.ndarray: 3x3 homogeneous matrix.
+    """
+    theta = np.radians(float(angle))
+    c, s = np.cos(theta), np.sin(theta)
+    px, py = float(pivot[0]), float(pivot[1])
+    tx, ty = float(translation[0]), float(translation[1])
+    return np.array([[c, -s, px - c * px + s * py + tx],
+                     [s, c, py - s * px - c * py + ty],
+                     [0.0, 0.0, 1.0]])
+
+
+def pathHeightAndRz(settings):
+    """Z height and RZ angle of a path"""
+    z_height = float(settings.get(GlueSettingKey.SPRAYING_HEIGHT, DEFAULT_HEIGHT))
+    rz_angle = float(settings.get(GlueSettingKey.RZ_ANGLE, 0))
+    return z_height, rz_angle
+
+
+def _toPoints(contour):
+    return np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+
+
+def _patternEntries(workpiece, key):
+    """Non-empty entries of the workpiece spray pattern as (points, settings)."""
+    pattern = workpiece.sprayPattern if isinstance(workpiece.sprayPattern, dict) else {}
+    entries = []
+    for entry in pattern.get(key, []):
+        contour = entry.get("contour")
+        if contour is not None and len(contour) > 0:
+            entries.append((_toPoints(contour), dict(entry.get("settings", {}))))
+    return entries
+
+
+def _outline(workpiece):
+    if isinstance(workpiece.contour, dict):
+        contour, settings = workpiece.contour.get("contour"), dict(workpiece.contour.get("settings", {}))
+    else:
+        contour, settings = workpiece.contour, {}
+    if contour is None or len(contour) == 0:
+        return None, settings
+    points = _toPoints(contour)
+    if not np.array_equal(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+    return points, settings
+
+
+def _hashArray(digest, array):
+    digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+
+
+def workpieceFingerprint(workpiece):
+    """Hash of everything a compiled program depends on in the workpiece (geometry and settings)."""
+    digest = hashlib.sha1()
+    outline, settings = _outline(workpiece)
+    if outline is not None:
+        _hashArray(digest, outline)
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    for key in ("Contour", "Fill"):
+        digest.update(key.encode())
+        for points, entrySettings in _patternEntries(workpiece, key):
+            _hashArray(digest, points)
+            digest.update(json.dumps(entrySettings, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def matrixFingerprint(matrix):
+    if matrix is None:
+        return None
+    return hashlib.sha1(np.round(np.asarray(matrix, dtype=np.float64), 9).tobytes()).hexdigest()
+
+
+class CompiledPath:
+    """
+    One path of a compiled program.
+
+    Attributes:
+        kind (str): PATH_CONTOUR, PATH_FILL or PATH_OUTLINE.
+        points (np.ndarray): Conditioned points (N, 2) in the workpiece frame (camera pixels).
+        settings (dict): Settings of the spray pattern entry.
+        height (float): Z of the path.
+        rz (float): RZ angle of the path.
+        velocityPercent (np.ndarray): Planned velocity per segment (SDK %).
+        pumpSpeeds (np.ndarray): Planned pump speed per segment.
+        events (list): Tool events {"type", "index", "time"}; time is relative to the motion at the point.
+    """
+
+    def __init__(self, kind, points, settings, height, rz, velocityPercent, pumpSpeeds, events):
+        self.kind = kind
+        self.points = points
+        self.settings = settings
+        self.height = height
+        self.rz = rz
+        self.velocityPercent = velocityPercent
+        self.pumpSpeeds = pumpSpeeds
+        self.events = events
+
+    def toDict(self):
+        return {
+            "kind": self.kind,
+            "points": self.points.tolist(),
+            "settings": self.settings,
+            "height": self.height,
+            "rz": self.rz,
+            "velocity_percent": self.velocityPercent.tolist(),
+            "pump_speeds": self.pumpSpeeds.tolist(),
+            "events": self.events,
+        }
+
+    @staticmethod
+    def fromDict(data):
+        return CompiledPath(data["kind"], np.asarray(data["points"], dtype=np.float64).reshape(-1, 2),
+                            data["settings"], float(data["height"]), float(data["rz"]),
+                            np.asarray(data["velocity_percent"], dtype=float),
+                            np.asarray(data["pump_speeds"], dtype=int), data["events"])
+
+
+class SprayProgram:
+    """
+    Spray program of one workpiece in its own frame.
+
+    Attributes:
+        workpieceId: Id of the workpiece.
+        fingerprint (str): Workpiece fingerprint the program was compiled from.
+        matrixFingerprint (str): Fingerprint of the calibration matrix used for compilation.
+        paths (list): CompiledPath's in execution order.
+    """
+
+    def __init__(self, workpieceId, fingerprint, matrixFingerprint, paths):
+        self.workpieceId = workpieceId
+        self.fingerprint = fingerprint
+        self.matrixFingerprint = matrixFingerprint
+        self.paths = paths
+
+    def toRobotPaths(self, poseMatrix, transformService):
+        """
+        Instantiates the program for a matched part.
+
+        Args:
+            poseMatrix (np.ndarray): 3x3 pose of the part in the camera frame (see alignmentMatrix).
+            transformService (CoordinateTransformService): Camera to robot transformation.
+
+        Returns:
+            list: (robot_path, settings) tuples as expected by RobotService.traceContours.
+        """
+        if not self.paths:
+            return []
+        robotPaths = transformService.toRobotPaths([p.points for p in self.paths],
+                                                   [p.height for p in self.paths],
+                                                   [p.rz for p in self.paths],
+                                                   preTransform=poseMatrix)
+        return [(robotPath.tolist(), path.settings) for robotPath, path in zip(robotPaths, self.paths)]
+
+    def toDict(self):
+        return {
+            "version": PROGRAM_VERSION,
+            "workpiece_id": self.workpieceId,
+            "fingerprint": self.fingerprint,
+            "matrix_fingerprint": self.matrixFingerprint,
+            "paths": [path.toDict() for path in self.paths],
+        }
+
+    @staticmethod
+    def fromDict(data):
+        if data.get("version") != PROGRAM_VERSION:
+            raise ValueError(f"Unsupported spray program version: {data.get('version')}")
+        return SprayProgram(data["workpiece_id"], data["fingerprint"], data["matrix_fingerprint"],
+                            [CompiledPath.fromDict(path) for path in data["paths"]])
+
+    def save(self, filePath):
+        with open(filePath, 'w') as file:
+            json.dump(self.toDict(), file)
+
+    @staticmethod
+    def load(filePath):
+        with open(filePath, 'r') as file:
+            return SprayProgram.fromDict(json.load(file))
+
+
+class SprayProgramCompiler:
+    """
+    Compiles workpieces into SprayPrograms.
+
+    Attributes:
+        transformService (CoordinateTransformService): Camera <-> robot transformation.
+        pathConditioner (PathConditioner): Selects the points to keep (tolerance in robot mm).
+        velocityProfiler (VelocityProfiler): Plans the per-segment velocities and pump speeds.
+        fillSpacing (float): Raster spacing of the fills in robot mm.
+    """
+
+    def __init__(self, transformService=None, pathConditioner=None, velocityProfiler=None, fillSpacing=FILL_SPACING):
+        self.transformService = transformService if transformService is not None else CoordinateTransformService()
+        self.pathConditioner = pathConditioner if pathConditioner is not None else PathConditioner()
+        self.velocityProfiler = velocityProfiler if velocityProfiler is not None else VelocityProfiler()
+        self.fillSpacing = fillSpacing
+
+    def compile(self, workpiece):
+        """
+        Compiles the spray program of a workpiece in its stored pose.
+
+        Args:
+            workpiece (Workpiece): The stored (not aligned) workpiece.
+
+        Returns:
+            SprayProgram: The compiled program.
+
+        Raises:
+            ValueError: If the calibration matrix is not available.
+        """
+        paths = []
+        contours = _patternEntries(workpiece, "Contour")
+        fills = [(points, settings) for points, settings in _patternEntries(workpiece, "Fill") if len(points) >= 3]
+
+        if not contours and not fills:
+            outline, settings = _outline(workpiece)
+            if outline is not None:
+                paths.append(self._compilePath(PATH_OUTLINE, outline, settings))
+
+        for points, settings in contours:
+            paths.append(self._compilePath(PATH_CONTOUR, points, settings))
+
+        for points, settings in fills:
+            # The raster is generated in robot mm so the spacing does not depend on the camera resolution
+            robotPolygon = self.transformService.cameraToRobot([points])[0]
+            passes = [np.asarray(p) for p in generateFillPaths(robotPolygon, self.fillSpacing, optimizeAngle=True)]
+            for localPass in self.transformService.robotToCamera(passes):
+                paths.append(self._compilePath(PATH_FILL, localPass, settings, condition=False))
+
+        return SprayProgram(workpiece.workpieceId, workpieceFingerprint(workpiece),
+                            matrixFingerprint(self.transformService.cameraToRobotMatrix), paths)
+
+    def _compilePath(self, kind, points, settings, condition=True):
+        height, rz = pathHeightAndRz(settings)
+        robotPath = self.transformService.toRobotPaths([points], [height], [rz])[0]
+        if condition:
+            indices = self.pathConditioner.conditionIndices(robotPath)
+            points, robotPath = points[indices], robotPath[indices]
+
+        velocity = float(settings.get(RobotSettingKey.VELOCITY.value) or DEFAULT_VELOCITY)
+        acceleration = float(settings.get(RobotSettingKey.ACCELERATION.value) or DEFAULT_ACCELERATION)
+        coefficient = float(settings.get(GlueSettingKey.GLUE_SPEED_COEFFICIENT.value, 1.0))
+        profile = self.velocityProfiler.plan(robotPath, velocity, acceleration, coefficient)
+
+        events = [
+            {"type": EVENT_TOOL_ON, "index": 0,
+             "time": -float(settings.get(GlueSettingKey.TIME_BEFORE_MOTION.value, 0.0))},
+            {"type": EVENT_TOOL_OFF, "index": len(points) - 1,
+             "time": float(settings.get(GlueSettingKey.TIME_BEFORE_STOP.value, 0.0))},
+        ]
+        return CompiledPath(kind, np.asarray(points, dtype=np.float64), settings, height, rz,
+                            profile.velocityPercent, profile.pumpSpeeds, events)
+
+
+class SprayProgramCache:
+    """
+    Compiled programs by workpiece, in memory and next to the workpiece files (singleton).
+
+    A program is valid while the workpiece fingerprint and the calibration matrix fingerprint match.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._init(*args, **kwargs)
+        return cls._instance
+
+    def _init(self, compiler=None):
+        self.compiler = compiler if compiler is not None else SprayProgramCompiler()
+        self.programs = {}
+        self._cacheLock = threading.Lock()
+
+    def programPath(self, workpiece):
+        """Program file next to the workpiece file or None if the workpiece was never stored."""
+        storageDir = getattr(workpiece, "storageDir", None)
+        if not storageDir:
+            return None
+        return os.path.join(storageDir, os.path.basename(os.path.normpath(storageDir)) + PROGRAM_FILE_SUFFIX)
+
+    def get(self, workpiece):
+        """
+        Returns the valid program of a workpiece, loading or compiling (and persisting) it if needed.
+
+        Raises:
+            ValueError: If the program has to be compiled and the calibration matrix is not available.
+        """
+        fingerprint = workpieceFingerprint(workpiece)
+        currentMatrix = matrixFingerprint(self.compiler.transformService.cameraToRobotMatrix)
+
+        with self._cacheLock:
+            program = self.programs.get(fingerprint)
+            if program is not None and program.matrixFingerprint == currentMatrix:
+                return program
+
+            filePath = self.programPath(workpiece)
+            if filePath and os.path.exists(filePath):
+                try:
+                    program = SprayProgram.load(filePath)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"[SprayProgramCache] Error loading {filePath}: {e}")
+                    program = None
+                if program is not None and program.fingerprint == fingerprint \
+                        and program.matrixFingerprint == currentMatrix:
+                    self.programs[fingerprint] = program
+                    return program
+
+            return self._compileAndStore(workpiece, filePath)
+
+    def compile(self, workpiece):
+        """Compiles and persists the program of a workpiece (e.g. when it is saved)."""
+        with self._cacheLock:
+            return self._compileAndStore(workpiece, self.programPath(workpiece))
+
+    def _compileAndStore(self, workpiece, filePath):
+        print(f"[SprayProgramCache] Compiling spray program of workpiece {workpiece.workpieceId}")
+        program = self.compiler.compile(workpiece)
+        self.programs[program.fingerprint] = program
+        if filePath:
+            try:
+                program.save(filePath)
+            except OSError as e:
+                print(f"[SprayProgramCache] Error saving {filePath}: {e}")
+        return program
+
+    def clear(self):
+        with self._cacheLock:
+            self.programs.clear()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+    from types import SimpleNamespace
+
+    import cv2
+
+    service = CoordinateTransformService()
+    service.setMatrix(np.array([[0.5, 0.01, -100.0], [0.02, -0.5, 400.0], [1e-5, 2e-5, 1.0]]))
+    settings = {RobotSettingKey.VELOCITY.value: 30, RobotSettingKey.ACCELERATION.value: 30}
+
+    # Rounded rectangle part (dense pixel contour) with an inner spray contour and a fill
+    t = np.linspace(0, 2 * np.pi, 720, endpoint=False)
+    outline = np.stack([640 + 300 * np.sign(np.cos(t)) * np.abs(np.cos(t)) ** 0.3,
+                        360 + 200 * np.sign(np.sin(t)) * np.abs(np.sin(t)) ** 0.3], axis=1)
+    inner = 640 + (outline - 640) * 0.8
+    fill = [[540, 300], [740, 300], [740, 420], [540, 420]]
+    workpiece = SimpleNamespace(workpieceId=1, contour={"contour": outline, "settings": {}},
+                                sprayPattern={"Contour": [{"contour": inner, "settings": settings}],
+                                              "Fill": [{"contour": fill, "settings": settings}]})
+    workpiece.storageDir = tempfile.mkdtemp()
+
+    compiler = SprayProgramCompiler(service)
+    cache = SprayProgramCache(compiler)
+    t0 = time.perf_counter()
+    program = cache.get(workpiece)
+    compileTime = time.perf_counter() - t0
+    print(f"compiled {len(program.paths)} paths ({sum(len(p.points) for p in program.paths)} points) "
+          f"in {compileTime * 1000:.1f} ms -> {cache.programPath(workpiece)}")
+
+    # Matched part: rotated by 30 degrees around its centroid and moved
+    pivot, angle, shift = (640, 360), 30.0, (40, -25)
+    pose = alignmentMatrix(angle, pivot, shift)
+
+    cache.clear()
+    t0 = time.perf_counter()
+    loaded = cache.get(workpiece)
+    loadTime = time.perf_counter() - t0
+
+    # Reference: rotate / translate every contour, transform, condition and fill per cycle
+    conditioner = PathConditioner()
+    t0 = time.perf_counter()
+    for _ in range(20):
+        aligned = [cv2.transform(c.reshape(-1, 1, 2), pose[:2]).reshape(-1, 2)
+                   for c in (inner, np.asarray(fill, dtype=float))]
+        reference = [conditioner.condition(p.tolist())
+                     for p in service.toRobotPaths(aligned[:1], [125.0], [0.0])]
+        for p in generateFillPaths(service.cameraToRobot(aligned[1:])[0], FILL_SPACING, optimizeAngle=True):
+            reference.append(p)
+    perCycle = (time.perf_counter() - t0) / 20
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        robotPaths = loaded.toRobotPaths(pose, service)
+    compiled = (time.perf_counter() - t0) / 20
+
+    # The compiled contour must match the contour aligned and transformed at runtime
+    expected = service.toRobotPaths([cv2.transform(loaded.paths[0].points.reshape(-1, 1, 2), pose[:2])],
+                                    [125.0], [0.0])[0]
+    error = np.max(np.abs(np.asarray(robotPaths[0][0]) - expected))
+    print(f"load from disk {loadTime * 1000:.1f} ms, per cycle recompute {perCycle * 1000:.2f} ms, "
+          f"compiled program {compiled * 1000:.3f} ms, max difference {error:.2e} mm")
@@ -0,0 +1,168 @@
+import numpy as np
+
+from GlueDispensingApplication.robot.RobotConfig import ROBOT_MAX_LINEAR_VELOCITY, ROBOT_MAX_LINEAR_ACCELERATION
+from GlueDispensingApplication.robot.CycleTimeEstimator import (segmentLengths, cornerSpeedLimits, limitJunctionSpeeds,
+                                                                trapezoidalSegmentTimes, DEFAULT_BLEND_RADIUS)
+
+"""
+VelocityProfiler
+----------------
+Curvature-aware velocity planning for spray paths.
+
+Every path used to run at the single velocity from the settings, so the robot slowed down in tight
+radii on its own while the pump kept dispensing and beads pooled in the corners. The profiler:
+    1. computes the discrete curvature at every point with vectorized finite differences (Menger
+       curvature of three consecutive points) and the blend radius limit of sharp corners,
+    2. limits the speed through every point with a lateral acceleration bound v = sqrt(a_lat / k),
+    3. makes the limits reachable with forward / backward passes over the tangential acceleration,
+    4. emits a velocity per segment (SDK percentage) and the matching pump speed schedule.
+While a path is traced the PumpSpeedController of RobotService reads the schedule (PumpSchedule) a pump
+lag ahead of the TCP, so the pump slows down for a tight radius before the robot does.
+"""
+
+MAX_LATERAL_ACCELERATION = 500.0  # mm/s^2 - keeps the bead shape in curves
+MIN_SPRAY_VELOCITY = 5.0  # mm/s - never plan below this speed
+
+
+def discreteCurvature(points):
+    """
+    Discrete curvature at every point of a path (vectorized Menger curvature).
+
+    Args:
+        points (array-like): Path of shape (N, >=2).
+
+    Returns:
+        np.ndarray: Curvature in 1/mm of shape (N,), 0 at the end points and on straight runs.
+    """
+    pts = np.asarray(points, dtype=float)
+    n = len(pts)
+    curvature = np.zeros(n)
+    if n < 3:
+        return curvature
+
+    xyz = pts[:, :3] if pts.shape[1] >= 3 else np.hstack([pts[:, :2], np.zeros((n, 1))])
+    a, b, c = xyz[:-2], xyz[1:-1], xyz[2:]
+    ab = np.linalg.norm(b - a, axis=1)
+    bc = np.linalg.norm(c - b, axis=1)
+    ac = np.linalg.norm(c - a, axis=1)
+    twiceArea = np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    denom = ab * bc * ac
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = np.where(denom > 1e-12, 2.0 * twiceArea / denom, 0.0)
+    curvature[1:-1] = k
+    return curvature
+
+
+class VelocityProfile:
+    """
+    Planned speeds of one path.
+
+    Attributes:
+        speeds (np.ndarray): Speed per segment in mm/s (segment i ends at point i + 1).
+        velocityPercent (np.ndarray): Speed per segment as SDK velocity percentage.
+        pumpSpeeds (np.ndarray): Pump speed register value per segment.
+        junctionSpeeds (np.ndarray): Feasible speed through every point in mm/s.
+        curvature (np.ndarray): Curvature per point in 1/mm.
+    """
+
+    def __init__(self, speeds, velocityPercent, pumpSpeeds, junctionSpeeds, curvature):
+        self.speeds = speeds
+        self.velocityPercent = velocityPercent
+        self.pumpSpeeds = pumpSpeeds
+        self.junctionSpeeds = junctionSpeeds
+        self.curvature = curvature
+
+    def segmentVelocity(self, start, end):
+        """Velocity percentage for a move covering segments start..end-1 (e.g. a MoveC)."""
+        return float(np.min(self.velocityPercent[start:end]))
+
+    def segmentPumpSpeed(self, start, end):
+        return int(np.min(self.pumpSpeeds[start:end]))
+
+
+class VelocityProfiler:
+    """
+    Plans per-segment velocities and pump speeds from the path geometry.
+
+    Attributes:
+        maxLateralAcceleration (float): Lateral acceleration bound in mm/s^2.
+        minVelocity (float): Lowest planned speed in mm/s.
+        blendR (float): Blend radius used for the MoveL's in mm.
+    """
+
+    def __init__(self, maxLateralAcceleration=MAX_LATERAL_ACCELERATION, minVelocity=MIN_SPRAY_VELOCITY,
+                 blendR=DEFAULT_BLEND_RADIUS, maxVelocity=ROBOT_MAX_LINEAR_VELOCITY,
+                 maxAcceleration=ROBOT_MAX_LINEAR_ACCELERATION):
+        self.maxLateralAcceleration = maxLateralAcceleration
+        self.minVelocity = minVelocity
+        self.blendR = blendR
+        self.maxVelocity = maxVelocity
+        self.maxAcceleration = maxAcceleration
+
+    def plan(self, path, velocityPercent, accelerationPercent, glueSpeedCoefficient=1.0, maxPumpSpeed=65535):
+        """
+        Plans the speeds of a path.
+
+        Args:
+            path (list): Robot poses [x, y, z, rx, ry, rz].
+            velocityPercent (float): Velocity from the settings (SDK %), the speed on straight runs.
+            accelerationPercent (float): Acceleration from the settings (SDK %).
+            glueSpeedCoefficient (float): Pump register units per mm/s.
+            maxPumpSpeed (int): Upper limit of the pump speed register.
+
+        Returns:
+            VelocityProfile: Planned speeds (empty arrays for paths with less than 2 points).
+        """
+        velocity = max(float(velocityPercent), 1e-3) / 100.0 * self.maxVelocity
+        acceleration = max(float(accelerationPercent), 1e-3) / 100.0 * self.maxAcceleration
+
+        if path is None or len(path) < 2:
+            empty = np.zeros(0)
+            return VelocityProfile(empty, empty, empty.astype(int), empty, empty)
+
+        curvature = discreteCurvature(path)
+        with np.errstate(divide='ignore'):
+            curveLimits = np.where(curvature > 1e-9, np.sqrt(self.maxLateralAcceleration / curvature), velocity)
+
+        # Sharp corners between long segments have little Menger curvature - the blend radius decides there
+        cornerLimits = cornerSpeedLimits(path, velocity, self.maxLateralAcceleration, self.blendR)
+        limits = np.minimum(np.minimum(curveLimits, velocity), np.maximum(cornerLimits, self.minVelocity))
+        limits = np.maximum(limits, self.minVelocity)
+        limits[0] = limits[-1] = velocity  # the path starts and ends with the dispensing on
+
+        lengths = segmentLengths(path)
+        junctions = limitJunctionSpeeds(lengths, limits, acceleration)
+        junctions = np.maximum(junctions, self.minVelocity)
+
+        # Cruise speed of every segment: the settings speed on long straights, the junction speeds in curves
+        vIn, vOut = junctions[:-1], junctions[1:]
+        peaks = np.sqrt(np.maximum((2 * acceleration * lengths + vIn ** 2 + vOut ** 2) / 2.0, 0.0))
+        speeds = np.maximum(np.minimum(velocity, peaks), np.minimum(vIn, vOut))
+        percent = np.clip(speeds / self.maxVelocity * 100.0, 1e-3, 100.0)
+        pumpSpeeds = np.clip(np.round(speeds * glueSpeedCoefficient), 0, maxPumpSpeed).astype(int)
+        return VelocityProfile(speeds, percent, pumpSpeeds, junctions, curvature)
+
+
+if __name__ == "__main__":
+    from GlueDispensingApplication.robot.CycleTimeEstimator import CycleTimeEstimator
+
+    # Rounded rectangle 300 x 200 with 15 mm corner radius (10 points per corner)
+    path = []
+    corners = [(285, 15, -90), (285, 185, 0), (15, 185, 90), (15, 15, 180)]
+    for cx, cy, startAngle in corners:
+        for a in np.radians(np.linspace(startAngle, startAngle + 90, 10)):
+            path.append([cx + 15 * np.cos(a), cy + 15 * np.sin(a), 100, 180, 0, 0])
+    path.append(path[0])
+
+    profiler = VelocityProfiler()
+    estimator = CycleTimeEstimator(calibrationPath=None, logPath=None)
+    lengths = segmentLengths(path)
+    for settingsVelocity in (10, 20, 40):
+        velocity, acceleration = estimator._toMotion(settingsVelocity, 30)
+        profile = profiler.plan(path, settingsVelocity, 30, glueSpeedCoefficient=20)
+        j = profile.junctionSpeeds
+        profiled = trapezoidalSegmentTimes(lengths, j[:-1], j[1:], profile.speeds, acceleration).sum()
+        print(f"vel {settingsVelocity} %: straight {profile.speeds.max():.0f} mm/s, corners "
+              f"{profile.speeds.min():.0f} mm/s, pump {profile.pumpSpeeds.min()}..{profile.pumpSpeeds.max()}, "
+              f"constant velocity {estimator.motionTime(path, settingsVelocity, 30):.2f} s, "
+              f"profiled {profiled:.2f} s")
@@ -67,6 +67,8 @@ class GlueDataFetcher:
         self.thread = None
         self._initialized = True
         self.broker = MessageBroker()
+        for topic in ("GlueMeter_1/VALUE", "GlueMeter_2/VALUE", "GlueMeter_3/VALUE"):
+            self.broker.conflate(topic)
 
     def fetch(self):
         try:
@@ -0,0 +1,286 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from API.MessageBroker import MessageBroker
+
+""" PUMP CONTROL LOOP DEFAULTS """
+PUMP_CONTROL_RATE_HZ = 50  # fixed loop rate
+PUMP_SPEED_DEADBAND = 50  # minimum register change that triggers a new write
+PUMP_MIN_WRITE_INTERVAL = 0.05  # seconds between two consecutive Modbus writes
+PUMP_MAX_SPEED = 65535  # upper limit of the motor speed register
+PUMP_STATS_PUBLISH_INTERVAL = 1.0  # seconds
+PUMP_ERROR_LOG_INTERVAL = 1.0  # seconds between two logged write errors, the loop keeps running at 50 Hz
+PUMP_SCHEDULE_LOOKAHEAD = 0.1  # seconds, the schedule is read this far ahead of the TCP (about the pump lag)
+PUMP_SCHEDULE_SEARCH_DISTANCE = 50.0  # mm of path after the last located segment searched for the TCP
+
+
+class PumpSchedule:
+    """
+    Planned pump speed along one path (VelocityProfile.pumpSpeeds), looked up by the TCP position.
+
+    The TCP is located on the nearest segment from the one it was last located on up to
+    PUMP_SCHEDULE_SEARCH_DISTANCE further along the path, so the path is followed in order - also a closed
+    contour that ends where it starts.
+
+    Attributes:
+        pumpSpeeds (np.ndarray): Pump speed register value per segment.
+        segment (int): Segment the TCP was last located on.
+        distance (float): Path length in mm up to the last located TCP position.
+    """
+
+    def __init__(self, path, pumpSpeeds, searchDistance=PUMP_SCHEDULE_SEARCH_DISTANCE):
+        points = np.asarray([p[:3] for p in path], dtype=float)
+        self.starts = points[:-1]
+        self.vectors = np.diff(points, axis=0)
+        self.lengths = np.linalg.norm(self.vectors, axis=1)
+        self.cumulative = np.r_[0.0, np.cumsum(self.lengths)]
+        self.pumpSpeeds = np.asarray(pumpSpeeds, dtype=float)
+        if len(self.pumpSpeeds) != len(self.lengths) or len(self.lengths) == 0:
+            raise ValueError(f"Expected one pump speed per segment ({len(self.lengths)}), got {len(self.pumpSpeeds)}")
+        self.searchDistance = searchDistance
+        self.segment = 0
+        self.distance = 0.0
+
+    def locate(self, position):
+        """
+        Locates the TCP on the path.
+
+        Args:
+            position (list): TCP pose, only x, y, z are used.
+
+        Returns:
+            float: Path length in mm from the first point to the TCP.
+        """
+        first = self.segment
+        last = int(np.searchsorted(self.cumulative, self.distance + self.searchDistance, side="right"))
+        last = min(max(last, first + 1), len(self.lengths))
+        relative = np.asarray(position[:3], dtype=float) - self.starts[first:last]
+        vectors = self.vectors[first:last]
+        t = np.clip(np.einsum("ij,ij->i", relative, vectors) / np.maximum(self.lengths[first:last] ** 2, 1e-12),
+                    0.0, 1.0)
+        nearest = int(np.argmin(np.linalg.norm(relative - t[:, None] * vectors, axis=1)))
+        self.segment = first + nearest
+        self.distance = self.cumulative[self.segment] + t[nearest] * self.lengths[self.segment]
+        return self.distance
+
+    def speedAt(self, position, lookahead=0.0):
+        """
+        Planned pump speed at a distance ahead of the TCP.
+
+        Args:
+            position (list): TCP pose.
+            lookahead (float): Distance ahead of the TCP along the path in mm.
+
+        Returns:
+            float: Pump speed register value.
+        """
+        distance = self.locate(position) + max(lookahead, 0.0)
+        index = int(np.searchsorted(self.cumulative, distance, side="right")) - 1
+        return float(self.pumpSpeeds[min(max(index, 0), len(self.pumpSpeeds) - 1)])
+
+
+class PumpSpeedController:
+    """
+    Fixed-rate closed-loop controller that couples the glue pump speed to the robot TCP velocity.
+
+    Every cycle the pump command is computed from the latest realtime state of the robot
+    (velocity feed-forward plus following-error compensation) and only written to the motor
+    speed register when it differs from the last written value by more than the deadband and
+    the minimum write interval has elapsed. This keeps the RS-485 bus load bounded regardless
+    of how fast the robot state changes.
+
+    With a PumpSchedule the planned pump speed PUMP_SCHEDULE_LOOKAHEAD ahead of the TCP caps the command,
+    so the pump already slows down for a tight radius before the robot does instead of one pump lag later.
+
+    Loop jitter statistics are published on `statsTopic`. A failing cycle (e.g. a Modbus write error) is
+    counted and logged at most once per PUMP_ERROR_LOG_INTERVAL; the loop keeps running.
+
+    Attributes:
+        stateProvider: Object exposing `speed`, `accel`, `pos` and `following_error_gain`
+                       (e.g. RobotStateManager).
+        writeFunction (callable): Function `(motorAddress, speed)` that writes the speed register.
+        motorAddress (int): Motor speed register address.
+        coefficient (float): Glue speed coefficient (register units per mm/s).
+        schedule (PumpSchedule or None): Planned pump speed along the path being traced.
+    """
+
+    def __init__(self, stateProvider, writeFunction, motorAddress, coefficient,
+                 rateHz=PUMP_CONTROL_RATE_HZ,
+                 deadband=PUMP_SPEED_DEADBAND,
+                 minWriteInterval=PUMP_MIN_WRITE_INTERVAL,
+                 maxSpeed=PUMP_MAX_SPEED,
+                 useSecondOrder=True,
+                 schedule=None,
+                 scheduleLookahead=PUMP_SCHEDULE_LOOKAHEAD):
+        self.stateProvider = stateProvider
+        self.writeFunction = writeFunction
+        self.motorAddress = motorAddress
+        self.coefficient = coefficient
+        self.period = 1.0 / rateHz
+        self.deadband = deadband
+        self.minWriteInterval = minWriteInterval
+        self.maxSpeed = maxSpeed
+        self.useSecondOrder = useSecondOrder
+        self.schedule = schedule
+        self.scheduleLookahead = scheduleLookahead
+
+        self.statsTopic = "glue/pump/controller/stats"
+        self.broker = MessageBroker()
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.lastWrittenSpeed = None
+        self.lastWriteTime = 0.0
+        self.telemetry = None  # optional MotionTelemetryRecorder, receives every register write
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._resetStats()
+
+    def _resetStats(self):
+        self.cycles = 0
+        self.writes = 0
+        self.skippedWrites = 0
+        self.overruns = 0
+        self.failures = 0
+        self.jitterSum = 0.0
+        self.jitterMax = 0.0
+
+    def computeCommand(self):
+        """
+        Computes the pump speed command from the latest robot state.
+
+        Returns:
+            int: Pump speed register value clamped to [0, maxSpeed].
+        """
+        velocity = self.stateProvider.speed
+        accel = self.stateProvider.accel
+        gain = self.stateProvider.following_error_gain
+
+        # Feed-forward on TCP velocity with 1st order following error compensation
+        feedForward = velocity + gain * velocity
+
+        # Optional 2nd order: account for accel lag
+        if self.useSecondOrder:
+            feedForward += (gain * 0.5) * accel
+
+        command = feedForward * self.coefficient
+
+        # Planned pump speed where the TCP will be one pump lag from now, with the same compensation
+        position = self.stateProvider.pos
+        if self.schedule is not None and position is not None:
+            planned = self.schedule.speedAt(position, velocity * self.scheduleLookahead)
+            command = min(command, planned * (1.0 + gain))
+
+        command = int(round(command))
+        return max(0, min(self.maxSpeed, command))
+
+    def update(self, now):
+        """
+        Runs one control cycle: computes the command and writes it if it changed meaningfully.
+
+        Args:
+            now (float): Current monotonic time in seconds.
+
+        Returns:
+            bool: True if the register was written.
+        """
+        command = self.computeCommand()
+
+        if self.lastWrittenSpeed is not None:
+            if abs(command - self.lastWrittenSpeed) < self.deadband:
+                return False
+            if now - self.lastWriteTime < self.minWriteInterval:
+                self.skippedWrites += 1
+                return False
+
+        self.write(command, now)
+        return True
+
+    def write(self, speed, now=None):
+        """Writes the speed register and records the written value."""
+        self.writeFunction(self.motorAddress, speed)
+        self.lastWrittenSpeed = speed
+        self.lastWriteTime = time.monotonic() if now is None else now
+        self.writes += 1
+        if self.telemetry is not None:
+            self.telemetry.recordPump(self.lastWriteTime, speed)
+
+    def getStats(self):
+        """
+        Returns the loop statistics collected since the controller was started.
+
+        Returns:
+            dict: cycles, writes, skipped writes, overruns, failed cycles and jitter (seconds).
+        """
+        return {
+            "rate_hz": 1.0 / self.period,
+            "cycles": self.cycles,
+            "writes": self.writes,
+            "skipped_writes": self.skippedWrites,
+            "overruns": self.overruns,
+            "failures": self.failures,
+            "jitter_mean": self.jitterSum / self.cycles if self.cycles else 0.0,
+            "jitter_max": self.jitterMax,
+        }
+
+    def run(self):
+        nextTick = time.monotonic()
+        lastStatsPublish = nextTick
+        lastErrorLog = None
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            jitter = now - nextTick
+            self.cycles += 1
+            self.jitterSum += jitter
+            self.jitterMax = max(self.jitterMax, jitter)
+
+            try:
+                self.update(now)
+            except Exception:
+                self.failures += 1
+                if lastErrorLog is None or now - lastErrorLog >= PUMP_ERROR_LOG_INTERVAL:
+                    self.logger.exception("Error updating pump speed of motor %s (%d failed cycles)",
+                                          self.motorAddress, self.failures)
+                    lastErrorLog = now
+
+            if now - lastStatsPublish >= PUMP_STATS_PUBLISH_INTERVAL:
+                self.broker.publish(self.statsTopic, self.getStats())
+                lastStatsPublish = now
+
+            # Schedule on absolute deadlines so the rate does not drift
+            nextTick += self.period
+            delay = nextTick - time.monotonic()
+            if delay < 0:
+                # Loop overran its period - skip the missed ticks instead of bursting
+                self.overruns += 1
+                nextTick = time.monotonic()
+                continue
+            self._stop_event.wait(delay)
+
+    def start(self, initialSpeed=None):
+        """
+        Starts the control loop thread.
+
+        Args:
+            initialSpeed (int, optional): Speed written once before the loop starts.
+        """
+        self._stop_event.clear()
+        self._resetStats()
+        self.lastWrittenSpeed = None
+        if initialSpeed is not None:
+            self.write(int(initialSpeed))
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the control loop and publishes the final statistics."""
+        self._stop_event.set()
+        if self._thread is not None and threading.current_thread() != self._thread:
+            self._thread.join(timeout=1)
+        self._thread = None
+        self.broker.publish(self.statsTopic, self.getStats())
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from API.MessageBroker import MessageBroker, DELIVERY_SYNC
+
+"""
+CoordinateTransformService
+--------------------------
+Single owner of the camera -> robot homography.
+
+The matrix is loaded once, its inverse (robot -> camera) and validity are cached, and whole batches of
+contours are transformed with ONE cv2.perspectiveTransform call over a concatenated buffer that is
+sliced back per contour. The service reloads the matrix when RobotCalibrationService publishes a new
+one (MATRIX_UPDATED_TOPIC) or when the file on disk changes.
+"""
+
+CAMERA_TO_ROBOT_MATRIX_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'VisionSystem', 'calibration',
+                                           'cameraCalibration', 'storage', 'calibration_result',
+                                           'cameraToRobotMatrix.npy')
+MATRIX_UPDATED_TOPIC = "robot/calibration/matrixUpdated"
+MATRIX_FILE_CHECK_INTERVAL = 1.0  # seconds between two checks of the matrix file modification time
+
+ROBOT_RX = 180.0  # standard spraying orientation
+ROBOT_RY = 0.0
+
+
+def _concatenate(contours):
+    """Stacks contours into one (N, 1, 2) float64 buffer and returns it with the slice offsets."""
+    arrays = [np.asarray(c, dtype=np.float64).reshape(-1, 2) for c in contours]
+    counts = np.array([len(a) for a in arrays], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    if offsets[-1] == 0:
+        return np.empty((0, 1, 2), dtype=np.float64), offsets
+    return np.concatenate(arrays).reshape(-1, 1, 2), offsets
+
+
+class CoordinateTransformService:
+    """
+    Cached, batched camera <-> robot coordinate transformations (singleton).
+
+    Attributes:
+        matrixPath (str): Path of the camera-to-robot homography (.npy).
+        cameraToRobotMatrix (np.ndarray): 3x3 homography camera -> robot or None.
+        robotToCameraMatrix (np.ndarray): Cached inverse or None.
+        isValid (bool): True if a finite, invertible matrix is loaded.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+                cls._instance._init(*args, **kwargs)
+        return cls._instance
+
+    def _init(self, matrixPath=CAMERA_TO_ROBOT_MATRIX_PATH):
+        self.matrixPath = matrixPath
+        self.cameraToRobotMatrix = None
+        self.robotToCameraMatrix = None
+        self.isValid = False
+        self._matrixMtime = None
+        self._lastFileCheck = 0.0
+        self._matrixLock = threading.Lock()
+
+        self.reload()
+        self.broker = MessageBroker()
+        # Synchronous: the matrix is in place when publish returns, so no cycle plans with the old one
+        self.broker.subscribe(MATRIX_UPDATED_TOPIC, self.onMatrixUpdated, mode=DELIVERY_SYNC)
+
+    """ MATRIX MANAGEMENT """
+
+    def setMatrix(self, matrix):
+        """
+        Sets the camera-to-robot homography and caches its inverse.
+
+        Args:
+            matrix (np.ndarray): 3x3 homography or None.
+
+        Returns:
+            bool: True if the matrix is valid.
+        """
+        with self._matrixLock:
+            self.cameraToRobotMatrix = None
+            self.robotToCameraMatrix = None
+            self.isValid = False
+            if matrix is None:
+                return False
+            matrix = np.asarray(matrix, dtype=np.float64).reshape(3, 3)
+            if not np.isfinite(matrix).all():
+                print("[CoordinateTransformService] Camera to robot matrix contains invalid values")
+                return False
+            try:
+                inverse = np.linalg.inv(matrix)
+            except np.linalg.LinAlgError:
+                print("[CoordinateTransformService] Camera to robot matrix is singular")
+                return False
+            self.cameraToRobotMatrix = matrix
+            self.robotToCameraMatrix = inverse
+            self.isValid = True
+            return True
+
+    def reload(self):
+        """Loads the matrix from `matrixPath`. Returns True on success."""
+        try:
+            self._matrixMtime = os.path.getmtime(self.matrixPath)
+            matrix = np.load(self.matrixPath)
+        except (OSError, ValueError) as e:
+            print(f"[CoordinateTransformService] Error loading matrix: {e}")
+            self._matrixMtime = None
+            return self.setMatrix(None)
+        return self.setMatrix(matrix)
+
+    def onMatrixUpdated(self, message=None):
+        """Broker callback - uses the published matrix if present, otherwise reloads from disk."""
+        matrix = message.get("matrix") if isinstance(message, dict) else None
+        if matrix is not None:
+            self.setMatrix(matrix)
+            try:
+                self._matrixMtime = os.path.getmtime(self.matrixPath)
+            except OSError:
+                pass
+        else:
+            self.reload()
+
+    def _checkMatrixFile(self):
+        now = time.monotonic()
+        if now - self._lastFileCheck < MATRIX_FILE_CHECK_INTERVAL:
+            return
+        self._lastFileCheck = now
+        try:
+            mtime = os.path.getmtime(self.matrixPath)
+        except OSError:
+            return
+        if mtime != self._matrixMtime:
+            print("[CoordinateTransformService] Camera to robot matrix changed on disk - reloading")
+            self.reload()
+
+    def _matrices(self):
+        self._checkMatrixFile()
+        if not self.isValid:
+            raise ValueError("Camera to robot matrix is not available - calibrate the robot first")
+        return self.cameraToRobotMatrix, self.robotToCameraMatrix
+
+    """ TRANSFORMATIONS """
+
+    def cameraToRobot(self, contours):
+        """
+        Transforms a batch of camera contours to robot coordinates in one call.
+
+        Args:
+            contours (list): Contours of shape (N, 2) or (N, 1, 2).
+
+        Returns:
+            list: One (N, 2) float64 array per contour.
+        """
+        matrix, _ = self._matrices()
+        return self._transformBatch(contours, matrix)
+
+    def robotToCamera(self, contours):
+        """Transforms a batch of robot contours to camera coordinates with the cached inverse."""
+        _, inverse = self._matrices()
+        return self._transformBatch(contours, inverse)
+
+    def robotPointToCamera(self, x, y):
+        """
+        Transforms a single robot point to camera coordinates (hot path of the trajectory preview).
+
+        Returns:
+            tuple: (x_cam, y_cam)
+        """
+        _, inverse = self._matrices()
+        hx = inverse[0, 0] * x + inverse[0, 1] * y + inverse[0, 2]
+        hy = inverse[1, 0] * x + inverse[1, 1] * y + inverse[1, 2]
+        hw = inverse[2, 0] * x + inverse[2, 1] * y + inverse[2, 2]
+        return hx / hw, hy / hw
+
+    def toRobotPaths(self, contours, heights, rzAngles, preTransform=None):
+        """
+        Transforms camera contours to robot poses [x, y, z, rx, ry, rz] in one vectorized pass.
+
+        Args:
+            contours (list): Camera contours of shape (N, 2) or (N, 1, 2).
+            heights (list): Z value per contour.
+            rzAngles (list): RZ angle per contour.
+            preTransform (np.ndarray, optional): 3x3 camera frame transformation applied before the
+                                                 homography (e.g. the pose of a matched workpiece).
+
+        Returns:
+            list: One (N, 6) float64 array per contour.
+        """
+        matrix, _ = self._matrices()
+        if preTransform is not None:
+            matrix = matrix @ np.asarray(preTransform, dtype=np.float64)
+        buffer, offsets = _concatenate(contours)
+        if len(buffer) == 0:
+            return [np.empty((0, 6)) for _ in contours]
+
+        xy = cv2.perspectiveTransform(buffer, matrix).reshape(-1, 2)
+        counts = np.diff(offsets)
+        poses = np.empty((len(xy), 6), dtype=np.float64)
+        poses[:, :2] = xy
+        poses[:, 2] = np.repeat(np.asarray(heights, dtype=np.float64), counts)
+        poses[:, 3] = ROBOT_RX
+        poses[:, 4] = ROBOT_RY
+        poses[:, 5] = np.repeat(np.asarray(rzAngles, dtype=np.float64), counts)
+        return [poses[offsets[i]:offsets[i + 1]] for i in range(len(contours))]
+
+    def _transformBatch(self, contours, matrix):
+        buffer, offsets = _concatenate(contours)
+        if len(buffer) == 0:
+            return [np.empty((0, 2)) for _ in contours]
+        transformed = cv2.perspectiveTransform(buffer, matrix).reshape(-1, 2)
+        return [transformed[offsets[i]:offsets[i + 1]] for i in range(len(contours))]
+
+
+if __name__ == "__main__":
+    service = CoordinateTransformService()
+    service.setMatrix(np.array([[0.5, 0.01, -100.0], [0.02, -0.5, 400.0], [1e-5, 2e-5, 1.0]]))
+
+    rng = np.random.default_rng(0)
+    contours = [rng.uniform(0, 1280, size=(int(n), 2)).astype(np.float32) for n in rng.integers(50, 500, 40)]
+
+    # Reference: one perspectiveTransform per contour (utils.applyTransformation) and per point pose lists
+    # (GlueSprayingApplication._convert_to_robot_path)
+    t0 = time.perf_counter()
+    for _ in range(20):
+        reference = [cv2.perspectiveTransform(c.reshape(-1, 1, 2), service.cameraToRobotMatrix) for c in contours]
+        paths = [[[float(p[0][0]), float(p[0][1]), 125.0, 180.0, 0.0, 0.0] for p in r] for r in reference]
+    perContour = (time.perf_counter() - t0) / 20
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        batched = service.toRobotPaths(contours, [125.0] * len(contours), [0.0] * len(contours))
+    batch = (time.perf_counter() - t0) / 20
+
+    error = max(np.max(np.abs(r.reshape(-1, 2) - b[:, :2])) for r, b in zip(reference, batched))
+    print(f"{sum(len(c) for c in contours)} points: per contour {perContour * 1000:.2f} ms, "
+          f"batched {batch * 1000:.2f} ms, max difference {error:.2e}")
+
+    # Reference: inverse per call (utils.transformSinglePointToCamera)
+    t0 = time.perf_counter()
+    for _ in range(10000):
+        inverse = np.linalg.inv(service.cameraToRobotMatrix)
+        h = inverse @ np.array([100.0, 200.0, 1])
+        h[0] / h[2], h[1] / h[2]
+    single = (time.perf_counter() - t0) / 10000
+    t0 = time.perf_counter()
+    for _ in range(10000):
+        service.robotPointToCamera(100.0, 200.0)
+    cached = (time.perf_counter() - t0) / 10000
+    print(f"robot -> camera point: inverse per call {single * 1e6:.1f} us, cached inverse {cached * 1e6:.1f} us")
@@ -0,0 +1,256 @@
+import struct
+import time
+
+import numpy as np
+
+from API.shared.SharedMemory import attach_shared_memory, create_shared_memory
+
+"""
+FrameBus
+--------
+Camera frames in shared memory, readable by any process on the machine.
+
+The writer (the vision service) owns a named segment with a ring of FRAME_BUS_SLOTS slots. Publishing a
+frame is one memcpy into the next slot; readers (GUI, recorder, MJPEG streamer, ...) attach by name and
+map the latest slot as a NumPy array without copying it.
+
+Every slot starts with a seqlock header (sequence, frame number, timestamp, shape, dtype). The writer
+makes the sequence odd before it touches the slot and even again when the frame is complete, so a reader
+that sees the same even sequence before and after reading knows the frame was not overwritten meanwhile.
+A zero-copy view stays valid until the writer wraps around the ring (FRAME_BUS_SLOTS - 1 frames later);
+BusFrame.isValid() re-checks the sequence after the frame was used, latest(copy=True) returns a private
+copy instead.
+"""
+
+FRAME_BUS_NAME = "glue_dispensing_frames"
+FRAME_BUS_SLOTS = 4
+FRAME_BUS_SLOT_SIZE = 1920 * 1080 * 3  # bytes, largest frame
+FRAME_BUS_POLL_INTERVAL = 0.001  # seconds between checks of waitForFrame
+
+BUS_MAGIC = b"FRAMEBUS"
+BUS_HEADER = struct.Struct("<8sIIQ")  # magic, slot count, slot size, latest frame number (0 = none)
+SLOT_HEADER = struct.Struct("<QQdI4I8s")  # sequence, frame number, timestamp, ndim, shape, dtype
+HEADER_SIZE = 64  # bus and slot headers are padded to keep the frame data aligned
+MAX_DIMENSIONS = 4
+
+
+class BusFrame:
+    """
+    A frame read from the bus.
+
+    Attributes:
+        number (int): Frame number, increasing by one per published frame.
+        timestamp (float): time.monotonic() of the capture (system wide on Linux).
+        image (numpy.ndarray): Read-only view into the slot, or a private copy.
+    """
+
+    def __init__(self, reader, slot, sequence, number, timestamp, image):
+        self._reader = reader
+        self._slot = slot
+        self._sequence = sequence
+        self.number = number
+        self.timestamp = timestamp
+        self.image = image
+
+    def isValid(self):
+        """False if the writer has since overwritten the slot of a zero-copy frame."""
+        return self._reader._slotSequence(self._slot) == self._sequence
+
+
+class _FrameBus:
+    def __init__(self, memory, slotCount, slotSize):
+        self.memory = memory
+        self.buffer = memory.buf
+        self.slotCount = slotCount
+        self.slotSize = slotSize
+
+    def _slotOffset(self, slot):
+        return HEADER_SIZE + slot * (HEADER_SIZE + self.slotSize)
+
+    def _slotSequence(self, slot):
+        return struct.unpack_from("<Q", self.buffer, self._slotOffset(slot))[0]
+
+    def latestNumber(self):
+        return BUS_HEADER.unpack_from(self.buffer, 0)[3]
+
+    def close(self):
+        self.buffer = None
+        try:
+            self.memory.close()
+        except BufferError:
+            pass  # zero-copy frames still reference the segment, it is released with them
+
+
+class FrameBusWriter(_FrameBus):
+    """
+    Owner of the bus, publishes frames.
+
+    Attributes:
+        frameNumber (int): Number of the last published frame.
+    """
+
+    def __init__(self, name=FRAME_BUS_NAME, slotCount=FRAME_BUS_SLOTS, slotSize=FRAME_BUS_SLOT_SIZE):
+        memory = create_shared_memory(name, HEADER_SIZE + slotCount * (HEADER_SIZE + slotSize))
+        super().__init__(memory, slotCount, slotSize)
+        self.name = name
+        self.frameNumber = 0
+        BUS_HEADER.pack_into(self.buffer, 0, BUS_MAGIC, slotCount, slotSize, 0)
+        for slot in range(slotCount):
+            SLOT_HEADER.pack_into(self.buffer, self._slotOffset(slot), 0, 0, 0.0, 0, 0, 0, 0, 0, b"")
+
+    def publish(self, frame, timestamp=None):
+        """
+        Copies a frame into the next slot.
+
+        Args:
+            frame (numpy.ndarray): Frame to publish (at most slotSize bytes, up to 4 dimensions).
+            timestamp (float): Capture time, time.monotonic() if None.
+
+        Returns:
+            int: Frame number, None if the frame does not fit a slot.
+        """
+        if frame.nbytes > self.slotSize or frame.ndim > MAX_DIMENSIONS:
+            print(f"[FrameBus] Frame {frame.shape} {frame.dtype} does not fit a {self.slotSize} byte slot")
+            return None
+        number = self.frameNumber + 1
+        slot = number % self.slotCount
+        offset = self._slotOffset(slot)
+        sequence = self._slotSequence(slot)
+
+        struct.pack_into("<Q", self.buffer, offset, sequence + 1)  # odd: being written
+        target = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.buffer, offset=offset + HEADER_SIZE)
+        np.copyto(target, frame)
+        shape = tuple(frame.shape) + (0,) * (MAX_DIMENSIONS - frame.ndim)
+        SLOT_HEADER.pack_into(self.buffer, offset, sequence + 1, number,
+                              time.monotonic() if timestamp is None else timestamp, frame.ndim, *shape,
+                              frame.dtype.str.encode())
+        struct.pack_into("<Q", self.buffer, offset, sequence + 2)  # even: complete
+
+        struct.pack_into("<Q", self.buffer, BUS_HEADER.size - 8, number)
+        self.frameNumber = number
+        return number
+
+    def close(self):
+        super().close()
+        try:
+            self.memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameBusReader(_FrameBus):
+    """Attaches to a bus published by another process (or thread)."""
+
+    def __init__(self, name=FRAME_BUS_NAME):
+        memory = attach_shared_memory(name)
+        magic, slotCount, slotSize, _ = BUS_HEADER.unpack_from(memory.buf, 0)
+        if magic != BUS_MAGIC:
+            memory.close()
+            raise ValueError(f"Shared memory '{name}' is not a frame bus")
+        super().__init__(memory, slotCount, slotSize)
+        self.name = name
+
+    def latest(self, copy=False, retries=3):
+        """
+        Reads the most recent frame.
+
+        Args:
+            copy (bool): Return a private copy instead of a view into the slot.
+            retries (int): Attempts when the writer is overwriting the slot being read.
+
+        Returns:
+            BusFrame: The frame, None if nothing was published yet (or every attempt was torn).
+        """
+        for _ in range(retries + 1):
+            number = self.latestNumber()
+            if number == 0:
+                return None
+            slot = number % self.slotCount
+            offset = self._slotOffset(slot)
+            sequence, slotNumber, timestamp, ndim, *rest = SLOT_HEADER.unpack_from(self.buffer, offset)
+            if sequence % 2 or slotNumber != number:
+                continue  # being written, or the writer has lapped us
+            shape, dtype = tuple(rest[:ndim]), np.dtype(rest[MAX_DIMENSIONS].rstrip(b"\0").decode())
+            image = np.ndarray(shape, dtype=dtype, buffer=self.buffer, offset=offset + HEADER_SIZE)
+            if copy:
+                image = image.copy()
+            else:
+                image.flags.writeable = False
+            if self._slotSequence(slot) != sequence:
+                continue
+            return BusFrame(self, slot, sequence, number, timestamp, image)
+        return None
+
+    def waitForFrame(self, afterNumber=0, timeout=1.0, copy=False):
+        """Waits for a frame newer than afterNumber. Returns None on timeout."""
+        deadline = time.monotonic() + timeout
+        while self.latestNumber() <= afterNumber:
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(FRAME_BUS_POLL_INTERVAL)
+        return self.latest(copy)
+
+
+def _writerProcess(name, count, shape):
+    writer = FrameBusWriter(name, slotSize=int(np.prod(shape)))
+    frame = np.empty(shape, dtype=np.uint8)
+    publishTimes = []
+    print("ready", flush=True)
+    for number in range(1, count + 1):
+        frame.fill(number % 256)  # lets the reader detect torn frames
+        start = time.perf_counter()
+        writer.publish(frame)
+        publishTimes.append(time.perf_counter() - start)
+        time.sleep(1 / 60.0)
+    publishTimes.sort()
+    print(f"writer: publish p50 {publishTimes[len(publishTimes) // 2] * 1000:.3f} ms "
+          f"p99 {publishTimes[int(len(publishTimes) * 0.99)] * 1000:.3f} ms per frame", flush=True)
+    time.sleep(0.5)
+    writer.close()
+
+
+if __name__ == "__main__":
+    import subprocess
+    import sys
+
+    if len(sys.argv) == 3 and sys.argv[1] == "--writer":
+        _writerProcess(sys.argv[2], 300, (720, 1280, 3))
+        sys.exit(0)
+
+    # A writer process publishing 720p at 60 Hz, this process reads it like an out-of-process GUI would
+    name = f"frame_bus_bench_{int(time.time())}"
+    writer = subprocess.Popen([sys.executable, "-m", "GlueDispensingApplication.vision.FrameBus", "--writer", name],
+                              stdout=subprocess.PIPE, text=True)
+    writer.stdout.readline()
+    reader = FrameBusReader(name)
+
+    last, seen, torn, stale = 0, 0, 0, 0
+    ages, viewTimes, copyTimes = [], [], []
+    while writer.poll() is None:
+        frame = reader.waitForFrame(last, timeout=0.5)
+        if frame is None:
+            continue
+        ages.append(time.monotonic() - frame.timestamp)
+        start = time.perf_counter()
+        view = reader.latest()
+        viewTimes.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        copied = reader.latest(copy=True)
+        copyTimes.append(time.perf_counter() - start)
+        # Use the zero-copy frame, then check it was not overwritten meanwhile
+        if view is not None:
+            consistent = view.image[0, 0, 0] == view.image[-1, -1, -1] == view.number % 256
+            if not view.isValid():
+                stale += 1
+            elif not consistent:
+                torn += 1
+        seen += frame.number - last > 0
+        last = frame.number
+        del frame, view, copied
+    print(writer.stdout.read().strip())
+    for label, values in (("notify age", ages), ("zero-copy read", viewTimes), ("copying read", copyTimes)):
+        values.sort()
+        print(f"reader: {label:<15} p50 {values[len(values) // 2] * 1e6:8.1f} us  "
+              f"p99 {values[int(len(values) * 0.99)] * 1e6:8.1f} us")
+    print(f"reader: {seen} of {last} frames seen, {torn} torn, {stale} overwritten while in use")
+    reader.close()
@@ -6,6 +6,8 @@ import threading
 import numpy as np
 from API.shared.workpiece.WorkpieceService import WorkpieceService
 from GlueDispensingApplication.robot.RobotCalibrationService import CAMERA_TO_ROBOT_MATRIX_PATH
+from GlueDispensingApplication.vision.CoordinateTransformService import CoordinateTransformService
+from GlueDispensingApplication.vision.FrameBus import FrameBusWriter, FRAME_BUS_NAME
 from GlueDispensingApplication.utils import utils, Overlay
 from VisionSystem.VisionSystem import VisionSystem
 import os
@@ -81,11 +83,14 @@ class _VisionService(VisionSystem):
 
         self.latest_frame = None
         self.frame_lock = threading.Lock()
+        self.frameBus = None  # FrameBusWriter publishing every frame to other processes
 
         self.contours = None
+        self.contoursTimestamp = None  # time.monotonic() of the frame the contours were detected in
         self.workAreaCorners = None
         self.filteredContours = None
         self.pickupCamToRobotMatrix = self._loadPickupCamToRobotMatrix()
+        self.coordinateTransformService = CoordinateTransformService()
         broker = MessageBroker()
         broker.subscribe("vision/transformToCamera",self.transformRobotPointToCamera)
 
@@ -133,6 +138,7 @@ class _VisionService(VisionSystem):
 
         while True:
             self.contours, frame, _ = super().run()
+            self.contoursTimestamp = time.monotonic()
             state = "waiting_image" if frame is None else "ok"
             now = time.time()
             if now - last_publish_time >= publish_interval:
@@ -154,9 +160,20 @@ class _VisionService(VisionSystem):
             # update latest_frame safely
             with self.frame_lock:
                 self.latest_frame = frame
+            if self.frameBus is not None:
+                self.frameBus.publish(frame, self.contoursTimestamp)
 
 
 
+    def enableFrameBus(self, name=FRAME_BUS_NAME):
+        """
+        Publishes every camera frame (BGR) on a shared memory frame bus that other processes
+        (GUI, recorder, streamer) read with FrameBusReader(name).
+        """
+        if self.frameBus is None:
+            self.frameBus = FrameBusWriter(name)
+        return self.frameBus
+
     def getLatestFrame(self):
         """
             Retrieves the latest frame from the queue.
@@ -398,8 +415,8 @@ class _VisionService(VisionSystem):
         # message format {"x": x, "y": y}
         x = message.get("x")
         y = message.get("y")
-        point = (x, y)
-        return utils.transformSinglePointToCamera(point,self.cameraToRobotMatrix)
+        # Cached inverse instead of inverting the homography for every trajectory point
+        return self.coordinateTransformService.robotPointToCamera(x, y)
 
 if __name__ == "__main__":
     # Example usage
@@ -1,6 +1,7 @@
 from API.shared.workpiece.WorkpieceService import WorkpieceService
 from API import Constants
 from GlueDispensingApplication.workpiece.Workpiece import Workpiece
+from GlueDispensingApplication.robot.SprayProgramCompiler import SprayProgramCache
 
 
 class WorkpieceController:
@@ -68,5 +69,12 @@ class WorkpieceController:
 
         workpiece = Workpiece.fromDict(data)
         print("WP: ",workpiece)
-        return self.workpieceService.saveWorkpiece(workpiece)
+        result = self.workpieceService.saveWorkpiece(workpiece)
+
+        # Compile the spray program now so the first cycle only has to place it
+        try:
+            SprayProgramCache().compile(workpiece)
+        except ValueError as e:
+            print(f"Spray program not compiled, it will be compiled on first use: {e}")
+        return result
 
@@ -13,7 +13,7 @@ from src.plvision.PLVision.arucoModule import *
 from API.shared.settings.conreateSettings.CameraSettings import CameraSettings
 from API.shared.settings.conreateSettings.enums.CameraSettingKey import CameraSettingKey
 import logging
-from GlueDispensingApplication.SystemStatePublisherThread import SystemStatePublisherThread
+from GlueDispensingApplication.SystemStatePublisher import SystemStatePublisher
 import platform
 import cv2
 import enum
@@ -43,12 +43,11 @@ class VisionSystemState(Enum):
 class VisionSystem:
     def __init__(self, configFilePath=None, camera_settings=None):
         self.logger = logging.getLogger(self.__class__.__name__)
-        self.state=VisionSystemState.INITIALIZING
         self.stateTopic = "vision-system/state"
+        self.statePublisher = SystemStatePublisher()
+        self.state = VisionSystemState.INITIALIZING
 
         self.broker = MessageBroker()
-        self.system_state_publisher = SystemStatePublisherThread(publish_state_func=self.publishState, interval=0.1)
-        self.system_state_publisher.start()
 
         self.calibrationImages = []
 
@@ -589,9 +588,15 @@ class VisionSystem:
             data = json.load(f)
         return data
 
-    def publishState(self):
-        # print("Publishing state:", self.state)
-        self.broker.publish(self.stateTopic, self.state)
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        # Transitions are published by the state publisher, repeated assignments are not
+        self._state = state
+        self.statePublisher.report(self.stateTopic, state)
 
 if __name__ == "__main__":
     vision_system = VisionSystem()
@@ -55,17 +55,19 @@ else:
     pass
 
 if testRobot:
-    from GlueDispensingApplication.robot.RobotWrapper import TestRobotWrapper
-    robot = TestRobotWrapper()
+    from GlueDispensingApplication.robot.SimulatedRobotWrapper import SimulatedRobotWrapper
+    robot = SimulatedRobotWrapper()
 else:
     from GlueDispensingApplication.robot.RobotWrapper import RobotWrapper
     robot = RobotWrapper(ROBOT_IP)
 
 if __name__ == "__main__":
     messageBroker = MessageBroker()
+    messageBroker.start_metrics()  # topic rates and handler latency on "broker/metrics"
     # INIT SERVICES
     settingsService = SettingsService()
     cameraService = VisionServiceSingleton().get_instance()
+    cameraService.enableFrameBus()  # frames for out-of-process consumers (FrameBusReader)
 
     try:
         glueNozzleService = GlueNozzleService.get_instance()
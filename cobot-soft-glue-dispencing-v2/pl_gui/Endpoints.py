@@ -13,6 +13,7 @@ STOP_CONTOUR_DETECTION = "STOP_CONTOUR_DETECTION"
 CALIBRATE = "calibrate"
 CALIBRATE_CAMERA = "calibrate_camera"
 CALIBRATE_ROBOT = "calibrate_robot"
+AUTO_CALIBRATE_ROBOT = "auto_calibrate_robot"
 CAPTURE_CALIBRATION_IMAGE = "capture_calibration_image"
 HOME_ROBOT = "home_robot"
 GO_TO_CALIBRATION_POS = "GO_to_calibration_pos"
@@ -24,10 +25,13 @@ TEST_CALIBRATION = "test_calibration"
 SAVE_WORK_AREA_POINTS = "save_work_area_points"
 WORPIECE_GET_ALL = "WORKPIECE_GET_ALL"
 UPDATE_CAMERA_FEED = "cameraFeed/update"
+REQUEST_CAMERA_FEED = "cameraFeed/request"
 CREATE_WORKPIECE_TOPIC = "CREATE_WORKPIECE_TOPIC"
 SAVE_ROBOT_CALIBRATION_POINT = "SAVE_ROBOT_CALIBRATION_POINT"
 HELP = "HELP"
 RAW_MODE_ON = "rawModeOn"
 RAW_MODE_OFF = "rawModeOff"
 
-TEST_RUN = "test_run"
\ No newline at end of file
+TEST_RUN = "test_run"
+RECORD_CYCLE_TIMES = "record_cycle_times"
+CALIBRATE_CYCLE_TIME = "calibrate_cycle_time"
\ No newline at end of file
@@ -4,7 +4,7 @@ from API.MessageBroker import MessageBroker
 from pl_gui.Endpoints import WORPIECE_GET_ALL, CALIBRATE, GO_TO_CALIBRATION_POS, RAW_MODE_ON, CALIBRATE_CAMERA, \
     CAPTURE_CALIBRATION_IMAGE, JOG_ROBOT, CALIBRATE_ROBOT, TEST_CALIBRATION, SAVE_WORK_AREA_POINTS
 from pl_gui.main_application.appWidgets.AppWidget import AppWidget
-from pl_gui.main_application.helpers.Endpoints import UPDATE_CAMERA_FEED, HOME_ROBOT, SAVE_ROBOT_CALIBRATION_POINT
+from pl_gui.main_application.helpers.Endpoints import REQUEST_CAMERA_FEED, HOME_ROBOT, SAVE_ROBOT_CALIBRATION_POINT
 
 
 class ServiceCalibrationAppWidget(AppWidget):
@@ -31,8 +31,8 @@ class ServiceCalibrationAppWidget(AppWidget):
             from pl_gui.settings_view.CalibrationSettingsTab import CalibrationServiceTabLayout
 
             def updateCameraFeedCallback():
-                frame = self.controller.handle(UPDATE_CAMERA_FEED)
-                self.content_layout.update_camera_feed(frame)
+                # Timer driven: fetched in the background, at most one request in flight
+                self.controller.handle(REQUEST_CAMERA_FEED, self.content_layout.update_camera_feed)
 
             self.content_widget = QWidget(self.parent)
             self.content_layout = CalibrationServiceTabLayout()
@@ -1,6 +1,6 @@
 from pl_gui.Endpoints import RAW_MODE_ON, RAW_MODE_OFF
 from pl_gui.main_application.appWidgets.AppWidget import AppWidget
-from pl_gui.main_application.helpers.Endpoints import GET_SETTINGS, UPDATE_CAMERA_FEED, UPDATE_SETTINGS
+from pl_gui.main_application.helpers.Endpoints import GET_SETTINGS, REQUEST_CAMERA_FEED, UPDATE_SETTINGS
 
 
 class SettingsAppWidget(AppWidget):
@@ -31,9 +31,8 @@ class SettingsAppWidget(AppWidget):
                 self.controller.handle(UPDATE_SETTINGS, key, value, className)
 
             def updateCameraFeedCallback():
-
-                frame = self.controller.handle(UPDATE_CAMERA_FEED)
-                self.content_widget.updateCameraFeed(frame)
+                # Timer driven: fetched in the background, at most one request in flight
+                self.controller.handle(REQUEST_CAMERA_FEED, self.content_widget.updateCameraFeed)
 
             def onRawModeRequested(state):
                 if state:
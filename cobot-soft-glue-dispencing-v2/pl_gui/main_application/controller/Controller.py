@@ -1,4 +1,3 @@
-from PyQt6.QtCore import QThread
 from API.Request import Request
 from API.Response import Response
 from API import Constants
@@ -6,7 +5,7 @@ from API.shared.settings.conreateSettings.CameraSettings import CameraSettings
 from API.shared.settings.conreateSettings.GlueSettings import GlueSettings
 from API.shared.settings.conreateSettings.RobotSettings import RobotSettings
 
-from .RequestWorker import RequestWorker
+from .RequestExecutor import RequestExecutor
 from ..helpers.FeedbackProvider import FeedbackProvider
 from pl_gui.settings_view.CameraSettingsTabLayout import CameraSettingsTabLayout
 from pl_gui.settings_view.ContourSettingsTabLayout import ContourSettingsTabLayout
@@ -21,6 +20,7 @@ class Controller:
         self.logTag = self.__class__.__name__
         self.logger = logging.getLogger(self.__class__.__name__)
         self.requestSender = requestSender
+        self.executor = RequestExecutor(requestSender)
         self.endpointsMap = {}
         self.registerEndpoints()
 
@@ -36,6 +36,7 @@ class Controller:
             CAPTURE_CALIBRATION_IMAGE: self.handleCaptureCalibrationImage,
             CALIBRATE_CAMERA: self.handleCalibrateCamera,
             CALIBRATE_ROBOT: self.handleCalibrateRobot,
+            AUTO_CALIBRATE_ROBOT: self.handleAutoCalibrateRobot,
             TEST_CALIBRATION: self.handleTestCalibration,
             SAVE_WORK_AREA_POINTS: self.handleSaveWorkAreaPoints,
             HOME_ROBOT: self.homeRobot,
@@ -44,6 +45,7 @@ class Controller:
             SAVE_WORKPIECE: self.saveWorkpiece,
             SAVE_WORKPIECE_DXF: self.saveWorkpieceFromDXF,
             UPDATE_CAMERA_FEED:self.updateCameraFeed,
+            REQUEST_CAMERA_FEED: self.requestCameraFeed,
             CREATE_WORKPIECE_TOPIC: self.createWorkpieceAsync,
             SAVE_ROBOT_CALIBRATION_POINT: self.saveRobotCalibrationPoint,
             HELP: self.handleHelp,
@@ -52,6 +54,8 @@ class Controller:
             STOP_CONTOUR_DETECTION: self.handleStopContourDetection,
             WORPIECE_GET_ALL: self.handleGetAllWorpieces,
             TEST_RUN: self.handleTestRun,
+            RECORD_CYCLE_TIMES: self.handleRecordCycleTimes,
+            CALIBRATE_CYCLE_TIME: self.handleCalibrateCycleTime,
             RAW_MODE_ON: self.handleRawModeOn,
             RAW_MODE_OFF: self.handleRawModeOff,
             "executeFromGallery": self.handleExecuteFromGallery
@@ -190,6 +194,34 @@ class Controller:
         return True, response.message
 
 
+    def handleAutoCalibrateRobot(self, onFinished=None):
+        request = Constants.ROBOT_AUTO_CALIBRATE
+        def onSuccess(req, resp):
+            FeedbackProvider.showMessage(resp.message)
+            if onFinished:
+                onFinished(resp.status == Constants.RESPONSE_STATUS_SUCCESS, resp.message)
+
+        def onError(req, err):
+            self.logger.error(f"{self.logTag}] CALLBACK ERROR MESSAGE {err}")
+            if onFinished:
+                onFinished(False, str(err))
+
+        # A second click while the routine runs joins it instead of moving the robot twice
+        return self._runAsyncRequest(request, onSuccess, onError, coalesce=True)
+
+    def handleRecordCycleTimes(self, enabled):
+        request = Constants.ROBOT_CYCLE_TIME_RECORD
+        response = self.requestSender.sendRequest(request, data=enabled)
+        response = Response.from_dict(response)
+        return response.status == Constants.RESPONSE_STATUS_SUCCESS, response.message
+
+    def handleCalibrateCycleTime(self):
+        request = Constants.ROBOT_CYCLE_TIME_CALIBRATE
+        response = self.requestSender.sendRequest(request)
+        response = Response.from_dict(response)
+        FeedbackProvider.showMessage(response.message)
+        return response.status == Constants.RESPONSE_STATUS_SUCCESS, response.message
+
     def handleCalibrateCamera(self):
         """ MOVE ROBOT TO CALIBRATION POSITION"""
         print("Calibrating camera")
@@ -329,6 +361,17 @@ class Controller:
         frame = response.data['frame']
         return frame
 
+    def requestCameraFeed(self, onFrame):
+        """
+        Fetches the latest frame in the background and calls onFrame(frame) in the GUI thread. Timer driven
+        callers never pile up requests: at most one is in flight and the latest caller receives the frame.
+        """
+        def onSuccess(req, resp):
+            if resp.status == Constants.RESPONSE_STATUS_SUCCESS:
+                onFrame(resp.data['frame'])
+
+        return self._runAsyncRequest(Constants.CAMERA_ACTION_GET_LATEST_FRAME, onSuccess, coalesce=True)
+
     def handleJog(self, axis, direction, step):
         request = f"robot/jog/{axis}/{direction}/{step}"
 
@@ -368,7 +411,7 @@ class Controller:
             return Constants.RESPONSE_STATUS_ERROR
 
         if asyncParam:
-            self._runAsyncRequest(request,onSuccess,onError)
+            self._runAsyncRequest(request,onSuccess,onError,coalesce=True)
         else:
             resp = self.requestSender.sendRequest(request)
             resp = Response.from_dict(resp)
@@ -389,7 +432,8 @@ class Controller:
         def onError(req, err):
             self.logger.error(f"{self.logTag}] CALLBACK ERROR MESSAGE {err}")
 
-        self._runAsyncRequest(request, onSuccess, onError)
+        # A second start while one is running joins it instead of starting the cycle twice
+        self._runAsyncRequest(request, onSuccess, onError, coalesce=True)
 
 
     def createWorkpieceAsync(self, onSuccess, onError=None):
@@ -403,32 +447,17 @@ class Controller:
                 contours = resp.data['contours']
                 onSuccess(frame, contours, resp.data)
 
-        self._runAsyncRequest(request, successCallback, onError)
-
-    def _runAsyncRequest(self, request, onSuccess, onError=None):
-        thread = QThread()
-        worker = RequestWorker(self.requestSender, request)
-        worker.moveToThread(thread)
-
-        def cleanup():
-            thread.quit()
-            thread.wait()
-            worker.deleteLater()
-            thread.deleteLater()
-
-        def handleFinished(req, resp):
-            cleanup()
-            if onSuccess:
-                onSuccess(req, resp)
+        self._runAsyncRequest(request, successCallback, onError, coalesce=True)
 
-        def handleError(req, error):
-            cleanup()
-            if onError:
-                self.logger.error(f"{self.logTag}] [_runAsyncRequest onError] {req} {error}")
-                onError(req, error)
+    def _runAsyncRequest(self, request, onSuccess, onError=None, coalesce=False, data=None):
+        """
+        Sends a request on the executor's thread pool; onSuccess(request, response) and onError(request, error)
+        are called in the GUI thread.
 
-        thread.started.connect(worker.run)
-        worker.finished.connect(handleFinished)
-        worker.error.connect(handleError)
-        thread.start()
+        Args:
+            coalesce (bool): Join an identical request in flight (idempotent requests only).
 
+        Returns:
+            RequestHandle: Handle to cancel the request.
+        """
+        return self.executor.submit(request, onSuccess, onError, data=data, coalesce=coalesce)
@@ -0,0 +1,179 @@
+from PyQt6.QtCore import QObject, QThreadPool
+import logging
+
+from .RequestWorker import RequestWorker, RequestWorkerSignals
+
+"""
+RequestExecutor
+---------------
+Runs the controller's background requests on a bounded QThreadPool.
+
+The controller used to create a QThread per asynchronous request. Timer driven requests (camera feed)
+and repeated clicks created threads continuously and piled up duplicate requests while the backend was
+slow. The executor reuses REQUEST_WORKERS pool threads and:
+    - coalesces idempotent requests: with coalesce=True at most one request per key (the request string
+      unless given) is in flight; a new caller joins the running request and supersedes the previous
+      caller, so only the latest caller receives the result,
+    - bounds the backlog: with REQUEST_MAX_PENDING requests queued or running, new ones are rejected and
+      their onError is called at once,
+    - supports cancellation: RequestHandle.cancel() removes a queued request from the pool; a request
+      that is already running completes, but its result is dropped,
+    - delivers results in the GUI thread: the workers emit signals of an object living in the GUI
+      thread, so onSuccess(request, response) and onError(request, error) may update widgets.
+"""
+
+REQUEST_WORKERS = 4  # pool threads sending requests
+REQUEST_MAX_PENDING = 32  # queued and running requests before new ones are rejected
+
+
+class RequestHandle:
+    """
+    A caller's interest in the result of a request.
+
+    Attributes:
+        key (str): Coalescing key.
+        request (str): The request.
+        cancelled (bool): Cancelled or superseded by a later caller, the callbacks will not be called.
+        done (bool): The callbacks were called (or the request was rejected).
+    """
+
+    def __init__(self, executor, key, request, onSuccess, onError):
+        self.executor = executor
+        self.key = key
+        self.request = request
+        self.onSuccess = onSuccess
+        self.onError = onError
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        self.executor.cancel(self)
+
+
+class RequestExecutor(QObject):
+    """
+    Bounded, coalescing executor of background requests. Create and use it in the GUI thread.
+
+    Attributes:
+        submitted (int): Requests started on the pool.
+        coalesced (int): Calls that joined a request already in flight.
+        rejected (int): Calls rejected because the backlog was full.
+        cancelled (int): Cancelled calls.
+        completed (int): Calls whose onSuccess was called.
+        failed (int): Calls whose onError was called.
+    """
+
+    def __init__(self, requestSender, workers=REQUEST_WORKERS, maxPending=REQUEST_MAX_PENDING, parent=None):
+        super().__init__(parent)
+        self.logTag = self.__class__.__name__
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.requestSender = requestSender
+        self.maxPending = maxPending
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(workers)
+        self.signals = RequestWorkerSignals(self)  # lives in the GUI thread, results are queued to it
+        self.signals.finished.connect(self._onFinished)
+        self.signals.error.connect(self._onError)
+        self._handles = {}  # worker -> RequestHandle of the caller receiving its result
+        self._inFlight = {}  # coalescing key -> worker
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, request, onSuccess=None, onError=None, data=None, coalesce=False, key=None):
+        """
+        Sends a request on the pool.
+
+        Args:
+            request (str): The request.
+            onSuccess (Callable): Called in the GUI thread with (request, Response).
+            onError (Callable): Called in the GUI thread with (request, error).
+            data: Payload of the request. It is not part of the default coalescing key.
+            coalesce (bool): Join an identical request in flight instead of sending another one.
+            key (str): Coalescing key, the request if None.
+
+        Returns:
+            RequestHandle: Handle to cancel the call.
+        """
+        key = request if key is None else key
+        handle = RequestHandle(self, key, request, onSuccess, onError)
+
+        worker = self._inFlight.get(key) if coalesce else None
+        if worker is not None:
+            self._handles[worker].cancelled = True  # superseded, the latest caller receives the result
+            self._handles[worker] = handle
+            self.coalesced += 1
+            return handle
+
+        if len(self._handles) >= self.maxPending:
+            self.rejected += 1
+            handle.done = True
+            self.logger.warning(f"{self.logTag}] Rejected '{request}': {len(self._handles)} requests pending")
+            if onError:
+                onError(request, RuntimeError(f"Request '{request}' rejected, too many pending requests"))
+            return handle
+
+        worker = RequestWorker(self.requestSender, request, data, self.signals)
+        self._handles[worker] = handle
+        if coalesce:
+            self._inFlight[key] = worker
+        self.submitted += 1
+        self.pool.start(worker)
+        return handle
+
+    def cancel(self, handle):
+        """Drops the callbacks of a call; its request is removed from the pool if it has not started yet."""
+        if handle.done or handle.cancelled:
+            return
+        handle.cancelled = True
+        self.cancelled += 1
+        for worker, current in list(self._handles.items()):
+            if current is handle:
+                if self.pool.tryTake(worker):
+                    self._release(worker)
+                else:
+                    worker.cancelled = True  # skipped if it has not started yet, otherwise its result is dropped
+                break
+
+    def _release(self, worker):
+        handle = self._handles.pop(worker, None)
+        if handle is not None and self._inFlight.get(handle.key) is worker:
+            del self._inFlight[handle.key]
+        return handle
+
+    def _onFinished(self, worker, response):
+        handle = self._release(worker)
+        if handle is None or handle.cancelled:
+            return
+        handle.done = True
+        self.completed += 1
+        if handle.onSuccess:
+            handle.onSuccess(handle.request, response)
+
+    def _onError(self, worker, error):
+        handle = self._release(worker)
+        if handle is None or handle.cancelled:
+            return
+        handle.done = True
+        self.failed += 1
+        self.logger.error(f"{self.logTag}] [_onError] {handle.request} {error}")
+        if handle.onError:
+            handle.onError(handle.request, error)
+
+    def shutdown(self, timeout=5000):
+        """Drops the queued requests and waits at most timeout ms for the running ones."""
+        self.pool.clear()
+        for handle in self._handles.values():
+            handle.cancelled = True
+        self._handles.clear()
+        self._inFlight.clear()
+        self.pool.waitForDone(timeout)
+
+    def metrics(self):
+        return {"workers": self.pool.maxThreadCount(), "active": self.pool.activeThreadCount(),
+                "pending": len(self._handles), "submitted": self.submitted, "coalesced": self.coalesced,
+                "rejected": self.rejected, "cancelled": self.cancelled, "completed": self.completed,
+                "failed": self.failed}
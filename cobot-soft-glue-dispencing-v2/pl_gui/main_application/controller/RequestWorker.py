@@ -1,18 +1,42 @@
-from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
 from API.Response import Response
-class RequestWorker(QObject):
-    finished = pyqtSignal(object, object)  # request, response
-    error = pyqtSignal(object, object)     # request, error
 
-    def __init__(self, requestSender, request):
+
+class RequestWorkerSignals(QObject):
+    finished = pyqtSignal(object, object)  # worker, response
+    error = pyqtSignal(object, object)     # worker, error
+
+
+class RequestWorker(QRunnable):
+    """
+    Sends one request on a QThreadPool thread and reports the response through `signals`.
+
+    Attributes:
+        request (str): The request to send.
+        data: Payload of the request.
+        cancelled (bool): Set before the worker started to skip the request (finished with response None).
+    """
+
+    def __init__(self, requestSender, request, data=None, signals=None):
         super().__init__()
+        self.setAutoDelete(False)  # the executor keeps it until its result was delivered
         self.requestSender = requestSender
         self.request = request
+        self.data = data
+        self.signals = signals if signals is not None else RequestWorkerSignals()
+        self.cancelled = False
 
     def run(self):
+        if self.cancelled:
+            self.signals.finished.emit(self, None)  # lets the executor release it
+            return
         try:
-            response_dict = self.requestSender.sendRequest(self.request)
+            # Senders without a payload argument (API RequestSender, mock controllers) get the request only
+            if self.data is None:
+                response_dict = self.requestSender.sendRequest(self.request)
+            else:
+                response_dict = self.requestSender.sendRequest(self.request, self.data)
             response = Response.from_dict(response_dict)
-            self.finished.emit(self.request, response)
+            self.signals.finished.emit(self, response)
         except Exception as e:
-            self.error.emit(self.request, e)
+            self.signals.error.emit(self, e)
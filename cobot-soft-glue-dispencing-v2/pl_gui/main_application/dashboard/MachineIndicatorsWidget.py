@@ -111,6 +111,7 @@ class MachineToolbar(QWidget):
 
     # Add signal for thread-safe GUI updates
     gui_update_signal = pyqtSignal(str)
+    eta_update_signal = pyqtSignal(float)
 
     def __init__(self):
         super().__init__()
@@ -122,10 +123,12 @@ class MachineToolbar(QWidget):
 
         # Connect the thread-safe signal to the actual update method
         self.gui_update_signal.connect(self._update_info_label_safe)
+        self.eta_update_signal.connect(self._update_eta_label_safe)
 
         # Subscribe to broker - weak references will handle cleanup automatically
         broker = MessageBroker()
         broker.subscribe("vision/state", self.update_info_label_threadsafe)
+        broker.subscribe("robot/cycle/eta", self.update_eta_label_threadsafe)
 
     def setup_ui(self):
         self.setStyleSheet("""
@@ -159,6 +162,18 @@ class MachineToolbar(QWidget):
         """)
         layout.addWidget(self.state_label)
 
+        # Estimated cycle time of the current program
+        self.eta_label = QLabel("ETA: --")
+        self.eta_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.eta_label.setFont(QFont("Roboto", 10, QFont.Weight.Medium))
+        self.eta_label.setStyleSheet("""
+            background: #F3EDF7;
+            color: #6750A4;
+            border-radius: 8px;
+            padding: 4px 10px;
+        """)
+        layout.addWidget(self.eta_label)
+
         # Spacer
         layout.addStretch()
         # Language Selector (centered)
@@ -213,6 +228,18 @@ class MachineToolbar(QWidget):
             print(f"Widget deleted during callback: {e}")
             # The weak reference system will handle cleanup automatically
 
+    def update_eta_label_threadsafe(self, message):
+        """Thread-safe handler for cycle time estimates published by the application"""
+        try:
+            self.eta_update_signal.emit(float(message.get("total", 0.0)))
+        except RuntimeError as e:
+            print(f"Widget deleted during callback: {e}")
+
+    def _update_eta_label_safe(self, seconds):
+        """Main thread GUI update method for the ETA label"""
+        minutes, secs = divmod(int(round(seconds)), 60)
+        self.eta_label.setText(f"ETA: {minutes:d}:{secs:02d}")
+
     def _update_info_label_safe(self, info):
         """Main thread GUI update method"""
         # Check if widgets still exist before updating
@@ -18,6 +18,7 @@ SAVE_WORKPIECE = "save_workpiece"
 SAVE_WORKPIECE_DXF = "save_workpiece_dxf"
 WORPIECE_GET_ALL = "WORKPIECE_GET_ALL"
 UPDATE_CAMERA_FEED = "cameraFeed/update"
+REQUEST_CAMERA_FEED = "cameraFeed/request"
 CREATE_WORKPIECE_TOPIC = "CREATE_WORKPIECE_TOPIC"
 SAVE_ROBOT_CALIBRATION_POINT = "SAVE_ROBOT_CALIBRATION_POINT"
 HELP = "HELP"